@@ -0,0 +1,230 @@
+"""
+Name: DeckCache
+breif: Binary cache of parsed input decks keyed by a content hash for MCDC-TNT
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+from mcdc_tnt.mesh_import import NpzMember, ImportMesh, MeshFiles
+
+
+# bumped whenever the parsed setup changes layout, old caches are rebuilt
+CACHE_VERSION = 2
+
+# modules that build the parsed setup, any edit to them invalidates caches
+# (CACHE_VERSION alone relies on someone remembering to bump it)
+PARSER_SOURCES = ('input_parser.py', 'sampling.py', 'weight_windows.py', 'mesh_import.py', 'deck_cache.py')
+
+# sha256 of PARSER_SOURCES, read once per run
+_parser_hash = None
+
+# cache files go next to the deck
+CACHE_DIR = '.mcdc_tnt_cache'
+
+# per cell arrays of the setup, memory mapped when the cache is read
+MESH_NAMES = ('mesh_cap_xsec', 'mesh_scat_xsec', 'mesh_fis_xsec', 'mesh_total_xsec')
+
+
+def CachePaths(input_file):
+    """
+    Array (.npz) and metadata (.json) cache files of an input deck
+    """
+    directory = os.path.join(os.path.dirname(os.path.abspath(input_file)), CACHE_DIR)
+    name = os.path.basename(input_file)
+    return(os.path.join(directory, name + '.npz'), os.path.join(directory, name + '.json'))
+
+
+def ParserHash():
+    """
+    sha256 of the source of every module in PARSER_SOURCES, so a cache
+    written by another version of the parser is never used
+    """
+    global _parser_hash
+    if _parser_hash is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in PARSER_SOURCES:
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(f.read())
+        _parser_hash = digest.hexdigest()
+    return(_parser_hash)
+
+
+def DeckHash(input_file, mesh_files):
+    """
+    sha256 of the parser source (ParserHash), the deck contents and the
+    size and modification time of every mesh file it references (hashing
+    multi GB meshes on every run would cost more than parsing)
+    """
+    digest = hashlib.sha256()
+    digest.update(str(CACHE_VERSION).encode())
+    digest.update(ParserHash().encode())
+    with open(input_file, 'rb') as f:
+        digest.update(f.read())
+    for path in mesh_files:
+        stat = os.stat(path)
+        digest.update('{0}:{1}:{2}'.format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns).encode())
+    return(digest.hexdigest())
+
+
+def SaveCache(input_file, setup):
+    """
+    Writes the parsed setup of an input deck (SimulationSetup's return) to
+    its cache: arrays into an uncompressed .npz, everything else and the
+    deck hash into a .json written last. Imported meshes are not copied,
+    they are mapped again from their files on a cache hit
+
+    Returns
+    -------
+    True if the cache was written.
+
+    """
+    [comp_parms, sim_perams] = setup[:2]
+    directory = os.path.dirname(os.path.abspath(input_file))
+    mesh_files = MeshFiles(sim_perams['mesh_file'], directory)
+
+    arrays = {}
+    metadata = {'version': CACHE_VERSION,
+                'hash': DeckHash(input_file, mesh_files),
+                'mesh files': mesh_files,
+                'comp_parms': Encode(comp_parms, 'comp_parms', arrays),
+                'sim_perams': Encode(sim_perams, 'sim_perams', arrays)}
+    if sim_perams['mesh_file'] is None:
+        for name, values in zip(MESH_NAMES, setup[2:6]):
+            arrays[name] = values
+    arrays['surface_distances'] = setup[6]
+
+    [array_file, metadata_file] = CachePaths(input_file)
+    try:
+        os.makedirs(os.path.dirname(array_file), exist_ok=True)
+        #replaced whole so a concurrent run never reads half a file
+        with open(array_file + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(array_file + '.tmp', array_file)
+        with open(metadata_file + '.tmp', 'w') as f:
+            json.dump(metadata, f)
+        os.replace(metadata_file + '.tmp', metadata_file)
+    except OSError as error:
+        print('>>>Could not write the input deck cache ({0}), continuing without'.format(error))
+        return(False)
+    return(True)
+
+
+def LoadCache(input_file):
+    """
+    Setup of an input deck from its cache, None when there is no cache or
+    the deck (or a mesh file it references) changed since it was written.
+    Mesh arrays are memory mapped (copy on write) so a hit costs about a
+    file open whatever the mesh size
+    """
+    [array_file, metadata_file] = CachePaths(input_file)
+    try:
+        with open(metadata_file, 'r') as f:
+            metadata = json.load(f)
+        if (metadata['version'] != CACHE_VERSION) or (metadata['hash'] != DeckHash(input_file, metadata['mesh files'])):
+            return(None)
+
+        with np.load(array_file) as archive:
+            arrays = {name: archive[name] for name in archive.files if name not in MESH_NAMES}
+        comp_parms = Decode(metadata['comp_parms'], arrays)
+        sim_perams = Decode(metadata['sim_perams'], arrays)
+
+        if sim_perams['mesh_file'] is None:
+            mesh = [NpzMember(array_file, name) for name in MESH_NAMES]
+        else:
+            mesh = ImportMesh(sim_perams['mesh_file'], sim_perams['N_mesh'],
+                              os.path.dirname(os.path.abspath(input_file)))
+    except (OSError, ValueError, KeyError):
+        #missing, unreadable or stale cache, parse the deck again
+        return(None)
+
+    return(comp_parms, sim_perams, mesh[0], mesh[1], mesh[2], mesh[3], arrays['surface_distances'])
+
+
+def Encode(parameters, prefix, arrays):
+    """
+    JSON version of a parameter dict, arrays (and lists of arrays) move to
+    arrays and are replaced by {'__array__': name} references
+    """
+    encoded = {}
+    for key, value in parameters.items():
+        name = '{0}/{1}'.format(prefix, key)
+        if isinstance(value, np.ndarray):
+            arrays[name] = value
+            encoded[key] = {'__array__': name}
+        elif isinstance(value, list) and any(isinstance(v, np.ndarray) for v in value):
+            encoded[key] = {'__arrays__': []}
+            for i, v in enumerate(value):
+                arrays['{0}/{1}'.format(name, i)] = v
+                encoded[key]['__arrays__'].append('{0}/{1}'.format(name, i))
+        elif isinstance(value, np.generic):
+            encoded[key] = value.item()
+        else:
+            encoded[key] = value
+    return(encoded)
+
+
+def Decode(encoded, arrays):
+    """
+    Parameter dict back from Encode
+    """
+    parameters = {}
+    for key, value in encoded.items():
+        if isinstance(value, dict) and ('__array__' in value):
+            parameters[key] = arrays[value['__array__']]
+        elif isinstance(value, dict) and ('__arrays__' in value):
+            parameters[key] = [arrays[name] for name in value['__arrays__']]
+        else:
+            parameters[key] = value
+    return(parameters)
+
+
+def test_DeckCache():
+    import tempfile
+    comp_parms = {'seed': 7, 'hard_targ': 'pp'}
+    sim_perams = {'N_mesh': 3, 'dx': np.float64(0.5), 'mesh_file': None, 'implicit_capture': None,
+                  'tally_meshes': [np.array([0, 1.5]), np.array([0, .5, 1.5])], 'source_pdf': np.full(3, 1/3),
+                  'isotropic': 'Ture'}
+    mesh = [np.full(3, 0.1), np.full(3, 0.2), np.full(3, 0.3), np.full(3, 0.6)]
+    setup = (comp_parms, sim_perams, *mesh, np.array([0, 1.5]))
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, 'deck.yaml')
+        with open(input_file, 'w') as f:
+            f.write('name: deck\n')
+
+        assert(LoadCache(input_file) is None)
+        assert(SaveCache(input_file, setup) == True)
+
+        cached = LoadCache(input_file)
+        assert(cached[0] == comp_parms)
+        assert(cached[1]['dx'] == 0.5 and cached[1]['isotropic'] == 'Ture')
+        assert(cached[1]['implicit_capture'] is None)
+        assert(np.array_equal(cached[1]['tally_meshes'][1], [0, .5, 1.5]))
+        assert(isinstance(cached[2], np.memmap))
+        for values, cached_values in zip(mesh, cached[2:6]):
+            assert(np.array_equal(values, cached_values))
+
+        #any change to the deck invalidates the cache
+        with open(input_file, 'a') as f:
+            f.write('# changed\n')
+        assert(LoadCache(input_file) is None)
+
+        #and so does any change to the parser
+        global _parser_hash
+        assert(SaveCache(input_file, setup) == True)
+        assert(LoadCache(input_file) is not None)
+        parser_hash = ParserHash()
+        try:
+            _parser_hash = 'edited parser'
+            assert(LoadCache(input_file) is None)
+        finally:
+            _parser_hash = parser_hash
+
+
+if __name__ == '__main__':
+    test_DeckCache()
@@ -1,5 +1,18 @@
 import numpy as np
 from timeit import default_timer as timer
+from mcdc_tnt.tallies import BatchTally
+from mcdc_tnt.weight_windows import WindowsFromFlux
+from mcdc_tnt.sampling import CumulativeTable
+from mcdc_tnt.timing import KernelTimer, FigureOfMerit
+
+
+# k-eigenvalue estimators, in the order they are scored every cycle
+K_ESTIMATORS = ('collision', 'absorption', 'track length')
+NUM_K_ESTIMATORS = len(K_ESTIMATORS)
+
+# groups of whole histories a single batch weighted event based run is split
+# into for its error estimate (unless the deck sets history groups)
+HISTORY_GROUPS = 10
 
 
 
@@ -28,7 +41,8 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
     sim_perams : Python Dict
         variables for simulation (e.g. num particles).
     mesh_cap_xsec : vector double
-        capture x-sections for every mesh cell.
+        capture x-sections for every mesh cell ([N_groups, N_mesh] with
+        energy groups, same for the other three).
     mesh_scat_xsec : vector double
         scattering x-sections for every mesh cell.
     mesh_fis_xsec : vector double
@@ -40,7 +54,29 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
 
     Returns
     -------
-    scalar flux and assocated errors.
+    scalar flux and assocated errors, and a dict of the optional tallies.
+    With several batches (or eigenvalue cycles) the errors are the spread of
+    the batch means. A single batch history based run squares the score of
+    every history, a single batch event based run squares every track
+    segment instead, which differs from (and for correlated segments
+    understates) the per history error. Event based runs with history
+    groups (and weighted ones, 10 groups by default) take the spread of
+    groups of whole histories, the same error history mode estimates.
+    The dict of optional tallies:
+    'cell edges' are the edges of the material mesh cells, 'tally meshes'
+    holds a (edges, flux, error) tuple for every tally mesh, 'reaction
+    rates' the collision flux and the scatter, capture and fission rates of
+    every cell per source particle and 'time flux' the time edges and the
+    time bin, cell, flux and error of every (time bin, cell) that scored
+    (the rest are zero), 'surface current' the bins,
+    currents and errors of every (surface, mu bin, time bin) (all three None
+    unless requested). 'leakage' is the weight per source particle leaving
+    the left and right of the slab. 'k' holds the (mean, standard error) of the
+    collision, absorption and track length k estimators over the active
+    cycles of an eigenvalue run (None in fixed source mode). 'timing' holds
+    the run time, source particles and a KernelTimer report of every kernel
+    and 'fom' the figure of merit 1/(R^2 T) of every material mesh cell and
+    of every tally mesh bin.
 
     """
     
@@ -50,7 +86,8 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
     elif comp_parms['hard_targ'] == 'nb_cpu':
         import mcdc_tnt.numba_kernels.cpu as kernels
         from mcdc_tnt.numba_kernels.warmup import WarmUp
-        WarmUp(comp_parms['p_warmup']) #warmup kernels
+        WarmUp(comp_parms['p_warmup'], sim_perams['transport_mode'] == 'history',
+               sim_perams['tracking'] == 'delta') #warmup kernels
         
     elif comp_parms['hard_targ'] == 'nb_gpu':
         import mcdc_tnt.numba_kernels.gpu as kernels
@@ -63,26 +100,43 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
     dx = sim_perams['dx']
     particle_speed = sim_perams['part_speed']
     
+    # widths of the material mesh cells, dx unless the mesh is non-uniform
+    cell_edges = sim_perams['cell_edges']
+    cell_widths = dx
+    if cell_edges is not None:
+        cell_widths = np.diff(cell_edges)
+    
+    # energy groups: the [N_groups, N_mesh] cross sections go to the kernels
+    # flattened (views), group g of cell is g*N_mesh + cell
+    energy_groups = None
+    if sim_perams['group_speeds'] is not None:
+        if comp_parms['hard_targ'] == 'nb_gpu':
+            print('>>>Energy groups not implemented for nb_gpu, running the first group')
+            [mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec] = [mesh_xsec[0] for mesh_xsec in
+                    (mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec)]
+            sim_perams = dict(sim_perams, part_speed=sim_perams['group_speeds'][0])
+        else:
+            if sim_perams['transport_mode'] == 'history':
+                print('>>>Energy groups not implemented for history based transport, running event based')
+                sim_perams = dict(sim_perams, transport_mode='event')
+            energy_groups = kernels.EnergyGroups(sim_perams['group_speeds'], sim_perams['spectrum_cdf'],
+                                                 sim_perams['scatter_cdf'], sim_perams['mesh_region'])
+            [mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec] = [np.reshape(mesh_xsec, -1) for mesh_xsec in
+                    (mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec)]
+            print('{0} energy groups'.format(energy_groups.num_groups))
+    
     
     #===============================================================================
     # Initial setups
     #===============================================================================
     
-    # Initialize RNG
-    np.random.seed(comp_parms['seed'])
-    
-    init_particle = num_part
-    meshwise_fission_pdf = np.zeros(N_mesh, dtype=float)
+    # source pdf from SimulationSetup (cached with the deck) and its cumulative
+    # table (built once, SourceParticles bisects it). The cross sections are
+    # used as given, SampleEvent scales its draw by the cell total, so
+    # imported (memory mapped) arrays are never written
+    meshwise_fission_pdf = sim_perams['source_pdf']
+    meshwise_fission_cdf = CumulativeTable(meshwise_fission_pdf)
     
-    total_mesh_fission_xsec = sum(mesh_fis_xsec)
-    for cell in range(N_mesh):
-        meshwise_fission_pdf[cell] = mesh_fis_xsec[cell]/total_mesh_fission_xsec
-        
-        mesh_cap_xsec[cell] = mesh_cap_xsec[cell] / mesh_total_xsec[cell]
-        mesh_scat_xsec[cell] = mesh_scat_xsec[cell] / mesh_total_xsec[cell]
-        mesh_fis_xsec[cell] = mesh_fis_xsec[cell] / mesh_total_xsec[cell]
-        
-    meshwise_fission_pdf /= sum(meshwise_fission_pdf)
     mesh_dist_traveled = np.zeros(N_mesh, dtype=float)
     mesh_dist_traveled_squared = np.zeros(N_mesh, dtype=float)
     
@@ -91,45 +145,466 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
     # Allocate particle phase space
     #===============================================================================
     
-    phase_parts = 5*num_part #see note about data storage
+    # initial headroom only, the bank grows geometrically if fissions need more
+    phase_parts = int(np.ceil(sim_perams['bank_headroom']*num_part))
+    
+    bank = kernels.ParticleBank(phase_parts)
+    spare = kernels.ParticleBank(phase_parts) #double buffer for BringOutYourDead
+    workspace = kernels.AdvanceWorkspace(phase_parts) #Advance scratch, reused every generation
+    
+    # Initialize RNG, counter based: every draw is keyed by (seed, p_id, event)
+    bank.seed = comp_parms['seed']
+    
+    # surface tracking (track length flux) or delta tracking (collision estimator flux)
+    Advance = kernels.Advance
+    if sim_perams['tracking'] == 'delta':
+        if comp_parms['hard_targ'] == 'nb_gpu':
+            print('>>>Delta tracking not implemented for nb_gpu, running surface tracking')
+        elif sim_perams['transport_mode'] == 'history':
+            print('>>>Delta tracking not implemented for history based transport, running surface tracking')
+        else:
+            Advance = kernels.AdvanceDelta
+    
+    # k-eigenvalue power iteration, needs the reaction counts and a track
+    # length tally of the material cells for its estimators
+    eigenvalue = False
+    if sim_perams['mode'] == 'eigenvalue':
+        if comp_parms['hard_targ'] == 'nb_gpu':
+            print('>>>Eigenvalue mode not implemented for nb_gpu, running fixed source')
+        elif sim_perams['transport_mode'] == 'history':
+            print('>>>Eigenvalue mode not implemented for history based transport, running fixed source')
+        elif energy_groups is not None:
+            print('>>>Eigenvalue mode not implemented for energy groups, running fixed source')
+        else:
+            eigenvalue = True
+    
+    # weight windows, particles are split into and rouletted out of the bank
+    # after every scatter
+    weight_windows = sim_perams['weight_windows']
+    pilot_particles = sim_perams['pilot_particles']
+    if (weight_windows is not None) or (pilot_particles > 0):
+        if comp_parms['hard_targ'] == 'nb_gpu':
+            print('>>>Weight windows not implemented for nb_gpu, running without')
+            weight_windows = None
+            pilot_particles = 0
+        elif sim_perams['transport_mode'] == 'history':
+            print('>>>Weight windows not implemented for history based transport, running without')
+            weight_windows = None
+            pilot_particles = 0
+    
+    # wall time of every kernel call, the run time (pilot included) goes into
+    # the figure of merit of every tally cell
+    timers = KernelTimer()
+    start_run = timer()
+    
+    if pilot_particles > 0:
+        #short analog run, the windows follow its (material mesh) flux
+        start = timer()
+        pilot_dist_traveled = np.zeros(N_mesh, dtype=float)
+        TransportBatch(kernels, comp_parms, sim_perams, bank, spare, workspace, Advance,
+                       phase_parts, pilot_particles, meshwise_fission_cdf, mesh_total_xsec, mesh_cap_xsec,
+                       mesh_scat_xsec, mesh_fis_xsec, surface_distances,
+                       pilot_dist_traveled, np.zeros(N_mesh, dtype=float), timers=timers,
+                       energy_groups=energy_groups)
+        weight_windows = WindowsFromFlux(pilot_dist_traveled/cell_widths, meshwise_fission_pdf, sim_perams['window_ratio'])
+        end = timer()
+        print('Weight windows from a {0} particle pilot run: {1}'.format(pilot_particles, end-start))
+    
+    mesh_edges = list(sim_perams['tally_meshes'])
+    if eigenvalue == True:
+        #material cells as the last tally mesh, not part of the output
+        mesh_edges.append(np.arange(N_mesh+1)*dx if cell_edges is None else cell_edges)
+    
+    # flux tally meshes independent of the material mesh
+    tally_meshes = None
+    if len(mesh_edges) > 0:
+        if comp_parms['hard_targ'] == 'nb_gpu':
+            print('>>>Tally meshes not implemented for nb_gpu, only the material mesh is tallied')
+        elif sim_perams['transport_mode'] == 'history':
+            print('>>>Tally meshes not implemented for history based transport, only the material mesh is tallied')
+        else:
+            tally_meshes = kernels.BuildTallyMeshes(mesh_edges)
+            mesh_batch_tally = BatchTally(tally_meshes.num_bins)
+            mesh_flux_last = np.zeros(tally_meshes.num_bins, dtype=float)
+    
+    # reaction counts (scatter, capture, fission) scored inside SampleEvent
+    reaction_tally = None
+    if (sim_perams['reaction_tallies'] == True) or (eigenvalue == True):
+        if sim_perams['transport_mode'] == 'history':
+            print('>>>Reaction tallies not implemented for history based transport, skipping')
+        elif energy_groups is not None:
+            print('>>>Reaction tallies not implemented for energy groups, skipping')
+        else:
+            reaction_tally = np.zeros((3, N_mesh), dtype=float)
+    
+    # time binned flux of the mesh cells
+    time_tally = None
+    if sim_perams['time_edges'] is not None:
+        if comp_parms['hard_targ'] == 'nb_gpu':
+            print('>>>Time binned tallies not implemented for nb_gpu, skipping')
+        elif sim_perams['transport_mode'] == 'history':
+            print('>>>Time binned tallies not implemented for history based transport, skipping')
+        else:
+            time_tally = kernels.TimeTally(sim_perams['time_edges'], N_mesh)
+            time_batch_tally = BatchTally(0)
+            time_bins_last = np.zeros(0, dtype=np.int64)
+            time_flux_last = np.zeros(0, dtype=float)
+    
+    # surface crossings binned by direction cosine and time
+    surface_tally = None
+    if sim_perams['surface_mu_bins'] > 0:
+        if comp_parms['hard_targ'] == 'nb_gpu':
+            print('>>>Surface tallies not implemented for nb_gpu, skipping')
+        elif sim_perams['transport_mode'] == 'history':
+            print('>>>Surface tallies not implemented for history based transport, skipping')
+        else:
+            surface_time_edges = sim_perams['time_edges']
+            if surface_time_edges is None:
+                surface_time_edges = np.array([0, np.inf])
+            surface_tally = kernels.SurfaceTally(np.array(surface_distances, dtype=float),
+                                                 np.linspace(-1, 1, sim_perams['surface_mu_bins']+1),
+                                                 surface_time_edges)
+            surface_batch_tally = BatchTally(surface_tally.current.shape[0])
+            surface_current_last = np.zeros(surface_tally.current.shape[0], dtype=float)
+    
+    #===============================================================================
+    # Batch Loop
+    #===============================================================================
+    # the source is split into batches, the batch to batch spread of the
+    # tally gives the error estimate and can stop the run early
+    num_batches = max(min(sim_perams['batches'], num_part), 1)
+    batch_tally = BatchTally(N_mesh)
+    
+    # event based Advance squares every track segment, weighted segments
+    # (implicit capture, weight windows) of one history are too correlated
+    # for that to give their variance: a single batch runs as groups of
+    # whole histories instead and the errors come from the group spread,
+    # the per history error history mode estimates. history groups asks for
+    # that split (and sets the number of groups) on any event based run
+    num_groups = sim_perams['history_groups']
+    weighted = (sim_perams['implicit_capture'] is not None) or (weight_windows is not None)
+    if (num_groups < 2) and (weighted == True):
+        num_groups = HISTORY_GROUPS
+    event_based = (sim_perams['transport_mode'] != 'history') or (comp_parms['hard_targ'] == 'nb_gpu')
+    history_groups = (num_batches == 1) and (num_groups > 1) and (eigenvalue == False) and event_based
+    if history_groups == True:
+        num_batches = min(num_groups, num_part)
+    batch_dist_traveled = np.zeros(N_mesh, dtype=float)
+    
+    # in eigenvalue mode every cycle is a batch of num_part particles sourced
+    # from the fission sites of the cycle before, only the active ones count
+    fission_bank = None
+    cycle_active = True
+    if eigenvalue == True:
+        num_inactive = sim_perams['inactive_cycles']
+        num_batches = num_inactive + sim_perams['active_cycles']
+        
+        fission_bank = kernels.ParticleBank(phase_parts)
+        fission_bank.seed = bank.seed
+        k_tally = BatchTally(NUM_K_ESTIMATORS)
+        
+        #collision, absorption and track length scores per unit nu
+        k_bins = slice(tally_meshes.num_bins-N_mesh, tally_meshes.num_bins)
+        absorption = mesh_cap_xsec + mesh_fis_xsec
+        fission_per_collision = np.divide(mesh_fis_xsec, mesh_total_xsec, out=np.zeros(N_mesh), where=mesh_total_xsec > 0)
+        fission_per_absorption = np.divide(mesh_fis_xsec, absorption, out=np.zeros(N_mesh), where=absorption > 0)
+        nu_fission_xsec = nu_new_neutrons*mesh_fis_xsec
+        
+        start = timer()
+        kernels.SourceParticles(bank, dx, num_part, meshwise_fission_cdf,
+                                particle_speed, sim_perams['iso'], cell_edges, energy_groups)
+        timers.add('SourceParticles', timer()-start, num_part)
+    
+    trans_lhs = 0
+    trans_rhs = 0
+    init_particle = 0
+    start_batches = timer()
+    
+    for batch in range(num_batches):
+        batch_part = num_part//num_batches + (batch < num_part%num_batches)
+        
+        if eigenvalue == True:
+            batch_part = bank.num_part
+            cycle_active = batch >= num_inactive
+            print("")
+            print("===============================================================================")
+            print("                        Cycle {0} of {1} ({2})".format(batch+1, num_batches,
+                    'active' if cycle_active else 'inactive'))
+            print("===============================================================================")
+            
+            #inactive cycles are rolled back, k is scored from the differences
+            reaction_start = reaction_tally.copy()
+            mesh_flux_start = tally_meshes.flux.copy()
+            mesh_flux_squared_start = tally_meshes.flux_squared.copy()
+            squared_start = mesh_dist_traveled_squared.copy()
+        
+        elif (num_batches > 1) and (history_groups == False):
+            print("")
+            print("===============================================================================")
+            print("                             Batch {0} of {1}".format(batch+1, num_batches))
+            print("===============================================================================")
+        
+        batch_dist_traveled[:] = 0
+        [batch_lhs, batch_rhs] = TransportBatch(kernels, comp_parms, sim_perams, bank, spare, workspace, Advance,
+                                                phase_parts, batch_part, meshwise_fission_cdf, mesh_total_xsec, mesh_cap_xsec,
+                                                mesh_scat_xsec, mesh_fis_xsec, surface_distances,
+                                                batch_dist_traveled, mesh_dist_traveled_squared, tally_meshes, reaction_tally,
+                                                time_tally if cycle_active else None,
+                                                surface_tally if cycle_active else None, fission_bank, weight_windows,
+                                                timers, energy_groups)
+        
+        if eigenvalue == True:
+            counts = reaction_tally - reaction_start
+            track = tally_meshes.flux[k_bins] - mesh_flux_start[k_bins]
+            k_cycle = np.array([nu_new_neutrons*np.sum(np.sum(counts, axis=0)*fission_per_collision),
+                                nu_new_neutrons*np.sum((counts[1]+counts[2])*fission_per_absorption),
+                                np.sum(track*nu_fission_xsec)])/batch_part
+            
+            #fission sites renormalized to num_part source particles for the next cycle
+            start = timer()
+            num_sites = kernels.PopulationControl(fission_bank, bank, num_part)
+            timers.add('PopulationControl', timer()-start, num_sites)
+            print('cycle {0}: k collision {1:.5f}, absorption {2:.5f}, track length {3:.5f} ({4} fission sites)'.format(
+                    batch+1, k_cycle[0], k_cycle[1], k_cycle[2], num_sites))
+            
+            if cycle_active == True:
+                k_tally.add_batch(k_cycle)
+            else:
+                reaction_tally[:] = reaction_start
+                tally_meshes.flux[:] = mesh_flux_start
+                tally_meshes.flux_squared[:] = mesh_flux_squared_start
+                mesh_dist_traveled_squared[:] = squared_start
+            
+            if num_sites == 0:
+                print('>>>Fission source died out in cycle {0}, stopping'.format(batch+1))
+                if cycle_active == False:
+                    break
+            
+            if cycle_active == False:
+                continue
+        
+        trans_lhs += batch_lhs
+        trans_rhs += batch_rhs
+        init_particle += batch_part
+        mesh_dist_traveled += batch_dist_traveled
+        
+        batch_tally.add_batch(batch_dist_traveled/batch_part, batch_part)
+        if tally_meshes is not None:
+            mesh_batch_tally.add_batch((tally_meshes.flux - mesh_flux_last)/batch_part, batch_part)
+            mesh_flux_last[:] = tally_meshes.flux
+        if time_tally is not None:
+            #sparse, the bins that scored for the first time join the batch sums
+            positions = np.searchsorted(time_tally.bins, time_bins_last)
+            time_batch_tally.grow(positions, len(time_tally.bins))
+            flux_last = np.zeros(len(time_tally.bins), dtype=float)
+            flux_last[positions] = time_flux_last
+            time_batch_tally.add_batch((time_tally.flux - flux_last)/batch_part, batch_part)
+            time_bins_last = time_tally.bins.copy()
+            time_flux_last = time_tally.flux.copy()
+        if surface_tally is not None:
+            surface_batch_tally.add_batch((surface_tally.current - surface_current_last)/batch_part, batch_part)
+            surface_current_last[:] = surface_tally.current
+        
+        if (num_batches > 1) and (history_groups == False):
+            elapsed = timer() - start_batches
+            print('batch {0}: max relative error {1:.4e}, FOM {2:.4e}'.format(batch+1,
+                    batch_tally.relative_error(), batch_tally.figure_of_merit(elapsed)))
+            
+            if batch_tally.converged(sim_perams['target_rel_error'], sim_perams['target_fom'], elapsed):
+                print('>>>Convergence target met after {0} of {1} batches ({2} particles)'.format(batch+1,
+                        num_batches, init_particle))
+                break
+        
+        if (eigenvalue == True) and (bank.num_part == 0):
+            #fission source died out
+            break
+    
+    #===============================================================================
+    # Step Output
+    #===============================================================================
+    
+    run_time = timer() - start_run
+    
+    print()
+    print('particle bank high-water mark: {0} ({1} resizes, capacity {2})'.format(bank.high_water, bank.num_resize, bank.capacity))
+    print('leakage per source particle: left {0}, right {1}'.format(trans_lhs/init_particle, trans_rhs/init_particle))
+    if (num_batches == 1) and (eigenvalue == False) and event_based:
+        print('flux errors from squared track segments, not per history (set history groups or batches for that)')
+    print()
+    print('transport time: {0}'.format(run_time))
+    timers.print_report()
+    
+    
+    mesh_dist_traveled /= init_particle
+    mesh_dist_traveled_squared /= init_particle
+    #standard error of the mean history score, the sample variance over N-1
+    #histories is divided by N once
+    standard_deviation_flux = np.maximum(mesh_dist_traveled_squared - mesh_dist_traveled**2, 0)/(init_particle-1)
+    standard_deviation_flux = np.sqrt(standard_deviation_flux)
+    
+    if batch_tally.num_batches > 1:
+        #batch statistics, spread of the batch means
+        standard_deviation_flux = batch_tally.std_error()
+    
+    scalar_flux = mesh_dist_traveled/cell_widths
+    scalar_flux/=max(scalar_flux)
+    
+    tallies = {'cell edges': np.arange(N_mesh+1)*dx if cell_edges is None else cell_edges.copy(),
+               'tally meshes': [], 'reaction rates': None, 'time flux': None, 'surface current': None,
+               'leakage': (trans_lhs/init_particle, trans_rhs/init_particle), 'k': None,
+               'timing': {'run seconds': run_time, 'particles': init_particle, 'kernels': timers.report()},
+               'fom': {'mesh': FigureOfMerit(mesh_dist_traveled, standard_deviation_flux, run_time), 'tally meshes': []}}
+    
+    if eigenvalue == True:
+        k_error = k_tally.std_error()
+        tallies['k'] = {name: (k_tally.mean[i], k_error[i]) for i, name in enumerate(K_ESTIMATORS)}
+        print('k-eigenvalue over {0} active cycles:'.format(k_tally.num_batches))
+        for name in K_ESTIMATORS:
+            print('    {0:<13} {1:.5f} +/- {2:.5f}'.format(name, tallies['k'][name][0], tallies['k'][name][1]))
+    if tally_meshes is not None:
+        flux = tally_meshes.flux/init_particle
+        flux_squared = tally_meshes.flux_squared/init_particle
+        error = np.sqrt(np.maximum(flux_squared - flux**2, 0)/(init_particle-1))
+        if mesh_batch_tally.num_batches > 1:
+            error = mesh_batch_tally.std_error()
+        
+        for m in range(len(sim_perams['tally_meshes'])):
+            edges = tally_meshes.edges[tally_meshes.edge_offsets[m]:tally_meshes.edge_offsets[m+1]]
+            bins = slice(tally_meshes.edge_offsets[m]-m, tally_meshes.edge_offsets[m+1]-m-1)
+            
+            #flux per unit width, normalized like the material mesh flux
+            width = np.diff(edges)
+            norm = max(np.max(flux[bins]/width), 1e-300)
+            tallies['tally meshes'].append((edges.copy(), flux[bins]/width/norm, error[bins]/width/norm))
+            tallies['fom']['tally meshes'].append(FigureOfMerit(flux[bins], error[bins], run_time))
+    
+    if (reaction_tally is not None) and (sim_perams['reaction_tallies'] == True):
+        #collision estimator of the flux next to the reaction rates, per unit width
+        reaction_rates = np.zeros((4, N_mesh), dtype=float)
+        reaction_rates[0] = np.divide(np.sum(reaction_tally, axis=0), mesh_total_xsec, out=np.zeros(N_mesh),
+                                      where=mesh_total_xsec > 0)
+        reaction_rates[1:] = reaction_tally
+        tallies['reaction rates'] = reaction_rates/(cell_widths*init_particle)
     
-    # Position
-    p_pos_x = np.zeros(phase_parts, dtype=float)
-    p_pos_y = np.zeros(phase_parts, dtype=float)
-    p_pos_z = np.zeros(phase_parts, dtype=float)
+    if time_tally is not None:
+        #flux per source particle, unit width and unit time of the (time bin, cell) that scored
+        flux = time_tally.flux/init_particle
+        flux_squared = time_tally.flux_squared/init_particle
+        error = np.sqrt(np.maximum(flux_squared - flux**2, 0)/(init_particle-1))
+        if time_batch_tally.num_batches > 1:
+            error = time_batch_tally.std_error()
+        
+        time_bins = time_tally.bins//N_mesh
+        cells = time_tally.bins % N_mesh
+        width = np.broadcast_to(cell_widths, N_mesh)[cells]*np.diff(time_tally.time_edges)[time_bins]
+        tallies['time flux'] = (time_tally.time_edges.copy(), time_bins, cells, flux/width, error/width)
     
-    # Direction
-    p_dir_x = np.zeros(phase_parts, dtype=float)
-    p_dir_y = np.zeros(phase_parts, dtype=float)
-    p_dir_z = np.zeros(phase_parts, dtype=float)
+    if surface_tally is not None:
+        #[surface, mu bin, time bin] crossings per source particle
+        shape = (surface_tally.num_surfaces, surface_tally.num_mu_bins, surface_tally.num_time_bins)
+        current = surface_tally.current/init_particle
+        error = np.sqrt(surface_tally.current)/init_particle
+        if surface_batch_tally.num_batches > 1:
+            error = surface_batch_tally.std_error()
+        tallies['surface current'] = (surface_tally.surfaces.copy(), surface_tally.mu_edges.copy(),
+                                      surface_tally.time_edges.copy(), current.reshape(shape), error.reshape(shape))
     
-    # Speed
-    p_speed = np.zeros(phase_parts, dtype=float)
+    return(scalar_flux, standard_deviation_flux, tallies)
     
-    # Time
-    p_time = np.zeros(phase_parts, dtype=float)
+    # # the sum of all debits from functional operations should be the number of
+    # #currently alive particles
+    # account = alive_cycle_start + particles_added_fission - fis_count - cap_count - tally_left_t - tally_right_t
+    # if account != num_part:
+    #     print("ERROR PARTICLES HAVE BEEN UNACCOUNTED FOR")
     
-    # Region
-    p_mesh_cell = np.zeros(phase_parts, dtype=np.int32)
-    #print(p_mesh_cell.dtype)
-    # Flags
-    p_alive = np.full(phase_parts, False, dtype=bool)
+    # print("{0} particles are produced from {1} fission events".format(fissions_to_add, fis_count))
+    # print("particles captured:  {0}".format(cap_count))
+    # print("particles scattered: {0}".format(scat_count))
+    # print("particles leaving left:    {0}".format(tally_left_t))
+    # print("particles leaving right:   {0}".format(tally_right_t))
+    # print("total particles now alive and stored: {0}".format(num_part))
+    
+    # # alive_last = alive_now
+    
+
+
+def TransportBatch(kernels, comp_parms, sim_perams, bank, spare, workspace, Advance, phase_parts, num_part,
+                   meshwise_fission_cdf, mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                   surface_distances, mesh_dist_traveled, mesh_dist_traveled_squared, tally_meshes=None,
+                   reaction_tally=None, time_tally=None, surface_tally=None, fission_bank=None, weight_windows=None,
+                   timers=None, energy_groups=None):
+    """
+    Samples num_part source particles and transports them (and all of their
+    progeny) until every one is dead. With a fission bank (one k-eigenvalue
+    cycle) the bank already holds the num_part source particles and fission
+    particles are banked for the next cycle instead of transported
+
+    Parameters
+    ----------
+    kernels : module
+        kernel set of the hardware target.
+    bank, spare : ParticleBank
+        particle bank and its double buffer, empty on entry and exit.
+    workspace : AdvanceWorkspace
+        Advance scratch.
+    Advance : function
+        surface or delta tracking Advance kernel.
+    phase_parts : int
+        smallest capacity the banks are shrunk to.
+    num_part : int
+        number of source particles.
+    mesh_dist_traveled : vector double
+        flux tally (added to).
+    mesh_dist_traveled_squared : vector double
+        flux squared tally (added to).
+    tally_meshes : TallyMeshes, optional
+        independent flux tally meshes (added to).
+    reaction_tally : array double [3, N_mesh], optional
+        scatter, capture and fission counts of every cell (added to).
+    time_tally : TimeTally, optional
+        time binned flux of the mesh cells (added to).
+    surface_tally : SurfaceTally, optional
+        surface crossings (added to).
+    fission_bank : ParticleBank, optional
+        fission sites of an eigenvalue cycle (added to).
+    weight_windows : array double [3, N_mesh], optional
+        lower bound, survival weight and upper bound of every cell, scattered
+        particles are split or rouletted against them.
+    timers : KernelTimer, optional
+        wall time of every kernel call (added to).
+    energy_groups : EnergyGroups, optional
+        group tables of a multigroup run, the cross sections are then
+        flattened [N_groups*N_mesh] group major.
+    other arguments as in Generations.
+
+    Returns
+    -------
+    weight leaking out the left and right of the slab.
+
+    """
+    dx = sim_perams['dx']
+    cell_edges = sim_perams['cell_edges']
+    nu_new_neutrons = sim_perams['nu']
+    particle_speed = sim_perams['part_speed']
     
-    #mesh_particle_index = np.zeros([N_mesh, phase_parts], dtype=np.uint8)
+    # with weight windows the windows play roulette instead of the cutoff
+    implicit_capture = sim_perams['implicit_capture']
+    if (weight_windows is not None) and (implicit_capture is not None):
+        implicit_capture = np.array([0.0, implicit_capture[1]])
     
+    if timers is None:
+        timers = KernelTimer()
     
-    scatter_event_index = np.zeros(phase_parts, dtype=int)
-    capture_event_index = np.zeros(phase_parts, dtype=int)
-    fission_event_index = np.zeros(phase_parts, dtype=int)
+    scatter_event_index = np.zeros(bank.capacity, dtype=int)
+    capture_event_index = np.zeros(bank.capacity, dtype=int)
+    fission_event_index = np.zeros(bank.capacity, dtype=int)
     
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, 
-    p_alive] = kernels.SourceParticles(p_pos_x, p_pos_y,
-                                                      p_pos_z, p_mesh_cell, dx,
-                                                      p_dir_y, p_dir_z, p_dir_x,
-                                                      p_speed, p_time, p_alive,
-                                                      num_part, meshwise_fission_pdf,
-                                                      particle_speed, sim_perams['iso'])
+    if fission_bank is None:
+        start = timer()
+        kernels.SourceParticles(bank, dx, num_part, meshwise_fission_cdf,
+                                particle_speed, sim_perams['iso'], cell_edges, energy_groups)
+        timers.add('SourceParticles', timer()-start, num_part)
     
     
     #===============================================================================
@@ -140,6 +615,24 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
     alive = num_part
     trans_lhs = 0
     trans_rhs = 0
+    
+    if sim_perams['transport_mode'] == 'history':
+        if comp_parms['hard_targ'] == 'nb_gpu':
+            print('>>>History based transport not implemented for nb_gpu, running event based')
+        else:
+            #every source particle and its progeny transported to death in one go
+            start = timer()
+            
+            [trans_lhs, trans_rhs] = kernels.TransportHistories(bank, dx, mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                                                               nu_new_neutrons, particle_speed, surface_distances,
+                                                               mesh_dist_traveled, mesh_dist_traveled_squared,
+                                                               implicit_capture, cell_edges)
+            alive = 0
+            
+            end = timer()
+            timers.add('TransportHistories', end-start, num_part)
+            print('History based transport time: {0}'.format(end-start))
+    
     while alive > 0:
         print("")
         print("===============================================================================")
@@ -158,16 +651,21 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
         
         start = timer()
         
-        [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared] = kernels.Advance(
-                p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time,
-                num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, surface_distances[len(surface_distances)-1])
+        Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared,
+                surface_distances[len(surface_distances)-1], workspace, tally_meshes, time_tally,
+                surface_tally, cell_edges)
         
         end = timer()
+        timers.add('Advance', end-start, num_part)
         print('Advance time: {0}'.format(end-start))
+        print('Advance sub-steps: {0}, active fraction per pass: {1}'.format(workspace.num_sub_steps,
+                np.array2string(workspace.active_fraction[:workspace.num_sub_steps], precision=3, threshold=8)))
         #===============================================================================
         # EVENT 2 : Still in problem
         #===============================================================================
-        [p_alive, tally_left_t, tally_right_t] = kernels.StillIn(p_pos_x, surface_distances, p_alive, num_part)
+        start = timer()
+        [tally_left_t, tally_right_t] = kernels.StillIn(bank, surface_distances)
+        timers.add('StillIn', timer()-start, num_part)
         
         trans_lhs += tally_left_t
         trans_rhs += tally_right_t
@@ -176,11 +674,18 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
         # EVENT 3 : Sample event
         #===============================================================================
         
-        rands = np.random.random(num_part)
+        # event index vectors follow the bank if it has grown
+        if len(scatter_event_index) < bank.capacity:
+            scatter_event_index = np.zeros(bank.capacity, dtype=int)
+            capture_event_index = np.zeros(bank.capacity, dtype=int)
+            fission_event_index = np.zeros(bank.capacity, dtype=int)
         
-        [scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count] = kernels.SampleEvent(
-                p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
-                capture_event_index, fission_event_index, num_part, nu_new_neutrons, rands)
+        start = timer()
+        [scat_count, cap_count, fis_count] = kernels.SampleEvent(
+                bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
+                capture_event_index, fission_event_index, nu_new_neutrons, reaction_tally,
+                implicit_capture, energy_groups, workspace)
+        timers.add('SampleEvent', timer()-start, num_part)
        
         
         fissions_to_add = (fis_count)*nu_new_neutrons
@@ -192,9 +697,15 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
         # EVENT 3 : Scatter
         #===============================================================================
         
-        rands = np.random.random(scat_count * 2) #exact number of rands known
+        start = timer()
+        kernels.Scatter(bank, scatter_event_index, scat_count, energy_groups)
+        timers.add('Scatter', timer()-start, scat_count)
         
-        [p_dir_x, p_dir_y, p_dir_z] = kernels.Scatter(scatter_event_index, scat_count, p_dir_x, p_dir_y, p_dir_z, rands)
+        if weight_windows is not None:
+            start = timer()
+            [split_count, roulette_count] = kernels.WeightWindow(bank, scatter_event_index, scat_count, weight_windows)
+            timers.add('WeightWindow', timer()-start, scat_count)
+            killed += roulette_count
         
         
         #===============================================================================
@@ -204,16 +715,12 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
         # print("max index {0}".format(num_part))
         # print("")
         
-        rands = np.random.random(fis_count * nu_new_neutrons * 2) #exact number of rands known
-        #2 is for number reqired per new neutron
-        
-        [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, 
-         p_time, p_alive, particles_added_fission] = kernels.FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, 
-                                                  p_dir_y, p_dir_z, p_dir_x, p_speed, 
-                                                  p_time, p_alive, fis_count, nu_new_neutrons, 
-                                                  fission_event_index, num_part, particle_speed, rands)
+        start = timer()
+        particles_added_fission = kernels.FissionsAdd(bank, fis_count, nu_new_neutrons, 
+                                                  fission_event_index, particle_speed, fission_bank, energy_groups)
+        timers.add('FissionsAdd', timer()-start, particles_added_fission)
     
-        num_part += particles_added_fission
+        num_part = bank.num_part
         # print("")
         # print("max index {0}".format(num_part))
                                                   
@@ -235,10 +742,14 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
         # Event 5: Purge the dead
         #===============================================================================
         
-        [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, 
-         p_time, p_alive, kept] = kernels.BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, 
-                                                   p_dir_y, p_dir_z, p_dir_x, p_speed, 
-                                                   p_time, p_alive, num_part)
+        start = timer()
+        kept = kernels.BringOutYourDead(bank, spare, sim_perams['bank_swap'])
+        timers.add('BringOutYourDead', timer()-start, num_part)
+        
+        if sim_perams['bank_shrink'] == True:
+            bank.shrink(phase_parts)
+            spare.num_part = kept
+            spare.shrink(phase_parts)
                                                    
         num_part = kept
         alive = num_part
@@ -251,37 +762,8 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_
         
         end_o = timer()
         print('Overall time to completion: {0}'.format(end_o-start_o))
-    #===============================================================================
-    # Step Output
-    #===============================================================================
-    
-    
-    mesh_dist_traveled /= init_particle
-    mesh_dist_traveled_squared /= init_particle
-    standard_deviation_flux = ((mesh_dist_traveled_squared - mesh_dist_traveled**2)/(init_particle-1))
-    standard_deviation_flux = np.sqrt(standard_deviation_flux/(init_particle))
-    
-    x_mesh = np.linspace(0,surface_distances[len(surface_distances)-1], N_mesh)
-    scalar_flux = mesh_dist_traveled/dx
-    scalar_flux/=max(scalar_flux)
-    
-    return(scalar_flux, standard_deviation_flux)
-    
-    # # the sum of all debits from functional operations should be the number of
-    # #currently alive particles
-    # account = alive_cycle_start + particles_added_fission - fis_count - cap_count - tally_left_t - tally_right_t
-    # if account != num_part:
-    #     print("ERROR PARTICLES HAVE BEEN UNACCOUNTED FOR")
-    
-    # print("{0} particles are produced from {1} fission events".format(fissions_to_add, fis_count))
-    # print("particles captured:  {0}".format(cap_count))
-    # print("particles scattered: {0}".format(scat_count))
-    # print("particles leaving left:    {0}".format(tally_left_t))
-    # print("particles leaving right:   {0}".format(tally_right_t))
-    # print("total particles now alive and stored: {0}".format(num_part))
-    
-    # # alive_last = alive_now
     
+    return(trans_lhs, trans_rhs)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,8 @@
 import numpy as np
 import pykokkos as pk
 import mcdc_tnt.pyk_kernels.all as kernels
+from mcdc_tnt.timing import KernelTimer, FigureOfMerit
+from mcdc_tnt.sampling import CumulativeTable
 
 #===============================================================================
 # Simulation Setup
@@ -51,20 +53,39 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
     num_part = sim_perams['num']
     dx = sim_perams['dx']
     particle_speed = sim_perams['part_speed']
+
+    # one group kernels, a multigroup deck runs its first group
+    if sim_perams['group_speeds'] is not None:
+        print('>>>Energy groups not implemented for PyKokkos, running the first group')
+        mesh_cap_xsec_np = mesh_cap_xsec_np[0]
+        mesh_scat_xsec_np = mesh_scat_xsec_np[0]
+        mesh_fis_xsec_np = mesh_fis_xsec_np[0]
+        mesh_total_xsec_np = mesh_total_xsec_np[0]
+        particle_speed = sim_perams['group_speeds'][0]
+
+    # the PyKokkos kernels only know uniform cells, a non-uniform mesh is
+    # sampled onto uniform cells as wide as its narrowest cell
+    cell_edges = sim_perams['cell_edges']
+    if cell_edges is not None:
+        print('>>>Non-uniform mesh not implemented for PyKokkos, running on uniform cells of width {0}'.format(dx))
+        N_mesh = int(round(sim_perams['L_slab']/dx))
+        cell = np.searchsorted(cell_edges, (np.arange(N_mesh)+0.5)*dx, side='right') - 1
+        cell = np.clip(cell, 0, len(cell_edges)-2)
+        mesh_cap_xsec_np = mesh_cap_xsec_np[cell]
+        mesh_scat_xsec_np = mesh_scat_xsec_np[cell]
+        mesh_fis_xsec_np = mesh_fis_xsec_np[cell]
+        mesh_total_xsec_np = mesh_total_xsec_np[cell]
     
     
     #===============================================================================
     # Initial setups
     #===============================================================================
     
-    # Initialize RNG
-    np.random.seed(comp_parms['seed'])
-    
     
     init_particle = num_part
     
     
-    total_mesh_fission_xsec = sum(mesh_fis_xsec_np)
+    total_mesh_fission_xsec = np.sum(mesh_fis_xsec_np)
     
     meshwise_fission_pdf_np = mesh_fis_xsec_np/total_mesh_fission_xsec
     meshwise_fission_pdf = pk.from_numpy(meshwise_fission_pdf_np)
@@ -75,8 +96,8 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
     mesh_fis_xsec = pk.from_numpy(mesh_fis_xsec_np)
     mesh_total_xsec = pk.from_numpy(mesh_total_xsec_np)
     
-    meshwise_fission_pdf_np /= sum(meshwise_fission_pdf_np)
-    meshwise_fission_pdf = pk.from_numpy(meshwise_fission_pdf_np)
+    meshwise_fission_pdf_np /= np.sum(meshwise_fission_pdf_np)
+    meshwise_fission_cdf = pk.from_numpy(CumulativeTable(meshwise_fission_pdf_np))
     
     mesh_dist_traveled_np = np.zeros(N_mesh, dtype=float)
     mesh_dist_traveled = pk.from_numpy(mesh_dist_traveled_np)
@@ -90,41 +111,15 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
     # Allocate particle phase space
     #===============================================================================
     
-    phase_parts = 5*num_part #see note about data storage
-    
-    # Position
-    p_pos_x_np = np.zeros(phase_parts, dtype=float)
-    p_pos_y_np = np.zeros(phase_parts, dtype=float)
-    p_pos_z_np = np.zeros(phase_parts, dtype=float)
-    
-    p_pos_x = pk.from_numpy(p_pos_x_np)
-    p_pos_y = pk.from_numpy(p_pos_y_np)
-    p_pos_z = pk.from_numpy(p_pos_z_np)
-    
-    # Direction
-    p_dir_x_np = np.zeros(phase_parts, dtype=float)
-    p_dir_y_np = np.zeros(phase_parts, dtype=float)
-    p_dir_z_np = np.zeros(phase_parts, dtype=float)
-    
-    p_dir_x = pk.from_numpy(p_dir_x_np)
-    p_dir_y = pk.from_numpy(p_dir_y_np)
-    p_dir_z = pk.from_numpy(p_dir_z_np)
-    
-    # Speed
-    p_speed_np = np.zeros(phase_parts, dtype=float)
-    p_speed = pk.from_numpy(p_speed_np)
-    
-    # Time
-    p_time_np = np.zeros(phase_parts, dtype=float)
-    p_time = pk.from_numpy(p_time_np)
+    # initial headroom only, the bank grows geometrically if fissions need more
+    phase_parts = int(np.ceil(sim_perams['bank_headroom']*num_part))
     
-    # Region
-    p_mesh_cell_np = np.zeros(phase_parts, dtype=np.int32)
-    p_mesh_cell = pk.from_numpy(p_mesh_cell_np)
+    bank = kernels.ParticleBank(phase_parts)
+    spare = kernels.ParticleBank(phase_parts) #double buffer for BringOutYourDead
     
-    # Flags
-    p_alive_np = np.full(phase_parts, False, dtype=np.int32)
-    p_alive = pk.from_numpy(p_alive_np)
+    # Initialize RNG, counter based: every draw is keyed by (seed, p_id, event)
+    bank.seed = comp_parms['seed']
+    workspace = kernels.AdvanceWorkspace(phase_parts) #Advance scratch, reused every generation
     
     #mesh_particle_index = np.zeros([N_mesh, phase_parts], dtype=np.uint8)
     
@@ -139,9 +134,6 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
     surface_distances = pk.from_numpy(surface_distances_np)
     print(surface_distances.dtype)
     
-    rands_np = np.random.random([num_part*4])
-    rands = pk.from_numpy(rands_np)
-    
     #print(p_pos_x.dtype)
     #print(p_pos_y.dtype)
     #print(p_pos_z.dtype)
@@ -153,15 +145,21 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
     #print(p_time.dtype)
     #print(p_alive.dtype)
     #print(meshwise_fission_pdf.dtype)
-    #print(rands.dtype)
+    
+    bank.reserve(num_part)
+    
+    # wall time of every kernel call and of the whole run
+    timers = KernelTimer()
+    timer_run = pk.Timer()
     
     print('Entering Source!')
     timer = pk.Timer()
     
     pk.execute(pk.ExecutionSpace.Default, 
-        kernels.SourceParticles(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_part, particle_speed, meshwise_fission_pdf, rands))
-          #                      p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_parts, particle_speed, meshwise_fission_pdf, rands
+        kernels.SourceParticles(bank, dx, num_part, particle_speed, meshwise_fission_cdf))
+    bank.num_part = num_part
     res = timer.seconds()
+    timers.add('SourceParticles', res, num_part)
     print('Source function time {0}'.format(res)) 
     #===============================================================================
     # Generation Loop
@@ -172,6 +170,27 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
     trans_lhs = 0
     trans_rhs = 0
     
+    if sim_perams['transport_mode'] == 'history':
+        print('>>>History based transport not implemented for PyKokkos, running event based')
+    if sim_perams['tracking'] == 'delta':
+        print('>>>Delta tracking not implemented for PyKokkos, running surface tracking')
+    if sim_perams['batches'] > 1:
+        print('>>>Batch statistics not implemented for PyKokkos, running one batch')
+    if len(sim_perams['tally_meshes']) > 0:
+        print('>>>Tally meshes not implemented for PyKokkos, only the material mesh is tallied')
+    if sim_perams['reaction_tallies'] == True:
+        print('>>>Reaction tallies not implemented for PyKokkos, skipping')
+    if sim_perams['time_edges'] is not None:
+        print('>>>Time binned tallies not implemented for PyKokkos, skipping')
+    if sim_perams['surface_mu_bins'] > 0:
+        print('>>>Surface tallies not implemented for PyKokkos, skipping')
+    if sim_perams['mode'] == 'eigenvalue':
+        print('>>>Eigenvalue mode not implemented for PyKokkos, running fixed source')
+    if sim_perams['implicit_capture'] is not None:
+        print('>>>Implicit capture not implemented for PyKokkos, running analog')
+    if (sim_perams['weight_windows'] is not None) or (sim_perams['pilot_particles'] > 0):
+        print('>>>Weight windows not implemented for PyKokkos, running without')
+    
     #pk view to export needed integer values form a function
     clever_out: pk.View1D[int] = pk.View([10], pk.int32)
     
@@ -193,10 +212,13 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
         print('Entering Advance!')
         timer = pk.Timer()
         
-        kernels.Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, surface_distances[len(surface_distances)-1])
+        kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, surface_distances[len(surface_distances)-1], workspace)
         
         res = timer.seconds()
+        timers.add('Advance', res, num_part)
         print('Advance function time {0}'.format(res))
+        print('Advance sub-steps: {0}, active fraction per pass: {1}'.format(workspace.num_sub_steps,
+                np.array2string(workspace.active_fraction[:workspace.num_sub_steps], precision=3, threshold=8)))
         timer = pk.Timer()
         
         #print(sum(p_alive[0:num_part]))  
@@ -204,9 +226,10 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
         # EVENT 2 : Still in problem
         #===============================================================================
         print('Entering StillIn!')
-        pk.execute(pk.ExecutionSpace.Default, kernels.StillIn(p_pos_x, surface_distances, p_alive, num_part, clever_out))
+        pk.execute(pk.ExecutionSpace.Default, kernels.StillIn(bank, surface_distances, clever_out))
         
         res = timer.seconds()
+        timers.add('StillIn', res, num_part)
         print('Still in function time {0}'.format(res))
         
         
@@ -218,8 +241,15 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
         # EVENT 3 : Sample event
         #===============================================================================
         
-        rands_np = np.random.random(num_part)
-        rands = pk.from_numpy(rands_np)
+        # event index vectors follow the bank if it has grown
+        if scatter_event_index_np.shape[0] < bank.capacity:
+            scatter_event_index_np = np.zeros(bank.capacity, dtype=np.int32)
+            capture_event_index_np = np.zeros(bank.capacity, dtype=np.int32)
+            fission_event_index_np = np.zeros(bank.capacity, dtype=np.int32)
+            
+            scatter_event_index = pk.from_numpy(scatter_event_index_np)
+            capture_event_index = pk.from_numpy(capture_event_index_np)
+            fission_event_index = pk.from_numpy(fission_event_index_np)
         
         print('Entering Sample!')
         #print(p_mesh_cell.dtype)
@@ -233,13 +263,13 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
         #print(clever_out.dtype)
         #print(p_alive.dtype)
         #print(meshwise_fission_pdf.dtype)
-        #print(rands.dtype)
         timer = pk.Timer()
         
-        pk.execute(pk.ExecutionSpace.Default, kernels.SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
-                                capture_event_index, fission_event_index, num_part, nu_new_neutrons, rands, clever_out))
+        pk.execute(pk.ExecutionSpace.Default, kernels.SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
+                                capture_event_index, fission_event_index, nu_new_neutrons, clever_out, workspace))
         
         res = timer.seconds()
+        timers.add('SampleEvent', res, num_part)
         print('Sample event in function time {0}'.format(res))
         #print(sum(p_alive[0:num_part]))
         scat_count = clever_out[0]
@@ -256,15 +286,13 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
         # EVENT 3 : Scatter
         #===============================================================================
         
-        rands_np = np.random.random(scat_count * 2) #exact number of rands known
-        rands = pk.from_numpy(rands_np)
-        
         timer = pk.Timer()
         
         print('Entering Scatter!')
-        pk.execute(pk.ExecutionSpace.Default, kernels.Scatter(scatter_event_index, scat_count, p_dir_x, p_dir_y, p_dir_z, rands))
+        pk.execute(pk.ExecutionSpace.Default, kernels.Scatter(bank, scatter_event_index, scat_count))
         
         res = timer.seconds()
+        timers.add('Scatter', res, scat_count)
         print('Scatter function time {0}'.format(res))
         
         
@@ -275,20 +303,20 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
         # print("max index {0}".format(num_part))
         # print("")
         
-        rands_np = np.random.random(fis_count * nu_new_neutrons * 2) #exact number of rands known
-        rands = pk.from_numpy(rands_np)
-        #2 is for number reqired per new neutron
         timer = pk.Timer()
         
+        # views are bound when the workload is built so grow the bank first
+        bank.reserve(num_part + fis_count*nu_new_neutrons)
+        
         print('Entering Fissions!')
-        pk.execute(pk.ExecutionSpace.Default, kernels.FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, 
-                                                  p_dir_y, p_dir_z, p_dir_x, 
-                                                  p_time, p_alive, p_speed, fis_count, nu_new_neutrons, 
-                                                  fission_event_index, num_part, particle_speed, rands, clever_out))
+        pk.execute(pk.ExecutionSpace.Default, kernels.FissionsAdd(bank, fis_count, nu_new_neutrons, 
+                                                  fission_event_index, particle_speed, clever_out))
         res = timer.seconds()
+        timers.add('FissionsAdd', res, clever_out[0])
         print('Fissions function time {0}'.format(res))
         #print(sum(p_alive[0:num_part]))  
         num_part += clever_out[0]
+        bank.num_part = num_part
         # print("")
         # print("max index {0}".format(num_part))
                                                   
@@ -311,14 +339,23 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
         #===============================================================================
         print('Entering PURGE!')
         timer = pk.Timer()
-        pk.execute(pk.ExecutionSpace.Default, kernels.BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, 
-                                                   p_dir_y, p_dir_z, p_dir_x, p_speed, 
-                                                   p_time, p_alive, num_part, clever_out))
+        pk.execute(pk.ExecutionSpace.Default, kernels.BringOutYourDead(bank, spare, clever_out))
+        if sim_perams['bank_swap'] == True:
+            kernels.SwapBuffers(bank, spare)
+        else:
+            pk.execute(pk.ExecutionSpace.Default, kernels.CopyBack(spare, bank, clever_out[0]))
         #print(sum(p_alive[0:num_part]))         
         res = timer.seconds()
+        timers.add('BringOutYourDead', res, num_part)
         print('CleanUp function time {0}'.format(res))
         num_part = clever_out[0]
+        bank.num_part = num_part
         alive = num_part
+        
+        if sim_perams['bank_shrink'] == True:
+            bank.shrink(phase_parts)
+            spare.num_part = num_part
+            spare.shrink(phase_parts)
                           
         # print("max index {0}".format(num_part))mesh_fis_xsec
         # print("")
@@ -332,6 +369,14 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
     # Step Output
     #===============================================================================
     
+    run_time = timer_run.seconds()
+    
+    print()
+    print('particle bank high-water mark: {0} ({1} resizes, capacity {2})'.format(bank.high_water, bank.num_resize, bank.capacity))
+    print()
+    print('transport time: {0}'.format(run_time))
+    timers.print_report()
+    
     #get back from pyk views
     for i in range(N_mesh):
         mesh_dist_traveled_np[i] = mesh_dist_traveled[i]
@@ -343,11 +388,16 @@ def Generations(comp_parms, sim_perams, mesh_cap_xsec_np, mesh_scat_xsec_np, mes
     standard_deviation_flux = ((mesh_dist_traveled_squared_np - mesh_dist_traveled_np**2)/(init_particle-1))
     standard_deviation_flux = np.sqrt(standard_deviation_flux/(init_particle))
     
-    x_mesh = np.linspace(0,surface_distances[len(surface_distances)-1], N_mesh)
     scalar_flux = mesh_dist_traveled_np/dx
     scalar_flux/=max(scalar_flux)
     
-    return(scalar_flux, standard_deviation_flux)
+    return(scalar_flux, standard_deviation_flux, {'cell edges': np.arange(N_mesh+1)*dx, 'tally meshes': [], 'reaction rates': None, 'time flux': None,
+                                                     'surface current': None, 'leakage': (trans_lhs/init_particle, trans_rhs/init_particle),
+                                                     'k': None,
+                                                     'timing': {'run seconds': run_time, 'particles': init_particle,
+                                                                'kernels': timers.report()},
+                                                     'fom': {'mesh': FigureOfMerit(mesh_dist_traveled_np, standard_deviation_flux, run_time),
+                                                             'tally meshes': []}})
     
     
     
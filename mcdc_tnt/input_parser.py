@@ -1,19 +1,46 @@
+import os
 import numpy as np
 import yaml
+from mcdc_tnt.weight_windows import WeightWindows, WindowsFromImportance
+from mcdc_tnt.mesh_import import ImportMesh
+from mcdc_tnt.deck_cache import LoadCache, SaveCache
+from mcdc_tnt.sampling import CumulativeTable
 
-def SimulationSetup(input_file):
+def SimulationSetup(input_file, cache=True):
     """
-    Sets up dictionaries and mesh for transport
+    Sets up dictionaries and mesh for transport. The parsed deck is cached
+    next to it (see deck_cache) and reused while neither the deck nor the
+    mesh files it imports change
 
     Parameters
     ----------
     input_file : <input_file_name>.yaml
         Name of the input file to be ran.
+    cache : bool, optional
+        read and write the input deck cache. The default is True.
 
     Returns
     -------
     Inital PSV's for use in transport.
 
+    """
+    if cache == True:
+        setup = LoadCache(input_file)
+        if setup is not None:
+            print('>>>Input deck setup read from cache')
+            return(setup)
+    
+    setup = ReadDeck(input_file)
+    if cache == True:
+        SaveCache(input_file, setup)
+    return(setup)
+
+
+
+def ReadDeck(input_file):
+    """
+    Parses an input deck and assembles (or imports) its mesh, see
+    SimulationSetup
     """
     
     with open(input_file,'r') as f:
@@ -29,20 +56,136 @@ def SimulationSetup(input_file):
     # generations = 1
     nu_new_neutrons = int(inputs['neutrons per fission']) #neutrons/fission
     isotropic = inputs['isotropic'] #isotropic
+    transport_mode = inputs.get('transport mode', 'event') #event or history based transport
+    if transport_mode not in ('event', 'history'):
+        raise ValueError('transport mode must be event or history: {0}'.format(transport_mode))
+    tracking = inputs.get('tracking', 'surface') #surface or delta (Woodcock) tracking in Advance
+    if tracking not in ('surface', 'delta'):
+        raise ValueError('tracking must be surface or delta: {0}'.format(tracking))
+    
+    # particle bank sizing (optional): initial allocation is headroom*num_part
+    # and grows geometrically from there, shrink releases memory after purges
+    bank_headroom = float(inputs.get('bank headroom', 2.0))
+    bank_shrink = inputs.get('bank shrink', False)
+    bank_swap = inputs.get('bank swap', True) #swap double buffers after purge instead of copying back
+    
+    # batch statistics (optional): the source is split into batches and the
+    # run stops early once the max relative error or the figure of merit
+    # 1/(R^2 T) reaches its target
+    batches = int(inputs.get('batches', 1))
+    history_groups = int(inputs.get('history groups', 0)) #single batch event based errors from groups of histories
+    target_rel_error = inputs.get('target relative error', None)
+    target_fom = inputs.get('target fom', None)
+    if target_rel_error is not None:
+        target_rel_error = float(target_rel_error)
+    if target_fom is not None:
+        target_fom = float(target_fom)
+    
+    # k-eigenvalue power iteration (optional): fixed size cycles sourced from
+    # the fission sites of the last one, tallies and k are averaged over the
+    # active cycles only
+    mode = inputs.get('mode', 'fixed source') #fixed source or eigenvalue
+    if mode not in ('fixed source', 'eigenvalue'):
+        raise ValueError('mode must be fixed source or eigenvalue: {0}'.format(mode))
+    inactive_cycles = int(inputs.get('inactive cycles', 10))
+    active_cycles = max(int(inputs.get('active cycles', 20)), 1)
+    
+    # implicit capture (optional): collisions never absorb, the weight is
+    # reduced by the capture probability instead and scatters below the
+    # weight cutoff play Russian roulette for the survival weight
+    implicit_capture = None
+    if inputs.get('implicit capture', False) == True:
+        weight_cutoff = float(inputs.get('weight cutoff', 0.25))
+        survival_weight = float(inputs.get('survival weight', 1.0))
+        if (weight_cutoff <= 0) or (survival_weight < weight_cutoff):
+            raise ValueError('need 0 < weight cutoff <= survival weight: {0}, {1}'.format(weight_cutoff, survival_weight))
+        implicit_capture = np.array([weight_cutoff, survival_weight], dtype=float)
     
     #===============================================================================
-    # Test case 1: Single Reigon
+    # Geometry: slab regions between the surface locations
     #===============================================================================
     
     Length_slab = np.float(inputs['length of slab'])
     surface_distances = np.array(inputs['surface locations'], dtype=float)
     
-    mesh_cell_length = np.float(inputs['dx']) #dx
-    N_mesh = int(Length_slab/mesh_cell_length)
+    # flux tally meshes (optional), independent of the material mesh: each
+    # is either uniform (dx over the slab) or given by its bin edges
+    tally_meshes = []
+    for tally_mesh in inputs.get('tally meshes', []):
+        if 'edges' in tally_mesh:
+            edges = np.array(tally_mesh['edges'], dtype=float)
+        else:
+            edges = np.linspace(0, Length_slab, int(round(Length_slab/float(tally_mesh['dx'])))+1)
+        if (len(edges) < 2) or np.any(np.diff(edges) <= 0):
+            raise ValueError('tally mesh edges must be increasing: {0}'.format(edges))
+        tally_meshes.append(edges)
+    
+    # per cell reaction rates and collision flux, scored in SampleEvent (optional)
+    reaction_tallies = inputs.get('reaction tallies', False)
+    
+    # time binned flux of the mesh cells (optional): a list of bin edges or
+    # uniform bins of width dt up to max time
+    time_edges = inputs.get('time bins', None)
+    if isinstance(time_edges, dict):
+        max_time = float(time_edges['max time'])
+        time_edges = np.linspace(0, max_time, int(round(max_time/float(time_edges['dt'])))+1)
+    if time_edges is not None:
+        time_edges = np.array(time_edges, dtype=float)
+        if (len(time_edges) < 2) or np.any(np.diff(time_edges) <= 0):
+            raise ValueError('time bin edges must be increasing: {0}'.format(time_edges))
+    
+    # surface crossing currents at every surface location (optional), binned
+    # by direction cosine (an even number of bins so mu = 0 is an edge) and
+    # by the time bins above
+    surface_tally = inputs.get('surface tally', False)
+    surface_mu_bins = 0
+    if isinstance(surface_tally, dict):
+        surface_mu_bins = int(surface_tally.get('mu bins', 10))
+    elif surface_tally == True:
+        surface_mu_bins = 10
+    surface_mu_bins += surface_mu_bins%2
     
-    cap_xsec = np.float(inputs['capture cross section']) #capture crossection
-    scat_xsec = np.float(inputs['scatter cross section'])  #scattering crossection
-    fis_xsec = np.float(inputs['fission cross section'])  #fission crossection
+    # material mesh: uniform cells of width dx, or non-uniform cells given by
+    # their edges or graded per region (cells per region and last to first
+    # cell width ratio), dx is then the narrowest cell
+    cell_edges = None
+    if 'mesh edges' in inputs:
+        cell_edges = np.array(inputs['mesh edges'], dtype=float)
+    elif 'mesh grading' in inputs:
+        cell_edges = GradedEdges(surface_distances, inputs['mesh grading']['cells'],
+                                 inputs['mesh grading'].get('ratio', 1))
+    if cell_edges is not None:
+        if (len(cell_edges) < 2) or np.any(np.diff(cell_edges) <= 0):
+            raise ValueError('mesh edges must be increasing: {0}'.format(cell_edges))
+        if (cell_edges[0] != 0) or (abs(cell_edges[-1] - Length_slab) > 1e-12*Length_slab):
+            raise ValueError('mesh edges must span the slab [0, {0}]: {1}'.format(Length_slab, cell_edges))
+        cell_edges[-1] = Length_slab
+        N_mesh = len(cell_edges)-1
+        mesh_cell_length = np.min(np.diff(cell_edges))
+    else:
+        mesh_cell_length = np.float(inputs['dx']) #dx
+        N_mesh = int(round(Length_slab/mesh_cell_length))
+    
+    # weight windows (optional): per cell (or per region) importances or lower
+    # weight bounds, else generated from the flux of an analog pilot run
+    weight_windows = None
+    pilot_particles = 0
+    window_ratio = 5.0
+    windows = inputs.get('weight windows', None)
+    if windows is not None:
+        window_ratio = float(windows.get('ratio', 5.0))
+        if window_ratio <= 1:
+            raise ValueError('weight window ratio must be > 1: {0}'.format(window_ratio))
+        if 'importances' in windows:
+            weight_windows = WindowsFromImportance(CellValues(windows['importances'], surface_distances,
+                                                              mesh_cell_length, N_mesh, cell_edges), window_ratio)
+        elif 'lower bounds' in windows:
+            lower = CellValues(windows['lower bounds'], surface_distances, mesh_cell_length, N_mesh, cell_edges)
+            if np.any(lower <= 0):
+                raise ValueError('weight window lower bounds must be positive: {0}'.format(lower))
+            weight_windows = WeightWindows(lower, window_ratio)
+        else:
+            pilot_particles = max(int(float(windows.get('pilot particles', num_part//10))), 1)
     
     hardware_target = inputs['hardware target']
     
@@ -50,8 +193,8 @@ def SimulationSetup(input_file):
     
     make_out = inputs['file output']
     
-    #abs_xsec = cap_xsec+fis_xsec #absorption crossection
-    total_xsec = cap_xsec + scat_xsec + fis_xsec #total crossection
+    if np.any(np.diff(surface_distances) <= 0):
+        raise ValueError('surface locations must be increasing: {0}'.format(surface_distances))
     
     #assemble mesh
     amm = inputs['assemble mesh']
@@ -61,21 +204,41 @@ def SimulationSetup(input_file):
     plot_error = inputs['error plot']
     
     
-    if (amm == True):
-        #establishing mesh
-        mesh_scat_xsec = np.zeros(N_mesh, dtype=float)
-        mesh_cap_xsec = np.zeros(N_mesh, dtype=float)
-        mesh_fis_xsec = np.zeros(N_mesh, dtype=float)
-        mesh_total_xsec = np.zeros(N_mesh, dtype=float)
-
-        for cell in range(N_mesh):
-            mesh_scat_xsec[cell] = scat_xsec
-            mesh_cap_xsec[cell] = cap_xsec
-            mesh_fis_xsec[cell] = fis_xsec
-            mesh_total_xsec[cell] = total_xsec
+    # energy groups (optional): multigroup cross sections [N_groups, N_mesh]
+    # with group speeds, an emission spectrum and a group to group scatter
+    # matrix per region, replace the one group cross sections
+    energy_groups = inputs.get('energy groups', None)
+    group_speeds = None
+    spectrum_cdf = None
+    scatter_cdf = None
+    mesh_region = None
+    
+    mesh_file = None
+    if (amm == True) and (energy_groups is not None):
+        [mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, group_speeds, spectrum_cdf, scatter_cdf,
+         mesh_region] = MultigroupMesh(energy_groups, surface_distances, mesh_cell_length, N_mesh, cell_edges)
+        mesh_total_xsec = mesh_cap_xsec + mesh_scat_xsec + mesh_fis_xsec
+    elif (amm == True):
+        # cross sections, one value per region (between consecutive surface
+        # locations) or a single value for the whole slab
+        cap_xsec = inputs['capture cross section'] #capture crossection
+        scat_xsec = inputs['scatter cross section']  #scattering crossection
+        fis_xsec = inputs['fission cross section']  #fission crossection
+        
+        #establishing mesh, every cell takes the region its center is in
+        mesh_scat_xsec = CellValues(scat_xsec, surface_distances, mesh_cell_length, N_mesh, cell_edges)
+        mesh_cap_xsec = CellValues(cap_xsec, surface_distances, mesh_cell_length, N_mesh, cell_edges)
+        mesh_fis_xsec = CellValues(fis_xsec, surface_distances, mesh_cell_length, N_mesh, cell_edges)
+        mesh_total_xsec = mesh_cap_xsec + mesh_scat_xsec + mesh_fis_xsec #total crossection
     else:
+        if energy_groups is not None:
+            raise ValueError('energy groups need an assembled mesh (assemble mesh: True)')
+        #per cell arrays written by another code, memory mapped instead of
+        #read (paths relative to the input deck)
         print('import mesh data from file')
-        #import mesh from file
+        mesh_file = inputs['mesh file']
+        [mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec] = ImportMesh(mesh_file, N_mesh,
+                                                                                    os.path.dirname(os.path.abspath(input_file)))
     
     #assemble formatted dicts for simplified i/o
     comp_parms = {'seed': seed,
@@ -90,44 +253,240 @@ def SimulationSetup(input_file):
                   'L_slab': Length_slab,
                   'dx': mesh_cell_length,
                   'N_mesh': N_mesh,
+                  'cell_edges': cell_edges,
+                  'mesh_file': mesh_file,
+                  'source_pdf': SourcePdf(mesh_fis_xsec, cell_edges),
                   'nu': nu_new_neutrons,
                   'iso': isotropic,
-                  'part_speed': particle_speed}
-                   
+                  'part_speed': particle_speed,
+                  'bank_headroom': bank_headroom,
+                  'bank_shrink': bank_shrink,
+                  'bank_swap': bank_swap,
+                  'transport_mode': transport_mode,
+                  'tracking': tracking,
+                  'batches': batches,
+                  'history_groups': history_groups,
+                  'target_rel_error': target_rel_error,
+                  'target_fom': target_fom,
+                  'group_speeds': group_speeds,
+                  'spectrum_cdf': spectrum_cdf,
+                  'scatter_cdf': scatter_cdf,
+                  'mesh_region': mesh_region,
+                  'mode': mode,
+                  'inactive_cycles': inactive_cycles,
+                  'active_cycles': active_cycles,
+                  'implicit_capture': implicit_capture,
+                  'weight_windows': weight_windows,
+                  'pilot_particles': pilot_particles,
+                  'window_ratio': window_ratio,
+                  'tally_meshes': tally_meshes,
+                  'reaction_tallies': reaction_tallies,
+                  'time_edges': time_edges,
+                  'surface_mu_bins': surface_mu_bins}
     
-    #===============================================================================
-    # Test case 2: Three Region
-    #===============================================================================
+    return(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec, surface_distances)
+
+
+
+def CellValues(values, surface_distances, dx, N_mesh, cell_edges=None):
+    """
+    Per cell values from a single value, a list with one value per mesh cell
+    or one per region (between consecutive surface locations, picked by cell
+    center with a binary search, no loop over the cells). Cells are dx wide
+    unless their edges are given
+    """
+    values = np.array(values, dtype=float).reshape(-1)
+    if len(values) == N_mesh:
+        return(values)
+    if len(values) == 1:
+        return(np.full(N_mesh, values[0]))
+    if len(values) == len(surface_distances)-1:
+        return(values[CellRegions(surface_distances, dx, N_mesh, cell_edges)])
+    raise ValueError('need one value per mesh cell ({0}) or per region ({1}): {2}'.format(N_mesh,
+                     len(surface_distances)-1, len(values)))
+
+
+def CellRegions(surface_distances, dx, N_mesh, cell_edges=None):
+    """
+    Region (between consecutive surface locations) every mesh cell center is
+    in, by a binary search
+    """
+    if cell_edges is None:
+        centers = (np.arange(N_mesh)+0.5)*dx
+    else:
+        centers = (cell_edges[:-1] + cell_edges[1:])/2
+    region = np.searchsorted(surface_distances, centers, side='right') - 1
+    return(np.clip(region, 0, len(surface_distances)-2).astype(np.int32))
+
+
+def MultigroupMesh(energy_groups, surface_distances, dx, N_mesh, cell_edges=None):
+    """
+    Multigroup cross sections and group tables from the energy groups entry
+    of an input deck: speeds (one per group), spectrum (emission spectrum of
+    source and fission particles, all in the first group by default),
+    capture and fission cross section (one entry per group, each a value,
+    one per region or one per cell) and scatter matrix (from group rows to
+    group columns, each entry a value or one per region)
+
+    Returns
+    -------
+    capture, scatter and fission cross sections [N_groups, N_mesh] (C
+    contiguous, a group's cells are consecutive), group speeds, cumulative
+    emission spectrum, cumulative scattering tables [N_regions, N_groups,
+    N_groups] and the region of every cell.
+
+    """
+    speeds = np.array(energy_groups['speeds'], dtype=float).reshape(-1)
+    num_groups = len(speeds)
+    num_regions = len(surface_distances)-1
+    if np.any(speeds <= 0):
+        raise ValueError('energy group speeds must be positive: {0}'.format(speeds))
     
-    # # index refers to region
-    # cap_xsec = np.array([1/3, 1/3, 1/3]) #capture crossection
-    # scat_xsec = np.array([2/3, 1/3, 2/3]) #scattering crossection
-    # fis_xsec = np.array([0,1/3,0]) #fission crossection
-    
-    # #abs_xsec = cap_xsec+fis_xsec #absorption crossection
-    # total_xsec = np.array([1,1,1]) #total crossection
-    
-    # Length_slab = 5
-    # surface_distances = np.array([0,2,4,Length_slab], dtype=np.float32)
-    # mesh_cell_length = 0.2 #dx
-    # N_mesh = int(Lenght_slab/mesh_cell_length)
-    
-    # #establishing mesh
-    # mesh_scat_xsec = np.zeros(N_mesh, dtype=np.float32)
-    # mesh_cap_xsec = np.zeros(N_mesh, dtype=np.float32)
-    # mesh_fis_xsec = np.zeros(N_mesh, dtype=np.float32)
-    # mesh_total_xsec = np.zeros(N_mesh, dtype=np.float32)
-    
-    # for i in range(len(surface_distances)-1):
-    #     for cell in range(int(surface_distances[i]/mesh_cell_length), int(surface_distances[i+1]/mesh_cell_length)):
-    #         mesh_scat_xsec[cell] = scat_xsec[i]
-    #         mesh_cap_xsec[cell] = cap_xsec[i]
-    #         mesh_fis_xsec[cell] = fis_xsec[i]
-    #         mesh_total_xsec[cell] = total_xsec[i]
-        
+    spectrum = np.array(energy_groups.get('spectrum', np.eye(num_groups)[0]), dtype=float).reshape(-1)
+    if (len(spectrum) != num_groups) or np.any(spectrum < 0) or (np.sum(spectrum) <= 0):
+        raise ValueError('need a non-negative spectrum value per energy group ({0}): {1}'.format(num_groups, spectrum))
     
-    # L = [0,2,4,5] #coordinants of boundaries
-    # generation_region = 1
-    # regions = 3
+    mesh_xsec = []
+    for name in ('capture cross section', 'fission cross section'):
+        values = energy_groups.get(name, [0.0]*num_groups)
+        if len(values) != num_groups:
+            raise ValueError('need a {0} per energy group ({1}): {2}'.format(name, num_groups, values))
+        mesh_xsec.append(np.array([CellValues(v, surface_distances, dx, N_mesh, cell_edges) for v in values]))
     
-    return(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec, surface_distances)
+    matrix = energy_groups['scatter matrix']
+    if (len(matrix) != num_groups) or any(len(row) != num_groups for row in matrix):
+        raise ValueError('scatter matrix must be {0} by {0} (from group, to group)'.format(num_groups))
+    scatter_matrix = np.zeros((num_regions, num_groups, num_groups))
+    for g in range(num_groups):
+        for h in range(num_groups):
+            values = np.array(matrix[g][h], dtype=float).reshape(-1)
+            if len(values) not in (1, num_regions):
+                raise ValueError('need one scatter matrix value per region ({0}): {1}'.format(num_regions, values))
+            scatter_matrix[:, g, h] = values
+    if np.any(scatter_matrix < 0):
+        raise ValueError('scatter matrix values must be non-negative')
+    
+    mesh_region = CellRegions(surface_distances, dx, N_mesh, cell_edges)
+    mesh_scat_xsec = np.ascontiguousarray(np.sum(scatter_matrix, axis=2)[mesh_region].T)
+    
+    return(mesh_xsec[0], mesh_scat_xsec, mesh_xsec[1], speeds, CumulativeTable(spectrum),
+           CumulativeTable(scatter_matrix), mesh_region)
+
+
+def SourcePdf(mesh_fis_xsec, cell_edges=None):
+    """
+    Probability of a source particle being born in every mesh cell, from
+    the fission cross sections (summed over the groups of a multigroup
+    [N_groups, N_mesh] table, times the cell widths of a non-uniform mesh),
+    whole array operations. A deck without fission has no source and raises
+    """
+    source_density = mesh_fis_xsec
+    if np.ndim(mesh_fis_xsec) == 2:
+        source_density = np.sum(mesh_fis_xsec, axis=0)
+    if cell_edges is not None:
+        source_density = source_density*np.diff(cell_edges)
+    total = np.sum(source_density)
+    if not (np.isfinite(total) and (total > 0)):
+        raise ValueError('the source is born on the fission cross section, it needs fission somewhere (fission cross sections sum to {0})'.format(total))
+    source_pdf = source_density/total
+    source_pdf /= np.sum(source_pdf)
+    return(source_pdf)
+
+
+def GradedEdges(surface_distances, cells, ratio=1):
+    """
+    Cell edges graded geometrically within every region (between consecutive
+    surface locations), so the mesh can be fine near interfaces and coarse
+    elsewhere. Region r gets cells[r] cells whose widths change by a
+    constant factor from the first to the last, ratio[r] being the last to
+    first width ratio (1 is uniform). Either may be a single value for every
+    region
+    """
+    num_regions = len(surface_distances)-1
+    cells = np.array(cells, dtype=int).reshape(-1)
+    ratio = np.array(ratio, dtype=float).reshape(-1)
+    if len(cells) == 1:
+        cells = np.full(num_regions, cells[0])
+    if len(ratio) == 1:
+        ratio = np.full(num_regions, ratio[0])
+    if (len(cells) != num_regions) or (len(ratio) != num_regions):
+        raise ValueError('need one mesh grading value per region ({0}): cells {1}, ratio {2}'.format(num_regions, cells, ratio))
+    if np.any(cells < 1) or np.any(ratio <= 0):
+        raise ValueError('mesh grading needs cells >= 1 and ratio > 0: cells {0}, ratio {1}'.format(cells, ratio))
+    
+    edges = [np.array([surface_distances[0]], dtype=float)]
+    for r in range(num_regions):
+        widths = ratio[r]**(np.arange(cells[r])/max(cells[r]-1, 1))
+        fractions = np.cumsum(widths)/np.sum(widths)
+        region_edges = surface_distances[r] + (surface_distances[r+1] - surface_distances[r])*fractions
+        region_edges[-1] = surface_distances[r+1]
+        edges.append(region_edges)
+    return(np.concatenate(edges))
+
+
+def test_CellValues():
+    surface_distances = np.array([0, 2, 4, 5], dtype=float)
+    
+    #three regions on ten cells of .5
+    values = CellValues([1, 2, 3], surface_distances, 0.5, 10)
+    assert(np.array_equal(values, [1, 1, 1, 1, 2, 2, 2, 2, 3, 3]))
+    
+    assert(np.array_equal(CellValues(0.5, surface_distances, 0.5, 10), np.full(10, 0.5)))
+    assert(np.array_equal(CellValues(np.arange(10), surface_distances, 0.5, 10), np.arange(10)))
+    
+    try:
+        CellValues([1, 2], surface_distances, 0.5, 10)
+        assert(False)
+    except ValueError:
+        pass
+    
+    #cell centers of a non-uniform mesh pick the region
+    cell_edges = np.array([0, 1.5, 2.5, 3, 5], dtype=float)
+    assert(np.array_equal(CellValues([1, 2, 3], surface_distances, 0.5, 4, cell_edges), [1, 2, 2, 3]))
+
+
+def test_MultigroupMesh():
+    surface_distances = np.array([0, 2, 4], dtype=float)
+    energy_groups = {'speeds': [10, 1],
+                     'capture cross section': [0.1, [0.2, 0.4]],
+                     'fission cross section': [0, 0.3],
+                     'scatter matrix': [[[0.5, 0.7], [0.5, 0.1]], [0, 1]]}
+    
+    [cap, scat, fis, speeds, spectrum_cdf, scatter_cdf, mesh_region] = MultigroupMesh(energy_groups, surface_distances, 1, 4)
+    assert(cap.shape == (2, 4) and cap.flags['C_CONTIGUOUS'])
+    assert(np.array_equal(cap[1], [0.2, 0.2, 0.4, 0.4]))
+    assert(np.allclose(scat, [[1, 1, 0.8, 0.8], [1, 1, 1, 1]]))
+    assert(np.array_equal(spectrum_cdf, [1, 1]))
+    assert(np.allclose(scatter_cdf[1, 0], [0.875, 1]) and np.array_equal(scatter_cdf[0, 1], [0, 1]))
+    assert(np.array_equal(mesh_region, [0, 0, 1, 1]))
+    
+    #the source is born on fission, summed over the groups
+    assert(np.allclose(SourcePdf(fis), 0.25))
+    
+    try:
+        MultigroupMesh(dict(energy_groups, speeds=[1]), surface_distances, 1, 4)
+        assert(False)
+    except ValueError:
+        pass
+    
+    try:
+        SourcePdf(np.zeros((2, 4)))
+        assert(False)
+    except ValueError:
+        pass
+
+
+def test_GradedEdges():
+    surface_distances = np.array([0, 2, 4, 5], dtype=float)
+    
+    #fine next to the interfaces at 2 and 4, uniform in the last region
+    edges = GradedEdges(surface_distances, [4, 4, 2], [0.1, 10, 1])
+    assert(len(edges) == 11)
+    assert(np.all(np.diff(edges) > 0))
+    assert(np.all(np.isin(surface_distances, edges)))
+    widths = np.diff(edges)
+    assert(np.isclose(widths[3]/widths[0], 0.1))
+    assert(np.isclose(widths[7]/widths[4], 10))
+    assert(np.allclose(widths[8:], 0.5))
+    
+    assert(np.allclose(GradedEdges(surface_distances, 2), [0, 1, 2, 3, 4, 4.5, 5]))
@@ -0,0 +1,190 @@
+"""
+Name: MeshImport
+breif: Memory mapped per cell cross section arrays from external files for MCDC-TNT
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import os
+import struct
+import zipfile
+import numpy as np
+
+
+# arrays of an imported mesh, total is optional (the sum of the others)
+MESH_ARRAYS = ('capture', 'scatter', 'fission', 'total')
+
+
+def LoadMeshArray(path, N_mesh, member=None):
+    """
+    Memory maps one per cell array without reading it: a .npy file, an
+    array (member) of an uncompressed .npz archive or a raw binary file of
+    little endian float64 values (any other extension). The map is copy on
+    write, a page written in memory becomes private and the file is never
+    changed
+
+    Parameters
+    ----------
+    path : str
+        file to map.
+    N_mesh : int
+        number of mesh cells the array must hold.
+    member : str, optional
+        name of the array in a .npz archive.
+
+    Returns
+    -------
+    np.memmap double [N_mesh] (a copy for compressed .npz members).
+
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        values = np.load(path, mmap_mode='c')
+    elif extension == '.npz':
+        values = NpzMember(path, member)
+    else:
+        values = np.memmap(path, dtype='<f8', mode='c')
+
+    name = path if member is None else '{0}[{1}]'.format(path, member)
+    if values.dtype != np.float64:
+        raise ValueError('mesh array {0} must be float64: {1}'.format(name, values.dtype))
+    if values.shape != (N_mesh,):
+        raise ValueError('mesh array {0} needs one value per mesh cell ({1}): shape {2}'.format(name, N_mesh, values.shape))
+    return(values)
+
+
+def NpzMember(path, member):
+    """
+    Memory maps array member of a .npz archive. Stored (np.savez) members
+    sit uncompressed in the zip so the .npy header is read from the file
+    and the data mapped past it, compressed ones (np.savez_compressed) can
+    only be loaded
+    """
+    with zipfile.ZipFile(path) as archive:
+        names = [name[:-4] for name in archive.namelist() if name.endswith('.npy')]
+        if member not in names:
+            raise ValueError('mesh file {0} has no {1} array: {2}'.format(path, member, names))
+        info = archive.getinfo(member + '.npy')
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        print('>>>{0}[{1}] is compressed, loading it instead of memory mapping'.format(path, member))
+        with np.load(path) as archive:
+            return(archive[member])
+
+    with open(path, 'rb') as f:
+        #local file header: fixed 30 bytes, then the name and extra field
+        f.seek(info.header_offset)
+        header = f.read(30)
+        [name_length, extra_length] = struct.unpack('<HH', header[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            [shape, fortran_order, dtype] = np.lib.format.read_array_header_1_0(f)
+        else:
+            [shape, fortran_order, dtype] = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    return(np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C'))
+
+
+def ImportMesh(mesh_file, N_mesh, directory=''):
+    """
+    Per cell capture, scatter, fission and total cross sections from
+    external files, all memory mapped (see LoadMeshArray)
+
+    Parameters
+    ----------
+    mesh_file : str or dict
+        a .npz archive holding capture, scatter, fission (and optionally
+        total) arrays, or a dict of those names to one file each.
+    N_mesh : int
+        number of mesh cells.
+    directory : str, optional
+        directory relative paths are taken from (the input deck's).
+
+    Returns
+    -------
+    capture, scatter, fission and total cross sections of every cell, the
+    total is the sum of the others when not given.
+
+    """
+    if isinstance(mesh_file, dict):
+        unknown = set(mesh_file) - set(MESH_ARRAYS)
+        if len(unknown) > 0:
+            raise ValueError('unknown mesh arrays {0}, expected {1}'.format(sorted(unknown), MESH_ARRAYS))
+        files = {name: (os.path.join(directory, path), None) for name, path in mesh_file.items()}
+    else:
+        path = os.path.join(directory, mesh_file)
+        with zipfile.ZipFile(path) as archive:
+            names = [name[:-4] for name in archive.namelist()]
+        files = {name: (path, name) for name in MESH_ARRAYS if name in names}
+
+    for name in MESH_ARRAYS[:3]:
+        if name not in files:
+            raise ValueError('mesh import needs a {0} array'.format(name))
+
+    arrays = [LoadMeshArray(files[name][0], N_mesh, files[name][1]) for name in MESH_ARRAYS[:3]]
+    if 'total' in files:
+        arrays.append(LoadMeshArray(files['total'][0], N_mesh, files['total'][1]))
+    else:
+        arrays.append(arrays[0] + arrays[1] + arrays[2])
+    return(arrays)
+
+
+def MeshFiles(mesh_file, directory=''):
+    """
+    Paths of the files an imported mesh (mesh_file as in ImportMesh) is
+    read from, none when the mesh is assembled from the deck (None)
+    """
+    if mesh_file is None:
+        return([])
+    if isinstance(mesh_file, dict):
+        return([os.path.join(directory, mesh_file[name]) for name in MESH_ARRAYS if name in mesh_file])
+    return([os.path.join(directory, mesh_file)])
+
+
+def test_ImportMesh():
+    import tempfile
+    N_mesh = 6
+    capture = np.linspace(0.1, 0.6, N_mesh)
+    scatter = np.full(N_mesh, 0.5)
+    fission = np.arange(N_mesh, dtype=float)/10
+
+    with tempfile.TemporaryDirectory() as directory:
+        #uncompressed archive, mapped in place
+        np.savez(os.path.join(directory, 'mesh.npz'), capture=capture, scatter=scatter, fission=fission)
+        [cap, scat, fis, total] = ImportMesh('mesh.npz', N_mesh, directory)
+        assert(isinstance(cap, np.memmap))
+        assert(np.array_equal(cap, capture) and np.array_equal(fis, fission))
+        assert(np.allclose(total, capture + scatter + fission))
+
+        #writes stay in memory
+        cap[0] = 7
+        assert(np.array_equal(ImportMesh('mesh.npz', N_mesh, directory)[0], capture))
+
+        #one file per array, .npy and raw float64
+        np.save(os.path.join(directory, 'cap.npy'), capture)
+        np.save(os.path.join(directory, 'scat.npy'), scatter)
+        fission.astype('<f8').tofile(os.path.join(directory, 'fis.bin'))
+        np.save(os.path.join(directory, 'total.npy'), capture + scatter + fission)
+        [cap, scat, fis, total] = ImportMesh({'capture': 'cap.npy', 'scatter': 'scat.npy', 'fission': 'fis.bin',
+                                              'total': 'total.npy'}, N_mesh, directory)
+        assert(isinstance(fis, np.memmap) and np.array_equal(fis, fission))
+        assert(np.array_equal(total, capture + scatter + fission))
+        assert(MeshFiles({'total': 'total.npy', 'capture': 'cap.npy'}, directory) == [os.path.join(directory, 'cap.npy'),
+                                                                                       os.path.join(directory, 'total.npy')])
+
+        #wrong length and dtype
+        for arrays in ({'capture': capture[:-1]}, {'capture': capture.astype(np.float32)}):
+            np.savez(os.path.join(directory, 'bad.npz'), **{'scatter': scatter, 'fission': fission, **arrays})
+            try:
+                ImportMesh('bad.npz', N_mesh, directory)
+                assert(False)
+            except ValueError:
+                pass
+
+
+if __name__ == '__main__':
+    test_ImportMesh()
@@ -8,72 +8,304 @@ Date: Dec 2nd 2021
 import math
 import numpy as np
 import numba as nb
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.workspace import AdvanceWorkspace
+from mcdc_tnt.numba_kernels.cpu.tally import NumChunks, ReduceTallies
+from mcdc_tnt.numba_kernels.rng import Rand
+from mcdc_tnt.numba_kernels.sampling import SampleDistance
+from mcdc_tnt.numba_kernels.tally_mesh import ScoreSegment, ScoreCollision
+from mcdc_tnt.numba_kernels.tally_time import BufferTimeSegments, MergeTimeTally
+from mcdc_tnt.numba_kernels.tally_surface import ScoreCrossings
 
 @nb.jit(nopython=True)
-def Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time,
-            num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L):
-    
-    p_end_trans = np.zeros(num_part)
-    end_flag = 0
-    max_mesh_index = len(mesh_total_xsec)-1
-    
-    cycle_count = 0
-    while end_flag == 0:
-        #allocate randoms
-        rands = np.random.rand(num_part)
-        #vector of indicies for particle transport
-        
-        p_dist_travled = np.zeros(num_part)
-        
-        pre_p_mesh = p_mesh_cell
-        
-        Advance_launch_threads(p_pos_x, p_pos_y, p_pos_z,
-                          p_dir_y, p_dir_z, p_dir_x, 
-                          p_mesh_cell, p_speed, p_time,  
-                          dx, mesh_total_xsec, L,
-                          p_dist_travled, p_end_trans, rands, num_part)
+def Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, workspace, tally_meshes=None, time_tally=None, surface_tally=None, cell_edges=None):
+    """
+    Surface tracks every particle in the bank to its next collision site (or
+    out of the slab) and tallies track lengths times the particle weight
+
+    Parameters
+    ----------
+    bank : ParticleBank
+        PSV: particles to move (first bank.num_part).
+    dx : double
+        mesh cell width.
+    mesh_total_xsec : vector double
+        total cross section of every mesh cell. With energy groups the
+        groups are stored back to back (group major), particles read value
+        p_group*N_mesh + p_mesh_cell.
+    mesh_dist_traveled : vector double
+        track length estimator tally (added to), summed over the groups.
+        Its length is the number of mesh cells.
+    mesh_dist_traveled_squared : vector double
+        track length squared tally (added to).
+    L : double
+        slab width.
+    workspace : AdvanceWorkspace
+        scratch vectors, grown here if the bank outgrew them.
+    tally_meshes : TallyMeshes, optional
+        independent tally meshes, every segment is split across their bins.
+    time_tally : TimeTally, optional
+        time binned flux of the mesh cells, every segment is split across
+        the time bins it spans.
+    surface_tally : SurfaceTally, optional
+        surface crossings, scored by the segments that cross a surface.
+    cell_edges : vector double, optional
+        edges of the (non-uniform) mesh cells, N_mesh+1 increasing values
+        from 0 to L. Cells are dx wide when None.
+
+    """
+    num_part = bank.num_part
+    workspace.reserve(num_part)
+    
+    #one rng event per call, the sub-step number picks the draw
+    event = bank.next_event()
+    
+    p_end_trans = workspace.p_end_trans
+    p_dist_travled = workspace.p_dist_travled
+    rands = workspace.rands
+    active = workspace.active
+    active_next = workspace.active_next
+    
+    #track lengths are scored into private rows inside the parallel region
+    num_cells = len(mesh_dist_traveled)
+    num_chunks = NumChunks(num_part)
+    workspace.num_chunks = num_chunks
+    workspace.reserve_tallies(num_chunks, num_cells)
+    tally = workspace.tally
+    tally_squared = workspace.tally_squared
+    [edges, edge_offsets, mesh_tally, mesh_tally_squared] = TallyMeshRows(tally_meshes, num_chunks)
+    [segment_cell, segment_start, segment_end, segment_score] = TimeTallySegments(time_tally, num_part)
+    [surfaces, mu_edges, surface_time_edges, surface_tally_rows] = SurfaceTallyRows(surface_tally, num_chunks)
+    cell_edges = CellEdges(cell_edges)
+    
+    #every particle starts on the worklist
+    for i in range(num_part):
+        p_end_trans[i] = 0
+        active[i] = i
+    num_active = num_part
+    
+    workspace.num_sub_steps = 0
+    while num_active > 0:
+        workspace.record_pass(num_active/num_part)
+        num_segments = num_active
         
-        end_flag = 1
-        for i in range(num_part):
-            if (0 < pre_p_mesh[i] < max_mesh_index):
-                mesh_dist_traveled[pre_p_mesh[i]] += p_dist_travled[i]
-                mesh_dist_traveled_squared[pre_p_mesh[i]] += p_dist_travled[i]**2
-                
-            if p_end_trans[i] == 0:
-                end_flag = 0
-            
-        summer = p_end_trans.sum()
-        cycle_count += 1
+        num_active = Advance_launch_threads(bank, dx, mesh_total_xsec, num_cells, L,
+                          p_dist_travled, p_end_trans, rands,
+                          active, active_next, num_active,
+                          tally, tally_squared, num_chunks,
+                          event, workspace.num_sub_steps,
+                          edges, edge_offsets, mesh_tally, mesh_tally_squared,
+                          segment_cell, segment_start, segment_end, segment_score,
+                          surfaces, mu_edges, surface_time_edges, surface_tally_rows,
+                          cell_edges)
+        if time_tally is not None:
+            BufferTimeSegments(time_tally, num_segments)
     
+    ReduceTallies(tally[:num_chunks], mesh_dist_traveled)
+    ReduceTallies(tally_squared[:num_chunks], mesh_dist_traveled_squared)
+    if tally_meshes is not None:
+        ReduceTallies(mesh_tally[:num_chunks], tally_meshes.flux)
+        ReduceTallies(mesh_tally_squared[:num_chunks], tally_meshes.flux_squared)
+    if surface_tally is not None:
+        ReduceTallies(surface_tally_rows[:num_chunks], surface_tally.current)
+    if time_tally is not None:
+        MergeTimeTally(time_tally)
+
+
+@nb.jit(nopython=True)
+def CellEdges(cell_edges):
+    """
+    Edges of the mesh cells, empty (uniform cells of width dx) when there
+    are none
+    """
+    if cell_edges is None:
+        return(np.zeros(0))
+    return(cell_edges)
+
+
+@nb.jit(nopython=True)
+def CellBounds(cell, dx, cell_edges):
+    """
+    Left and right bound of a mesh cell, cell*dx and one dx on when
+    cell_edges is empty
+    """
+    if cell_edges.shape[0] == 0:
+        LB = cell * dx
+        return(LB, LB + dx)
+    return(cell_edges[cell], cell_edges[cell+1])
+
+
+@nb.jit(nopython=True)
+def CellIndex(x, dx, cell_edges, max_mesh_index):
+    """
+    Mesh cell of a location inside the slab, by a binary search of
+    cell_edges (int(x/dx) when empty)
+    """
+    if cell_edges.shape[0] == 0:
+        return(min(int(x/dx), max_mesh_index))
+    return(min(max(np.searchsorted(cell_edges, x, side='right') - 1, 0), max_mesh_index))
+
+
+@nb.jit(nopython=True)
+def TallyMeshRows(tally_meshes, num_chunks):
+    """
+    Edges and zeroed private rows of the tally meshes, empty (nothing gets
+    scored) when there are none
+    """
+    if tally_meshes is None:
+        return(np.zeros(0), np.zeros(1, dtype=np.int64), np.zeros((num_chunks, 0)), np.zeros((num_chunks, 0)))
+    tally_meshes.reserve_tallies(num_chunks)
+    return(tally_meshes.edges, tally_meshes.edge_offsets, tally_meshes.tally, tally_meshes.tally_squared)
+
+
+@nb.jit(nopython=True)
+def TimeTallySegments(time_tally, num_part):
+    """
+    Segment slots of the time tally for num_part particles, empty (nothing
+    gets recorded) when there is none
+    """
+    if time_tally is None:
+        return(np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros(0))
+    time_tally.reserve_segments(num_part)
+    return(time_tally.segment_cell, time_tally.segment_start, time_tally.segment_end, time_tally.segment_score)
+
+
+@nb.jit(nopython=True)
+def SurfaceTallyRows(surface_tally, num_chunks):
+    """
+    Surfaces, bin edges and zeroed private rows of the surface tally, no
+    surfaces (nothing gets scored) when there is none
+    """
+    if surface_tally is None:
+        return(np.zeros(0), np.zeros(2), np.zeros(2), np.zeros((num_chunks, 0)))
+    surface_tally.reserve_tallies(num_chunks)
+    return(surface_tally.surfaces, surface_tally.mu_edges, surface_tally.time_edges, surface_tally.tally)
+
+
+@nb.jit(nopython=True)
+def GroupMajorants(mesh_total_xsec, num_cells):
+    """
+    Largest total cross section of every energy group (one value for one
+    group runs), delta tracking samples flights against the particle's own
+    """
+    num_groups = len(mesh_total_xsec)//num_cells
+    majorants = np.zeros(num_groups)
+    for g in range(num_groups):
+        majorants[g] = mesh_total_xsec[g*num_cells:(g+1)*num_cells].max()
+    return(majorants)
+
     
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared)
 
 @nb.jit(nopython=True, parallel=True) 
-def Advance_launch_threads(p_pos_x, p_pos_y, p_pos_z,
-                          p_dir_y, p_dir_z, p_dir_x, 
-                          p_mesh_cell, p_speed, p_time,  
-                          dx, mesh_total_xsec, L,
-                          p_dist_travled, p_end_trans, rands, num_part):
-                          
-    for i in nb.prange(num_part):
-        #print(type(i))
-        [p_pos_x[i], p_pos_y[i], p_pos_z[i], p_mesh_cell[i], p_time[i], p_dist_travled[i], p_end_trans[i]] = Advance_cycle(
-                      p_pos_x[i], p_pos_y[i], p_pos_z[i],
-                      p_dir_y[i], p_dir_z[i], p_dir_x[i], 
-                      p_mesh_cell[i], p_speed[i], p_time[i],  
-                      dx, mesh_total_xsec, L,
-                      p_dist_travled[i], p_end_trans[i], rands[i])
+def Advance_launch_threads(bank, dx, mesh_total_xsec, num_cells, L,
+                          p_dist_travled, p_end_trans, rands,
+                          active, active_next, num_active,
+                          tally, tally_squared, num_chunks,
+                          event, draw,
+                          edges, edge_offsets, mesh_tally, mesh_tally_squared,
+                          segment_cell, segment_start, segment_end, segment_score,
+                          surfaces, mu_edges, surface_time_edges, surface_tally,
+                          cell_edges):
+    """
+    One surface tracking sub-step for the num_active particles on the
+    worklist. Each chunk of the worklist scores into its own tally row and
+    keeps its survivors (in order) in its slice of active_next, the slices
+    are then packed back into active. Segments are also split across the
+    tally mesh bins (edges) into the chunk's mesh_tally row, surface
+    crossings go to its surface_tally row. With a time tally (segment_score
+    not empty) the segment of worklist slot j is recorded in segment_*[j],
+    for BufferTimeSegments to split across the time bins. Returns the new
+    worklist length
+    """
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_mesh_cell = bank.p_mesh_cell
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_weight = bank.p_weight
+    p_group = bank.p_group
+    p_alive = bank.p_alive
+    p_id = bank.p_id
+    seed = bank.seed
+    
+    max_mesh_index = num_cells-1
+    chunk = (num_active + num_chunks - 1) // num_chunks
+    offsets = np.zeros(num_chunks+1, dtype=np.int64)
+    
+    for c in nb.prange(num_chunks):
+        start = min(c*chunk, num_active)
+        k = start
+        for j in range(start, min(start+chunk, num_active)):
+            i = active[j]
+            #fresh random number and zeroed segment in the workspace slot
+            rands[i] = Rand(seed, p_id[i], event, draw)
+            p_dist_travled[i] = 0.0
+            pre_cell = p_mesh_cell[i] #cell the segment is tracked in
+            pre_x = p_pos_x[i]
+            pre_time = p_time[i]
+            
+            [p_pos_x[i], p_pos_y[i], p_pos_z[i], p_mesh_cell[i], p_time[i], p_dist_travled[i], p_end_trans[i], alive] = Advance_cycle(
+                          p_pos_x[i], p_pos_y[i], p_pos_z[i],
+                          p_dir_y[i], p_dir_z[i], p_dir_x[i], 
+                          p_mesh_cell[i], p_speed[i], p_time[i], p_group[i],
+                          dx, mesh_total_xsec, num_cells, L,
+                          p_dist_travled[i], p_end_trans[i], rands[i], cell_edges)
+            if alive == False:
+                p_alive[i] = False
+            
+            #weighted track length
+            score = p_dist_travled[i]*p_weight[i]
+            if (0 < pre_cell < max_mesh_index):
+                tally[c, pre_cell] += score
+                tally_squared[c, pre_cell] += score**2
+            
+            ScoreSegment(pre_x, p_pos_x[i], score, edges, edge_offsets,
+                         mesh_tally[c], mesh_tally_squared[c])
+            if segment_score.shape[0] > 0:
+                segment_cell[j] = pre_cell
+                segment_start[j] = pre_time
+                segment_end[j] = p_time[i]
+                segment_score[j] = score
+            ScoreCrossings(pre_x, p_pos_x[i], pre_time, p_time[i], p_dir_x[i],
+                           surfaces, mu_edges, surface_time_edges, surface_tally[c], p_weight[i])
+            
+            if p_end_trans[i] == 0:
+                active_next[k] = i
+                k += 1
+        offsets[c+1] = k - start
+    
+    # exclusive scan of the survivor counts (num_chunks is small)
+    for c in range(num_chunks):
+        offsets[c+1] += offsets[c]
+    
+    # pack, the old worklist is free to overwrite now
+    for c in nb.prange(num_chunks):
+        start = min(c*chunk, num_active)
+        for j in range(offsets[c+1]-offsets[c]):
+            active[offsets[c]+j] = active_next[start+j]
+    
+    return(offsets[num_chunks])
 
 
 
 @nb.jit(nopython=True) 
 def Advance_cycle(p_pos_x, p_pos_y, p_pos_z,
                   p_dir_y, p_dir_z, p_dir_x, 
-                  p_mesh_cell, p_speed, p_time,  
-                  dx, mesh_total_xsec, L,
-                  p_dist_travled, p_end_trans, rands):
-
+                  p_mesh_cell, p_speed, p_time, p_group,
+                  dx, mesh_total_xsec, num_cells, L,
+                  p_dist_travled, p_end_trans, rands, cell_edges):
+    """
+    One surface tracking step of a particle, to its collision site or the
+    next cell. A particle moving parallel to the cell edges (p_dir_x of 0)
+    in a void cell can neither collide nor leave, its transport ends where
+    it is and it is returned dead (alive False)
+    """
     kicker = 1e-10
+    alive = True
 
     if (p_end_trans == 0):
         if (p_pos_x < 0): #exited rhs
@@ -81,12 +313,15 @@ def Advance_cycle(p_pos_x, p_pos_y, p_pos_z,
         elif (p_pos_x >= L): #exited lhs
             p_end_trans = 1
             
+        elif (p_dir_x == 0) and (mesh_total_xsec[p_group*num_cells + p_mesh_cell] <= 0):
+            p_end_trans = 1
+            alive = False
+            
         else:
-            dist = -math.log(rands) / mesh_total_xsec[p_mesh_cell]
+            dist = SampleDistance(rands, mesh_total_xsec[p_group*num_cells + p_mesh_cell])
             
             x_loc = (p_dir_x * dist) + p_pos_x
-            LB = p_mesh_cell * dx
-            RB = LB + dx
+            [LB, RB] = CellBounds(p_mesh_cell, dx, cell_edges)
             
             if (x_loc < LB):        #move partilce into cell at left
                 p_dist_travled = (LB - p_pos_x)/p_dir_x + kicker
@@ -107,25 +342,227 @@ def Advance_cycle(p_pos_x, p_pos_y, p_pos_z,
             
             p_mesh_cell = cell_next
             p_time  += p_dist_travled/p_speed
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_time, p_dist_travled, p_end_trans)
+    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_time, p_dist_travled, p_end_trans, alive)
+
+
+
+@nb.jit(nopython=True)
+def AdvanceDelta(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, workspace, tally_meshes=None, time_tally=None, surface_tally=None, cell_edges=None):
+    """
+    Delta (Woodcock) tracking alternative to Advance: flights are sampled
+    against the majorant of mesh_total_xsec and accepted as real collisions
+    with probability total/majorant, so cell boundaries cost nothing. As
+    there are no per cell track lengths the flux is scored with a collision
+    estimator (weight/total per real collision) into the same tallies. Same
+    signature as Advance
+
+    Parameters
+    ----------
+    bank : ParticleBank
+        PSV: particles to move (first bank.num_part).
+    dx : double
+        mesh cell width.
+    mesh_total_xsec : vector double
+        total cross section of every mesh cell, group major with energy
+        groups (see Advance).
+    mesh_dist_traveled : vector double
+        flux tally (collision estimator, added to), summed over the groups.
+    mesh_dist_traveled_squared : vector double
+        squared flux tally (added to).
+    L : double
+        slab width.
+    workspace : AdvanceWorkspace
+        private tally rows, reused between calls.
+    tally_meshes : TallyMeshes, optional
+        independent tally meshes, scored with the same collision estimator.
+    time_tally : TimeTally, optional
+        time binned flux of the mesh cells, same collision estimator.
+    surface_tally : SurfaceTally, optional
+        surface crossings, scored by the flights that cross a surface.
+    cell_edges : vector double, optional
+        edges of the (non-uniform) mesh cells, cells are dx wide when None.
+
+    """
+    num_part = bank.num_part
+    event = bank.next_event()
+    
+    num_cells = len(mesh_dist_traveled)
+    num_chunks = NumChunks(num_part)
+    workspace.num_chunks = num_chunks
+    workspace.reserve_tallies(num_chunks, num_cells)
+    tally = workspace.tally
+    tally_squared = workspace.tally_squared
+    [edges, edge_offsets, mesh_tally, mesh_tally_squared] = TallyMeshRows(tally_meshes, num_chunks)
+    [segment_cell, segment_start, segment_end, segment_score] = TimeTallySegments(time_tally, num_part)
+    [surfaces, mu_edges, surface_time_edges, surface_tally_rows] = SurfaceTallyRows(surface_tally, num_chunks)
+    cell_edges = CellEdges(cell_edges)
+    majorants = GroupMajorants(mesh_total_xsec, num_cells)
+    
+    #every particle reaches its collision site in one pass
+    workspace.num_sub_steps = 0
+    workspace.record_pass(1.0)
+    
+    AdvanceDelta_launch_threads(bank, dx, mesh_total_xsec, num_cells, majorants, L,
+                                tally, tally_squared, num_chunks, event,
+                                edges, edge_offsets, mesh_tally, mesh_tally_squared,
+                                segment_cell, segment_start, segment_end, segment_score,
+                                surfaces, mu_edges, surface_time_edges, surface_tally_rows,
+                                cell_edges)
+    if time_tally is not None:
+        BufferTimeSegments(time_tally, num_part)
+    
+    ReduceTallies(tally[:num_chunks], mesh_dist_traveled)
+    ReduceTallies(tally_squared[:num_chunks], mesh_dist_traveled_squared)
+    if tally_meshes is not None:
+        ReduceTallies(mesh_tally[:num_chunks], tally_meshes.flux)
+        ReduceTallies(mesh_tally_squared[:num_chunks], tally_meshes.flux_squared)
+    if surface_tally is not None:
+        ReduceTallies(surface_tally_rows[:num_chunks], surface_tally.current)
+    if time_tally is not None:
+        MergeTimeTally(time_tally)
+
+
+@nb.jit(nopython=True, parallel=True)
+def AdvanceDelta_launch_threads(bank, dx, mesh_total_xsec, num_cells, majorants, L,
+                                tally, tally_squared, num_chunks, event,
+                                edges, edge_offsets, mesh_tally, mesh_tally_squared,
+                                segment_cell, segment_start, segment_end, segment_score,
+                                surfaces, mu_edges, surface_time_edges, surface_tally,
+                                cell_edges):
+    num_part = bank.num_part
+    
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_mesh_cell = bank.p_mesh_cell
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_weight = bank.p_weight
+    p_group = bank.p_group
+    p_alive = bank.p_alive
+    p_id = bank.p_id
+    seed = bank.seed
+    
+    chunk = (num_part + num_chunks - 1) // num_chunks
+    
+    for c in nb.prange(num_chunks):
+        for i in range(c*chunk, min((c+1)*chunk, num_part)):
+            [p_pos_x[i], p_pos_y[i], p_pos_z[i], p_mesh_cell[i], p_time[i], collision, alive] = Delta_cycle(
+                          p_pos_x[i], p_pos_y[i], p_pos_z[i],
+                          p_dir_y[i], p_dir_z[i], p_dir_x[i],
+                          p_mesh_cell[i], p_speed[i], p_time[i], p_weight[i], p_group[i],
+                          dx, mesh_total_xsec, num_cells, majorants[p_group[i]], L,
+                          seed, p_id[i], event,
+                          tally[c], tally_squared[c],
+                          edges, edge_offsets, mesh_tally[c], mesh_tally_squared[c],
+                          surfaces, mu_edges, surface_time_edges, surface_tally[c],
+                          cell_edges)
+            if alive == False:
+                p_alive[i] = False
+            
+            #a collision is a segment with no length in time
+            if segment_score.shape[0] > 0:
+                segment_cell[i] = p_mesh_cell[i]
+                segment_start[i] = p_time[i]
+                segment_end[i] = p_time[i]
+                segment_score[i] = collision
+
+
+@nb.jit(nopython=True)
+def Delta_cycle(p_pos_x, p_pos_y, p_pos_z,
+                p_dir_y, p_dir_z, p_dir_x,
+                p_mesh_cell, p_speed, p_time, p_weight, p_group,
+                dx, mesh_total_xsec, num_cells, majorant, L,
+                seed, p_id, event,
+                tally, tally_squared,
+                edges, edge_offsets, mesh_tally, mesh_tally_squared,
+                surfaces, mu_edges, surface_time_edges, surface_tally,
+                cell_edges):
+    """
+    Woodcock tracks one particle to its next real collision (or out of the
+    slab), scoring the collision estimator into tally (and the tally mesh
+    bins into mesh_tally) and every surface crossing into surface_tally, the
+    estimate is also returned (0 without a real collision) for the time
+    tally. The mesh cell is only updated while the particle is inside the slab. Flight f uses draws 2f
+    (distance) and 2f+1 (real or virtual) of the particle's event. The
+    majorant is the one of the particle's group. A particle moving parallel
+    to the cell edges (p_dir_x of 0) in a void cell can neither collide nor
+    leave, it is returned dead (alive False) where it is
+    """
+    kicker = 1e-10
+    max_mesh_index = num_cells-1
+    group_offset = p_group*num_cells
+    
+    collision = 0.0
+    alive = True
+    flight = 0
+    while (0 <= p_pos_x < L):
+        if (p_dir_x == 0) and (mesh_total_xsec[group_offset + p_mesh_cell] <= 0):
+            alive = False
+            break
+        
+        if majorant > 0:
+            dist = -math.log(Rand(seed, p_id, event, 2*flight)) / majorant
+        elif p_dir_x > 0:         #void slab, stream out the right
+            dist = (L - p_pos_x)/p_dir_x + kicker
+        else:                     #void slab, stream out the left
+            dist = -p_pos_x/p_dir_x + kicker
+        
+        pre_x = p_pos_x
+        pre_time = p_time
+        p_pos_x = p_pos_x+p_dir_x*dist
+        p_pos_y = p_pos_y+p_dir_y*dist
+        p_pos_z = p_pos_z+p_dir_z*dist
+        p_time += dist/p_speed
+        ScoreCrossings(pre_x, p_pos_x, pre_time, p_time, p_dir_x,
+                       surfaces, mu_edges, surface_time_edges, surface_tally, p_weight)
+        
+        if (p_pos_x < 0) or (p_pos_x >= L):
+            break
+        
+        p_mesh_cell = CellIndex(p_pos_x, dx, cell_edges, max_mesh_index)
+        
+        #real collision with probability total/majorant, else virtual
+        if Rand(seed, p_id, event, 2*flight+1)*majorant < mesh_total_xsec[group_offset + p_mesh_cell]:
+            collision = p_weight/mesh_total_xsec[group_offset + p_mesh_cell]
+            if (0 < p_mesh_cell < max_mesh_index):
+                tally[p_mesh_cell] += collision
+                tally_squared[p_mesh_cell] += collision**2
+            ScoreCollision(p_pos_x, collision, edges, edge_offsets,
+                           mesh_tally, mesh_tally_squared)
+            break
+        flight += 1
+    
+    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_time, collision, alive)
 
 
 
 @nb.jit(nopython=True) 
-def StillIn(p_pos_x, surface_distances, p_alive, num_part):
-    tally_left = 0
-    tally_right = 0
-    for i in range(num_part):
+def StillIn(bank, surface_distances):
+    """
+    Kills the particles that left the slab, returns the weight leaking out
+    of the left and right
+    """
+    p_pos_x = bank.p_pos_x
+    p_alive = bank.p_alive
+    p_weight = bank.p_weight
+    
+    tally_left = 0.0
+    tally_right = 0.0
+    for i in range(bank.num_part):
         #exit at left
         if p_pos_x[i] <= surface_distances[0]:
-            tally_left += 1
+            tally_left += p_weight[i]
             p_alive[i] = False
             
         elif p_pos_x[i] >= surface_distances[len(surface_distances)-1]:
-            tally_right += 1
+            tally_right += p_weight[i]
             p_alive[i] = False
             
-    return(p_alive, tally_left, tally_right)
+    return(tally_left, tally_right)
 
 
 
@@ -136,32 +573,33 @@ def test_Advance():
     N_m = 4
     
     num_part = 6
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1])
-    p_pos_y = 2.1*np.ones(num_part)
-    p_pos_z = 3.4*np.ones(num_part)
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1])
+    bank.p_pos_y[:] = 2.1
+    bank.p_pos_z[:] = 3.4
     
-    p_mesh_cell = np.array([-1, 0, 0, 1, 3, 4])
+    bank.p_mesh_cell[:] = np.array([-1, 0, 0, 1, 3, 4])
     
-    p_dir_x = np.ones(num_part)
-    p_dir_x[0] = -1
-    p_dir_y = np.zeros(num_part)
-    p_dir_z = np.zeros(num_part)
+    bank.p_dir_x[:] = 1
+    bank.p_dir_x[0] = -1
     
-    p_speed = np.ones(num_part)
-    p_time = np.zeros(num_part)
-    p_alive = np.ones(num_part, bool)
-    p_alive[5] = False
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(num_part)
+    bank.p_alive[:] = True
+    bank.p_alive[5] = False
     
     
-    particle_speed = 1
     mesh_total_xsec = np.array([0.1,1,.1,100])
     
     mesh_dist_traveled_squared = np.zeros(N_m)
     mesh_dist_traveled = np.zeros(N_m)
     
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared] = Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L)
+    Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, AdvanceWorkspace(num_part))
     
+    p_pos_x = bank.p_pos_x
     
     assert (np.sum(mesh_dist_traveled) > 0)
     assert (np.sum(mesh_dist_traveled_squared) > 0)
@@ -175,10 +613,15 @@ def test_StillIn():
     
     num_part = 7
     surface_distances = np.array([0,.25,.75,1])
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
-    p_alive = np.ones(num_part, bool)
     
-    [p_alive, tally_left, tally_right] = StillIn(p_pos_x, surface_distances, p_alive, num_part)
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
+    bank.p_alive[:] = True
+    
+    [tally_left, tally_right] = StillIn(bank, surface_distances)
+    
+    p_alive = bank.p_alive
     
     assert(p_alive[0] == False)
     assert(p_alive[5] == False)
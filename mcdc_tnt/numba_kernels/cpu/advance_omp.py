@@ -11,24 +11,46 @@ import numba as nb
 from numba import njit
 from numba.openmp import openmp_context as openmp
 from numba.openmp import omp_get_num_threads
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.workspace import AdvanceWorkspace
+from mcdc_tnt.numba_kernels.rng import Rand
 
 @nb.njit
-def Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time,
-            num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L):
-    
-    p_end_trans = np.zeros(num_part)
+def Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, workspace):
+    
+    num_part = bank.num_part
+    workspace.reserve(num_part)
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_mesh_cell = bank.p_mesh_cell
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_id = bank.p_id
+    seed = bank.seed
+    event = bank.next_event()
+    
+    p_end_trans = workspace.p_end_trans
+    p_dist_travled = workspace.p_dist_travled
+    rands = workspace.rands
+    pre_p_mesh = np.zeros(num_part, dtype=np.int32) #only this variant tracks per particle cells
+    
+    p_end_trans[:num_part] = 0
     end_flag = 0
     max_mesh_index = len(mesh_total_xsec)-1
     
     cycle_count = 0
     while end_flag == 0:
-        #allocate randoms
-        rands = np.random.rand(num_part)
-        #vector of indicies for particle transport
+        #refill randoms in place
+        for i in range(num_part):
+            rands[i] = Rand(seed, p_id[i], event, cycle_count)
         
-        p_dist_travled = np.zeros(num_part)
+        p_dist_travled[:num_part] = 0
         
-        pre_p_mesh = p_mesh_cell
+        pre_p_mesh[:num_part] = p_mesh_cell[:num_part] #cell each segment was tracked in
         
         #print("Into advance")
         Advance_cycle(p_pos_x, p_pos_y, p_pos_z,
@@ -46,11 +68,7 @@ def Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_
             if p_end_trans[i] == 0:
                 end_flag = 0
             
-        summer = p_end_trans.sum()
         cycle_count += 1
-    
-    
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared)
 
 
 @nb.njit
@@ -108,7 +126,11 @@ def Advance_cycle(p_pos_x, p_pos_y, p_pos_z,
 
 
 
-def StillIn(p_pos_x, surface_distances, p_alive, num_part):
+def StillIn(bank, surface_distances):
+    num_part = bank.num_part
+    p_pos_x = bank.p_pos_x
+    p_alive = bank.p_alive
+    
     tally_left = 0
     tally_right = 0
     for i in range(num_part):
@@ -121,7 +143,7 @@ def StillIn(p_pos_x, surface_distances, p_alive, num_part):
             tally_right += 1
             p_alive[i] = False
             
-    return(p_alive, tally_left, tally_right)
+    return(tally_left, tally_right)
 
 
 
@@ -132,32 +154,33 @@ def test_Advance():
     N_m = 4
     
     num_part = 6
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1])
-    p_pos_y = 2.1*np.ones(num_part)
-    p_pos_z = 3.4*np.ones(num_part)
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1])
+    bank.p_pos_y[:] = 2.1
+    bank.p_pos_z[:] = 3.4
     
-    p_mesh_cell = np.array([-1, 0, 0, 1, 3, 4])
+    bank.p_mesh_cell[:] = np.array([-1, 0, 0, 1, 3, 4])
     
-    p_dir_x = np.ones(num_part)
-    p_dir_x[0] = -1
-    p_dir_y = np.zeros(num_part)
-    p_dir_z = np.zeros(num_part)
+    bank.p_dir_x[:] = 1
+    bank.p_dir_x[0] = -1
     
-    p_speed = np.ones(num_part)
-    p_time = np.zeros(num_part)
-    p_alive = np.ones(num_part, bool)
-    p_alive[5] = False
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(num_part)
+    bank.p_alive[:] = True
+    bank.p_alive[5] = False
     
     
-    particle_speed = 1
     mesh_total_xsec = np.array([0.1,1,.1,100])
     
     mesh_dist_traveled_squared = np.zeros(N_m)
     mesh_dist_traveled = np.zeros(N_m)
     
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared] = Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L)
+    Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, AdvanceWorkspace(num_part))
     
+    p_pos_x = bank.p_pos_x
     
     assert (np.sum(mesh_dist_traveled) > 0)
     assert (np.sum(mesh_dist_traveled_squared) > 0)
@@ -170,11 +193,16 @@ def test_Advance():
 def test_StillIn():    
     
     num_part = 7
-    surface_distances = [0,.25,.75,1]
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
-    p_alive = np.ones(num_part, bool)
+    surface_distances = np.array([0,.25,.75,1])
+    
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
+    bank.p_alive[:] = True
+    
+    [tally_left, tally_right] = StillIn(bank, surface_distances)
     
-    [p_alive, tally_left, tally_right] = StillIn(p_pos_x, surface_distances, p_alive, num_part)
+    p_alive = bank.p_alive
     
     assert(p_alive[0] == False)
     assert(p_alive[5] == False)
@@ -6,116 +6,259 @@ Date: Dec 2nd 2021
 """
 import numpy as np
 import numba as nb
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.workspace import AdvanceWorkspace
+from mcdc_tnt.numba_kernels.rng import Rand
+from mcdc_tnt.numba_kernels.cpu.tally import NumChunks, ReduceTallies
 
 
-@nb.jit(nopython=True)# parallel=True)
-def SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu_new_neutrons, rands):
+# event codes
+NO_EVENT = 0
+SCATTER = 1
+CAPTURE = 2
+FISSION = 3
+
+# rows of the reaction tally (event code - 1)
+NUM_REACTION_TALLIES = 3
+
+
+@nb.jit(nopython=True, parallel=True)
+def SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu_new_neutrons, reaction_tally=None, implicit_capture=None, energy_groups=None, workspace=None):
     """
-    Samples the next events of particles under transport
+    Samples the next events of particles under transport. Classify, count,
+    scan, scatter: every thread owns a contiguous chunk of particles, gives
+    each an event code and counts the codes, the counts are exclusive scanned
+    and each thread then writes its chunk into the index vectors. No counter
+    is shared between threads and the index vectors come out in particle
+    order (same result as a serial loop). The optional reaction tally is
+    scored in the classify pass, where the cell and cross sections are
+    already loaded, into one private copy per chunk. The event codes, chunk
+    counts and private copies live in the workspace and are reused every
+    call. With implicit capture (survival biasing) no particle is captured:
+    its weight is reduced by the capture probability and it scatters or
+    fissions, scattered particles below the weight cutoff play Russian
+    roulette (losers are recorded with the captures).
 
     Parameters
     ----------
-    p_mesh_cell : vector int
-        PSV: mesh cell location of a given particle.
-    p_alive : vector bool
-        PSV: is it alive?
+    bank : ParticleBank
+        PSV: phase space of particles under transport (reads p_mesh_cell,
+        clears p_alive of absorbed particles, updates p_weight with implicit
+        capture).
     mesh_cap_xsec : vector double
         vector containing capturew cross sections that is the length of the number of cells.
     mesh_scat_xsec : vector double
-        DESCRIPTION.
+        scattering cross sections of every cell.
     mesh_fis_xsec : vector double
-        DESCRIPTION.
+        fission cross sections of every cell. None of the three are modified,
+        they do not need to be normalized. With energy groups all three are
+        group major, particles read value p_group*N_mesh + p_mesh_cell.
     scatter_event_index : vector int
         records the location in the PSV of the scatter events.
     capture_event_index : vector int
         records the location in the PSV of capture events.
     fission_event_index : vector int
         records the location in the PSV of fission events.
-    num_part : int
-        number of particles currently under transport (indxed form 1).
     nu_new_neutrons : int
         number of neutrons produced per fission event.
-    rands : vector double
-        produced from an rng, needs to be num_part long.
+    reaction_tally : array double [NUM_REACTION_TALLIES, N_mesh], optional
+        added to: rows SCATTER-1, CAPTURE-1 and FISSION-1 count the reactions
+        (weighted) in every cell, summed over the groups. Their sum is the
+        collision count, the collision flux estimate is that over the cell
+        total cross section.
+    implicit_capture : vector double [2], optional
+        weight cutoff and survival weight of Russian roulette, turns implicit
+        capture on. The default is None (analog capture).
+    energy_groups : EnergyGroups, optional
+        energy groups of a multigroup run, the cross sections are then
+        looked up by p_group. The default is None (one group).
+    workspace : AdvanceWorkspace, optional
+        scratch event codes, chunk counts and private reaction tallies,
+        grown here if the bank outgrew them. The default is None (allocated for this call).
 
     Returns
     -------
-    Index vectors of particle next operations.
+    Number of scatter, capture and fission events recorded in the index
+    vectors of particle next operations.
 
     """
-    fissions_to_add = 0
-    scat_count = 0
-    cap_count = 0
-    fis_count = 0
-    killed = 0
+    p_mesh_cell = bank.p_mesh_cell
+    p_alive = bank.p_alive
+    p_weight = bank.p_weight
+    p_group = bank.p_group
+    num_part = bank.num_part
+    p_id = bank.p_id
+    seed = bank.seed
+    event = bank.next_event()
     
-    #normalize cross sections in each mesh cell
-    total_scat_xsec = mesh_scat_xsec + mesh_cap_xsec + mesh_fis_xsec
-    mesh_scat_xsec /= total_scat_xsec
-    mesh_cap_xsec /= total_scat_xsec
-    mesh_fis_xsec /= total_scat_xsec
+    if energy_groups is None:
+        num_cells = len(mesh_cap_xsec)
+    else:
+        num_cells = energy_groups.num_cells
     
+    if implicit_capture is None:
+        implicit = False
+        weight_cutoff = 0.0
+        survival_weight = 1.0
+    else:
+        implicit = True
+        weight_cutoff = implicit_capture[0]
+        survival_weight = implicit_capture[1]
     
-    for i in nb.prange(num_part):
-        if p_alive[i] == True:
-            
-            event_rand = rands[i]
-            
-            #produce a vector defining the boundaries of the function in a given 
-            #pdf_bounds = np.array([0,
-            #               mesh_scat_xsec[p_mesh_cell[i]],
-            #               mesh_scat_xsec[p_mesh_cell[i]]+mesh_cap_xsec[p_mesh_cell[i]],
-            #               mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] + mesh_fis_xsec[p_mesh_cell[i]],
-            #               1])
-            
-            #scatter?
-            if event_rand < mesh_scat_xsec[p_mesh_cell[i]]:
-                scatter_event_index[scat_count] = i
-                scat_count += 1
-            
-            #capture?
-            elif mesh_scat_xsec[p_mesh_cell[i]] < event_rand < mesh_scat_xsec[p_mesh_cell[i]]+mesh_cap_xsec[p_mesh_cell[i]]:
-                p_alive[i] = False
-                killed += 1
-                capture_event_index[cap_count] = i
-                cap_count +=1
-                
-            #fission?
-            elif mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] < event_rand < mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] + mesh_fis_xsec[p_mesh_cell[i]]:
-                p_alive[i] = False
-                killed += 1
-                fissions_to_add += nu_new_neutrons
-                fission_event_index[fis_count] = i
-                fis_count +=1
+    num_chunks = NumChunks(num_part)
+    chunk = (num_part + num_chunks - 1) // num_chunks
+    
+    workspace = EventWorkspace(workspace, num_part)
+    workspace.reserve(num_part)
+    event_code = workspace.event_code
+    
+    if reaction_tally is None:
+        tally_cells = 0
+    else:
+        tally_cells = reaction_tally.shape[1]
+    workspace.reserve_events(num_chunks, NUM_REACTION_TALLIES, tally_cells)
+    private = workspace.event_tally[:num_chunks]
+    
+    # classify and count per thread, row c+1 holds the counts of chunk c
+    offsets = workspace.event_offsets[:num_chunks+1]
+    for c in nb.prange(num_chunks):
+        for i in range(c*chunk, min((c+1)*chunk, num_part)):
+            event_code[i] = NO_EVENT
+            if p_alive[i] == True:
+                cell = p_mesh_cell[i]
+                xs = p_group[i]*num_cells + cell
+                weight = p_weight[i]
+                if implicit == True:
+                    [code, survival] = ImplicitCapture(Rand(seed, p_id[i], event, 0),
+                                                       mesh_scat_xsec[xs], mesh_cap_xsec[xs], mesh_fis_xsec[xs])
+                else:
+                    code = EventCode(Rand(seed, p_id[i], event, 0),
+                                     mesh_scat_xsec[xs], mesh_cap_xsec[xs], mesh_fis_xsec[xs])
+                    survival = 1.0
                 
-            #else:
-                #print("error: event for particle {part} not sorted properly".format(part =i))
-                #print("random number used: {rand}".format(rand = event_rand))
-                #print(pdf_bounds)
+                if (tally_cells > 0) and (code != NO_EVENT):
+                    private[c, CAPTURE-1, cell] += weight*(1.0-survival)
+                    private[c, code-1, cell] += weight*survival
                 
-                #exit()
+                if implicit == True:
+                    weight *= survival
+                    if (code == SCATTER) and (weight < weight_cutoff):
+                        weight = Roulette(Rand(seed, p_id[i], event, 1), weight, survival_weight)
+                        if weight == 0.0:
+                            code = CAPTURE
+                    p_weight[i] = weight
                 
-    return(scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count)
+                event_code[i] = code
+                if code != NO_EVENT:
+                    offsets[c+1, code-1] += 1
+                if (code == CAPTURE) or (code == FISSION):
+                    p_alive[i] = False
+    
+    if reaction_tally is not None:
+        ReduceTallies(private.reshape((num_chunks, NUM_REACTION_TALLIES*tally_cells)),
+                      reaction_tally.reshape(NUM_REACTION_TALLIES*tally_cells))
+    
+    # exclusive scan (num_chunks is small)
+    for c in range(num_chunks):
+        for e in range(3):
+            offsets[c+1, e] += offsets[c, e]
+    
+    # scatter
+    for c in nb.prange(num_chunks):
+        k_scat = offsets[c, SCATTER-1]
+        k_cap = offsets[c, CAPTURE-1]
+        k_fis = offsets[c, FISSION-1]
+        for i in range(c*chunk, min((c+1)*chunk, num_part)):
+            if event_code[i] == SCATTER:
+                scatter_event_index[k_scat] = i
+                k_scat += 1
+            elif event_code[i] == CAPTURE:
+                capture_event_index[k_cap] = i
+                k_cap += 1
+            elif event_code[i] == FISSION:
+                fission_event_index[k_fis] = i
+                k_fis += 1
+    
+    scat_count = offsets[num_chunks, SCATTER-1]
+    cap_count = offsets[num_chunks, CAPTURE-1]
+    fis_count = offsets[num_chunks, FISSION-1]
+    
+    return(scat_count, cap_count, fis_count)
+
+
+@nb.jit(nopython=True)
+def EventWorkspace(workspace, num_part):
+    """
+    The given workspace, or a fresh one for num_part particles when None
+    """
+    if workspace is None:
+        return(AdvanceWorkspace(num_part))
+    return(workspace)
+
+
+@nb.jit(nopython=True)
+def EventCode(event_rand, scat_xsec, cap_xsec, fis_xsec):
+    """
+    Maps a draw on (0,1) onto the reaction of a collision. The draw is scaled
+    by the cell total, so normalized and raw cross sections sample the same
+    """
+    event_rand *= scat_xsec + cap_xsec + fis_xsec
+    
+    if event_rand < scat_xsec:
+        return(SCATTER)
+    elif event_rand < scat_xsec + cap_xsec:
+        return(CAPTURE)
+    elif event_rand < scat_xsec + cap_xsec + fis_xsec:
+        return(FISSION)
+    return(NO_EVENT)
+
+
+@nb.jit(nopython=True)
+def ImplicitCapture(event_rand, scat_xsec, cap_xsec, fis_xsec):
+    """
+    Samples a collision with capture removed: returns the reaction (scatter
+    or fission, or capture if nothing else is possible) and the fraction of
+    the weight that survives it, 1 - cap/total
+    """
+    total = scat_xsec + cap_xsec + fis_xsec
+    if total <= 0:
+        return(NO_EVENT, 1.0)
+    if scat_xsec + fis_xsec <= 0:
+        return(CAPTURE, 0.0)
+    return(EventCode(event_rand, scat_xsec, 0.0, fis_xsec), (scat_xsec + fis_xsec)/total)
+
+
+@nb.jit(nopython=True)
+def Roulette(roulette_rand, weight, survival_weight):
+    """
+    Russian roulette: the particle survives with probability
+    weight/survival_weight and carries survival_weight on, else it is killed
+    (weight 0). The expected weight is unchanged
+    """
+    if roulette_rand*survival_weight < weight:
+        return(survival_weight)
+    return(0.0)
     
     
 def test_SampleEvent():
-        p_mesh_cell = np.array([0,1,0,5])
-        p_alive = [True,True,True,False]
+        bank = ParticleBank(4)
+        bank.num_part = 3
+        bank.p_mesh_cell[:] = np.array([0,1,2,5])
+        bank.p_alive[:] = [True,True,True,False]
+        bank.p_id[:] = np.arange(4)
         
-        mesh_cap_xsec = 1/3*np.ones(2)
-        mesh_scat_xsec = 1/3*np.ones(2)
-        mesh_fis_xsec = 1/2*np.ones(2)
+        #each cell only has one reaction so the outcome does not depend on the draw
+        mesh_cap_xsec = np.array([0.0, 1.0, 0.0])
+        mesh_scat_xsec = np.array([2.0, 0.0, 0.0])
+        mesh_fis_xsec = np.array([0.0, 0.0, 0.5])
         
-        scatter_event_index = np.zeros(3)
-        capture_event_index = np.zeros(3)
-        fission_event_index = np.zeros(3) 
-        
-        controled_rands = np.array([.2, .4, .8])
+        scatter_event_index = np.zeros(3, dtype=np.int64)
+        capture_event_index = np.zeros(3, dtype=np.int64)
+        fission_event_index = np.zeros(3, dtype=np.int64)
         
         nu = 2
-        num_part = 3
         
-        [scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count] = SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu, controled_rands)
+        [scat_count, cap_count, fis_count] = SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu)
         
         assert (fis_count == 1)
         assert (scat_count == 1)
@@ -125,6 +268,56 @@ def test_SampleEvent():
         assert (capture_event_index[0] == 1)
         assert (fission_event_index[0] == 2)
         assert (scatter_event_index[0] == 0)
+        assert (bank.event == 1)
+        
+        #cross sections are read only
+        assert (mesh_scat_xsec[0] == 2.0)
+        assert (mesh_fis_xsec[2] == 0.5)
+        
+        #fused reaction tally, same events as above
+        bank.p_alive[:] = [True,True,True,False]
+        reaction_tally = np.zeros((NUM_REACTION_TALLIES, 3))
+        SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu, reaction_tally)
+        
+        assert (np.allclose(reaction_tally, np.eye(3)))
+        
+        
+def test_SampleEvent_implicit_capture():
+        bank = ParticleBank(3)
+        bank.num_part = 3
+        bank.p_mesh_cell[:] = np.array([0,1,2])
+        bank.p_alive[:] = True
+        bank.p_id[:] = np.arange(3)
+        
+        #half capture and half scatter, pure capture, pure fission
+        mesh_cap_xsec = np.array([1.0, 1.0, 0.0])
+        mesh_scat_xsec = np.array([1.0, 0.0, 0.0])
+        mesh_fis_xsec = np.array([0.0, 0.0, 0.5])
+        
+        scatter_event_index = np.zeros(3, dtype=np.int64)
+        capture_event_index = np.zeros(3, dtype=np.int64)
+        fission_event_index = np.zeros(3, dtype=np.int64)
+        reaction_tally = np.zeros((NUM_REACTION_TALLIES, 3))
+        
+        #cutoff below the reduced weight, no roulette
+        [scat_count, cap_count, fis_count] = SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
+                                                         capture_event_index, fission_event_index, 2, reaction_tally, np.array([0.25, 1.0]))
+        
+        assert ([scat_count, cap_count, fis_count] == [1, 1, 1])
+        assert (scatter_event_index[0] == 0)
+        assert (bank.p_alive[0] == True)
+        assert (np.isclose(bank.p_weight[0], 0.5))
+        assert (np.isclose(bank.p_weight[2], 1.0))
+        #every collision scores its whole weight
+        assert (np.allclose(np.sum(reaction_tally, axis=0), 1.0))
+        assert (np.allclose(reaction_tally[CAPTURE-1], [0.5, 1.0, 0.0]))
+        
+        #roulette, survivors come back with the survival weight
+        bank.p_weight[0] = 0.1
+        SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
+                    capture_event_index, fission_event_index, 2, None, np.array([0.25, 1.0]))
+        assert ((bank.p_weight[0] == 1.0) or (bank.p_alive[0] == False))
         
 if __name__ == '__main__':
     test_SampleEvent()
+    test_SampleEvent_implicit_capture()
@@ -5,26 +5,25 @@ Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
 Date: Dec 2nd 2021
 """
 
+import math
 import numpy as np
 import numba as nb
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.rng import Rand
+from mcdc_tnt.numba_kernels.energy_groups import GroupTables
+from mcdc_tnt.numba_kernels.sampling import SampleCdf
 
 
 @nb.jit(nopython=True, parallel=True)
-def SourceParticles(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive,
-        num_parts, meshwise_fission_pdf, particle_speed, isotropic=True):
+def SourceParticles(bank, dx, num_parts, meshwise_fission_cdf, particle_speed, isotropic=True, cell_edges=None, energy_groups=None):
     """
     Parameters
     ----------
     particle phase space perameters:
-        p_pos_x : vector(float)
-        p_pos_y : vector(float)
-        p_pos_z : vector(float)
-        p_region : vector(int)
-        p_dir_y : vector(float)
-        p_dir_z : vector(float)
-        p_dir_x : vector(float)
-        p_speed : vector(float)
-        p_time : vector(float)
+        bank : ParticleBank
+            PSV: first num_parts slots are filled with source particles
+            and bank.num_part is set to num_parts (grown if needed).
+            Source particle i gets p_id i.
         
         
     problem geometry perameters
@@ -38,32 +37,62 @@ def SourceParticles(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z
             width of generating region.
         generation_region : int
             index of generating region.
+        meshwise_fission_cdf : vector double
+            cumulative birth probability of every mesh cell
+            (mcdc_tnt.sampling.CumulativeTable of the source pdf, built once
+            per run), the birth cell is found by binary search.
         particle_speed : float
             particle speed.
         isotropic : Bool, optional
             is the source isotropic or uniform. The default is True.
+        cell_edges : vector double, optional
+            edges of the (non-uniform) mesh cells, cells are dx wide when
+            None. The default is None.
+        energy_groups : EnergyGroups, optional
+            particles are born in a group sampled from the emission
+            spectrum (draw 4) at that group's speed. The default is None
+            (group 0 at particle_speed).
 
     Returns
     -------
-    All pahse space perameters.
+    None, bank is filled in place.
     """
+    # any particles already in the bank are overwritten, no need to copy them
+    bank.num_part = 0
+    bank.reserve(num_parts)
+    
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_weight = bank.p_weight
+    p_mesh_cell = bank.p_mesh_cell
+    p_group = bank.p_group
+    p_alive = bank.p_alive
+    p_id = bank.p_id
+    seed = bank.seed
+    event = bank.next_event()
+    
+    [speeds, spectrum_cdf, scatter_cdf, mesh_region] = GroupTables(energy_groups)
+    multigroup = speeds.shape[0] > 0
     
     for i in nb.prange(num_parts):
         # Position
         
-        #find mesh cell birth based on provided pdf
-        xi = np.random.random()
-        cell = 0
-        summer = 0
-        while (summer < xi):
-            summer += meshwise_fission_pdf[cell]
-            cell += 1
-                
-        cell -=1
+        #find mesh cell birth based on provided cdf
+        p_id[i] = i
+        cell = SampleCdf(meshwise_fission_cdf, Rand(seed, i, event, 0))
         p_mesh_cell[i] = cell
         
         #sample birth location within cell
-        p_pos_x[i] = dx*cell + dx*np.random.random()
+        if cell_edges is None:
+            p_pos_x[i] = dx*cell + dx*Rand(seed, i, event, 1)
+        else:
+            p_pos_x[i] = cell_edges[cell] + (cell_edges[cell+1]-cell_edges[cell])*Rand(seed, i, event, 1)
         p_pos_y[i] = 0.0
         p_pos_z[i] = 0.0
         
@@ -71,61 +100,57 @@ def SourceParticles(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z
         # Direction
         if isotropic:
             # Sample polar and azimuthal angles uniformly
-            mu  = 2.0*np.random.random() - 1.0
-            azi = 2.0*np.pi*np.random.random()
+            mu  = 2.0*Rand(seed, i, event, 2) - 1.0
+            azi = 2.0*math.pi*Rand(seed, i, event, 3)
     	
             # Convert to Cartesian coordinate
             c = (1.0 - mu**2)**0.5
-            p_dir_y[i] = np.cos(azi)*c
-            p_dir_z[i] = np.sin(azi)*c
+            p_dir_y[i] = math.cos(azi)*c
+            p_dir_z[i] = math.sin(azi)*c
             p_dir_x[i] = mu
         else:
             p_dir_x[i] = 1.0
             p_dir_y[i] = 0.0
             p_dir_z[i] = 0.0
     
-        # Speed
-        p_speed[i] = particle_speed
+        # Energy group and speed
+        if multigroup == True:
+            p_group[i] = SampleCdf(spectrum_cdf, Rand(seed, i, event, 4))
+            p_speed[i] = speeds[p_group[i]]
+        else:
+            p_group[i] = 0
+            p_speed[i] = particle_speed
     
         # Time
         p_time[i] = 0.0
+        p_weight[i] = 1.0
         
         p_alive[i] = True
-        
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive)
+    
+    bank.num_part = num_parts
 
 
 
 
 def test_SourceParticles():
     num_parts = 5
-    p_pos_x = np.zeros(num_parts)
-    p_pos_y = np.zeros(num_parts)
-    p_pos_z = np.zeros(num_parts)
-    
-    p_mesh_cell = np.zeros(num_parts)
-    
-    p_dir_x = np.zeros(num_parts)
-    p_dir_y = np.zeros(num_parts)
-    p_dir_z = np.zeros(num_parts)
-    
-    p_speed = np.zeros(num_parts)
-    p_time = np.ones(num_parts)
-    p_alive = np.zeros(num_parts)
+    bank = ParticleBank(num_parts)
+    bank.p_time[:] = 1
     
     particle_speed = 1
-    meshwise_fission_pdf = [0,1]
+    meshwise_fission_cdf = np.array([0.0,1.0])
     
     iso=False
     
     dx = 0.2
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive] = SourceParticles(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_parts, meshwise_fission_pdf, particle_speed, iso)
+    SourceParticles(bank, dx, num_parts, meshwise_fission_cdf, particle_speed, iso)
     
-    assert (np.sum(p_time) == 0)
-    assert (p_mesh_cell.all() == 1)
-    assert (p_alive.all() == True)
-    assert (p_pos_x.all() > .2)
+    assert (bank.num_part == num_parts)
+    assert (np.sum(bank.p_time) == 0)
+    assert (bank.p_mesh_cell.all() == 1)
+    assert (bank.p_alive.all() == True)
+    assert (bank.p_pos_x.all() > .2)
     
 if __name__ == '__main__':
     test_SourceParticles()    
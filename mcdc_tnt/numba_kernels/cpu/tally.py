@@ -0,0 +1,64 @@
+"""
+Name: Tally
+breif: Privatize-then-reduce helpers for thread parallel tallies in MCDC-TNT
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import numba as nb
+
+
+# particle chunks a prange is split into, fixed (not the thread count) so
+# the chunk rows, and the order ReduceTallies adds them in, are the same
+# for any NUMBA_NUM_THREADS: tallies are bit for bit reproducible. Enough
+# to keep 64 threads busy
+NUM_CHUNKS = 64
+
+
+@nb.jit(nopython=True)
+def NumChunks(num_part, per_chunk=1):
+    """
+    Number of contiguous particle chunks to hand out in a prange, one private
+    tally row is kept per chunk so no two threads ever score the same row.
+    Depends on num_part only (per_chunk*NUM_CHUNKS, fewer for small banks)
+    """
+    return(max(min(num_part, per_chunk*NUM_CHUNKS), 1))
+
+
+@nb.jit(nopython=True, parallel=True)
+def ReduceTallies(private, tally):
+    """
+    Adds every row of a privatized tally into the shared one (in place),
+    parallel over tally bins so it scales with the mesh, not the threads
+
+    Parameters
+    ----------
+    private : array double [num_chunks, N]
+        per chunk partial tallies.
+    tally : vector double [N]
+        shared tally that is added to.
+
+    """
+    num_chunks = private.shape[0]
+    for cell in nb.prange(tally.shape[0]):
+        total = 0.0
+        for c in range(num_chunks):
+            total += private[c, cell]
+        tally[cell] += total
+
+
+def test_ReduceTallies():
+    private = np.arange(12, dtype=np.float64).reshape(3, 4)
+    tally = np.ones(4)
+    
+    ReduceTallies(private, tally)
+    
+    assert(np.allclose(tally, [13, 16, 19, 22]))
+    assert(NumChunks(0) == 1)
+    assert(NumChunks(1, 4) == 1)
+    assert(NumChunks(10**6) == NUM_CHUNKS)
+
+
+if __name__ == '__main__':
+    test_ReduceTallies()
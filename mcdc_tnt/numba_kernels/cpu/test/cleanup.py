@@ -0,0 +1,141 @@
+"""
+Scaling benchmark for the BringOutYourDead stream compaction, run with e.g.
+    NUMBA_NUM_THREADS=16 python cleanup.py 1e7
+thread counts 1, 2, 4, ... up to NUMBA_NUM_THREADS are timed against the
+serial in place version (and the cuda kernel when a gpu is there)
+"""
+
+import sys
+import numpy as np
+import numba as nb
+from numba import cuda
+from timeit import default_timer as timer
+
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.cpu.cleanup import BringOutYourDead
+
+
+@nb.jit(nopython=True)
+def BringOutYourDead_serial(bank):
+    """
+    Serial in place version of BringOutYourDead, the baseline the parallel
+    compaction is timed against
+    
+    Parameters
+    ----------
+    bank : ParticleBank
+        PSV: phase space of every particle under transport, the first
+        bank.num_part particles are compacted in place.
+
+
+    Returns
+    -------
+    number of particles kept (also stored as bank.num_part)
+
+    """
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_weight = bank.p_weight
+    p_mesh_cell = bank.p_mesh_cell
+    p_group = bank.p_group
+    p_alive = bank.p_alive
+    p_id = bank.p_id
+    
+    kept = 0
+    for i in range(bank.num_part):
+        if p_alive[i] == True:
+            
+            p_pos_x[kept] = p_pos_x[i]
+            p_pos_y[kept] = p_pos_y[i]
+            p_pos_z[kept] = p_pos_z[i]
+            
+            # Direction
+            p_dir_x[kept] = p_dir_x[i]
+            p_dir_y[kept] = p_dir_y[i]
+            p_dir_z[kept] = p_dir_z[i]
+            
+            # Speed
+            p_speed[kept] = p_speed[i]
+            
+            # Time
+            p_time[kept] = p_time[i]
+            p_weight[kept] = p_weight[i]
+            
+            # Regions
+            p_mesh_cell[kept] = p_mesh_cell[i]
+            p_group[kept] = p_group[i]
+            
+            # Flags
+            p_alive[kept] = p_alive[i] 
+            p_id[kept] = p_id[i]
+            kept +=1
+    
+    bank.num_part = kept
+    
+    return(kept)
+
+
+def fill(bank, n, alive):
+    bank.num_part = n
+    bank.p_pos_x[:n] = np.arange(n)
+    bank.p_mesh_cell[:n] = np.arange(n) % 100
+    bank.p_alive[:n] = alive
+
+
+def time_it(run, bank, n, alive, reps):
+    best = np.inf
+    for r in range(reps):
+        fill(bank, n, alive)
+        start = timer()
+        run()
+        end = timer()
+        best = min(best, end-start)
+    return(best)
+
+
+if __name__ == '__main__':
+    n = int(float(sys.argv[1])) if len(sys.argv) > 1 else int(1e7)
+    reps = 5
+
+    np.random.seed(777)
+    alive = np.random.random(n) < 0.5 #roughly what a cycle with c=1 leaves
+
+    bank = ParticleBank(n)
+    spare = ParticleBank(n)
+
+    #warm up (compile)
+    fill(bank, n, alive)
+    BringOutYourDead_serial(bank)
+    fill(bank, n, alive)
+    BringOutYourDead(bank, spare, swap=False)
+    fill(bank, n, alive)
+    BringOutYourDead(bank, spare, swap=True)
+
+    t_serial = time_it(lambda: BringOutYourDead_serial(bank), bank, n, alive, reps)
+
+    print('BringOutYourDead scaling, {0} particles, best of {1}'.format(n, reps))
+    print('serial in place......{0:.4f} s'.format(t_serial))
+    print()
+    print('threads    copy back [s]    swap [s]    speedup (swap)')
+
+    threads = 1
+    while threads <= nb.config.NUMBA_NUM_THREADS:
+        nb.set_num_threads(threads)
+        t_copy = time_it(lambda: BringOutYourDead(bank, spare, swap=False), bank, n, alive, reps)
+        t_swap = time_it(lambda: BringOutYourDead(bank, spare, swap=True), bank, n, alive, reps)
+        print('{0:7d}    {1:13.4f}    {2:8.4f}    {3:14.2f}'.format(threads, t_copy, t_swap, t_serial/t_swap))
+        threads *= 2
+
+    if cuda.is_available():
+        from mcdc_tnt.numba_kernels.gpu.cleanup import BringOutYourDead as BringOutYourDead_gpu
+        fill(bank, n, alive)
+        BringOutYourDead_gpu(bank, spare)
+        t_gpu = time_it(lambda: BringOutYourDead_gpu(bank, spare), bank, n, alive, reps)
+        print()
+        print('cuda (with copies)...{0:.4f} s'.format(t_gpu))
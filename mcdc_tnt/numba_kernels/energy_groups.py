@@ -0,0 +1,87 @@
+"""
+Name: EnergyGroups
+breif: Multigroup speeds, emission spectrum and group to group scattering tables for MCDC-TNT (Numba)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import numba as nb
+from numba.experimental import jitclass
+
+
+energy_groups_spec = [
+    ('num_groups', nb.int64),
+    ('num_cells', nb.int64),
+    ('speeds', nb.float64[::1]),
+    ('spectrum_cdf', nb.float64[::1]),
+    ('scatter_cdf', nb.float64[:, :, ::1]),
+    ('mesh_region', nb.int32[::1]),
+]
+
+
+@jitclass(energy_groups_spec)
+class EnergyGroups:
+    """
+    Everything the kernels need to move particles between energy groups.
+    Cross sections stay in the per cell vectors the kernels already take,
+    stored group major and flattened: group g of cell is g*num_cells + cell,
+    so particles of one group walking through the mesh read consecutive
+    values
+
+    Attributes
+    ----------
+    num_groups : int
+        number of energy groups.
+    num_cells : int
+        number of material mesh cells.
+    speeds : vector double [num_groups]
+        particle speed of every group, feeds p_speed (and so p_time).
+    spectrum_cdf : vector double [num_groups]
+        cumulative emission spectrum of source and fission particles.
+    scatter_cdf : array double [num_regions, num_groups, num_groups]
+        cumulative group to group scattering probabilities, row
+        [region, g] is sampled for the outgoing group of a group g scatter.
+    mesh_region : vector int [num_cells]
+        region (row of scatter_cdf) of every mesh cell.
+    """
+
+    def __init__(self, speeds, spectrum_cdf, scatter_cdf, mesh_region):
+        self.num_groups = speeds.shape[0]
+        self.num_cells = mesh_region.shape[0]
+        self.speeds = speeds
+        self.spectrum_cdf = spectrum_cdf
+        self.scatter_cdf = scatter_cdf
+        self.mesh_region = mesh_region
+
+
+@nb.jit(nopython=True)
+def GroupTables(energy_groups):
+    """
+    Speeds, emission and scattering cdfs and cell regions of the energy
+    groups, empty (one group runs) when there are none
+    """
+    if energy_groups is None:
+        return(np.zeros(0), np.zeros(0), np.zeros((0, 0, 0)), np.zeros(0, dtype=np.int32))
+    return(energy_groups.speeds, energy_groups.spectrum_cdf, energy_groups.scatter_cdf, energy_groups.mesh_region)
+
+
+def test_EnergyGroups():
+    from mcdc_tnt.numba_kernels.sampling import SampleCdf
+    #two regions, group 0 scatters down half the time in region 1 only
+    scatter_cdf = np.array([[[1.0, 1.0], [0.0, 1.0]],
+                            [[0.5, 1.0], [0.0, 0.0]]])
+    energy_groups = EnergyGroups(np.array([2.0, 0.5]), np.array([1.0, 1.0]),
+                                 scatter_cdf, np.array([0, 0, 1], dtype=np.int32))
+    assert(energy_groups.num_groups == 2 and energy_groups.num_cells == 3)
+
+    [speeds, spectrum_cdf, scatter_cdf, mesh_region] = GroupTables(energy_groups)
+    assert(SampleCdf(spectrum_cdf, 0.99) == 0)
+    assert(SampleCdf(scatter_cdf[0, 0], 0.7) == 0)
+    assert(SampleCdf(scatter_cdf[1, 0], 0.3) == 0)
+    assert(SampleCdf(scatter_cdf[1, 0], 0.7) == 1)
+    assert(GroupTables(None)[0].shape[0] == 0)
+
+
+if __name__ == '__main__':
+    test_EnergyGroups()
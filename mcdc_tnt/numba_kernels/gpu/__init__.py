@@ -1,3 +1,5 @@
+from ..particle_bank import ParticleBank
+from ..workspace import AdvanceWorkspace
 from .advance import Advance, StillIn
 from .cleanup import BringOutYourDead
 from .fissions_add import FissionsAdd
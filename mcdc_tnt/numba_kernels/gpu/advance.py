@@ -9,97 +9,128 @@ import math
 import numpy as np
 import numba as nb
 from numba import cuda
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.workspace import AdvanceWorkspace
+from mcdc_tnt.numba_kernels.rng import RandCuda
+from mcdc_tnt.numba_kernels.sampling import SampleDistance
 
 #@cuda.jit(nopython=True)
-def Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time,
-            num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L):
+def Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, workspace, tally_meshes=None, time_tally=None, surface_tally=None, cell_edges=None):
+    """
+    Surface tracks every particle in the bank to its next collision site on
+    the device. Takes the arguments of the cpu Advance, the optional tallies
+    are not implemented on the gpu (Generations only passes None). cell_edges
+    are the edges of a non-uniform mesh, cells are dx wide when None
+    """
+    num_part = bank.num_part
+    workspace.reserve(num_part)
     
+    #one rng event per call, the sub-step number picks the draw
+    event = bank.next_event()
     
+    p_end_trans = workspace.p_end_trans[:num_part]
+    p_end_trans[:] = 0
     
-    p_end_trans = np.zeros(num_part, dtype=int)
-    end_flag = 0
+    remaining = np.zeros(1, dtype=np.int64)
+    still_in_transport = num_part
     max_mesh_index = len(mesh_total_xsec)-1
     
     cycle_count = 0
+    workspace.num_sub_steps = 0
     
     #copy data to cuda device
-    d_p_pos_x = cuda.to_device(p_pos_x)
-    d_p_pos_y = cuda.to_device(p_pos_y)
-    d_p_pos_z = cuda.to_device(p_pos_z)
-    d_p_dir_y = cuda.to_device(p_dir_y)
-    d_p_dir_z = cuda.to_device(p_dir_z)
-    d_p_dir_x = cuda.to_device(p_dir_x)
-    d_p_mesh_cell = cuda.to_device(p_mesh_cell)
-    d_p_speed = cuda.to_device(p_speed)
-    d_p_time = cuda.to_device(p_time)
+    d_p_pos_x = cuda.to_device(bank.p_pos_x)
+    d_p_pos_y = cuda.to_device(bank.p_pos_y)
+    d_p_pos_z = cuda.to_device(bank.p_pos_z)
+    d_p_dir_y = cuda.to_device(bank.p_dir_y)
+    d_p_dir_z = cuda.to_device(bank.p_dir_z)
+    d_p_dir_x = cuda.to_device(bank.p_dir_x)
+    d_p_mesh_cell = cuda.to_device(bank.p_mesh_cell)
+    d_p_speed = cuda.to_device(bank.p_speed)
+    d_p_time = cuda.to_device(bank.p_time)
+    d_p_id = cuda.to_device(bank.p_id)
+    d_p_weight = cuda.to_device(bank.p_weight)
+    d_p_alive = cuda.to_device(bank.p_alive)
     d_p_end_trans = cuda.to_device(p_end_trans)
     d_mesh_total_xsec = cuda.to_device(mesh_total_xsec)
+    if cell_edges is None:
+        cell_edges = np.zeros(0)
+    d_cell_edges = cuda.to_device(cell_edges)
+    
+    #tallies are scored on the device with atomics and copied back once
+    d_mesh_dist_traveled = cuda.to_device(mesh_dist_traveled)
+    d_mesh_dist_traveled_squared = cuda.to_device(mesh_dist_traveled_squared)
+    d_remaining = cuda.to_device(remaining)
+    
+    #scratch lives on the device for the whole call, randoms are drawn there
+    #from the same counter based streams as the cpu kernels
+    d_p_dist_travled = cuda.device_array(num_part, dtype=np.float64)
+    d_rands = cuda.device_array(num_part, dtype=np.float64)
     
     threadsperblock = 32
     blockspergrid = (num_part + (threadsperblock - 1)) // threadsperblock
-    #ScatterCuda[blockspergrid, threadsperblock](d_scatter_indices, d_p_dir_x, d_p_dir_y, d_p_dir_z, d_p_rands)
     
     
-    while end_flag == 0:
-        #allocate randoms
-        rands = np.random.rand(num_part)
-        d_rands = cuda.to_device(rands)
-        #vector of indicies for particle transport
+    while still_in_transport > 0:
+        workspace.record_pass(still_in_transport/num_part)
         
-        p_dist_travled = np.zeros(num_part, dtype=float)
-        d_p_dist_travled = cuda.to_device(p_dist_travled)
+        #refill randoms and zero segments in place
+        FillRandsCuda[blockspergrid, threadsperblock](d_p_id, bank.seed, event, workspace.num_sub_steps,
+                                                      d_rands, d_p_dist_travled, num_part)
         
-        pre_p_mesh = p_mesh_cell
+        remaining[0] = 0
+        d_remaining.copy_to_device(remaining)
         
         AdvanceCuda[blockspergrid, threadsperblock](d_p_pos_x, d_p_pos_y, d_p_pos_z,
                           d_p_dir_y, d_p_dir_z, d_p_dir_x, 
-                          d_p_mesh_cell, d_p_speed, d_p_time,  
-                          dx, d_mesh_total_xsec, L,
-                          d_p_dist_travled, d_p_end_trans, d_rands, num_part)
-        
+                          d_p_mesh_cell, d_p_speed, d_p_time, d_p_weight, d_p_alive,
+                          dx, d_mesh_total_xsec, L, d_cell_edges,
+                          d_p_dist_travled, d_p_end_trans, d_rands, num_part,
+                          d_mesh_dist_traveled, d_mesh_dist_traveled_squared, max_mesh_index, d_remaining)
         
-        #retrive two important peices of data
-        p_dist_travled = d_p_dist_travled.copy_to_host()
-        p_dir_z = d_p_dir_z.copy_to_host()
-        p_mesh_cell = d_p_mesh_cell.copy_to_host()
-        p_end_trans = d_p_end_trans.copy_to_host()
-        
-        
-        end_flag = 1
-        for i in range(num_part):
-            if (0 < pre_p_mesh[i] < max_mesh_index):
-                mesh_dist_traveled[pre_p_mesh[i]] += p_dist_travled[i]
-                mesh_dist_traveled_squared[pre_p_mesh[i]] += p_dist_travled[i]**2
-                
-            if p_end_trans[i] == 0:
-                end_flag = 0
+        #only the count of particles still moving comes back each sub-step
+        d_remaining.copy_to_host(remaining)
+        still_in_transport = remaining[0]
         
-        summer = p_end_trans.sum()
         cycle_count += 1
         
-        print("Advance Complete:......{1}%       ".format(cycle_count, int(100*summer/num_part)), end = "\r")
+        print("Advance Complete:......{1}%       ".format(cycle_count, int(100*(num_part-still_in_transport)/num_part)), end = "\r")
     print()
-        
-    p_pos_x = d_p_pos_x.copy_to_host()
-    p_pos_y = d_p_pos_y.copy_to_host()
-    p_pos_z = d_p_pos_z.copy_to_host()
-    p_dir_y = d_p_dir_y.copy_to_host()
-    p_dir_z = d_p_dir_z.copy_to_host()
-    p_dir_x = d_p_dir_x.copy_to_host()
-    p_speed = d_p_speed.copy_to_host()
-    p_time = d_p_time.copy_to_host()
-
     
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared)
+    d_mesh_dist_traveled.copy_to_host(mesh_dist_traveled)
+    d_mesh_dist_traveled_squared.copy_to_host(mesh_dist_traveled_squared)
+    d_p_end_trans.copy_to_host(p_end_trans)
+    
+    #copy back into the bank columns in place
+    d_p_pos_x.copy_to_host(bank.p_pos_x)
+    d_p_pos_y.copy_to_host(bank.p_pos_y)
+    d_p_pos_z.copy_to_host(bank.p_pos_z)
+    d_p_dir_y.copy_to_host(bank.p_dir_y)
+    d_p_dir_z.copy_to_host(bank.p_dir_z)
+    d_p_dir_x.copy_to_host(bank.p_dir_x)
+    d_p_mesh_cell.copy_to_host(bank.p_mesh_cell)
+    d_p_speed.copy_to_host(bank.p_speed)
+    d_p_time.copy_to_host(bank.p_time)
+    d_p_alive.copy_to_host(bank.p_alive)
+
+
+
+@cuda.jit
+def FillRandsCuda(p_id, seed, event, draw, rands, p_dist_travled, num_part):
+    i = cuda.grid(1)
+    if (i < num_part):
+        rands[i] = RandCuda(seed, p_id[i], event, draw)
+        p_dist_travled[i] = 0.0
 
 
 
 @cuda.jit 
 def AdvanceCuda(p_pos_x, p_pos_y, p_pos_z,
                   p_dir_y, p_dir_z, p_dir_x, 
-                  p_mesh_cell, p_speed, p_time,  
-                  dx, mesh_total_xsec, L,
-                  p_dist_travled, p_end_trans, rands, num_part):
+                  p_mesh_cell, p_speed, p_time, p_weight, p_alive,
+                  dx, mesh_total_xsec, L, cell_edges,
+                  p_dist_travled, p_end_trans, rands, num_part,
+                  mesh_dist_traveled, mesh_dist_traveled_squared, max_mesh_index, remaining):
 
     kicker = 1e-10
     i = cuda.grid(1)
@@ -112,25 +143,35 @@ def AdvanceCuda(p_pos_x, p_pos_y, p_pos_z,
             elif (p_pos_x[i] >= L): #exited lhs
                 p_end_trans[i] = 1
                 
+            elif (p_dir_x[i] == 0) and (mesh_total_xsec[p_mesh_cell[i]] <= 0):
+                #parallel to the cell edges in a void, never collides or leaves
+                p_end_trans[i] = 1
+                p_alive[i] = False
+                
             else:
-                dist = -math.log(rands[i]) / mesh_total_xsec[p_mesh_cell[i]]
+                pre_cell = p_mesh_cell[i]
+                dist = SampleDistance(rands[i], mesh_total_xsec[pre_cell])
                 
                 x_loc = (p_dir_x[i] * dist) + p_pos_x[i]
-                LB = p_mesh_cell[i] * dx
-                RB = LB + dx
+                if cell_edges.shape[0] == 0:
+                    LB = pre_cell * dx
+                    RB = LB + dx
+                else:
+                    LB = cell_edges[pre_cell]
+                    RB = cell_edges[pre_cell+1]
                 
                 if (x_loc < LB):        #move partilce into cell at left
                     p_dist_travled[i] = (LB - p_pos_x[i])/p_dir_x[i] + kicker
-                    cell_next = p_mesh_cell[i] - 1
+                    cell_next = pre_cell - 1
                    
                 elif (x_loc > RB):      #move particle into cell at right
                     p_dist_travled[i] = (RB - p_pos_x[i])/p_dir_x[i] + kicker
-                    cell_next = p_mesh_cell[i] + 1
+                    cell_next = pre_cell + 1
                     
                 else:                   #move particle in cell
                     p_dist_travled[i] = dist
                     p_end_trans[i] = 1
-                    cell_next = p_mesh_cell[i]
+                    cell_next = pre_cell
                     
                 p_pos_x[i] += p_dir_x[i]*p_dist_travled[i]
                 p_pos_y[i] += p_dir_y[i]*p_dist_travled[i]
@@ -138,26 +179,43 @@ def AdvanceCuda(p_pos_x, p_pos_y, p_pos_z,
                 
                 p_mesh_cell[i] = cell_next
                 p_time[i]  += p_dist_travled[i]/p_speed[i]
+                
+                #weighted track length
+                score = p_dist_travled[i]*p_weight[i]
+                if (0 < pre_cell) and (pre_cell < max_mesh_index):
+                    cuda.atomic.add(mesh_dist_traveled, pre_cell, score)
+                    cuda.atomic.add(mesh_dist_traveled_squared, pre_cell, score**2)
+                
+                if p_end_trans[i] == 0:
+                    cuda.atomic.add(remaining, 0, 1)
             
 
 
 
 
 
-def StillIn(p_pos_x, surface_distances, p_alive, num_part):
-    tally_left = 0
-    tally_right = 0
-    for i in range(num_part):
+def StillIn(bank, surface_distances):
+    """
+    Kills the particles that left the slab, returns the weight leaking out
+    of the left and right
+    """
+    p_pos_x = bank.p_pos_x
+    p_alive = bank.p_alive
+    p_weight = bank.p_weight
+    
+    tally_left = 0.0
+    tally_right = 0.0
+    for i in range(bank.num_part):
         #exit at left
         if p_pos_x[i] <= surface_distances[0]:
-            tally_left += 1
+            tally_left += p_weight[i]
             p_alive[i] = False
             
         elif p_pos_x[i] >= surface_distances[len(surface_distances)-1]:
-            tally_right += 1
+            tally_right += p_weight[i]
             p_alive[i] = False
             
-    return(p_alive, tally_left, tally_right)
+    return(tally_left, tally_right)
 
 
 
@@ -168,32 +226,33 @@ def test_Advance():
     N_m = 4
     
     num_part = 6
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1])
-    p_pos_y = 2.1*np.ones(num_part)
-    p_pos_z = 3.4*np.ones(num_part)
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1])
+    bank.p_pos_y[:] = 2.1
+    bank.p_pos_z[:] = 3.4
     
-    p_mesh_cell = np.array([-1, 0, 0, 1, 3, 4])
+    bank.p_mesh_cell[:] = np.array([-1, 0, 0, 1, 3, 4])
     
-    p_dir_x = np.ones(num_part)
-    p_dir_x[0] = -1
-    p_dir_y = np.zeros(num_part)
-    p_dir_z = np.zeros(num_part)
+    bank.p_dir_x[:] = 1
+    bank.p_dir_x[0] = -1
     
-    p_speed = np.ones(num_part)
-    p_time = np.zeros(num_part)
-    p_alive = np.ones(num_part, bool)
-    p_alive[5] = False
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(num_part)
+    bank.p_alive[:] = True
+    bank.p_alive[5] = False
     
     
-    particle_speed = 1
     mesh_total_xsec = np.array([0.1,1,.1,100])
     
     mesh_dist_traveled_squared = np.zeros(N_m)
     mesh_dist_traveled = np.zeros(N_m)
     
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared] = Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L)
+    Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, AdvanceWorkspace(num_part))
     
+    p_pos_x = bank.p_pos_x
     
     assert (np.sum(mesh_dist_traveled) > 0)
     assert (np.sum(mesh_dist_traveled_squared) > 0)
@@ -206,11 +265,16 @@ def test_Advance():
 def test_StillIn():    
     
     num_part = 7
-    surface_distances = [0,.25,.75,1]
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
-    p_alive = np.ones(num_part, bool)
+    surface_distances = np.array([0,.25,.75,1])
+    
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
+    bank.p_alive[:] = True
+    
+    [tally_left, tally_right] = StillIn(bank, surface_distances)
     
-    [p_alive, tally_left, tally_right] = StillIn(p_pos_x, surface_distances, p_alive, num_part)
+    p_alive = bank.p_alive
     
     assert(p_alive[0] == False)
     assert(p_alive[5] == False)
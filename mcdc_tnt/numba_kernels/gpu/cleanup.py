@@ -6,113 +6,260 @@ Date: Dec 2nd 2021
 """
 
 
+import numpy as np
 import numba as nb
+from numba import cuda
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.cpu.cleanup import SwapBuffers
 
-@nb.jit(nopython=True)
-def BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_part):
+
+# threads of the count/scan (one block so the scan needs no second pass)
+SCAN_THREADS = 1024
+
+
+@cuda.jit
+def CountCuda(p_alive, num_part, chunk, counts):
+    
+    c = cuda.grid(1)
+    
+    if (c < counts.size):
+        count = 0
+        for i in range(c*chunk, min((c+1)*chunk, num_part)):
+            if p_alive[i] == True:
+                count += 1
+        counts[c] = count
+
+
+@cuda.jit
+def ScanCuda(counts, offsets):
+    """
+    Exclusive scan of the SCAN_THREADS chunk counts into offsets (total in
+    offsets[SCAN_THREADS]), Hillis-Steele in shared memory, one block
     """
-    Removes particles that died in the last round of particle transport by
-    rewriting there postiion with the alive ones
+    t = cuda.threadIdx.x
+    temp = cuda.shared.array(SCAN_THREADS, nb.int64)
     
-    Parameters
-    ----------
-    p_pos_x : vector double
-        PSV: x position of phase space particles (index is particle value).
-    p_pos_y : vector double
-        PSV: y position of phase space particles (index is particle value).
-    p_pos_z : vector double
-        PSV: z position of phase space particles (index is particle value).
-    p_mesh_cell : vector int
-        PSV: mesh cell location of a given particle.
-    p_dir_y : vector double
-        PSV: y direction unit value of phase space particles (index is particle value).
-    p_dir_z : vector double
-         PSV: z direction unit value of phase space particles (index is particle value).
-    p_dir_x : vector double
-         PSV: x direction unit value of phase space particles (index is particle value).
-    p_speed : vector double
-        PSV: speed (energy) or a particle (index is particle).
-    p_time : vector double
-        PSV: particle clock.
-    p_alive : vector bool
-        PSV: is it alive?
-    num_part : int
-        number of particles currently under transport (indxed form 1).
+    count = counts[t]
+    temp[t] = count
+    cuda.syncthreads()
+    
+    d = 1
+    while d < SCAN_THREADS:
+        value = 0
+        if t >= d:
+            value = temp[t-d]
+        cuda.syncthreads()
+        temp[t] += value
+        cuda.syncthreads()
+        d *= 2
+    
+    offsets[t] = temp[t] - count
+    if t == SCAN_THREADS-1:
+        offsets[SCAN_THREADS] = temp[t]
+
 
+@cuda.jit
+def ScatterAliveCuda(p_pos_x, p_pos_y, p_pos_z, p_dir_x, p_dir_y, p_dir_z,
+                     p_speed, p_time, p_weight, p_mesh_cell, p_group, p_alive, p_id,
+                     o_pos_x, o_pos_y, o_pos_z, o_dir_x, o_dir_y, o_dir_z,
+                     o_speed, o_time, o_weight, o_mesh_cell, o_group, o_alive, o_id,
+                     num_part, chunk, offsets):
+    
+    c = cuda.grid(1)
+    
+    if (c < offsets.size-1):
+        k = offsets[c]
+        for i in range(c*chunk, min((c+1)*chunk, num_part)):
+            if p_alive[i] == True:
+                o_pos_x[k] = p_pos_x[i]
+                o_pos_y[k] = p_pos_y[i]
+                o_pos_z[k] = p_pos_z[i]
+                o_dir_x[k] = p_dir_x[i]
+                o_dir_y[k] = p_dir_y[i]
+                o_dir_z[k] = p_dir_z[i]
+                o_speed[k] = p_speed[i]
+                o_time[k] = p_time[i]
+                o_weight[k] = p_weight[i]
+                o_mesh_cell[k] = p_mesh_cell[i]
+                o_group[k] = p_group[i]
+                o_alive[k] = True
+                o_id[k] = p_id[i]
+                k += 1
 
 
+def BringOutYourDead(bank, spare=None, swap=True):
+    """
+    NUMBA CUDA Kernel: Removes particles that died in the last round of
+    particle transport with a stream compaction. Every cuda thread counts the
+    live particles in its chunk, the counts are exclusive scanned on the
+    device and each thread then scatters its chunk into the output columns.
+    Only the alive flags go to the device until the count is known: an
+    empty bank, a bank where everything died and a bank where nothing died
+    return without moving the other columns.
+    
+    Parameters
+    ----------
+    bank : ParticleBank
+        PSV: phase space of every particle under transport, the first
+        bank.num_part particles are compacted.
+    spare : ParticleBank, optional
+        second buffer, only used (and grown) when swap is True.
+    swap : bool, optional
+        if True the compacted particles land in spare and the columns are
+        swapped with bank, if False they are copied straight back into bank.
+        The default is True.
+
     Returns
     -------
-    PSV ready for next itteration of lifer cycle
+    number of particles kept (also stored as bank.num_part)
 
     """
-    kept = 0
-    for i in range(num_part):
-        if p_alive[i] == True:
-        #     if p_mesh_cell[i] > 9:
-        #         print("index from this round:")
-        #         print(i)
-        #         print("index for next round:")
-        #         print(kept)
-            
-            p_pos_x[kept] = p_pos_x[i]
-            p_pos_y[kept] = p_pos_y[i]
-            p_pos_z[kept] = p_pos_z[i]
-            
-            # Direction
-            p_dir_x[kept] = p_dir_x[i]
-            p_dir_y[kept] = p_dir_y[i]
-            p_dir_z[kept] = p_dir_z[i]
-            
-            # Speed
-            p_speed[kept] = p_speed[i]
-            
-            # Time
-            p_time[kept] = p_time[i]
-            
-            # Regions
-            p_mesh_cell[kept] = p_mesh_cell[i]
-            
-            # Flags
-            p_alive[kept] = p_alive[i] 
-            kept +=1
-            
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, kept)
+    num_part = bank.num_part
+    if num_part == 0:
+        return(0)
+    
+    threadsperblock = 32
+    num_chunks = SCAN_THREADS
+    chunk = max((num_part + num_chunks - 1) // num_chunks, 1)
+    blockspergrid = (num_chunks + (threadsperblock - 1)) // threadsperblock
+    
+    d_p_alive = cuda.to_device(bank.p_alive[:num_part])
+    
+    # per thread count and exclusive scan, only the total comes back
+    d_counts = cuda.device_array(num_chunks, dtype=np.int64)
+    d_offsets = cuda.device_array(num_chunks+1, dtype=np.int64)
+    CountCuda[blockspergrid, threadsperblock](d_p_alive, num_part, chunk, d_counts)
+    ScanCuda[1, num_chunks](d_counts, d_offsets)
+    kept = int(d_offsets[num_chunks:].copy_to_host()[0])
+    
+    if (kept == 0) or (kept == num_part):
+        bank.num_part = kept
+        return(kept)
+    
+    d_p_pos_x = cuda.to_device(bank.p_pos_x[:num_part])
+    d_p_pos_y = cuda.to_device(bank.p_pos_y[:num_part])
+    d_p_pos_z = cuda.to_device(bank.p_pos_z[:num_part])
+    d_p_dir_x = cuda.to_device(bank.p_dir_x[:num_part])
+    d_p_dir_y = cuda.to_device(bank.p_dir_y[:num_part])
+    d_p_dir_z = cuda.to_device(bank.p_dir_z[:num_part])
+    d_p_speed = cuda.to_device(bank.p_speed[:num_part])
+    d_p_time = cuda.to_device(bank.p_time[:num_part])
+    d_p_weight = cuda.to_device(bank.p_weight[:num_part])
+    d_p_mesh_cell = cuda.to_device(bank.p_mesh_cell[:num_part])
+    d_p_group = cuda.to_device(bank.p_group[:num_part])
+    d_p_id = cuda.to_device(bank.p_id[:num_part])
+    
+    if swap == True:
+        if spare is None:
+            spare = ParticleBank(kept)
+        spare.num_part = 0
+        spare.reserve(kept)
+        out = spare
+    else:
+        out = bank
+    
+    d_o_pos_x = cuda.device_array(kept, dtype=np.float64)
+    d_o_pos_y = cuda.device_array(kept, dtype=np.float64)
+    d_o_pos_z = cuda.device_array(kept, dtype=np.float64)
+    d_o_dir_x = cuda.device_array(kept, dtype=np.float64)
+    d_o_dir_y = cuda.device_array(kept, dtype=np.float64)
+    d_o_dir_z = cuda.device_array(kept, dtype=np.float64)
+    d_o_speed = cuda.device_array(kept, dtype=np.float64)
+    d_o_time = cuda.device_array(kept, dtype=np.float64)
+    d_o_weight = cuda.device_array(kept, dtype=np.float64)
+    d_o_mesh_cell = cuda.device_array(kept, dtype=np.int32)
+    d_o_group = cuda.device_array(kept, dtype=np.int32)
+    d_o_alive = cuda.device_array(kept, dtype=np.bool_)
+    d_o_id = cuda.device_array(kept, dtype=np.int64)
+    
+    # scatter
+    ScatterAliveCuda[blockspergrid, threadsperblock](d_p_pos_x, d_p_pos_y, d_p_pos_z,
+                     d_p_dir_x, d_p_dir_y, d_p_dir_z, d_p_speed, d_p_time, d_p_weight, d_p_mesh_cell, d_p_group, d_p_alive, d_p_id,
+                     d_o_pos_x, d_o_pos_y, d_o_pos_z, d_o_dir_x, d_o_dir_y, d_o_dir_z,
+                     d_o_speed, d_o_time, d_o_weight, d_o_mesh_cell, d_o_group, d_o_alive, d_o_id,
+                     num_part, chunk, d_offsets)
+    
+    d_o_pos_x.copy_to_host(out.p_pos_x[:kept])
+    d_o_pos_y.copy_to_host(out.p_pos_y[:kept])
+    d_o_pos_z.copy_to_host(out.p_pos_z[:kept])
+    d_o_dir_x.copy_to_host(out.p_dir_x[:kept])
+    d_o_dir_y.copy_to_host(out.p_dir_y[:kept])
+    d_o_dir_z.copy_to_host(out.p_dir_z[:kept])
+    d_o_speed.copy_to_host(out.p_speed[:kept])
+    d_o_time.copy_to_host(out.p_time[:kept])
+    d_o_weight.copy_to_host(out.p_weight[:kept])
+    d_o_mesh_cell.copy_to_host(out.p_mesh_cell[:kept])
+    d_o_group.copy_to_host(out.p_group[:kept])
+    d_o_alive.copy_to_host(out.p_alive[:kept])
+    d_o_id.copy_to_host(out.p_id[:kept])
+    
+    if swap == True:
+        spare.num_part = kept
+        SwapBuffers(bank, spare)
+    
+    bank.num_part = kept
+    
+    return(kept)
     
     
 def test_BOYD():
     
     num_part = 3
     
-    p_pos_x = [1,2,3]
-    p_pos_y = [1,2,3]
-    p_pos_z = [1,2,3]
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    
+    bank.p_pos_x[:] = [1,2,3]
+    bank.p_pos_y[:] = [1,2,3]
+    bank.p_pos_z[:] = [1,2,3]
+    
+    bank.p_mesh_cell[:] = [1,2,3]
     
-    p_mesh_cell = [1,2,3]
+    bank.p_dir_x[:] = [1,2,3]
+    bank.p_dir_y[:] = [1,2,3]
+    bank.p_dir_z[:] = [1,2,3]
     
-    p_dir_x = [1,2,3]
-    p_dir_y = [1,2,3]
-    p_dir_z = [1,2,3]
+    bank.p_speed[:] = [1,2,3]
+    bank.p_time[:] = [1,2,3]
+    bank.p_alive[:] = [False,True,False]
     
-    p_speed = [1,2,3]
-    p_time = [1,2,3]
-    p_alive = [False,True,False]
     
+    spare = ParticleBank(1)
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, kept] = BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_part)
+    kept = BringOutYourDead(bank, spare)
     
     assert(kept == 1)
-    assert(p_dir_x[0] == 2)
-    assert(p_dir_y[0] == 2)
-    assert(p_dir_z[0] == 2)
+    assert(bank.num_part == 1)
+    assert(bank.p_dir_x[0] == 2)
+    assert(bank.p_dir_y[0] == 2)
+    assert(bank.p_dir_z[0] == 2)
+    
+    assert(bank.p_pos_x[0] == 2)
+    assert(bank.p_pos_y[0] == 2)
+    assert(bank.p_pos_z[0] == 2)
+    
+    assert(bank.p_speed[0] == 2)
+    assert(bank.p_time[0] == 2)
+    assert(bank.p_alive[0] == True)
+    
+    #more particles than scan threads, every chunk scatters
+    num_part = 3000
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.arange(num_part)
+    bank.p_alive[:] = np.arange(num_part) % 3 == 0
+    
+    kept = BringOutYourDead(bank, spare, swap=False)
     
-    assert(p_pos_x[0] == 2)
-    assert(p_pos_y[0] == 2)
-    assert(p_pos_z[0] == 2)
+    assert(kept == 1000)
+    assert(np.array_equal(bank.p_pos_x[:kept], np.arange(0, num_part, 3)))
     
-    assert(p_speed[0] == 2)
-    assert(p_time[0] == 2)
-    assert(p_alive[0] == True)
+    #nothing died, everything died, nothing there
+    assert(BringOutYourDead(bank, spare) == 1000)
+    bank.p_alive[:] = False
+    assert(BringOutYourDead(bank, spare) == 0)
+    assert(bank.num_part == 0)
+    assert(BringOutYourDead(bank, spare) == 0)
     
 if __name__ == '__main__':
     test_BOYD()
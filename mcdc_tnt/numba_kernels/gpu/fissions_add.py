@@ -4,56 +4,62 @@ breif: Adding fission particles to phase vectors for MCDC-TNT
 Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
 Date: Nov 18th 2021
 """
+import math
 import numpy as np
 import numba as nb
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.rng import Rand, ChildId
 
 
 @nb.jit(nopython=True)
-def FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive,
-                fis_count, nu_new_neutrons, fission_event_index, num_part, particle_speed, rands):
+def FissionsAdd(bank, fis_count, nu_new_neutrons, fission_event_index, particle_speed, fission_bank=None, energy_groups=None):
     """
     Run advance for a
 
     Parameters
     ----------
-    p_pos_x : vector double
-        PSV: x position of phase space particles (index is particle value).
-    p_pos_y : vector double
-        PSV: y position of phase space particles (index is particle value).
-    p_pos_z : vector double
-        PSV: z position of phase space particles (index is particle value).
-    p_mesh_cell : vector int
-        PSV: mesh cell location of a given particle.
-    p_dir_y : vector double
-        PSV: y direction unit value of phase space particles (index is particle value).
-    p_dir_z : vector double
-         PSV: z direction unit value of phase space particles (index is particle value).
-    p_dir_x : vector double
-         PSV: x direction unit value of phase space particles (index is particle value).
-    p_speed : vector double
-        PSV: speed (energy) or a particle (index is particle).
-    p_time : vector double
-        PSV: particle clock.
-    p_alive : vector bool
-        PSV: is it alive?
+    bank : ParticleBank
+        PSV: phase space of particles under transport, new fission particles
+        are appended after the first bank.num_part particles (the bank is
+        grown first if they would not fit). Child j of parent p draws
+        3j, 3j+1 and 3j+2 of p's stream for its direction and p_id and
+        carries p's weight.
     fis_count : int
         how many fissions where recorded in smaple event.
     nu_new_neutrons : int
         how many neutrons produced per fission.
     fission_event_index : vector int
         indicies of particles that underwent fission after sample event.
-    num_part : int
-        number of particles currently under transport (indxed form 1).
     particle_speed : double
         speed of fissioned particles.
-    rands : vector double
-        produced from an rng, needs to be fis_count*nu*2.
+    fission_bank, energy_groups : optional
+        k-eigenvalue fission bank and energy groups of the cpu FissionsAdd,
+        not implemented on the gpu (one group), Generations only passes None.
 
     Returns
     -------
-    Phase space variables with new fissions added.
+    Number of particles added (bank.num_part is advanced by the same amount).
 
     """
+    # grow the bank (geometrically) before anything is written past num_part
+    bank.reserve(bank.num_part + fis_count*nu_new_neutrons)
+    
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_weight = bank.p_weight
+    p_mesh_cell = bank.p_mesh_cell
+    p_alive = bank.p_alive
+    p_id = bank.p_id
+    seed = bank.seed
+    event = bank.next_event()
+    num_part = bank.num_part
+    
     k=0 #index for fission temp vectors
     for i in range(fis_count):
         for j in range(nu_new_neutrons):
@@ -63,17 +69,15 @@ def FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_
             p_pos_y[k+num_part] = p_pos_y[fission_event_index[i]]
             p_pos_z[k+num_part] = p_pos_z[fission_event_index[i]]
             
-            # print("fission particle produced")
-            # print("from particle {0} and indexed as particle {1}".format(fission_event_index[i], k+num_part))
-            # print("produced at: {0}".format(p_pos_x[k+num_part]))
             # Direction
             # Sample polar and azimuthal angles uniformly
-            mu  = 2.0*rands[4*i+2*j] - 1.0
-            azi = 2.0*rands[4*i+2*j+1]
+            parent = p_id[fission_event_index[i]]
+            mu  = 2.0*Rand(seed, parent, event, 3*j) - 1.0
+            azi = 2.0*math.pi*Rand(seed, parent, event, 3*j+1)
             # Convert to Cartesian coordinate
             c = (1.0 - mu**2)**0.5
-            p_dir_y[k+num_part] = np.cos(azi)*c
-            p_dir_z[k+num_part] = np.sin(azi)*c
+            p_dir_y[k+num_part] = math.cos(azi)*c
+            p_dir_z[k+num_part] = math.sin(azi)*c
             p_dir_x[k+num_part] = mu
                   
             # Speed
@@ -81,57 +85,53 @@ def FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_
             
             # Time
             p_time[k+num_part] = p_time[fission_event_index[i]]
+            p_weight[k+num_part] = p_weight[fission_event_index[i]]
 
             # Flags
             p_alive[k+num_part] = True
+            p_id[k+num_part] = ChildId(seed, parent, event, 3*j+2)
             
             k+=1
-            
     
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, k)
+    bank.num_part = num_part + k
+    
+    return(k)
     
     
     
 
 def test_FissionsAdd():
     
-    L = 1
-    dx = .25
-    N_m = 4
-    
     num_part = 3
-    p_pos_x = np.array([.55, 3, 5])
-    p_pos_y = np.array([10, 3, 5])
-    p_pos_z = np.array([15, 3, 5])
+    bank = ParticleBank(num_part)
+    bank.num_part = 1
     
-    p_mesh_cell = np.array([2, 87, -1])
+    bank.p_pos_x[:] = np.array([.55, 3, 5])
+    bank.p_pos_y[:] = np.array([10, 3, 5])
+    bank.p_pos_z[:] = np.array([15, 3, 5])
     
-    p_dir_x = np.ones(num_part)
-    p_dir_y = np.zeros(num_part)
-    p_dir_z = np.zeros(num_part)
+    bank.p_mesh_cell[:] = np.array([2, 87, -1])
     
-    p_speed = np.ones(num_part)
-    p_time = np.zeros(num_part)
-    p_alive = np.ones(num_part, bool)
-    p_alive[0] = False
+    bank.p_dir_x[:] = 1
+    bank.p_speed[:] = 1
+    bank.p_alive[:] = True
+    bank.p_alive[0] = False
     
     fis_count = 1
     nu = 2
-    fission_event_index = [0]
-    
-    rands = [1,1,1,1]
-    
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, k] = FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, fis_count, nu, fission_event_index, 1, 1, rands)
-    
-    print(p_pos_x)
-    print(p_pos_y)
-    print(p_pos_z)
-    
-    assert(np.allclose(p_pos_x, [0.55, 0.55, 0.55]))
-    assert(np.allclose(p_pos_y, [10,10,10]))
-    assert(np.allclose(p_pos_z, [15,15,15]))
-    assert(p_dir_x.all() == 1)
-    assert(p_alive[1:2].all() == True)
+    fission_event_index = np.array([0])
+    
+    k = FissionsAdd(bank, fis_count, nu, fission_event_index, 1)
+    
+    assert(k == 2)
+    assert(bank.num_part == 3)
+    assert(np.allclose(bank.p_pos_x, [0.55, 0.55, 0.55]))
+    assert(np.allclose(bank.p_pos_y, [10,10,10]))
+    assert(np.allclose(bank.p_pos_z, [15,15,15]))
+    assert(bank.p_dir_x.all() == 1)
+    assert(bank.p_alive[1:2].all() == True)
+    assert(np.allclose(bank.p_dir_x[1:]**2 + bank.p_dir_y[1:]**2 + bank.p_dir_z[1:]**2, 1))
+    assert(bank.p_id[1] != bank.p_id[2])
     
     
 if __name__ == '__main__':
@@ -5,117 +5,196 @@ Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
 Date: Dec 2nd 2021
 """
 import numpy as np
-import numba as nb
+from numba import cuda
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.rng import RandCuda
+from mcdc_tnt.numba_kernels.cpu.sample_event import EventCode, ImplicitCapture, Roulette, NO_EVENT, SCATTER, CAPTURE, FISSION, NUM_REACTION_TALLIES
 
 
-@nb.jit(nopython=True, parallel=True)
-def SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu_new_neutrons, rands):
+EventCodeCuda = cuda.jit(device=True)(EventCode.py_func)
+ImplicitCaptureCuda = cuda.jit(device=True)(ImplicitCapture.py_func)
+RouletteCuda = cuda.jit(device=True)(Roulette.py_func)
+
+
+@cuda.jit
+def ClassifyCuda(p_mesh_cell, p_alive, p_weight, p_id, seed, event, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                 num_part, chunk, event_code, counts, reaction_tally, implicit, weight_cutoff, survival_weight):
+    
+    c = cuda.grid(1)
+    
+    if (c < counts.shape[0]-1):
+        for i in range(c*chunk, min((c+1)*chunk, num_part)):
+            code = NO_EVENT
+            if p_alive[i] == True:
+                cell = p_mesh_cell[i]
+                weight = p_weight[i]
+                if implicit == True:
+                    code, survival = ImplicitCaptureCuda(RandCuda(seed, p_id[i], event, 0),
+                                                         mesh_scat_xsec[cell], mesh_cap_xsec[cell], mesh_fis_xsec[cell])
+                else:
+                    code = EventCodeCuda(RandCuda(seed, p_id[i], event, 0),
+                                         mesh_scat_xsec[cell], mesh_cap_xsec[cell], mesh_fis_xsec[cell])
+                    survival = 1.0
+                if (code != NO_EVENT) and (reaction_tally.shape[1] > 0):
+                    cuda.atomic.add(reaction_tally, (CAPTURE-1, cell), weight*(1.0-survival))
+                    cuda.atomic.add(reaction_tally, (code-1, cell), weight*survival)
+                if implicit == True:
+                    weight *= survival
+                    if (code == SCATTER) and (weight < weight_cutoff):
+                        weight = RouletteCuda(RandCuda(seed, p_id[i], event, 1), weight, survival_weight)
+                        if weight == 0.0:
+                            code = CAPTURE
+                    p_weight[i] = weight
+                if code != NO_EVENT:
+                    counts[c+1, code-1] += 1
+                if (code == CAPTURE) or (code == FISSION):
+                    p_alive[i] = False
+            event_code[i] = code
+
+
+@cuda.jit
+def IndexEventsCuda(event_code, num_part, chunk, offsets,
+                    scatter_event_index, capture_event_index, fission_event_index):
+    
+    c = cuda.grid(1)
+    
+    if (c < offsets.shape[0]-1):
+        k_scat = offsets[c, SCATTER-1]
+        k_cap = offsets[c, CAPTURE-1]
+        k_fis = offsets[c, FISSION-1]
+        for i in range(c*chunk, min((c+1)*chunk, num_part)):
+            if event_code[i] == SCATTER:
+                scatter_event_index[k_scat] = i
+                k_scat += 1
+            elif event_code[i] == CAPTURE:
+                capture_event_index[k_cap] = i
+                k_cap += 1
+            elif event_code[i] == FISSION:
+                fission_event_index[k_fis] = i
+                k_fis += 1
+
+
+def SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu_new_neutrons, reaction_tally=None, implicit_capture=None, energy_groups=None, workspace=None):
     """
-    Samples the next events of particles under transport
+    NUMBA CUDA Kernel: Samples the next events of particles under transport.
+    Every cuda thread gives the particles in its chunk an event code and
+    counts the codes, the counts are exclusive scanned and each thread then
+    writes its chunk into the index vectors (in particle order). The optional
+    reaction tally is scored with atomics in the classify kernel, implicit
+    capture and Russian roulette are applied there as well.
 
     Parameters
     ----------
-    p_mesh_cell : vector int
-        PSV: mesh cell location of a given particle.
-    p_alive : vector bool
-        PSV: is it alive?
+    bank : ParticleBank
+        PSV: phase space of particles under transport (reads p_mesh_cell,
+        clears p_alive of absorbed particles, updates p_weight with implicit
+        capture).
     mesh_cap_xsec : vector double
-        vector containing capturew cross sections that is the length of the number of cells.
+        capture cross sections of every cell.
     mesh_scat_xsec : vector double
-        DESCRIPTION.
+        scattering cross sections of every cell.
     mesh_fis_xsec : vector double
-        DESCRIPTION.
+        fission cross sections of every cell. None of the three are modified,
+        they do not need to be normalized.
     scatter_event_index : vector int
         records the location in the PSV of the scatter events.
     capture_event_index : vector int
         records the location in the PSV of capture events.
     fission_event_index : vector int
         records the location in the PSV of fission events.
-    num_part : int
-        number of particles currently under transport (indxed form 1).
     nu_new_neutrons : int
         number of neutrons produced per fission event.
-    rands : vector double
-        produced from an rng, needs to be num_part long.
+    reaction_tally : array double [NUM_REACTION_TALLIES, N_mesh], optional
+        added to: rows SCATTER-1, CAPTURE-1 and FISSION-1 count the reactions
+        (weighted) in every cell. Their sum is the collision count, the
+        collision flux estimate is that over the cell total cross section.
+    implicit_capture : vector double [2], optional
+        weight cutoff and survival weight of Russian roulette, turns implicit
+        capture on. The default is None (analog capture).
+    energy_groups : EnergyGroups, optional
+        not implemented on the gpu (one group), Generations only passes None.
+    workspace : AdvanceWorkspace, optional
+        unused, the event codes and counts are device arrays.
 
     Returns
     -------
-    Index vectors of particle next operations.
+    Number of scatter, capture and fission events recorded in the index
+    vectors of particle next operations.
 
     """
-    fissions_to_add = 0
-    scat_count = 0
-    cap_count = 0
-    fis_count = 0
-    killed = 0
+    num_part = bank.num_part
+    event = bank.next_event()
+    
+    threadsperblock = 32
+    num_chunks = 32*threadsperblock
+    chunk = max((num_part + num_chunks - 1) // num_chunks, 1)
+    blockspergrid = (num_chunks + (threadsperblock - 1)) // threadsperblock
+    
+    d_p_mesh_cell = cuda.to_device(bank.p_mesh_cell[:num_part])
+    d_p_alive = cuda.to_device(bank.p_alive[:num_part])
+    d_p_weight = cuda.to_device(bank.p_weight[:num_part])
+    d_p_id = cuda.to_device(bank.p_id[:num_part])
+    d_event_code = cuda.device_array(max(num_part, 1), dtype=np.int8)
+    
+    # per thread classify and count
+    d_counts = cuda.to_device(np.zeros((num_chunks+1, 3), dtype=np.int64))
+    if reaction_tally is None:
+        d_reaction_tally = cuda.to_device(np.zeros((NUM_REACTION_TALLIES, 0), dtype=np.float64))
+    else:
+        d_reaction_tally = cuda.to_device(reaction_tally)
+    if implicit_capture is None:
+        implicit_capture = np.array([0.0, 1.0])
+        implicit = False
+    else:
+        implicit = True
+    ClassifyCuda[blockspergrid, threadsperblock](d_p_mesh_cell, d_p_alive, d_p_weight, d_p_id, bank.seed, event,
+                                                 mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                                                 num_part, chunk, d_event_code, d_counts, d_reaction_tally,
+                                                 implicit, implicit_capture[0], implicit_capture[1])
+    if reaction_tally is not None:
+        d_reaction_tally.copy_to_host(reaction_tally)
+    
+    # exclusive scan, only num_chunks long so done on the host
+    offsets = np.cumsum(d_counts.copy_to_host(), axis=0)
+    [scat_count, cap_count, fis_count] = [int(n) for n in offsets[num_chunks]]
+    d_offsets = cuda.to_device(offsets)
     
-    #normalize cross sections in each mesh cell
-    total_scat_xsec = mesh_scat_xsec + mesh_cap_xsec + mesh_fis_xsec
-    mesh_scat_xsec /= total_scat_xsec
-    mesh_cap_xsec /= total_scat_xsec
-    mesh_fis_xsec /= total_scat_xsec
+    d_scatter_event_index = cuda.device_array(max(scat_count, 1), dtype=scatter_event_index.dtype)
+    d_capture_event_index = cuda.device_array(max(cap_count, 1), dtype=capture_event_index.dtype)
+    d_fission_event_index = cuda.device_array(max(fis_count, 1), dtype=fission_event_index.dtype)
     
+    # scatter
+    IndexEventsCuda[blockspergrid, threadsperblock](d_event_code, num_part, chunk, d_offsets,
+                    d_scatter_event_index, d_capture_event_index, d_fission_event_index)
     
-    for i in nb.prange(num_part):
-        if p_alive[i] == True:
-            
-            event_rand = rands[i]
-            
-            #produce a vector defining the boundaries of the function in a given 
-            #pdf_bounds = np.array([0,
-            #               mesh_scat_xsec[p_mesh_cell[i]],
-            #               mesh_scat_xsec[p_mesh_cell[i]]+mesh_cap_xsec[p_mesh_cell[i]],
-            #               mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] + mesh_fis_xsec[p_mesh_cell[i]],
-            #               1])
-            
-            #scatter?
-            if event_rand < mesh_scat_xsec[p_mesh_cell[i]]:
-                scatter_event_index[scat_count] = i
-                scat_count += 1
-            
-            #capture?
-            elif mesh_scat_xsec[p_mesh_cell[i]] < event_rand < mesh_scat_xsec[p_mesh_cell[i]]+mesh_cap_xsec[p_mesh_cell[i]]:
-                p_alive[i] = False
-                killed += 1
-                capture_event_index[cap_count] = i
-                cap_count +=1
-                
-            #fission?
-            elif mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] < event_rand < mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] + mesh_fis_xsec[p_mesh_cell[i]]:
-                p_alive[i] = False
-                killed += 1
-                fissions_to_add += nu_new_neutrons
-                fission_event_index[fis_count] = i
-                fis_count +=1
-                
-            #else:
-                #print("error: event for particle {part} not sorted properly".format(part =i))
-                #print("random number used: {rand}".format(rand = event_rand))
-                #print(pdf_bounds)
-                
-                #exit()
-                
-    return(scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count)
+    d_p_alive.copy_to_host(bank.p_alive[:num_part])
+    d_p_weight.copy_to_host(bank.p_weight[:num_part])
+    scatter_event_index[:scat_count] = d_scatter_event_index.copy_to_host()[:scat_count]
+    capture_event_index[:cap_count] = d_capture_event_index.copy_to_host()[:cap_count]
+    fission_event_index[:fis_count] = d_fission_event_index.copy_to_host()[:fis_count]
+    
+    return(scat_count, cap_count, fis_count)
     
     
 def test_SampleEvent():
-        p_mesh_cell = np.array([0,1,0,5])
-        p_alive = [True,True,True,False]
-        
-        mesh_cap_xsec = 1/3*np.ones(2)
-        mesh_scat_xsec = 1/3*np.ones(2)
-        mesh_fis_xsec = 1/2*np.ones(2)
+        bank = ParticleBank(4)
+        bank.num_part = 3
+        bank.p_mesh_cell[:] = np.array([0,1,2,5])
+        bank.p_alive[:] = [True,True,True,False]
+        bank.p_id[:] = np.arange(4)
         
-        scatter_event_index = np.zeros(3)
-        capture_event_index = np.zeros(3)
-        fission_event_index = np.zeros(3) 
+        #each cell only has one reaction so the outcome does not depend on the draw
+        mesh_cap_xsec = np.array([0.0, 1.0, 0.0])
+        mesh_scat_xsec = np.array([2.0, 0.0, 0.0])
+        mesh_fis_xsec = np.array([0.0, 0.0, 0.5])
         
-        controled_rands = np.array([.2, .4, .8])
+        scatter_event_index = np.zeros(3, dtype=np.int64)
+        capture_event_index = np.zeros(3, dtype=np.int64)
+        fission_event_index = np.zeros(3, dtype=np.int64)
         
         nu = 2
-        num_part = 3
         
-        [scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count] = SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu, controled_rands)
+        [scat_count, cap_count, fis_count] = SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu)
         
         assert (fis_count == 1)
         assert (scat_count == 1)
@@ -125,6 +204,16 @@ def test_SampleEvent():
         assert (capture_event_index[0] == 1)
         assert (fission_event_index[0] == 2)
         assert (scatter_event_index[0] == 0)
+        assert (bank.event == 1)
+        assert (bank.p_alive[0] == True)
+        assert (bank.p_alive[1:3].any() == False)
+        
+        #fused reaction tally, same events as above
+        bank.p_alive[:] = [True,True,True,False]
+        reaction_tally = np.zeros((NUM_REACTION_TALLIES, 3))
+        SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu, reaction_tally)
+        
+        assert (np.allclose(reaction_tally, np.eye(3)))
         
 if __name__ == '__main__':
     test_SampleEvent()
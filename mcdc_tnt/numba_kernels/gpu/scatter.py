@@ -8,17 +8,19 @@ Date: Dec 2nd 2021
 import math
 import numpy as np
 from numba import cuda
+from mcdc_tnt.numba_kernels.particle_bank import ParticleBank
+from mcdc_tnt.numba_kernels.rng import RandCuda
 
 @cuda.jit
-def ScatterCuda(d_scatter_indices, p_dir_x, p_dir_y, p_dir_z, rands):
+def ScatterCuda(d_scatter_indices, p_dir_x, p_dir_y, p_dir_z, p_id, seed, event):
     
     i = cuda.grid(1)
     
     if (i < d_scatter_indices.size):
 
-        # Sample polar and azimuthal angles uniformly
-        mu  = 2.0*rands[2*i] - 1.0
-        azi = 2.0*math.pi*rands[2*i+1]
+        # Sample polar and azimuthal angles uniformly, drawn in the thread
+        mu  = 2.0*RandCuda(seed, p_id[d_scatter_indices[i]], event, 0) - 1.0
+        azi = 2.0*math.pi*RandCuda(seed, p_id[d_scatter_indices[i]], event, 1)
         
         # Convert to Cartesian coordinate
         c = (1.0 - mu**2)**0.5
@@ -27,71 +29,71 @@ def ScatterCuda(d_scatter_indices, p_dir_x, p_dir_y, p_dir_z, rands):
         p_dir_x[d_scatter_indices[i]] = mu
 
 
-def Scatter(scatter_indices, scat_count, p_dir_x, p_dir_y, p_dir_z, rands):
+def Scatter(bank, scatter_indices, scat_count, energy_groups=None):
     """
     NUMBA CUDA Kernel: Isotropically chosses new particle directions after a scatter event
 
     Parameters
     ----------
+    bank : ParticleBank
+        PSV: phase space of particles under transport (directions updated).
     scatter_indices : vector int
         Indicies to PSV of particls that will be undergoing transport.
     scat_count : int
         number of particles to scatter.
-    p_dir_y : vector double
-        PSV: y direction unit value of phase space particles (index is particle value).
-    p_dir_z : vector double
-         PSV: z direction unit value of phase space particles (index is particle value).
-    p_dir_x : vector double
-         PSV: x direction unit value of phase space particles (index is particle value).
-    rands : vector doubles
-        from an rng, length: 2*scat_count.
+    energy_groups : EnergyGroups, optional
+        not implemented on the gpu (one group), Generations only passes None.
 
     Returns
     -------
     None.
 
     """
-    d_scatter_indices = cuda.to_device(scatter_indices)
-    d_p_dir_x = cuda.to_device(p_dir_x)
-    d_p_dir_y = cuda.to_device(p_dir_y)
-    d_p_dir_z = cuda.to_device(p_dir_z)
-    d_p_rands = cuda.to_device(rands)
+    d_scatter_indices = cuda.to_device(scatter_indices[:scat_count])
+    d_p_dir_x = cuda.to_device(bank.p_dir_x)
+    d_p_dir_y = cuda.to_device(bank.p_dir_y)
+    d_p_dir_z = cuda.to_device(bank.p_dir_z)
+    d_p_id = cuda.to_device(bank.p_id)
+    event = bank.next_event()
     
     threadsperblock = 32
     blockspergrid = (scat_count + (threadsperblock - 1)) // threadsperblock
-    ScatterCuda[blockspergrid, threadsperblock](d_scatter_indices, d_p_dir_x, d_p_dir_y, d_p_dir_z, d_p_rands)
+    ScatterCuda[blockspergrid, threadsperblock](d_scatter_indices, d_p_dir_x, d_p_dir_y, d_p_dir_z,
+                                                d_p_id, bank.seed, event)
     
-    p_dir_x = d_p_dir_x.copy_to_host()
-    p_dir_y = d_p_dir_y.copy_to_host()
-    p_dir_z = d_p_dir_z.copy_to_host()
-    
-    return(p_dir_x, p_dir_y, p_dir_z)
+    d_p_dir_x.copy_to_host(bank.p_dir_x)
+    d_p_dir_y.copy_to_host(bank.p_dir_y)
+    d_p_dir_z.copy_to_host(bank.p_dir_z)
     
 
 def test_Scatter():
     
     scat_count = 3
-    scatter_indices = np.array([0,1,4], dtype=int)
-    p_dir_x = np.array([1,2,0,0,4])
-    p_dir_y = np.array([1,2,0,0,4])
-    p_dir_z = np.array([1,2,0,0,4])
-    rands = np.array([1,1,0,0,.5,.5])
-    
-    
-    [p_dir_x, p_dir_y, p_dir_z] = Scatter(scatter_indices, scat_count, p_dir_x, p_dir_y, p_dir_z, rands)
+    scatter_indices = np.array([0,1,4])
+    bank = ParticleBank(5)
+    bank.num_part = 5
+    bank.p_id[:] = np.arange(5)
+    bank.p_dir_x[:] = [1,2,0,0,4]
+    bank.p_dir_y[:] = [1,2,0,0,4]
+    bank.p_dir_z[:] = [1,2,0,0,4]
     
+    Scatter(bank, scatter_indices, scat_count)
     
-    assert(p_dir_y[0] == 0)
-    assert(p_dir_z[0] == 0)
-    assert(p_dir_x[0] == 1)
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
     
-    assert(p_dir_y[1] == 0)
-    assert(p_dir_z[1] == 0)
-    assert(p_dir_x[1] == -1)
+    #scattered particles get new unit directions, the rest are untouched
+    norms = p_dir_x**2 + p_dir_y**2 + p_dir_z**2
+    assert(np.allclose(norms[scatter_indices], 1))
+    assert(p_dir_x[2] == 0)
+    assert(p_dir_x[3] == 0)
     
-    assert(p_dir_y[4] == -1)
-    assert(np.allclose(p_dir_z[4], 0))
-    assert(p_dir_x[4] == 0)
+    #same seed, particle and event gives the same direction
+    first = p_dir_x.copy()
+    bank.event = 0
+    Scatter(bank, scatter_indices, scat_count)
+    assert(np.array_equal(bank.p_dir_x, first))
     
 if __name__ == '__main__':
     test_Scatter()
@@ -0,0 +1,226 @@
+"""
+Name: ParticleBank
+breif: Structure of arrays particle phase space for MCDC-TNT (Numba)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import numba as nb
+from numba.experimental import jitclass
+
+
+particle_bank_spec = [
+    ('capacity', nb.int64),
+    ('num_part', nb.int64),
+    ('high_water', nb.int64),
+    ('num_resize', nb.int64),
+    ('seed', nb.int64),
+    ('event', nb.int64),
+
+    # Position
+    ('p_pos_x', nb.float64[::1]),
+    ('p_pos_y', nb.float64[::1]),
+    ('p_pos_z', nb.float64[::1]),
+
+    # Direction
+    ('p_dir_x', nb.float64[::1]),
+    ('p_dir_y', nb.float64[::1]),
+    ('p_dir_z', nb.float64[::1]),
+
+    # Speed
+    ('p_speed', nb.float64[::1]),
+
+    # Time
+    ('p_time', nb.float64[::1]),
+
+    # Weight
+    ('p_weight', nb.float64[::1]),
+
+    # Region
+    ('p_mesh_cell', nb.int32[::1]),
+
+    # Energy group
+    ('p_group', nb.int32[::1]),
+
+    # Flags
+    ('p_alive', nb.boolean[::1]),
+
+    # Identity (random number stream)
+    ('p_id', nb.int64[::1]),
+]
+
+
+@jitclass(particle_bank_spec)
+class ParticleBank:
+    """
+    Owns the particle phase space vectors (PSV) as a structure of arrays so
+    kernels can take a single object and mutate it in place
+
+    Attributes
+    ----------
+    capacity : int
+        number of particle slots allocated in every PSV column.
+    num_part : int
+        number of particles currently under transport (live count, the
+        first num_part slots of every column are in use).
+    high_water : int
+        largest number of particles the bank has been asked to hold.
+    num_resize : int
+        number of times the columns have been reallocated (grow or shrink).
+    seed : int
+        key of the counter based random number generator (rng.Rand).
+    event : int
+        rng event counter, every kernel that draws takes a fresh one.
+    p_pos_x, p_pos_y, p_pos_z : vector double
+        PSV: position of phase space particles (index is particle value).
+    p_dir_x, p_dir_y, p_dir_z : vector double
+        PSV: direction unit value of phase space particles.
+    p_speed : vector double
+        PSV: speed (energy) or a particle (index is particle).
+    p_time : vector double
+        PSV: particle clock.
+    p_weight : vector double
+        PSV: statistical weight, every score is multiplied by it (1 for
+        analog transport).
+    p_mesh_cell : vector int
+        PSV: mesh cell location of a given particle.
+    p_group : vector int
+        PSV: energy group of a given particle (0 in one group runs).
+    p_alive : vector bool
+        PSV: is it alive?
+    p_id : vector int
+        PSV: particle id, keys the particle's random number stream.
+    """
+
+    def __init__(self, capacity):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.num_part = 0
+        self.high_water = 0
+        self.num_resize = 0
+        self.seed = 0
+        self.event = 0
+
+        self.p_pos_x = np.zeros(capacity, dtype=np.float64)
+        self.p_pos_y = np.zeros(capacity, dtype=np.float64)
+        self.p_pos_z = np.zeros(capacity, dtype=np.float64)
+
+        self.p_dir_x = np.zeros(capacity, dtype=np.float64)
+        self.p_dir_y = np.zeros(capacity, dtype=np.float64)
+        self.p_dir_z = np.zeros(capacity, dtype=np.float64)
+
+        self.p_speed = np.zeros(capacity, dtype=np.float64)
+        self.p_time = np.zeros(capacity, dtype=np.float64)
+        self.p_weight = np.ones(capacity, dtype=np.float64)
+
+        self.p_mesh_cell = np.zeros(capacity, dtype=np.int32)
+        self.p_group = np.zeros(capacity, dtype=np.int32)
+        self.p_alive = np.zeros(capacity, dtype=np.bool_)
+        self.p_id = np.zeros(capacity, dtype=np.int64)
+
+    def resize(self, new_capacity):
+        """
+        Reallocates every PSV column to new_capacity, copying the first
+        num_part (live) slots over. All columns are copied in one pass
+        """
+        n = self.num_part
+
+        p_pos_x = np.zeros(new_capacity, dtype=np.float64)
+        p_pos_y = np.zeros(new_capacity, dtype=np.float64)
+        p_pos_z = np.zeros(new_capacity, dtype=np.float64)
+
+        p_dir_x = np.zeros(new_capacity, dtype=np.float64)
+        p_dir_y = np.zeros(new_capacity, dtype=np.float64)
+        p_dir_z = np.zeros(new_capacity, dtype=np.float64)
+
+        p_speed = np.zeros(new_capacity, dtype=np.float64)
+        p_time = np.zeros(new_capacity, dtype=np.float64)
+        p_weight = np.ones(new_capacity, dtype=np.float64)
+
+        p_mesh_cell = np.zeros(new_capacity, dtype=np.int32)
+        p_group = np.zeros(new_capacity, dtype=np.int32)
+        p_alive = np.zeros(new_capacity, dtype=np.bool_)
+        p_id = np.zeros(new_capacity, dtype=np.int64)
+
+        for i in range(n):
+            p_pos_x[i] = self.p_pos_x[i]
+            p_pos_y[i] = self.p_pos_y[i]
+            p_pos_z[i] = self.p_pos_z[i]
+
+            p_dir_x[i] = self.p_dir_x[i]
+            p_dir_y[i] = self.p_dir_y[i]
+            p_dir_z[i] = self.p_dir_z[i]
+
+            p_speed[i] = self.p_speed[i]
+            p_time[i] = self.p_time[i]
+            p_weight[i] = self.p_weight[i]
+
+            p_mesh_cell[i] = self.p_mesh_cell[i]
+            p_group[i] = self.p_group[i]
+            p_alive[i] = self.p_alive[i]
+            p_id[i] = self.p_id[i]
+
+        self.p_pos_x = p_pos_x
+        self.p_pos_y = p_pos_y
+        self.p_pos_z = p_pos_z
+
+        self.p_dir_x = p_dir_x
+        self.p_dir_y = p_dir_y
+        self.p_dir_z = p_dir_z
+
+        self.p_speed = p_speed
+        self.p_time = p_time
+        self.p_weight = p_weight
+
+        self.p_mesh_cell = p_mesh_cell
+        self.p_group = p_group
+        self.p_alive = p_alive
+        self.p_id = p_id
+
+        self.capacity = new_capacity
+        self.num_resize += 1
+
+    def reserve(self, n):
+        """
+        Makes sure the bank can hold n particles, doubling the capacity until
+        it fits (amortized O(1) per particle added). Also moves the high-water
+        mark. Returns True if the columns were reallocated
+        """
+        if n > self.high_water:
+            self.high_water = n
+
+        if n <= self.capacity:
+            return False
+
+        new_capacity = self.capacity
+        while new_capacity < n:
+            new_capacity *= 2
+
+        self.resize(new_capacity)
+        return True
+
+    def shrink(self, min_capacity):
+        """
+        Halves the allocation once the live count drops below a quarter of the
+        capacity (never below min_capacity), so a grow/shrink pair can not
+        thrash. Returns True if the columns were reallocated
+        """
+        if 4*self.num_part >= self.capacity:
+            return False
+
+        new_capacity = max(2*self.num_part, min_capacity, 1)
+        if new_capacity >= self.capacity:
+            return False
+
+        self.resize(new_capacity)
+        return True
+
+    def next_event(self):
+        """
+        Advances the rng event counter, returns the new event number. Draws
+        are keyed by (seed, p_id, event, draw) so they do not depend on which
+        thread (or backend) handles a particle
+        """
+        self.event += 1
+        return self.event
@@ -0,0 +1,103 @@
+"""
+Name: RNG
+breif: Counter based (Philox4x32-10) random numbers for MCDC-TNT (Numba)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import numba as nb
+from numba import cuda
+
+# Philox4x32 multipliers and Weyl key increments (Salmon et al. 2011)
+PHILOX_M0 = np.uint64(0xD2511F53)
+PHILOX_M1 = np.uint64(0xCD9E8D57)
+PHILOX_W0 = np.uint64(0x9E3779B9)
+PHILOX_W1 = np.uint64(0xBB67AE85)
+MASK32 = np.uint64(0xFFFFFFFF)
+SHIFT32 = np.uint64(32)
+
+
+def MakeRNG(jit):
+    """
+    Builds the generator with the given decorator (nb.jit for the cpu,
+    cuda.jit(device=True) for kernels) so both share one definition
+    """
+    
+    @jit
+    def philox(seed, p_id, event, draw):
+        """
+        Philox4x32-10 block: key is the 64 bit seed, the 128 bit counter is
+        (particle id, event counter, draw). Pure function of its arguments so
+        every thread (or backend) gets the same number for the same particle.
+        Returns four 32 bit words (as uint64)
+        """
+        seed = np.uint64(seed)
+        p_id = np.uint64(p_id)
+        
+        k0 = seed & MASK32
+        k1 = (seed >> SHIFT32) & MASK32
+        
+        c0 = p_id & MASK32
+        c1 = (p_id >> SHIFT32) & MASK32
+        c2 = np.uint64(event) & MASK32
+        c3 = np.uint64(draw) & MASK32
+        
+        for r in range(10):
+            prod0 = PHILOX_M0*c0
+            prod1 = PHILOX_M1*c2
+            
+            c0 = (prod1 >> SHIFT32) ^ c1 ^ k0
+            c1 = prod1 & MASK32
+            c2 = (prod0 >> SHIFT32) ^ c3 ^ k1
+            c3 = prod0 & MASK32
+            
+            k0 = (k0 + PHILOX_W0) & MASK32
+            k1 = (k1 + PHILOX_W1) & MASK32
+        
+        return(c0, c1, c2, c3)
+    
+    @jit
+    def rand(seed, p_id, event, draw):
+        """
+        Uniform double on the open interval (0,1) from 52 bits of a block
+        """
+        [w0, w1, w2, w3] = philox(seed, p_id, event, draw)
+        x = (w0 >> np.uint64(6))*np.uint64(67108864) + (w1 >> np.uint64(6))
+        return((np.float64(x) + 0.5)*2.220446049250313e-16)
+    
+    @jit
+    def child_id(seed, p_id, event, draw):
+        """
+        63 bit id for a particle born from p_id (fission), random so the ids
+        of a whole family tree do not depend on bank order
+        """
+        [w0, w1, w2, w3] = philox(seed, p_id, event, draw)
+        return(np.int64(((w2 & np.uint64(0x7FFFFFFF)) << SHIFT32) | w3))
+    
+    return(philox, rand, child_id)
+
+
+# numba cpu (jit) and cuda (device) flavours of the same functions
+[Philox, Rand, ChildId] = MakeRNG(nb.jit(nopython=True))
+[PhiloxCuda, RandCuda, ChildIdCuda] = MakeRNG(cuda.jit(device=True))
+
+
+def test_Rand():
+    # Random123 known answer test, philox4x32_10 with a zero key and counter
+    assert(Philox(0, 0, 0, 0) == (0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8))
+    
+    a = Rand(777, 5, 3, 0)
+    assert(0 < a < 1)
+    assert(Rand(777, 5, 3, 0) == a)
+    assert(Rand(777, 5, 3, 1) != a)
+    assert(Rand(777, 6, 3, 0) != a)
+    assert(Rand(778, 5, 3, 0) != a)
+    assert(ChildId(777, 5, 3, 0) >= 0)
+    
+    draws = np.array([Rand(1, i, 0, 0) for i in range(10000)])
+    assert(abs(draws.mean() - 0.5) < 0.01)
+
+
+if __name__ == '__main__':
+    test_Rand()
@@ -0,0 +1,15 @@
+"""
+Name: Sampling
+breif: Binary search sampling of cumulative tables and flight distances for MCDC-TNT (Numba)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numba as nb
+from mcdc_tnt.sampling import MakeSampleCdf, MakeSampleDistance
+
+
+# numba (jit) flavours of the table search and distance to collision
+# shared with the other backends
+SampleCdf = MakeSampleCdf(nb.jit(nopython=True))
+SampleDistance = MakeSampleDistance(nb.jit(nopython=True))
@@ -0,0 +1,122 @@
+"""
+Name: SurfaceTally
+breif: Surface crossing current tallies binned by direction cosine and time for MCDC-TNT (Numba)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import numba as nb
+from numba.experimental import jitclass
+
+
+surface_tally_spec = [
+    ('num_surfaces', nb.int64),
+    ('num_mu_bins', nb.int64),
+    ('num_time_bins', nb.int64),
+    ('surfaces', nb.float64[::1]),
+    ('mu_edges', nb.float64[::1]),
+    ('time_edges', nb.float64[::1]),
+    ('current', nb.float64[::1]),
+    ('tally', nb.float64[:, ::1]),
+]
+
+
+@jitclass(surface_tally_spec)
+class SurfaceTally:
+    """
+    Particles crossing every surface, binned by direction cosine and
+    crossing time. Bins are flattened, bin (surface, mu, time) is
+    (s*num_mu_bins + m)*num_time_bins + t. With mu edges split at 0 the
+    partial currents are the sums over the mu bins on either side and the
+    net current is their difference
+
+    Attributes
+    ----------
+    num_surfaces, num_mu_bins, num_time_bins : int
+        number of surfaces, direction cosine bins and time bins.
+    surfaces : vector double
+        x location of every surface.
+    mu_edges : vector double
+        sorted direction cosine bin edges on [-1, 1].
+    time_edges : vector double
+        sorted crossing time bin edges.
+    current : vector double
+        number of crossings in every bin.
+    tally : array double [num_chunks, num bins]
+        privatized tallies, one row per particle chunk.
+    """
+
+    def __init__(self, surfaces, mu_edges, time_edges):
+        self.num_surfaces = len(surfaces)
+        self.num_mu_bins = len(mu_edges)-1
+        self.num_time_bins = len(time_edges)-1
+        self.surfaces = surfaces
+        self.mu_edges = mu_edges
+        self.time_edges = time_edges
+        num_bins = self.num_surfaces*self.num_mu_bins*self.num_time_bins
+        self.current = np.zeros(num_bins, dtype=np.float64)
+        self.tally = np.zeros((1, num_bins), dtype=np.float64)
+
+    def reserve_tallies(self, num_chunks):
+        """
+        Makes sure there are num_chunks private rows and zeros the rows in use
+        """
+        if self.tally.shape[0] < num_chunks:
+            self.tally = np.zeros((num_chunks, self.current.shape[0]), dtype=np.float64)
+        else:
+            self.tally[:num_chunks] = 0.0
+
+
+@nb.jit(nopython=True)
+def ScoreCrossings(x0, x1, t0, t1, mu, surfaces, mu_edges, time_edges, tally, weight=1.0):
+    """
+    Scores the weight of a flight from x0 (time t0) to x1 (time t1) with
+    direction cosine mu into every surface it crosses. A surface at xs is
+    crossed when x0 and x1 are on opposite sides of it (x < xs is the left
+    side, as in StillIn), the crossing time is interpolated along the flight
+    """
+    if x0 == x1:
+        return
+
+    num_mu_bins = len(mu_edges)-1
+    num_time_bins = len(time_edges)-1
+    m = np.searchsorted(mu_edges, mu, side='right') - 1
+    m = min(max(m, 0), num_mu_bins-1)
+
+    for s in range(len(surfaces)):
+        xs = surfaces[s]
+        if (x0 < xs) != (x1 < xs):
+            t = t0 + (t1-t0)*(xs-x0)/(x1-x0)
+            b = np.searchsorted(time_edges, t, side='right') - 1
+            if 0 <= b < num_time_bins:
+                tally[(s*num_mu_bins + m)*num_time_bins + b] += weight
+
+
+def test_ScoreCrossings():
+    surface_tally = SurfaceTally(np.array([0.0, 0.5, 1.0]), np.array([-1.0, 0.0, 1.0]),
+                                 np.array([0.0, 1.0, 10.0]))
+    assert(surface_tally.current.shape[0] == 12)
+
+    tally = np.zeros(12)
+
+    #right through the middle surface at t = 1.5 and out the right at t = 2
+    ScoreCrossings(0.25, 1.0 + 1e-10, 1.25, 2.0, 1.0, surface_tally.surfaces,
+                   surface_tally.mu_edges, surface_tally.time_edges, tally)
+    assert(tally[(1*2 + 1)*2 + 1] == 1)
+    assert(tally[(2*2 + 1)*2 + 1] == 1)
+
+    #out the left at t = .5
+    ScoreCrossings(0.25, -1e-10, 0.25, 0.5, -1.0, surface_tally.surfaces,
+                   surface_tally.mu_edges, surface_tally.time_edges, tally)
+    assert(tally[(0*2 + 0)*2 + 0] == 1)
+    assert(np.sum(tally) == 3)
+
+    #inside one region, nothing
+    ScoreCrossings(0.6, 0.9, 0.0, 0.3, 0.5, surface_tally.surfaces,
+                   surface_tally.mu_edges, surface_tally.time_edges, tally)
+    assert(np.sum(tally) == 3)
+
+
+if __name__ == '__main__':
+    test_ScoreCrossings()
@@ -0,0 +1,299 @@
+"""
+Name: TimeTally
+breif: Time binned track length tally of the material mesh for MCDC-TNT (Numba)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import numba as nb
+from numba.experimental import jitclass
+
+
+time_tally_spec = [
+    ('num_cells', nb.int64),
+    ('num_time_bins', nb.int64),
+    ('time_edges', nb.float64[::1]),
+    ('bins', nb.int64[::1]),
+    ('flux', nb.float64[::1]),
+    ('flux_squared', nb.float64[::1]),
+    ('segment_cell', nb.int64[::1]),
+    ('segment_start', nb.float64[::1]),
+    ('segment_end', nb.float64[::1]),
+    ('segment_score', nb.float64[::1]),
+    ('pair_bin', nb.int64[::1]),
+    ('pair_value', nb.float64[::1]),
+    ('num_pairs', nb.int64),
+]
+
+
+@jitclass(time_tally_spec)
+class TimeTally:
+    """
+    Track length flux of every material mesh cell in every time bin, one run
+    gives the whole time history. Bins are numbered time major, bin
+    (t, cell) is t*num_cells + cell, and only the bins that scored are
+    stored (a fine time grid is mostly empty). Every Advance pass records
+    one segment per particle, BufferTimeSegments splits them into (bin,
+    value) pairs in particle order and MergeTimeTally adds those into the
+    stored bins in that same order, so the result does not depend on the
+    number of threads
+
+    Attributes
+    ----------
+    num_cells : int
+        number of material mesh cells.
+    num_time_bins : int
+        number of time bins.
+    time_edges : vector double
+        sorted time bin edges, flights past the last edge are not scored.
+    bins : vector int
+        sorted bins that scored so far.
+    flux, flux_squared : vector double [len(bins)]
+        track length (and squared) tally of the bins that scored.
+    segment_cell, segment_start, segment_end, segment_score : vectors
+        cell, start and end time and weighted length of the segment every
+        particle flew in the last pass (scratch, a score of 0 is no segment).
+    pair_bin, pair_value : vectors
+        (bin, length) pairs not yet merged into the stored bins (first
+        num_pairs).
+    num_pairs : int
+        number of pairs waiting to be merged.
+    """
+
+    def __init__(self, time_edges, num_cells):
+        self.num_cells = num_cells
+        self.num_time_bins = len(time_edges)-1
+        self.time_edges = time_edges
+        self.bins = np.zeros(0, dtype=np.int64)
+        self.flux = np.zeros(0, dtype=np.float64)
+        self.flux_squared = np.zeros(0, dtype=np.float64)
+        self.segment_cell = np.zeros(0, dtype=np.int64)
+        self.segment_start = np.zeros(0, dtype=np.float64)
+        self.segment_end = np.zeros(0, dtype=np.float64)
+        self.segment_score = np.zeros(0, dtype=np.float64)
+        self.pair_bin = np.zeros(0, dtype=np.int64)
+        self.pair_value = np.zeros(0, dtype=np.float64)
+        self.num_pairs = 0
+
+    def reserve_segments(self, n):
+        """
+        Makes sure there is a segment slot for n particles, contents are not
+        kept
+        """
+        if self.segment_score.shape[0] < n:
+            self.segment_cell = np.zeros(n, dtype=np.int64)
+            self.segment_start = np.zeros(n, dtype=np.float64)
+            self.segment_end = np.zeros(n, dtype=np.float64)
+            self.segment_score = np.zeros(n, dtype=np.float64)
+
+    def reserve_pairs(self, n):
+        """
+        Grows (doubling) to hold at least n pairs, the first num_pairs are
+        kept
+        """
+        capacity = max(self.pair_bin.shape[0], 1)
+        if n <= self.pair_bin.shape[0]:
+            return
+        while capacity < n:
+            capacity *= 2
+        pair_bin = np.zeros(capacity, dtype=np.int64)
+        pair_value = np.zeros(capacity, dtype=np.float64)
+        pair_bin[:self.num_pairs] = self.pair_bin[:self.num_pairs]
+        pair_value[:self.num_pairs] = self.pair_value[:self.num_pairs]
+        self.pair_bin = pair_bin
+        self.pair_value = pair_value
+
+    def dense_flux(self):
+        """
+        Flux of all num_time_bins*num_cells bins, zero where nothing scored
+        (only for tallies small enough to hold densely)
+        """
+        flux = np.zeros(self.num_time_bins*self.num_cells, dtype=np.float64)
+        flux[self.bins] = self.flux
+        return(flux)
+
+
+@nb.jit(nopython=True)
+def TimeSegmentBins(cell, t0, t1, dist, time_edges, num_cells):
+    """
+    Number of (bin, length) pairs ScoreTimeSegment writes for a segment
+    """
+    num_time_bins = len(time_edges)-1
+    if (dist <= 0) or (cell < 0) or (cell >= num_cells):
+        return(0)
+    if (t1 < time_edges[0]) or (t0 >= time_edges[num_time_bins]):
+        return(0)
+
+    first = max(np.searchsorted(time_edges, t0, side='right') - 1, 0)
+    if t1 == t0:
+        return(1 if first < num_time_bins else 0)
+    last = min(np.searchsorted(time_edges, t1, side='left'), num_time_bins)
+    return(max(last - first, 0))
+
+
+@nb.jit(nopython=True)
+def ScoreTimeSegment(cell, t0, t1, dist, time_edges, num_cells, pair_bin, pair_value, k):
+    """
+    Splits a flight of length dist in cell, from time t0 to t1, across the
+    time bins it crosses (the speed is constant so the track length goes with
+    the time spent in each bin). The (bin, length) pairs are written from
+    index k on, returns the index after the last one. A collision is a
+    segment with t1 == t0, dist all goes to the bin of t0
+    """
+    num_time_bins = len(time_edges)-1
+    if (dist <= 0) or (cell < 0) or (cell >= num_cells):
+        return(k)
+    if (t1 < time_edges[0]) or (t0 >= time_edges[num_time_bins]):
+        return(k)
+
+    b = max(np.searchsorted(time_edges, t0, side='right') - 1, 0)
+    if t1 == t0:
+        if b < num_time_bins:
+            pair_bin[k] = b*num_cells + cell
+            pair_value[k] = dist
+            k += 1
+        return(k)
+
+    scale = dist/(t1-t0)
+    while (b < num_time_bins) and (time_edges[b] < t1):
+        pair_bin[k] = b*num_cells + cell
+        pair_value[k] = max(min(t1, time_edges[b+1]) - max(t0, time_edges[b]), 0.0)*scale
+        k += 1
+        b += 1
+    return(k)
+
+
+@nb.jit(nopython=True, parallel=True)
+def BufferTimeSegments(time_tally, num_segments):
+    """
+    Splits the first num_segments recorded segments into (bin, length)
+    pairs, appended after the pairs already waiting. Every segment writes
+    its own slice (offsets are a scan of the pair counts), so the pairs come
+    out in segment order whatever the number of threads
+    """
+    time_edges = time_tally.time_edges
+    num_cells = time_tally.num_cells
+    segment_cell = time_tally.segment_cell
+    segment_start = time_tally.segment_start
+    segment_end = time_tally.segment_end
+    segment_score = time_tally.segment_score
+
+    offsets = np.zeros(num_segments+1, dtype=np.int64)
+    for j in nb.prange(num_segments):
+        offsets[j+1] = TimeSegmentBins(segment_cell[j], segment_start[j], segment_end[j],
+                                       segment_score[j], time_edges, num_cells)
+
+    offsets[0] = time_tally.num_pairs
+    for j in range(num_segments):
+        offsets[j+1] += offsets[j]
+    time_tally.reserve_pairs(offsets[num_segments])
+    pair_bin = time_tally.pair_bin
+    pair_value = time_tally.pair_value
+
+    for j in nb.prange(num_segments):
+        ScoreTimeSegment(segment_cell[j], segment_start[j], segment_end[j], segment_score[j],
+                         time_edges, num_cells, pair_bin, pair_value, offsets[j])
+    time_tally.num_pairs = offsets[num_segments]
+
+
+@nb.jit(nopython=True)
+def MergeTimeTally(time_tally):
+    """
+    Adds the waiting pairs into the stored bins. The pairs are stably sorted
+    by bin and summed in order, so every bin gets the same additions in the
+    same order on every run. Bins scored for the first time are inserted,
+    pairs of length 0 (flights ending on an edge) are dropped
+    """
+    n = time_tally.num_pairs
+    if n == 0:
+        return
+    pair_bin = time_tally.pair_bin[:n]
+    pair_value = time_tally.pair_value[:n]
+    order = np.argsort(pair_bin, kind='mergesort')
+
+    new_bins = np.zeros(n, dtype=np.int64)
+    new_flux = np.zeros(n, dtype=np.float64)
+    new_flux_squared = np.zeros(n, dtype=np.float64)
+    m = 0
+    for j in range(n):
+        p = order[j]
+        if pair_value[p] <= 0:
+            continue
+        if (m == 0) or (new_bins[m-1] != pair_bin[p]):
+            new_bins[m] = pair_bin[p]
+            m += 1
+        new_flux[m-1] += pair_value[p]
+        new_flux_squared[m-1] += pair_value[p]**2
+
+    #both are sorted, merge them
+    old_bins = time_tally.bins
+    num_old = old_bins.shape[0]
+    bins = np.zeros(num_old + m, dtype=np.int64)
+    flux = np.zeros(num_old + m, dtype=np.float64)
+    flux_squared = np.zeros(num_old + m, dtype=np.float64)
+    a = 0
+    b = 0
+    k = 0
+    while (a < num_old) or (b < m):
+        if (b == m) or ((a < num_old) and (old_bins[a] < new_bins[b])):
+            bins[k] = old_bins[a]
+            flux[k] = time_tally.flux[a]
+            flux_squared[k] = time_tally.flux_squared[a]
+            a += 1
+        elif (a == num_old) or (new_bins[b] < old_bins[a]):
+            bins[k] = new_bins[b]
+            flux[k] = new_flux[b]
+            flux_squared[k] = new_flux_squared[b]
+            b += 1
+        else:
+            bins[k] = old_bins[a]
+            flux[k] = time_tally.flux[a] + new_flux[b]
+            flux_squared[k] = time_tally.flux_squared[a] + new_flux_squared[b]
+            a += 1
+            b += 1
+        k += 1
+
+    time_tally.bins = bins[:k].copy()
+    time_tally.flux = flux[:k].copy()
+    time_tally.flux_squared = flux_squared[:k].copy()
+    time_tally.num_pairs = 0
+
+
+def test_ScoreTimeSegment():
+    time_tally = TimeTally(np.array([0.0, 1.0, 2.0, 4.0]), 2)
+    assert(time_tally.flux.shape[0] == 0)
+    time_tally.reserve_segments(3)
+
+    #speed 2, from t = .5 to 2.5 in cell 1
+    time_tally.segment_cell[0] = 1
+    time_tally.segment_start[0] = 0.5
+    time_tally.segment_end[0] = 2.5
+    time_tally.segment_score[0] = 4.0
+    assert(TimeSegmentBins(1, 0.5, 2.5, 4.0, time_tally.time_edges, 2) == 3)
+
+    #past the last edge
+    time_tally.segment_start[1] = 4.0
+    time_tally.segment_end[1] = 5.0
+    time_tally.segment_score[1] = 1.0
+
+    #collision in cell 0 at t = 3
+    time_tally.segment_start[2] = 3.0
+    time_tally.segment_end[2] = 3.0
+    time_tally.segment_score[2] = 2.0
+
+    BufferTimeSegments(time_tally, 3)
+    assert(time_tally.num_pairs == 4)
+    MergeTimeTally(time_tally)
+    assert(np.array_equal(time_tally.bins, [1, 3, 4, 5]))
+    assert(np.allclose(time_tally.dense_flux(), [0, 1, 0, 2, 2, 1]))
+
+    #scoring again adds into the stored bins
+    BufferTimeSegments(time_tally, 1)
+    MergeTimeTally(time_tally)
+    assert(np.allclose(time_tally.flux, [2, 4, 2, 2]))
+    assert(np.allclose(time_tally.flux_squared, [2, 8, 4, 2]))
+
+
+if __name__ == '__main__':
+    test_ScoreTimeSegment()
@@ -1,8 +1,9 @@
 import mcdc_tnt.numba_kernels.cpu as kernels
 import numpy as np
+from mcdc_tnt.sampling import CumulativeTable
 from timeit import default_timer as timer
 
-def WarmUp(print_q):
+def WarmUp(print_q, history=False, delta=False):
     
     N_mesh = 2
     nu_new_neutrons = 2
@@ -20,12 +21,9 @@ def WarmUp(print_q):
     # Initial setups
     #===============================================================================
     
-    # Initialize RNG
-    np.random.seed(777)
-    
     init_particle = num_part
     
-    meshwise_fission_pdf = mesh_fis_xsec/sum(mesh_fis_xsec)
+    meshwise_fission_cdf = CumulativeTable(mesh_fis_xsec)
     mesh_dist_traveled = np.zeros(N_mesh, dtype=float)
     mesh_dist_traveled_squared = np.zeros(N_mesh, dtype=float)
     
@@ -36,27 +34,8 @@ def WarmUp(print_q):
     
     phase_parts = 5*num_part #see note about data storage
     
-    # Position
-    p_pos_x = np.zeros(phase_parts, dtype=float)
-    p_pos_y = np.zeros(phase_parts, dtype=float)
-    p_pos_z = np.zeros(phase_parts, dtype=float)
-    
-    # Direction
-    p_dir_x = np.zeros(phase_parts, dtype=float)
-    p_dir_y = np.zeros(phase_parts, dtype=float)
-    p_dir_z = np.zeros(phase_parts, dtype=float)
-    
-    # Speed
-    p_speed = np.zeros(phase_parts, dtype=float)
-    
-    # Time
-    p_time = np.zeros(phase_parts, dtype=float)
-    
-    # Region
-    p_mesh_cell = np.zeros(phase_parts, dtype=np.int32)
-    #print(p_mesh_cell.dtype)
-    # Flags
-    p_alive = np.full(phase_parts, False, dtype=bool)
+    bank = kernels.ParticleBank(phase_parts)
+    bank.seed = 777 #counter based rng
     
     #mesh_particle_index = np.zeros([N_mesh, phase_parts], dtype=np.uint8)
     
@@ -65,69 +44,70 @@ def WarmUp(print_q):
     capture_event_index = np.zeros(phase_parts, dtype=int)
     fission_event_index = np.zeros(phase_parts, dtype=int)
     
-    rands = np.random.random(phase_parts)
-    
     start_o = timer()
     
     start = timer()
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, 
-    p_alive] = kernels.SourceParticles(p_pos_x, p_pos_y,
-                                                      p_pos_z, p_mesh_cell, dx,
-                                                      p_dir_y, p_dir_z, p_dir_x,
-                                                      p_speed, p_time, p_alive,
-                                                      num_part, meshwise_fission_pdf,
-                                                      particle_speed, True)
+    kernels.SourceParticles(bank, dx, num_part, meshwise_fission_cdf,
+                            particle_speed, True)
     end = timer()
     time_source = end-start
     
     start = timer()
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared] = kernels.Advance(
-                p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time,
-                num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, surface_distances[-1])
+    kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, surface_distances[-1],
+                    kernels.AdvanceWorkspace(phase_parts))
                 
+    if delta == True:
+        kernels.SourceParticles(bank, dx, num_part, meshwise_fission_cdf, particle_speed, True)
+        kernels.AdvanceDelta(bank, float(dx), mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, surface_distances[-1],
+                             kernels.AdvanceWorkspace(phase_parts))
+    
     end = timer()
     time_ad = end-start
     start = timer()
     
-    [scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count] = kernels.SampleEvent(
-                p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
-                capture_event_index, fission_event_index, num_part, nu_new_neutrons, rands)
+    [scat_count, cap_count, fis_count] = kernels.SampleEvent(
+                bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
+                capture_event_index, fission_event_index, nu_new_neutrons)
     
     end = timer()
     time_sample = end-start
     start = timer()
     
-    [p_alive, tally_left_t, tally_right_t] = kernels.StillIn(p_pos_x, surface_distances, p_alive, num_part)
+    [tally_left_t, tally_right_t] = kernels.StillIn(bank, surface_distances)
     
     end = timer()
     time_stillin = end-start
     start = timer()
     
     scat_count = 0 
-    [p_dir_x, p_dir_y, p_dir_z] = kernels.Scatter(scatter_event_index, scat_count, p_dir_x, p_dir_y, p_dir_z, rands)
+    kernels.Scatter(bank, scatter_event_index, scat_count)
     
     end = timer()
     time_scatter = end-start
     start = timer()
     
     fis_count = 0
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, 
-         p_time, p_alive, particles_added_fission] = kernels.FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, 
-                                                  p_dir_y, p_dir_z, p_dir_x, p_speed, 
-                                                  p_time, p_alive, fis_count, nu_new_neutrons, 
-                                                  fission_event_index, num_part, particle_speed, rands)
+    particles_added_fission = kernels.FissionsAdd(bank, fis_count, nu_new_neutrons, 
+                                                  fission_event_index, particle_speed)
     
     end = timer()
     time_fission = end-start
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, 
-         p_time, p_alive, kept] = kernels.BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, 
-                                                   p_dir_y, p_dir_z, p_dir_x, p_speed, 
-                                                   p_time, p_alive, num_part)
+    kept = kernels.BringOutYourDead(bank, kernels.ParticleBank(phase_parts))
     
     end = timer()
     time_BOYD = end-start
     
+    time_history = 0
+    if history == True:
+        start = timer()
+        kernels.SourceParticles(bank, dx, num_part, meshwise_fission_cdf, particle_speed, True)
+        kernels.TransportHistories(bank, float(dx), mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                                   nu_new_neutrons, float(particle_speed), surface_distances,
+                                   mesh_dist_traveled, mesh_dist_traveled_squared)
+        end = timer()
+        time_history = end-start
+    
     end_o = timer()
     time_overall = end_o-start_o
     
@@ -142,10 +122,12 @@ def WarmUp(print_q):
         print("scatter.......{0}".format(time_scatter))
         print("fission.......{0}".format(time_fission))
         print("BOYD..........{0}".format(time_BOYD))
+        if history == True:
+            print("History.......{0}".format(time_history))
         print()
         print("Overall.......{0}".format(time_overall))
         print()
         
     
 if __name__ == '__main__':
-    WarmUp()
+    WarmUp(True)
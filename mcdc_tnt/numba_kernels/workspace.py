@@ -0,0 +1,142 @@
+"""
+Name: AdvanceWorkspace
+breif: Persistent scratch vectors for the Advance kernels of MCDC-TNT (Numba)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import numba as nb
+from numba.experimental import jitclass
+
+
+advance_workspace_spec = [
+    ('capacity', nb.int64),
+    ('rands', nb.float64[::1]),
+    ('p_dist_travled', nb.float64[::1]),
+    ('p_end_trans', nb.int32[::1]),
+    ('active', nb.int64[::1]),
+    ('active_next', nb.int64[::1]),
+    ('num_sub_steps', nb.int64),
+    ('num_chunks', nb.int64),
+    ('active_fraction', nb.float64[::1]),
+    ('tally', nb.float64[:, ::1]),
+    ('tally_squared', nb.float64[:, ::1]),
+    ('event_code', nb.int8[::1]),
+    ('event_offsets', nb.int64[:, ::1]),
+    ('event_tally', nb.float64[:, :, ::1]),
+]
+
+
+@jitclass(advance_workspace_spec)
+class AdvanceWorkspace:
+    """
+    Scratch vectors Advance needs on every sub-step (and SampleEvent on
+    every call). Create once per simulation (sized like the bank) and pass
+    to every Advance call instead of allocating inside the sub-step loop
+
+    Attributes
+    ----------
+    capacity : int
+        number of particle slots allocated in every vector.
+    rands : vector double
+        random numbers for distance to collision, refilled in place.
+    p_dist_travled : vector double
+        distance traveled by every particle in the current sub-step.
+    p_end_trans : vector int
+        1 once a particle reached its collision site (or left the slab).
+    active, active_next : vector int
+        worklist of bank indices still streaming (compacted every sub-step).
+    num_sub_steps : int
+        sub-steps the last Advance call took.
+    num_chunks : int
+        particle chunks (parallel work items) the last Advance call used.
+    active_fraction : vector double
+        fraction of the bank still streaming at the start of every sub-step
+        of the last Advance call (first num_sub_steps entries).
+    tally, tally_squared : array double [num_chunks, N_mesh]
+        privatized track length tallies, one row per particle chunk.
+    event_code : vector int8
+        event SampleEvent picked for every particle.
+    event_offsets : array int [num_chunks+1, 3]
+        per chunk event counts (then offsets) of SampleEvent.
+    event_tally : array double [num_chunks, num_rows, N_mesh]
+        privatized reaction tallies of SampleEvent, one per particle chunk.
+    """
+
+    def __init__(self, capacity):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.rands = np.zeros(capacity, dtype=np.float64)
+        self.p_dist_travled = np.zeros(capacity, dtype=np.float64)
+        self.p_end_trans = np.zeros(capacity, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=np.int64)
+        self.active_next = np.zeros(capacity, dtype=np.int64)
+        self.num_sub_steps = 0
+        self.num_chunks = 0
+        self.active_fraction = np.zeros(64, dtype=np.float64)
+        self.tally = np.zeros((1, 1), dtype=np.float64)
+        self.tally_squared = np.zeros((1, 1), dtype=np.float64)
+        self.event_code = np.zeros(capacity, dtype=np.int8)
+        self.event_offsets = np.zeros((2, 3), dtype=np.int64)
+        self.event_tally = np.zeros((1, 1, 0), dtype=np.float64)
+
+    def reserve_tallies(self, num_chunks, N_mesh):
+        """
+        Makes sure the private tallies have num_chunks rows of N_mesh bins
+        and zeros the rows in use
+        """
+        if (self.tally.shape[0] < num_chunks) or (self.tally.shape[1] != N_mesh):
+            self.tally = np.zeros((num_chunks, N_mesh), dtype=np.float64)
+            self.tally_squared = np.zeros((num_chunks, N_mesh), dtype=np.float64)
+        else:
+            self.tally[:num_chunks] = 0.0
+            self.tally_squared[:num_chunks] = 0.0
+
+    def reserve_events(self, num_chunks, num_rows, N_mesh):
+        """
+        Makes sure there are num_chunks+1 rows of event counts and
+        num_chunks private reaction tallies of num_rows x N_mesh bins, zeros
+        the ones in use
+        """
+        if self.event_offsets.shape[0] < num_chunks+1:
+            self.event_offsets = np.zeros((num_chunks+1, 3), dtype=np.int64)
+        else:
+            self.event_offsets[:num_chunks+1] = 0
+        shape = self.event_tally.shape
+        if (shape[0] < num_chunks) or (shape[1] != num_rows) or (shape[2] != N_mesh):
+            self.event_tally = np.zeros((num_chunks, num_rows, N_mesh), dtype=np.float64)
+        else:
+            self.event_tally[:num_chunks] = 0.0
+
+    def reserve(self, n):
+        """
+        Grows (doubling) to hold at least n particles, contents are not kept.
+        Returns True if the vectors were reallocated
+        """
+        if n <= self.capacity:
+            return False
+
+        new_capacity = self.capacity
+        while new_capacity < n:
+            new_capacity *= 2
+
+        self.rands = np.zeros(new_capacity, dtype=np.float64)
+        self.p_dist_travled = np.zeros(new_capacity, dtype=np.float64)
+        self.p_end_trans = np.zeros(new_capacity, dtype=np.int32)
+        self.active = np.zeros(new_capacity, dtype=np.int64)
+        self.active_next = np.zeros(new_capacity, dtype=np.int64)
+        self.event_code = np.zeros(new_capacity, dtype=np.int8)
+        self.capacity = new_capacity
+        return True
+
+    def record_pass(self, fraction):
+        """
+        Appends the active fraction of one sub-step to the report
+        """
+        if self.num_sub_steps == len(self.active_fraction):
+            grown = np.zeros(2*len(self.active_fraction), dtype=np.float64)
+            grown[:self.num_sub_steps] = self.active_fraction
+            self.active_fraction = grown
+        self.active_fraction[self.num_sub_steps] = fraction
+        self.num_sub_steps += 1
@@ -1,6 +1,14 @@
-from .advance import Advance, StillIn, Advance_old
-from .cleanup import BringOutYourDead
+from .particle_bank import ParticleBank
+from .workspace import AdvanceWorkspace
+from .tally_mesh import TallyMeshes, BuildTallyMeshes
+from .tally_time import TimeTally
+from .tally_surface import SurfaceTally
+from .energy_groups import EnergyGroups
+from .advance import Advance, AdvanceDelta, StillIn, Advance_old
+from .cleanup import BringOutYourDead, PopulationControl
 from .fissions_add import FissionsAdd
 from .sample_event import SampleEvent
 from .scatter import Scatter
 from .source_particles import SourceParticles
+from .history import TransportHistories
+from .weight_window import WeightWindow
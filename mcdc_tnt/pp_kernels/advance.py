@@ -7,108 +7,161 @@ Date: Dec 2nd 2021
 
 import math
 import numpy as np
+from mcdc_tnt.pp_kernels.particle_bank import ParticleBank
+from mcdc_tnt.pp_kernels.workspace import AdvanceWorkspace
+from mcdc_tnt.pp_kernels.rng import Rand
+from mcdc_tnt.sampling import SampleDistance
+from mcdc_tnt.pp_kernels.tally_mesh import ScoreSegment, ScoreCollision
+from mcdc_tnt.pp_kernels.tally_time import ScoreTimeSegment, ScoreTimeCollision, MergeTimeTally
+from mcdc_tnt.pp_kernels.tally_surface import ScoreCrossings
 
 
-def Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time,
-            num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L):
+def Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, workspace, tally_meshes=None, time_tally=None, surface_tally=None, cell_edges=None):
     """
     Guts of transport is the function that actaully moves particles around, go figure.
     Implements surface tracking with flux (w/ error) via track length estimator
 
     Parameters
     ----------
-    p_pos_x : vector double
-        PSV: x position of phase space particles (index is particle value).
-    p_pos_y : vector double
-        PSV: y position of phase space particles (index is particle value).
-    p_pos_z : vector double
-        PSV: z position of phase space particles (index is particle value).
-    p_mesh_cell : vector int
-        PSV: mesh cell location of a given particle.
+    bank : ParticleBank
+        PSV: phase space of the bank.num_part particles under transport.
     dx : double
         mesh cell width.
-    p_dir_y : vector double
-        PSV: y direction unit value of phase space particles (index is particle value).
-    p_dir_z : vector double
-         PSV: z direction unit value of phase space particles (index is particle value).
-    p_dir_x : vector double
-         PSV: x direction unit value of phase space particles (index is particle value).
-    p_speed : vector double
-        PSV: speed (energy) or a particle (index is particle).
-    p_time : vector double
-        PSV: particle clock.
-    num_part : int
-        number of particles currently under transport.
     mesh_total_xsec : vector double
-        total cross section of every mesh cell (length num_cells).
+        total cross section of every mesh cell (length num_cells), with
+        energy groups group major (p_group*num_cells + p_mesh_cell).
     mesh_dist_traveled : vector double
-        track length estimator tally for use in comp of flux.
+        track length estimator tally for use in comp of flux, summed over
+        the groups (length num_cells).
     mesh_dist_traveled_squared : TYPE
         distance a particle travels in each cell for use in error with flux.
     L : double
         length of slab.
+    workspace : AdvanceWorkspace
+        scratch vectors reused every sub-step (grown here if needed).
+    tally_meshes : TallyMeshes, optional
+        independent tally meshes, every segment is split across their bins.
+    time_tally : TimeTally, optional
+        time binned flux of the mesh cells, every segment is split across
+        the time bins it spans.
+    surface_tally : SurfaceTally, optional
+        surface crossings, scored by the segments that cross a surface.
+    cell_edges : vector double, optional
+        edges of the (non-uniform) mesh cells, N_mesh+1 increasing values
+        from 0 to L. Cells are dx wide when None.
 
     Returns
     -------
-    Updated PSV with mesh distances.
+    None, bank and mesh distances are updated in place.
 
     """
-    p_end_trans = np.zeros(num_part)
-    end_flag = 0
-    max_mesh_index = len(mesh_total_xsec)-1
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_mesh_cell = bank.p_mesh_cell
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_id = bank.p_id
+    p_weight = bank.p_weight
+    p_group = bank.p_group
+    p_alive = bank.p_alive
+    num_part = bank.num_part
+    
+    #one rng event per call, the sub-step number picks the draw
+    event = bank.next_event()
+    
+    workspace.reserve(num_part)
+    p_end_trans = workspace.p_end_trans
+    p_dist_travled = workspace.p_dist_travled
+    rands = workspace.rands
+    active = workspace.active
+    
+    p_end_trans[:num_part] = 0
+    num_cells = len(mesh_dist_traveled)
+    max_mesh_index = num_cells-1
+    
+    #worklist of particles still streaming, compacted every sub-step
+    active[:num_part] = np.arange(num_part)
+    num_active = num_part
+    workspace.num_sub_steps = 0
     
     cycle_count = 0
-    while end_flag == 0:
-        #allocate randoms
-        rands = np.random.random([num_part])
-        #vector of indicies for particle transport
-        
-        p_dist_travled = np.zeros(num_part)
-        
-        pre_p_mesh = p_mesh_cell
+    while num_active > 0:
+        workspace.record_pass(num_active/num_part)
         
-        for i in range(num_part):
+        still_active = 0
+        for j in range(num_active):
+            i = active[j]
+            rands[i] = Rand(bank.seed, p_id[i], event, workspace.num_sub_steps)
+            p_dist_travled[i] = 0
+            pre_cell = p_mesh_cell[i] #cell the segment is tracked in
+            pre_x = p_pos_x[i]
+            pre_time = p_time[i]
+            
             Advance_cycle(i, p_pos_x, p_pos_y, p_pos_z,
                           p_dir_y, p_dir_z, p_dir_x, 
-                          p_mesh_cell, p_speed, p_time,  
-                          dx, mesh_total_xsec, L,
-                          p_dist_travled, p_end_trans, rands)
-        
-        end_flag = 1
-        for i in range(num_part):
-            if (0 < pre_p_mesh[i] < max_mesh_index):
-                mesh_dist_traveled[pre_p_mesh[i]] += p_dist_travled[i]
-                mesh_dist_traveled_squared[pre_p_mesh[i]] += p_dist_travled[i]**2
-                
+                          p_mesh_cell, p_speed, p_time, p_group,
+                          dx, mesh_total_xsec, num_cells, L,
+                          p_dist_travled, p_end_trans, p_alive, rands, cell_edges)
+            
+            #weighted track length
+            score = p_dist_travled[i]*p_weight[i]
+            if (0 < pre_cell < max_mesh_index):
+                mesh_dist_traveled[pre_cell] += score
+                mesh_dist_traveled_squared[pre_cell] += score**2
+            
+            if tally_meshes is not None:
+                ScoreSegment(pre_x, p_pos_x[i], score, tally_meshes.edges, tally_meshes.edge_offsets,
+                             tally_meshes.flux, tally_meshes.flux_squared)
+            
+            if time_tally is not None:
+                ScoreTimeSegment(pre_cell, pre_time, p_time[i], score, time_tally.time_edges,
+                                 time_tally.num_cells, time_tally.tally, time_tally.tally_squared)
+            
+            if surface_tally is not None:
+                ScoreCrossings(pre_x, p_pos_x[i], pre_time, p_time[i], p_dir_x[i], surface_tally.surfaces,
+                               surface_tally.mu_edges, surface_tally.time_edges, surface_tally.current, p_weight[i])
+            
+            #survivors are written behind the read position, in order
             if p_end_trans[i] == 0:
-                end_flag = 0
+                active[still_active] = i
+                still_active += 1
+        
+        num_active = still_active
         
         if (cycle_count > int(1e6)):
             print("************ERROR**********")
             print(" Max itter hit")
-            print(p_end_trans)
+            print(active[:num_active])
             print()
             print()
             return()
             
-        summer = p_end_trans.sum()
+        summer = num_part - num_active
         cycle_count += 1
         print("Advance Complete:......{1}%       ".format(cycle_count, int(100*summer/num_part)), end = "\r")
     print()
-        
-      
     
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared)
+    if time_tally is not None:
+        MergeTimeTally(time_tally)
 
 
 
 
 def Advance_cycle(i, p_pos_x, p_pos_y, p_pos_z,
                   p_dir_y, p_dir_z, p_dir_x, 
-                  p_mesh_cell, p_speed, p_time,  
-                  dx, mesh_total_xsec, L,
-                  p_dist_travled, p_end_trans, rands):
-
+                  p_mesh_cell, p_speed, p_time, p_group,
+                  dx, mesh_total_xsec, num_cells, L,
+                  p_dist_travled, p_end_trans, p_alive, rands, cell_edges=None):
+    """
+    One surface tracking step of particle i, to its collision site or the
+    next cell. A particle moving parallel to the cell edges in a void cell
+    can neither collide nor leave, its transport ends and it is killed
+    where it is
+    """
     kicker = 1e-10
 
     if (p_end_trans[i] == 0):
@@ -117,12 +170,15 @@ def Advance_cycle(i, p_pos_x, p_pos_y, p_pos_z,
         elif (p_pos_x[i] >= L): #exited lhs
             p_end_trans[i] = 1
             
+        elif (p_dir_x[i] == 0) and (mesh_total_xsec[p_group[i]*num_cells + p_mesh_cell[i]] <= 0):
+            p_end_trans[i] = 1
+            p_alive[i] = False
+            
         else:
-            dist = -math.log(rands[i]) / mesh_total_xsec[p_mesh_cell[i]]
+            dist = SampleDistance(rands[i], mesh_total_xsec[p_group[i]*num_cells + p_mesh_cell[i]])
             
             x_loc = (p_dir_x[i] * dist) + p_pos_x[i]
-            LB = p_mesh_cell[i] * dx
-            RB = LB + dx
+            [LB, RB] = CellBounds(p_mesh_cell[i], dx, cell_edges)
             
             if (x_loc < LB):        #move partilce into cell at left
                 p_dist_travled[i] = (LB - p_pos_x[i])/p_dir_x[i] + kicker
@@ -146,37 +202,161 @@ def Advance_cycle(i, p_pos_x, p_pos_y, p_pos_z,
 
 
 
+def CellBounds(cell, dx, cell_edges=None):
+    """
+    Left and right bound of a mesh cell, cell*dx and one dx on without
+    cell_edges
+    """
+    if cell_edges is None:
+        LB = cell * dx
+        return(LB, LB + dx)
+    return(cell_edges[cell], cell_edges[cell+1])
+
+
+
+def CellIndex(x, dx, cell_edges, max_mesh_index):
+    """
+    Mesh cell of a location inside the slab, by a binary search of
+    cell_edges (int(x/dx) without them)
+    """
+    if cell_edges is None:
+        return(min(int(x/dx), max_mesh_index))
+    return(min(max(int(np.searchsorted(cell_edges, x, side='right')) - 1, 0), max_mesh_index))
+
+
 
 
-def Advance_old(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time,
-            num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L):
+
+def AdvanceDelta(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, workspace, tally_meshes=None, time_tally=None, surface_tally=None, cell_edges=None):
+    """
+    Delta (Woodcock) tracking alternative to Advance: flights are sampled
+    against the majorant of mesh_total_xsec and accepted as real collisions
+    with probability total/majorant. The flux is scored with a collision
+    estimator (1/total per real collision) into the same tallies
+
+    Parameters
+    ----------
+    bank : ParticleBank
+        PSV: phase space of the bank.num_part particles under transport.
+    dx : double
+        mesh cell width.
+    mesh_total_xsec : vector double
+        total cross section of every mesh cell (length num_cells), group
+        major with energy groups.
+    mesh_dist_traveled : vector double
+        flux tally (collision estimator), summed over the groups.
+    mesh_dist_traveled_squared : vector double
+        squared flux tally for use in error with flux.
+    L : double
+        length of slab.
+    workspace : AdvanceWorkspace
+        only carries the sub-step report here.
+    tally_meshes : TallyMeshes, optional
+        independent tally meshes, scored with the same collision estimator.
+    time_tally : TimeTally, optional
+        time binned flux of the mesh cells, same collision estimator.
+    surface_tally : SurfaceTally, optional
+        surface crossings, scored by the flights that cross a surface.
+    cell_edges : vector double, optional
+        edges of the (non-uniform) mesh cells, cells are dx wide when None.
+
+    Returns
+    -------
+    None, bank and mesh tallies are updated in place.
+
+    """
+    #one majorant per energy group, flights use the particle's
+    majorants = np.max(np.reshape(mesh_total_xsec, (-1, len(mesh_dist_traveled))), axis=1)
+    event = bank.next_event()
+    
+    workspace.num_sub_steps = 0
+    workspace.record_pass(1.0)
+    
+    for i in range(bank.num_part):
+        Delta_cycle(i, bank, dx, mesh_total_xsec, majorants[bank.p_group[i]], L, event,
+                    mesh_dist_traveled, mesh_dist_traveled_squared, tally_meshes, time_tally, surface_tally, cell_edges)
+    
+    if time_tally is not None:
+        MergeTimeTally(time_tally)
+
+
+
+def Delta_cycle(i, bank, dx, mesh_total_xsec, majorant, L, event, mesh_dist_traveled, mesh_dist_traveled_squared, tally_meshes=None, time_tally=None,
+                surface_tally=None, cell_edges=None):
+    """
+    Woodcock tracks particle i to its next real collision (or out of the
+    slab). Flight f uses draws 2f (distance) and 2f+1 (real or virtual).
+    A particle moving parallel to the cell edges in a void cell can neither
+    collide nor leave, it is killed where it is
+    """
+    kicker = 1e-10
+    num_cells = len(mesh_dist_traveled)
+    max_mesh_index = num_cells-1
+    group_offset = bank.p_group[i]*num_cells
+    seed = bank.seed
+    p_id = bank.p_id[i]
+    
+    flight = 0
+    x = bank.p_pos_x[i]
+    while (0 <= x < L):
+        if (bank.p_dir_x[i] == 0) and (mesh_total_xsec[group_offset + bank.p_mesh_cell[i]] <= 0):
+            bank.p_alive[i] = False
+            break
+        
+        if majorant > 0:
+            dist = -math.log(Rand(seed, p_id, event, 2*flight)) / majorant
+        elif bank.p_dir_x[i] > 0:         #void slab, stream out the right
+            dist = (L - x)/bank.p_dir_x[i] + kicker
+        else:                             #void slab, stream out the left
+            dist = -x/bank.p_dir_x[i] + kicker
+        
+        pre_x = x
+        pre_time = bank.p_time[i]
+        x += bank.p_dir_x[i]*dist
+        bank.p_pos_y[i] += bank.p_dir_y[i]*dist
+        bank.p_pos_z[i] += bank.p_dir_z[i]*dist
+        bank.p_time[i] += dist/bank.p_speed[i]
+        if surface_tally is not None:
+            ScoreCrossings(pre_x, x, pre_time, bank.p_time[i], bank.p_dir_x[i], surface_tally.surfaces,
+                           surface_tally.mu_edges, surface_tally.time_edges, surface_tally.current, bank.p_weight[i])
+        
+        if (x < 0) or (x >= L):
+            break
+        
+        cell = CellIndex(x, dx, cell_edges, max_mesh_index)
+        bank.p_mesh_cell[i] = cell
+        
+        #real collision with probability total/majorant, else virtual
+        if Rand(seed, p_id, event, 2*flight+1)*majorant < mesh_total_xsec[group_offset + cell]:
+            score = bank.p_weight[i]/mesh_total_xsec[group_offset + cell]
+            if (0 < cell < max_mesh_index):
+                mesh_dist_traveled[cell] += score
+                mesh_dist_traveled_squared[cell] += score**2
+            if tally_meshes is not None:
+                ScoreCollision(x, score, tally_meshes.edges, tally_meshes.edge_offsets,
+                               tally_meshes.flux, tally_meshes.flux_squared)
+            if time_tally is not None:
+                ScoreTimeCollision(cell, bank.p_time[i], score, time_tally.time_edges,
+                                   time_tally.num_cells, time_tally.tally, time_tally.tally_squared)
+            break
+        flight += 1
+    
+    bank.p_pos_x[i] = x
+
+
+
+
+
+def Advance_old(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L):
     """
     Guts of transport is the function that actaully moves particles around, go figure.
     Implements surface tracking with flux (w/ error) via track length estimator
     Parameters
     ----------
-    p_pos_x : vector double
-        PSV: x position of phase space particles (index is particle value).
-    p_pos_y : vector double
-        PSV: y position of phase space particles (index is particle value).
-    p_pos_z : vector double
-        PSV: z position of phase space particles (index is particle value).
-    p_mesh_cell : vector int
-        PSV: mesh cell location of a given particle.
+    bank : ParticleBank
+        PSV: phase space of the bank.num_part particles under transport.
     dx : double
         mesh cell width.
-    p_dir_y : vector double
-        PSV: y direction unit value of phase space particles (index is particle value).
-    p_dir_z : vector double
-         PSV: z direction unit value of phase space particles (index is particle value).
-    p_dir_x : vector double
-         PSV: x direction unit value of phase space particles (index is particle value).
-    p_speed : vector double
-        PSV: speed (energy) or a particle (index is particle).
-    p_time : vector double
-        PSV: particle clock.
-    num_part : int
-        number of particles currently under transport.
     mesh_total_xsec : vector double
         total cross section of every mesh cell (length num_cells).
     mesh_dist_traveled : vector double
@@ -187,8 +367,19 @@ def Advance_old(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_
         length of slab.
     Returns
     -------
-    Updated PSV with mesh distances.
+    None, bank and mesh distances are updated in place.
     """
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_mesh_cell = bank.p_mesh_cell
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    num_part = bank.num_part
+    
     kicker = 1e-10
     for i in range(num_part):
         
@@ -232,25 +423,31 @@ def Advance_old(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_
                 
                 #advance particle clock
                 p_time[i]  += dist_traveled/p_speed[i]
-    
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared)
 
 
 
-def StillIn(p_pos_x, surface_distances, p_alive, num_part):
-    tally_left = 0
-    tally_right = 0
-    for i in range(num_part):
+def StillIn(bank, surface_distances):
+    """
+    Kills the particles that left the slab, returns the weight leaking out
+    of the left and right
+    """
+    p_pos_x = bank.p_pos_x
+    p_alive = bank.p_alive
+    p_weight = bank.p_weight
+    
+    tally_left = 0.0
+    tally_right = 0.0
+    for i in range(bank.num_part):
         #exit at left
         if p_pos_x[i] <= surface_distances[0]:
-            tally_left += 1
+            tally_left += p_weight[i]
             p_alive[i] = False
             
         elif p_pos_x[i] >= surface_distances[len(surface_distances)-1]:
-            tally_right += 1
+            tally_right += p_weight[i]
             p_alive[i] = False
             
-    return(p_alive, tally_left, tally_right)
+    return(tally_left, tally_right)
     
     
     
@@ -261,32 +458,33 @@ def test_Advance():
     N_m = 4
     
     num_part = 6
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1])
-    p_pos_y = 2.1*np.ones(num_part)
-    p_pos_z = 3.4*np.ones(num_part)
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1])
+    bank.p_pos_y[:] = 2.1
+    bank.p_pos_z[:] = 3.4
     
-    p_mesh_cell = np.array([-1, 0, 0, 1, 3, 4])
+    bank.p_mesh_cell[:] = np.array([-1, 0, 0, 1, 3, 4])
     
-    p_dir_x = np.ones(num_part)
-    p_dir_x[0] = -1
-    p_dir_y = np.zeros(num_part)
-    p_dir_z = np.zeros(num_part)
+    bank.p_dir_x[:] = 1
+    bank.p_dir_x[0] = -1
     
-    p_speed = np.ones(num_part)
-    p_time = np.zeros(num_part)
-    p_alive = np.ones(num_part, bool)
-    p_alive[5] = False
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(num_part)
+    bank.p_alive[:] = True
+    bank.p_alive[5] = False
     
     
-    particle_speed = 1
     mesh_total_xsec = np.array([0.1,1,.1,100])
     
     mesh_dist_traveled_squared = np.zeros(N_m)
     mesh_dist_traveled = np.zeros(N_m)
     
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared] = Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L)
+    Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, AdvanceWorkspace(num_part))
     
+    p_pos_x = bank.p_pos_x
     
     assert (np.sum(mesh_dist_traveled) > 0)
     assert (np.sum(mesh_dist_traveled_squared) > 0)
@@ -299,11 +497,16 @@ def test_Advance():
 def test_StillIn():    
     
     num_part = 7
-    surface_distances = [0,.25,.75,1]
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
-    p_alive = np.ones(num_part, bool)
+    surface_distances = np.array([0,.25,.75,1])
+    
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
+    bank.p_alive[:] = True
+    
+    [tally_left, tally_right] = StillIn(bank, surface_distances)
     
-    [p_alive, tally_left, tally_right] = StillIn(p_pos_x, surface_distances, p_alive, num_part)
+    p_alive = bank.p_alive
     
     assert(p_alive[0] == False)
     assert(p_alive[5] == False)
@@ -6,52 +6,104 @@ Date: Dec 2nd 2021
 """
 
 
+import numpy as np
+from mcdc_tnt.pp_kernels.particle_bank import ParticleBank
+from mcdc_tnt.pp_kernels.rng import Rand, ChildId
 
-def BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_part):
+def BringOutYourDead(bank, spare=None, swap=True):
     """
-    Removes particles that died in the last round of particle transport by
-    rewriting there postiion with the alive ones
+    Removes particles that died in the last round of particle transport with
+    a stream compaction: exclusive scan of the alive flags gives every live
+    particle its new slot, which it is scattered to in a second bank (same
+    algorithm as the Numba/PyKokkos kernels, vectorized with numpy here)
     
     Parameters
     ----------
-    p_pos_x : vector double
-        PSV: x position of phase space particles (index is particle value).
-    p_pos_y : vector double
-        PSV: y position of phase space particles (index is particle value).
-    p_pos_z : vector double
-        PSV: z position of phase space particles (index is particle value).
-    p_mesh_cell : vector int
-        PSV: mesh cell location of a given particle.
-    p_dir_y : vector double
-        PSV: y direction unit value of phase space particles (index is particle value).
-    p_dir_z : vector double
-         PSV: z direction unit value of phase space particles (index is particle value).
-    p_dir_x : vector double
-         PSV: x direction unit value of phase space particles (index is particle value).
-    p_speed : vector double
-        PSV: speed (energy) or a particle (index is particle).
-    p_time : vector double
-        PSV: particle clock.
-    p_alive : vector bool
-        PSV: is it alive?
-    num_part : int
-        number of particles currently under transport (indxed form 1).
+    bank : ParticleBank
+        PSV: phase space of every particle under transport, the first
+        bank.num_part particles are compacted.
+    spare : ParticleBank, optional
+        second buffer the live particles are scattered into, grown if needed.
+        If None a temporary one is allocated.
+    swap : bool, optional
+        if True the columns of bank and spare are swapped after the scatter,
+        if False the compacted particles are copied back into bank.
+        The default is True.
+
+    Returns
+    -------
+    number of particles kept (also stored as bank.num_part)
+
+    """
+    num_part = bank.num_part
+    if spare is None:
+        spare = ParticleBank(num_part)
+    
+    alive = bank.p_alive[:num_part]
+    
+    # exclusive scan of the alive flags
+    offsets = np.cumsum(alive) - alive
+    kept = int(np.count_nonzero(alive))
+    
+    spare.num_part = 0
+    spare.reserve(kept)
+    
+    # scatter
+    for name in ('p_pos_x', 'p_pos_y', 'p_pos_z', 'p_dir_x', 'p_dir_y', 'p_dir_z',
+                 'p_speed', 'p_time', 'p_weight', 'p_mesh_cell', 'p_group', 'p_alive', 'p_id'):
+        getattr(spare, name)[offsets[alive]] = getattr(bank, name)[:num_part][alive]
+        
+        if swap == False:
+            getattr(bank, name)[:kept] = getattr(spare, name)[:kept]
+    
+    if swap == True:
+        for name in ('p_pos_x', 'p_pos_y', 'p_pos_z', 'p_dir_x', 'p_dir_y', 'p_dir_z',
+                     'p_speed', 'p_time', 'p_weight', 'p_mesh_cell', 'p_group', 'p_alive', 'p_id'):
+            col = getattr(bank, name)
+            setattr(bank, name, getattr(spare, name))
+            setattr(spare, name, col)
+        bank.capacity, spare.capacity = spare.capacity, bank.capacity
+    
+    spare.num_part = 0
+    bank.num_part = kept
+    
+    return(kept)
+
 
+def BringOutYourDead_serial(bank):
+    """
+    Serial in place version of BringOutYourDead, kept as the reference for
+    the scan based compaction
+    
+    Parameters
+    ----------
+    bank : ParticleBank
+        PSV: phase space of every particle under transport, the first
+        bank.num_part particles are compacted in place.
 
 
     Returns
     -------
-    PSV ready for next itteration of lifer cycle
+    number of particles kept (also stored as bank.num_part)
 
     """
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_weight = bank.p_weight
+    p_mesh_cell = bank.p_mesh_cell
+    p_group = bank.p_group
+    p_alive = bank.p_alive
+    p_id = bank.p_id
+    
     kept = 0
-    for i in range(num_part):
+    for i in range(bank.num_part):
         if p_alive[i] == True:
-        #     if p_mesh_cell[i] > 9:
-        #         print("index from this round:")
-        #         print(i)
-        #         print("index for next round:")
-        #         print(kept)
             
             p_pos_x[kept] = p_pos_x[i]
             p_pos_y[kept] = p_pos_y[i]
@@ -67,51 +119,197 @@ def BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p
             
             # Time
             p_time[kept] = p_time[i]
+            p_weight[kept] = p_weight[i]
             
             # Regions
             p_mesh_cell[kept] = p_mesh_cell[i]
+            p_group[kept] = p_group[i]
             
             # Flags
             p_alive[kept] = p_alive[i] 
+            p_id[kept] = p_id[i]
             kept +=1
-            
-    return(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, kept)
+    
+    bank.num_part = kept
+    
+    return(kept)
+    
+    
+def PopulationControl(fission_bank, bank, num_part):
+    """
+    Combs the fission sites of a k-eigenvalue cycle into exactly num_part
+    source particles for the next cycle. The comb has num_part evenly spaced
+    teeth (j + u)*W/num_part over the cumulative site weights (total W) with
+    one uniform offset u, site i is picked by every tooth that falls on its
+    weight. With unit weights that is i = floor((j + u)*M/num_part) for M
+    sites, every site is kept floor or ceil of num_part/M times and the
+    population is renormalized without a per particle random draw.
+    
+    Parameters
+    ----------
+    fission_bank : ParticleBank
+        PSV: fission sites banked during the cycle, emptied after the comb.
+    bank : ParticleBank
+        PSV: overwritten with the num_part source particles of the next
+        cycle (grown if needed). Times and weights are reset to 0 and 1,
+        every particle gets a fresh p_id so duplicated sites do not share
+        a stream.
+    num_part : int
+        source particles per cycle.
+
+    Returns
+    -------
+    number of fission sites combed (M), 0 leaves bank empty.
+
+    """
+    num_sites = fission_bank.num_part
+    
+    bank.num_part = 0
+    if num_sites == 0:
+        return(0)
+    bank.reserve(num_part)
+    
+    p_pos_x = fission_bank.p_pos_x
+    p_pos_y = fission_bank.p_pos_y
+    p_pos_z = fission_bank.p_pos_z
+    p_dir_x = fission_bank.p_dir_x
+    p_dir_y = fission_bank.p_dir_y
+    p_dir_z = fission_bank.p_dir_z
+    p_speed = fission_bank.p_speed
+    p_weight = fission_bank.p_weight
+    p_mesh_cell = fission_bank.p_mesh_cell
+    p_group = fission_bank.p_group
+    p_id = fission_bank.p_id
+    
+    o_pos_x = bank.p_pos_x
+    o_pos_y = bank.p_pos_y
+    o_pos_z = bank.p_pos_z
+    o_dir_x = bank.p_dir_x
+    o_dir_y = bank.p_dir_y
+    o_dir_z = bank.p_dir_z
+    o_speed = bank.p_speed
+    o_time = bank.p_time
+    o_weight = bank.p_weight
+    o_mesh_cell = bank.p_mesh_cell
+    o_group = bank.p_group
+    o_alive = bank.p_alive
+    o_id = bank.p_id
+    
+    seed = bank.seed
+    event = bank.next_event()
+    offset = Rand(seed, 0, event, 0)
+    
+    cumulative_weight = np.cumsum(p_weight[:num_sites])
+    spacing = cumulative_weight[num_sites-1]/num_part
+    
+    for j in range(num_part):
+        i = min(np.searchsorted(cumulative_weight, (j + offset)*spacing, side='right'), num_sites-1)
+        
+        o_pos_x[j] = p_pos_x[i]
+        o_pos_y[j] = p_pos_y[i]
+        o_pos_z[j] = p_pos_z[i]
+        o_dir_x[j] = p_dir_x[i]
+        o_dir_y[j] = p_dir_y[i]
+        o_dir_z[j] = p_dir_z[i]
+        o_speed[j] = p_speed[i]
+        o_time[j] = 0.0
+        o_weight[j] = 1.0
+        o_mesh_cell[j] = p_mesh_cell[i]
+        o_group[j] = p_group[i]
+        o_alive[j] = True
+        o_id[j] = ChildId(seed, p_id[i], event, j)
+    
+    bank.num_part = num_part
+    fission_bank.num_part = 0
+    
+    return(num_sites)
     
     
 def test_BOYD():
     
     num_part = 3
     
-    p_pos_x = [1,2,3]
-    p_pos_y = [1,2,3]
-    p_pos_z = [1,2,3]
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
     
-    p_mesh_cell = [1,2,3]
+    bank.p_pos_x[:] = [1,2,3]
+    bank.p_pos_y[:] = [1,2,3]
+    bank.p_pos_z[:] = [1,2,3]
     
-    p_dir_x = [1,2,3]
-    p_dir_y = [1,2,3]
-    p_dir_z = [1,2,3]
+    bank.p_mesh_cell[:] = [1,2,3]
     
-    p_speed = [1,2,3]
-    p_time = [1,2,3]
-    p_alive = [False,True,False]
+    bank.p_dir_x[:] = [1,2,3]
+    bank.p_dir_y[:] = [1,2,3]
+    bank.p_dir_z[:] = [1,2,3]
     
+    bank.p_speed[:] = [1,2,3]
+    bank.p_time[:] = [1,2,3]
+    bank.p_alive[:] = [False,True,False]
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, kept] = BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_part)
+    
+    kept = BringOutYourDead(bank, ParticleBank(1), swap=False)
     
     assert(kept == 1)
-    assert(p_dir_x[0] == 2)
-    assert(p_dir_y[0] == 2)
-    assert(p_dir_z[0] == 2)
+    assert(bank.num_part == 1)
+    assert(bank.p_dir_x[0] == 2)
+    assert(bank.p_dir_y[0] == 2)
+    assert(bank.p_dir_z[0] == 2)
+    
+    assert(bank.p_pos_x[0] == 2)
+    assert(bank.p_pos_y[0] == 2)
+    assert(bank.p_pos_z[0] == 2)
+    
+    assert(bank.p_speed[0] == 2)
+    assert(bank.p_time[0] == 2)
+    assert(bank.p_alive[0] == True)
+    
+    
+def test_BOYD_swap():
+    
+    num_part = 1000
+    
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.arange(num_part)
+    bank.p_alive[:] = np.arange(num_part) % 3 == 0
+    
+    spare = ParticleBank(1)
+    kept = BringOutYourDead(bank, spare, swap=True)
+    
+    assert(kept == 334)
+    assert(bank.capacity >= kept)
+    assert(np.all(bank.p_pos_x[0:kept] == 3*np.arange(kept)))
+    assert(bank.p_alive[0:kept].all() == True)
+    
+def test_PopulationControl():
+    
+    fission_bank = ParticleBank(3)
+    fission_bank.num_part = 3
+    fission_bank.p_pos_x[:] = [1,2,3]
+    fission_bank.p_time[:] = 5
+    fission_bank.p_id[:] = [10,11,12]
+    
+    bank = ParticleBank(1)
+    
+    combed = PopulationControl(fission_bank, bank, 7)
     
-    assert(p_pos_x[0] == 2)
-    assert(p_pos_y[0] == 2)
-    assert(p_pos_z[0] == 2)
+    assert(combed == 3)
+    assert(bank.num_part == 7)
+    assert(fission_bank.num_part == 0)
+    # every site kept 2 or 3 times, in order
+    counts = np.bincount(bank.p_pos_x[0:7].astype(np.int64))[1:]
+    assert(np.sum(counts) == 7)
+    assert(np.all((counts == 2) | (counts == 3)))
+    assert(np.all(np.diff(bank.p_pos_x[0:7]) >= 0))
+    assert(np.all(bank.p_time[0:7] == 0))
+    assert(bank.p_alive[0:7].all() == True)
+    assert(len(np.unique(bank.p_id[0:7])) == 7)
     
-    assert(p_speed[0] == 2)
-    assert(p_time[0] == 2)
-    assert(p_alive[0] == True)
+    assert(PopulationControl(fission_bank, bank, 7) == 0)
+    assert(bank.num_part == 0)
     
 if __name__ == '__main__':
     test_BOYD()
+    test_BOYD_swap()
+    test_PopulationControl()
 
@@ -0,0 +1,61 @@
+"""
+Name: EnergyGroups
+breif: Multigroup speeds, emission spectrum and group to group scattering tables for MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+class EnergyGroups:
+    """
+    Everything the kernels need to move particles between energy groups.
+    Same layout as the Numba jitclass in mcdc_tnt.numba_kernels.energy_groups,
+    group g of cell is g*num_cells + cell in the cross section vectors
+
+    Attributes
+    ----------
+    num_groups : int
+        number of energy groups.
+    num_cells : int
+        number of material mesh cells.
+    speeds : vector double [num_groups]
+        particle speed of every group.
+    spectrum_cdf : vector double [num_groups]
+        cumulative emission spectrum of source and fission particles.
+    scatter_cdf : array double [num_regions, num_groups, num_groups]
+        cumulative group to group scattering probabilities.
+    mesh_region : vector int [num_cells]
+        region (row of scatter_cdf) of every mesh cell.
+    """
+
+    def __init__(self, speeds, spectrum_cdf, scatter_cdf, mesh_region):
+        self.num_groups = speeds.shape[0]
+        self.num_cells = mesh_region.shape[0]
+        self.speeds = speeds
+        self.spectrum_cdf = spectrum_cdf
+        self.scatter_cdf = scatter_cdf
+        self.mesh_region = mesh_region
+
+
+def GroupTables(energy_groups):
+    """
+    Speeds, emission and scattering cdfs and cell regions of the energy
+    groups, empty (one group runs) when there are none
+    """
+    if energy_groups is None:
+        return(np.zeros(0), np.zeros(0), np.zeros((0, 0, 0)), np.zeros(0, dtype=np.int32))
+    return(energy_groups.speeds, energy_groups.spectrum_cdf, energy_groups.scatter_cdf, energy_groups.mesh_region)
+
+
+def test_GroupTables():
+    assert(GroupTables(None)[2].shape == (0, 0, 0))
+    energy_groups = EnergyGroups(np.array([2.0, 0.5]), np.array([0.5, 1.0]), np.zeros((1, 2, 2)),
+                                 np.zeros(3, dtype=np.int32))
+    assert(energy_groups.num_groups == 2 and energy_groups.num_cells == 3)
+    assert(GroupTables(energy_groups)[1] is energy_groups.spectrum_cdf)
+
+
+if __name__ == '__main__':
+    test_GroupTables()
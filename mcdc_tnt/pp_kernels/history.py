@@ -0,0 +1,364 @@
+"""
+Name: History
+breif: History based transport engine for MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import math
+import numpy as np
+from mcdc_tnt.pp_kernels.particle_bank import ParticleBank
+from mcdc_tnt.pp_kernels.rng import Rand, ChildId
+from mcdc_tnt.pp_kernels.advance import CellBounds
+from mcdc_tnt.sampling import SampleDistance
+from mcdc_tnt.pp_kernels.sample_event import ImplicitCapture, Roulette, SCATTER, CAPTURE, FISSION
+
+
+def TransportHistories(bank, dx, mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                       nu_new_neutrons, particle_speed, surface_distances,
+                       mesh_dist_traveled, mesh_dist_traveled_squared, implicit_capture=None, cell_edges=None):
+    """
+    History based alternative to the event loop in Generations: every source
+    particle (and all of its fission progeny) is followed from birth through
+    every collision until death. Fission secondaries go on a buffer and are
+    transported once the current history ends. Same physics and tallies as
+    Advance -> StillIn -> SampleEvent -> Scatter -> FissionsAdd. Every
+    history draws from its own (p_id) stream of a single rng event, same
+    numbers as the Numba engine. One energy group only.
+
+    Parameters
+    ----------
+    bank : ParticleBank
+        PSV: source particles (first bank.num_part), all are dead afterwards.
+    dx : double
+        mesh cell width.
+    mesh_total_xsec : vector double
+        total cross section of every mesh cell.
+    mesh_cap_xsec : vector double
+        capture x-sections for every mesh cell.
+    mesh_scat_xsec : vector double
+        scattering x-sections for every mesh cell.
+    mesh_fis_xsec : vector double
+        fission x-sections for every mesh cell.
+    nu_new_neutrons : int
+        neutrons produced per fission.
+    particle_speed : double
+        speed of fission neutrons.
+    surface_distances : vector double
+        location of material interfaces, first and last are the slab edges.
+    mesh_dist_traveled : vector double
+        track length estimator tally (added to).
+    mesh_dist_traveled_squared : vector double
+        track length squared tally (added to).
+    implicit_capture : vector double [2], optional
+        weight cutoff and survival weight of Russian roulette, turns implicit
+        capture on (as in SampleEvent). The default is None.
+    cell_edges : vector double, optional
+        edges of the (non-uniform) mesh cells, cells are dx wide when None.
+
+    Returns
+    -------
+    weight leaking out the left and right of the slab.
+
+    """
+    num_part = bank.num_part
+    N_mesh = len(mesh_total_xsec)
+
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_weight = bank.p_weight
+    p_mesh_cell = bank.p_mesh_cell
+    p_alive = bank.p_alive
+    p_id = bank.p_id
+    seed = bank.seed
+    event = bank.next_event()
+
+    # one "thread", a single secondary buffer
+    [tally_left, tally_right] = TransportChunk(0, num_part,
+                   p_pos_x, p_pos_y, p_pos_z, p_dir_x, p_dir_y, p_dir_z,
+                   p_speed, p_time, p_weight, p_mesh_cell, p_alive, p_id, seed, event,
+                   dx, mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                   nu_new_neutrons, particle_speed, surface_distances,
+                   mesh_dist_traveled, mesh_dist_traveled_squared, implicit_capture, cell_edges)
+
+    bank.num_part = 0
+
+    return(tally_left, tally_right)
+
+
+def TransportChunk(start, end, p_pos_x, p_pos_y, p_pos_z, p_dir_x, p_dir_y, p_dir_z,
+                   p_speed, p_time, p_weight, p_mesh_cell, p_alive, p_id, seed, event,
+                   dx, mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                   nu_new_neutrons, particle_speed, surface_distances,
+                   tally, tally_squared, implicit_capture=None, cell_edges=None):
+    """
+    Runs every history in bank slots [start, end), fission secondaries go on
+    a stack (grown by doubling) and carry the weight of their parent
+    """
+    L = surface_distances[len(surface_distances)-1]
+    x_left = surface_distances[0]
+    max_mesh_index = len(mesh_total_xsec)-1
+
+    # per thread secondary buffer
+    buf_size = 16
+    s_pos_x = np.zeros(buf_size)
+    s_pos_y = np.zeros(buf_size)
+    s_pos_z = np.zeros(buf_size)
+    s_time = np.zeros(buf_size)
+    s_weight = np.zeros(buf_size)
+    s_mesh_cell = np.zeros(buf_size, dtype=np.int32)
+    s_id = np.zeros(buf_size, dtype=np.int64)
+    top = 0
+
+    # scores of the running history (source particle and all of its
+    # secondaries), squared into tally_squared once it is done so the
+    # variance is over whole histories
+    history_score = np.zeros(max_mesh_index+1)
+    touched = np.zeros(max_mesh_index+1, dtype=np.int32)
+    num_touched = 0
+
+    tally_left = 0.0
+    tally_right = 0.0
+
+    i = start
+    while (i < end) or (top > 0):
+        if top > 0:
+            #next secondary, born isotropic
+            top -= 1
+            x = s_pos_x[top]
+            y = s_pos_y[top]
+            z = s_pos_z[top]
+            t = s_time[top]
+            weight = s_weight[top]
+            cell = s_mesh_cell[top]
+            speed = particle_speed
+            pid = s_id[top]
+            draw = 0
+
+            mu  = 2.0*Rand(seed, pid, event, draw) - 1.0
+            azi = 2.0*math.pi*Rand(seed, pid, event, draw+1)
+            draw += 2
+            c = (1.0 - mu**2)**0.5
+            dir_x = mu
+            dir_y = math.cos(azi)*c
+            dir_z = math.sin(azi)*c
+
+        else:
+            if p_alive[i] == False:
+                i += 1
+                continue
+            num_touched = CloseHistory(history_score, touched, num_touched, tally_squared)
+            x = p_pos_x[i]
+            y = p_pos_y[i]
+            z = p_pos_z[i]
+            t = p_time[i]
+            weight = p_weight[i]
+            cell = p_mesh_cell[i]
+            speed = p_speed[i]
+            dir_x = p_dir_x[i]
+            dir_y = p_dir_y[i]
+            dir_z = p_dir_z[i]
+            pid = p_id[i]
+            draw = 0
+            p_alive[i] = False
+            i += 1
+
+        while True:
+            # Advance: surface track to the next collision site
+            end_trans = 0
+            alive = True
+            while end_trans == 0:
+                pre_cell = cell
+                [x, y, z, cell, t, dist, end_trans, alive] = Advance_particle(x, y, z,
+                        dir_y, dir_z, dir_x, cell, speed, t, dx, mesh_total_xsec, L, Rand(seed, pid, event, draw),
+                        cell_edges)
+                draw += 1
+
+                if (0 < pre_cell < max_mesh_index):
+                    tally[pre_cell] += dist*weight
+                    if history_score[pre_cell] == 0.0:
+                        touched[num_touched] = pre_cell
+                        num_touched += 1
+                    history_score[pre_cell] += dist*weight
+
+            # stuck in a void (parallel to the cell edges), killed
+            if alive == False:
+                break
+            
+            # StillIn
+            if x <= x_left:
+                tally_left += weight
+                break
+            elif x >= L:
+                tally_right += weight
+                break
+
+            # SampleEvent
+            total_xsec = mesh_scat_xsec[cell] + mesh_cap_xsec[cell] + mesh_fis_xsec[cell]
+            event_rand = Rand(seed, pid, event, draw)
+            draw += 1
+
+            if implicit_capture is not None:
+                # capture taken out of the weight, scatter or fission sampled
+                [code, survival] = ImplicitCapture(event_rand, mesh_scat_xsec[cell],
+                                                   mesh_cap_xsec[cell], mesh_fis_xsec[cell])
+                weight *= survival
+                if (code == SCATTER) and (weight < implicit_capture[0]):
+                    weight = Roulette(Rand(seed, pid, event, draw), weight, implicit_capture[1])
+                    draw += 1
+                    if weight == 0.0:
+                        code = CAPTURE
+            elif event_rand*total_xsec < mesh_scat_xsec[cell]:
+                code = SCATTER
+            elif event_rand*total_xsec < mesh_scat_xsec[cell] + mesh_cap_xsec[cell]:
+                code = CAPTURE
+            else:
+                code = FISSION
+
+            if code == SCATTER:
+                # Scatter
+                mu  = 2.0*Rand(seed, pid, event, draw) - 1.0
+                azi = 2.0*math.pi*Rand(seed, pid, event, draw+1)
+                draw += 2
+                c = (1.0 - mu**2)**0.5
+                dir_x = mu
+                dir_y = math.cos(azi)*c
+                dir_z = math.sin(azi)*c
+
+            elif code == CAPTURE:
+                # capture
+                break
+
+            else:
+                # FissionsAdd, into the thread buffer
+                if top + nu_new_neutrons > buf_size:
+                    while top + nu_new_neutrons > buf_size:
+                        buf_size *= 2
+                    s_pos_x = Grow(s_pos_x, buf_size, top)
+                    s_pos_y = Grow(s_pos_y, buf_size, top)
+                    s_pos_z = Grow(s_pos_z, buf_size, top)
+                    s_time = Grow(s_time, buf_size, top)
+                    s_weight = Grow(s_weight, buf_size, top)
+                    s_mesh_cell = Grow(s_mesh_cell, buf_size, top)
+                    s_id = Grow(s_id, buf_size, top)
+
+                for j in range(nu_new_neutrons):
+                    s_pos_x[top] = x
+                    s_pos_y[top] = y
+                    s_pos_z[top] = z
+                    s_time[top] = t
+                    s_weight[top] = weight
+                    s_mesh_cell[top] = cell
+                    s_id[top] = ChildId(seed, pid, event, draw)
+                    draw += 1
+                    top += 1
+                break
+
+    CloseHistory(history_score, touched, num_touched, tally_squared)
+    return(tally_left, tally_right)
+
+
+def CloseHistory(history_score, touched, num_touched, tally_squared):
+    """
+    Adds the squared scores of a finished history to tally_squared and
+    clears them (only the cells it touched), returns the new touched count
+    """
+    for k in range(num_touched):
+        cell = touched[k]
+        tally_squared[cell] += history_score[cell]**2
+        history_score[cell] = 0.0
+    return(0)
+
+
+def Advance_particle(x, y, z, dir_y, dir_z, dir_x, cell, speed, t, dx, mesh_total_xsec, L, rand, cell_edges=None):
+    """
+    Scalar version of advance.Advance_cycle for a single particle, alive
+    is False for one stuck in a void (parallel to the cell edges)
+    """
+    kicker = 1e-10
+    dist = 0.0
+    
+    if (x < 0) or (x >= L): #exited
+        return(x, y, z, cell, t, dist, 1, True)
+    
+    if (dir_x == 0) and (mesh_total_xsec[cell] <= 0):
+        return(x, y, z, cell, t, dist, 1, False)
+    
+    end_trans = 0
+    dist = SampleDistance(rand, mesh_total_xsec[cell])
+    
+    x_loc = (dir_x * dist) + x
+    [LB, RB] = CellBounds(cell, dx, cell_edges)
+    
+    if (x_loc < LB):        #move partilce into cell at left
+        dist = (LB - x)/dir_x + kicker
+        cell_next = cell - 1
+       
+    elif (x_loc > RB):      #move particle into cell at right
+        dist = (RB - x)/dir_x + kicker
+        cell_next = cell + 1
+        
+    else:                   #move particle in cell
+        end_trans = 1
+        cell_next = cell
+    
+    x += dir_x*dist
+    y += dir_y*dist
+    z += dir_z*dist
+    t += dist/speed
+    
+    return(x, y, z, cell_next, t, dist, end_trans, True)
+
+
+def Grow(a, new_size, n):
+    b = np.zeros(new_size, dtype=a.dtype)
+    b[:n] = a[:n]
+    return(b)
+
+
+def test_TransportHistories():
+
+    # pure absorber, every particle is either captured or leaks
+    num_part = 300
+    L = 1
+    N_mesh = 10
+    dx = L/N_mesh
+
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = 0.5
+    bank.p_mesh_cell[:] = 5
+    bank.p_dir_x[:] = 1
+    bank.p_speed[:] = 1
+    bank.p_alive[:] = True
+    bank.p_id[:] = np.arange(num_part)
+
+    surface_distances = np.array([0.0, 1.0])
+    mesh_total_xsec = np.ones(N_mesh)
+    mesh_cap_xsec = np.ones(N_mesh)
+    mesh_scat_xsec = np.zeros(N_mesh)
+    mesh_fis_xsec = np.zeros(N_mesh)
+
+    mesh_dist_traveled = np.zeros(N_mesh)
+    mesh_dist_traveled_squared = np.zeros(N_mesh)
+
+    [tally_left, tally_right] = TransportHistories(bank, dx, mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                                                   2, 1, surface_distances, mesh_dist_traveled, mesh_dist_traveled_squared)
+
+    # mono-directional beam, nothing goes left and exp(-0.5) make it out
+    assert(tally_left == 0)
+    assert(abs(tally_right/num_part - math.exp(-0.5)) < 0.1)
+    assert(bank.num_part == 0)
+    assert(bank.p_alive.any() == False)
+    assert(np.sum(mesh_dist_traveled[0:5]) == 0)
+    assert(np.sum(mesh_dist_traveled[6:9]) > 0)
+
+
+if __name__ == '__main__':
+    test_TransportHistories()
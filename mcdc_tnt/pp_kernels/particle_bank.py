@@ -0,0 +1,151 @@
+"""
+Name: ParticleBank
+breif: Structure of arrays particle phase space for MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+class ParticleBank:
+    """
+    Owns the particle phase space vectors (PSV) as a structure of arrays so
+    kernels can take a single object and mutate it in place. Same layout as
+    the Numba jitclass in mcdc_tnt.numba_kernels.particle_bank
+
+    Attributes
+    ----------
+    capacity : int
+        number of particle slots allocated in every PSV column.
+    num_part : int
+        number of particles currently under transport (live count, the
+        first num_part slots of every column are in use).
+    high_water : int
+        largest number of particles the bank has been asked to hold.
+    num_resize : int
+        number of times the columns have been reallocated (grow or shrink).
+    seed : int
+        key of the counter based random number generator (rng.Rand).
+    event : int
+        rng event counter, every kernel that draws takes a fresh one.
+    p_pos_x, p_pos_y, p_pos_z : vector double
+        PSV: position of phase space particles (index is particle value).
+    p_dir_x, p_dir_y, p_dir_z : vector double
+        PSV: direction unit value of phase space particles.
+    p_speed : vector double
+        PSV: speed (energy) or a particle (index is particle).
+    p_time : vector double
+        PSV: particle clock.
+    p_weight : vector double
+        PSV: statistical weight, every score is multiplied by it (1 for
+        analog transport).
+    p_mesh_cell : vector int
+        PSV: mesh cell location of a given particle.
+    p_group : vector int
+        PSV: energy group of a given particle (0 in one group runs).
+    p_alive : vector bool
+        PSV: is it alive?
+    p_id : vector int
+        PSV: particle id, keys the particle's random number stream.
+    """
+
+    def __init__(self, capacity):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.num_part = 0
+        self.high_water = 0
+        self.num_resize = 0
+        self.seed = 0
+        self.event = 0
+
+        # Position
+        self.p_pos_x = np.zeros(capacity, dtype=np.float64)
+        self.p_pos_y = np.zeros(capacity, dtype=np.float64)
+        self.p_pos_z = np.zeros(capacity, dtype=np.float64)
+
+        # Direction
+        self.p_dir_x = np.zeros(capacity, dtype=np.float64)
+        self.p_dir_y = np.zeros(capacity, dtype=np.float64)
+        self.p_dir_z = np.zeros(capacity, dtype=np.float64)
+
+        # Speed
+        self.p_speed = np.zeros(capacity, dtype=np.float64)
+
+        # Time
+        self.p_time = np.zeros(capacity, dtype=np.float64)
+
+        # Weight
+        self.p_weight = np.ones(capacity, dtype=np.float64)
+
+        # Region
+        self.p_mesh_cell = np.zeros(capacity, dtype=np.int32)
+
+        # Energy group
+        self.p_group = np.zeros(capacity, dtype=np.int32)
+
+        # Flags
+        self.p_alive = np.zeros(capacity, dtype=bool)
+
+        # Identity (random number stream)
+        self.p_id = np.zeros(capacity, dtype=np.int64)
+
+    def resize(self, new_capacity):
+        """
+        Reallocates every PSV column to new_capacity, copying the first
+        num_part (live) slots over
+        """
+        n = self.num_part
+        for name in ('p_pos_x', 'p_pos_y', 'p_pos_z', 'p_dir_x', 'p_dir_y', 'p_dir_z',
+                     'p_speed', 'p_time', 'p_weight', 'p_mesh_cell', 'p_group', 'p_alive', 'p_id'):
+            old = getattr(self, name)
+            new = np.ones(new_capacity, dtype=old.dtype) if name == 'p_weight' else np.zeros(new_capacity, dtype=old.dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+        self.capacity = new_capacity
+        self.num_resize += 1
+
+    def reserve(self, n):
+        """
+        Makes sure the bank can hold n particles, doubling the capacity until
+        it fits. Also moves the high-water mark. Returns True if the columns
+        were reallocated
+        """
+        if n > self.high_water:
+            self.high_water = n
+
+        if n <= self.capacity:
+            return False
+
+        new_capacity = self.capacity
+        while new_capacity < n:
+            new_capacity *= 2
+
+        self.resize(new_capacity)
+        return True
+
+    def shrink(self, min_capacity):
+        """
+        Halves the allocation once the live count drops below a quarter of the
+        capacity (never below min_capacity). Returns True if the columns were
+        reallocated
+        """
+        if 4*self.num_part >= self.capacity:
+            return False
+
+        new_capacity = max(2*self.num_part, min_capacity, 1)
+        if new_capacity >= self.capacity:
+            return False
+
+        self.resize(new_capacity)
+        return True
+
+    def next_event(self):
+        """
+        Advances the rng event counter, returns the new event number. Draws
+        are keyed by (seed, p_id, event, draw) so they do not depend on which
+        thread (or backend) handles a particle
+        """
+        self.event += 1
+        return self.event
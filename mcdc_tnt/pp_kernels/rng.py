@@ -0,0 +1,78 @@
+"""
+Name: RNG
+breif: Counter based (Philox4x32-10) random numbers for MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+# Philox4x32 multipliers and Weyl key increments (Salmon et al. 2011)
+PHILOX_M0 = 0xD2511F53
+PHILOX_M1 = 0xCD9E8D57
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+MASK32 = 0xFFFFFFFF
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def Philox(seed, p_id, event, draw):
+    """
+    Philox4x32-10 block: key is the 64 bit seed, the 128 bit counter is
+    (particle id, event counter, draw). Bit for bit the same as
+    mcdc_tnt.numba_kernels.rng.Philox. Returns four 32 bit words
+    """
+    seed = int(seed) & MASK64
+    p_id = int(p_id) & MASK64
+    
+    k0 = seed & MASK32
+    k1 = (seed >> 32) & MASK32
+    
+    c0 = p_id & MASK32
+    c1 = (p_id >> 32) & MASK32
+    c2 = int(event) & MASK32
+    c3 = int(draw) & MASK32
+    
+    for r in range(10):
+        prod0 = PHILOX_M0*c0
+        prod1 = PHILOX_M1*c2
+        
+        c0 = (prod1 >> 32) ^ c1 ^ k0
+        c1 = prod1 & MASK32
+        c2 = (prod0 >> 32) ^ c3 ^ k1
+        c3 = prod0 & MASK32
+        
+        k0 = (k0 + PHILOX_W0) & MASK32
+        k1 = (k1 + PHILOX_W1) & MASK32
+    
+    return(c0, c1, c2, c3)
+
+
+def Rand(seed, p_id, event, draw):
+    """
+    Uniform double on the open interval (0,1) from 52 bits of a block
+    """
+    [w0, w1, w2, w3] = Philox(seed, p_id, event, draw)
+    x = (w0 >> 6)*67108864 + (w1 >> 6)
+    return((float(x) + 0.5)*2.220446049250313e-16)
+
+
+def ChildId(seed, p_id, event, draw):
+    """
+    63 bit id for a particle born from p_id (fission), random so the ids
+    of a whole family tree do not depend on bank order
+    """
+    [w0, w1, w2, w3] = Philox(seed, p_id, event, draw)
+    return(((w2 & 0x7FFFFFFF) << 32) | w3)
+
+
+def test_Rand():
+    # Random123 known answer test, philox4x32_10 with a zero key and counter
+    assert(Philox(0, 0, 0, 0) == (0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8))
+    
+    a = Rand(777, 5, 3, 0)
+    assert(0 < a < 1)
+    assert(Rand(777, 5, 3, 1) != a)
+    assert(ChildId(777, 5, 3, 0) >= 0)
+
+
+if __name__ == '__main__':
+    test_Rand()
@@ -5,115 +5,193 @@ Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
 Date: Dec 2nd 2021
 """
 import numpy as np
+from mcdc_tnt.pp_kernels.particle_bank import ParticleBank
+from mcdc_tnt.pp_kernels.rng import Rand
 
 
-def SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu_new_neutrons, rands):
+# event codes
+NO_EVENT = 0
+SCATTER = 1
+CAPTURE = 2
+FISSION = 3
+
+# rows of the reaction tally (event code - 1)
+NUM_REACTION_TALLIES = 3
+
+
+def SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu_new_neutrons, reaction_tally=None, implicit_capture=None, energy_groups=None, workspace=None):
     """
-    Samples the next events of particles under transport
+    Samples the next events of particles under transport, optionally scoring
+    the reaction tally in the same pass. With implicit capture the weight is
+    reduced by the capture probability instead of capturing, scattered
+    particles below the weight cutoff play Russian roulette
 
     Parameters
     ----------
-    p_mesh_cell : vector int
-        PSV: mesh cell location of a given particle.
-    p_alive : vector bool
-        PSV: is it alive?
+    bank : ParticleBank
+        PSV: phase space of particles under transport (reads p_mesh_cell,
+        clears p_alive of absorbed particles, updates p_weight with implicit
+        capture).
     mesh_cap_xsec : vector double
         vector containing capturew cross sections that is the length of the number of cells.
     mesh_scat_xsec : vector double
-        DESCRIPTION.
+        scattering cross sections of every cell.
     mesh_fis_xsec : vector double
-        DESCRIPTION.
+        fission cross sections of every cell. None of the three are modified,
+        they do not need to be normalized. With energy groups all three are
+        group major, particles read value p_group*N_mesh + p_mesh_cell.
     scatter_event_index : vector int
         records the location in the PSV of the scatter events.
     capture_event_index : vector int
         records the location in the PSV of capture events.
     fission_event_index : vector int
         records the location in the PSV of fission events.
-    num_part : int
-        number of particles currently under transport (indxed form 1).
     nu_new_neutrons : int
         number of neutrons produced per fission event.
-    rands : vector double
-        produced from an rng, needs to be num_part long.
+    reaction_tally : array double [NUM_REACTION_TALLIES, N_mesh], optional
+        added to: rows SCATTER-1, CAPTURE-1 and FISSION-1 count the reactions
+        (weighted) in every cell, summed over the groups. Their sum is the
+        collision count, the collision flux estimate is that over the cell
+        total cross section.
+    implicit_capture : vector double [2], optional
+        weight cutoff and survival weight of Russian roulette, turns implicit
+        capture on. The default is None (analog capture).
+    energy_groups : EnergyGroups, optional
+        energy groups of a multigroup run, the cross sections are then
+        looked up by p_group. The default is None (one group).
+    workspace : AdvanceWorkspace, optional
+        unused, the pure python loop needs no scratch (the Numba kernel
+        keeps its event codes there).
 
     Returns
     -------
-    Index vectors of particle next operations.
+    Number of scatter, capture and fission events recorded in the index
+    vectors of particle next operations.
 
     """
-    fissions_to_add = 0
+    p_mesh_cell = bank.p_mesh_cell
+    p_alive = bank.p_alive
+    p_weight = bank.p_weight
+    p_group = bank.p_group
+    num_part = bank.num_part
+    p_id = bank.p_id
+    seed = bank.seed
+    event = bank.next_event()
+    
+    if energy_groups is None:
+        num_cells = len(mesh_cap_xsec)
+    else:
+        num_cells = energy_groups.num_cells
+    
     scat_count = 0
     cap_count = 0
     fis_count = 0
-    killed = 0
-    
-    #normalize cross sections in each mesh cell
-    total_scat_xsec = mesh_scat_xsec + mesh_cap_xsec + mesh_fis_xsec
-    mesh_scat_xsec /= total_scat_xsec
-    mesh_cap_xsec /= total_scat_xsec
-    mesh_fis_xsec /= total_scat_xsec
-    
     
     for i in range(num_part):
         if p_alive[i] == True:
             
-            event_rand = rands[i]
+            cell = p_mesh_cell[i]
+            xs = p_group[i]*num_cells + cell
+            weight = p_weight[i]
+            if implicit_capture is not None:
+                [code, survival] = ImplicitCapture(Rand(seed, p_id[i], event, 0),
+                                                   mesh_scat_xsec[xs], mesh_cap_xsec[xs], mesh_fis_xsec[xs])
+            else:
+                code = EventCode(Rand(seed, p_id[i], event, 0),
+                                 mesh_scat_xsec[xs], mesh_cap_xsec[xs], mesh_fis_xsec[xs])
+                survival = 1.0
+            
+            if (reaction_tally is not None) and (code != NO_EVENT):
+                reaction_tally[CAPTURE-1, cell] += weight*(1.0-survival)
+                reaction_tally[code-1, cell] += weight*survival
             
-            #produce a vector defining the boundaries of the function in a given 
-            #pdf_bounds = np.array([0,
-            #               mesh_scat_xsec[p_mesh_cell[i]],
-            #               mesh_scat_xsec[p_mesh_cell[i]]+mesh_cap_xsec[p_mesh_cell[i]],
-            #               mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] + mesh_fis_xsec[p_mesh_cell[i]],
-            #               1])
+            if implicit_capture is not None:
+                weight *= survival
+                if (code == SCATTER) and (weight < implicit_capture[0]):
+                    weight = Roulette(Rand(seed, p_id[i], event, 1), weight, implicit_capture[1])
+                    if weight == 0.0:
+                        code = CAPTURE
+                p_weight[i] = weight
             
             #scatter?
-            if event_rand < mesh_scat_xsec[p_mesh_cell[i]]:
+            if code == SCATTER:
                 scatter_event_index[scat_count] = i
                 scat_count += 1
             
             #capture?
-            elif mesh_scat_xsec[p_mesh_cell[i]] < event_rand < mesh_scat_xsec[p_mesh_cell[i]]+mesh_cap_xsec[p_mesh_cell[i]]:
+            elif code == CAPTURE:
                 p_alive[i] = False
-                killed += 1
                 capture_event_index[cap_count] = i
                 cap_count +=1
                 
             #fission?
-            elif mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] < event_rand < mesh_scat_xsec[p_mesh_cell[i]] + mesh_cap_xsec[p_mesh_cell[i]] + mesh_fis_xsec[p_mesh_cell[i]]:
+            elif code == FISSION:
                 p_alive[i] = False
-                killed += 1
-                fissions_to_add += nu_new_neutrons
                 fission_event_index[fis_count] = i
                 fis_count +=1
                 
-            else:
-                print("error: event for particle {part} not sorted properly".format(part =i))
-                print("random number used: {rand}".format(rand = event_rand))
-                print(pdf_bounds)
-                
-                exit()
-                
-    return(scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count)
+    return(scat_count, cap_count, fis_count)
+
+
+def EventCode(event_rand, scat_xsec, cap_xsec, fis_xsec):
+    """
+    Maps a draw on (0,1) onto the reaction of a collision. The draw is scaled
+    by the cell total, so normalized and raw cross sections sample the same
+    """
+    event_rand *= scat_xsec + cap_xsec + fis_xsec
+    
+    if event_rand < scat_xsec:
+        return(SCATTER)
+    elif event_rand < scat_xsec + cap_xsec:
+        return(CAPTURE)
+    elif event_rand < scat_xsec + cap_xsec + fis_xsec:
+        return(FISSION)
+    return(NO_EVENT)
+
+
+def ImplicitCapture(event_rand, scat_xsec, cap_xsec, fis_xsec):
+    """
+    Samples a collision with capture removed: returns the reaction (scatter
+    or fission, or capture if nothing else is possible) and the fraction of
+    the weight that survives it, 1 - cap/total
+    """
+    total = scat_xsec + cap_xsec + fis_xsec
+    if total <= 0:
+        return(NO_EVENT, 1.0)
+    if scat_xsec + fis_xsec <= 0:
+        return(CAPTURE, 0.0)
+    return(EventCode(event_rand, scat_xsec, 0.0, fis_xsec), (scat_xsec + fis_xsec)/total)
+
+
+def Roulette(roulette_rand, weight, survival_weight):
+    """
+    Russian roulette: survives with probability weight/survival_weight
+    carrying survival_weight, else killed (weight 0)
+    """
+    if roulette_rand*survival_weight < weight:
+        return(survival_weight)
+    return(0.0)
     
     
 def test_SampleEvent():
-        p_mesh_cell = np.array([0,1,0,5])
-        p_alive = [True,True,True,False]
+        bank = ParticleBank(4)
+        bank.num_part = 3
+        bank.p_mesh_cell[:] = np.array([0,1,2,5])
+        bank.p_alive[:] = [True,True,True,False]
+        bank.p_id[:] = np.arange(4)
         
-        mesh_cap_xsec = 1/3*np.ones(2)
-        mesh_scat_xsec = 1/3*np.ones(2)
-        mesh_fis_xsec = 1/2*np.ones(2)
+        #each cell only has one reaction so the outcome does not depend on the draw
+        mesh_cap_xsec = np.array([0.0, 1.0, 0.0])
+        mesh_scat_xsec = np.array([2.0, 0.0, 0.0])
+        mesh_fis_xsec = np.array([0.0, 0.0, 0.5])
         
-        scatter_event_index = np.zeros(3)
-        capture_event_index = np.zeros(3)
-        fission_event_index = np.zeros(3) 
-        
-        controled_rands = np.array([.2, .4, .8])
+        scatter_event_index = np.zeros(3, dtype=np.int64)
+        capture_event_index = np.zeros(3, dtype=np.int64)
+        fission_event_index = np.zeros(3, dtype=np.int64)
         
         nu = 2
-        num_part = 3
         
-        [scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count] = SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu, controled_rands)
+        [scat_count, cap_count, fis_count] = SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu)
         
         assert (fis_count == 1)
         assert (scat_count == 1)
@@ -124,5 +202,43 @@ def test_SampleEvent():
         assert (fission_event_index[0] == 2)
         assert (scatter_event_index[0] == 0)
         
+        #cross sections are read only
+        assert (mesh_scat_xsec[0] == 2.0)
+        assert (bank.event == 1)
+        
+        #fused reaction tally, same events as above
+        bank.p_alive[:] = [True,True,True,False]
+        reaction_tally = np.zeros((NUM_REACTION_TALLIES, 3))
+        SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu, reaction_tally)
+        
+        assert (np.allclose(reaction_tally, np.eye(3)))
+        
+        
+def test_SampleEvent_implicit_capture():
+        bank = ParticleBank(3)
+        bank.num_part = 3
+        bank.p_mesh_cell[:] = np.array([0,1,2])
+        bank.p_alive[:] = True
+        bank.p_id[:] = np.arange(3)
+        
+        #half capture and half scatter, pure capture, pure fission
+        mesh_cap_xsec = np.array([1.0, 1.0, 0.0])
+        mesh_scat_xsec = np.array([1.0, 0.0, 0.0])
+        mesh_fis_xsec = np.array([0.0, 0.0, 0.5])
+        
+        scatter_event_index = np.zeros(3, dtype=np.int64)
+        capture_event_index = np.zeros(3, dtype=np.int64)
+        fission_event_index = np.zeros(3, dtype=np.int64)
+        reaction_tally = np.zeros((NUM_REACTION_TALLIES, 3))
+        
+        [scat_count, cap_count, fis_count] = SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index,
+                                                         capture_event_index, fission_event_index, 2, reaction_tally, np.array([0.25, 1.0]))
+        
+        assert ([scat_count, cap_count, fis_count] == [1, 1, 1])
+        assert (np.isclose(bank.p_weight[0], 0.5))
+        assert (np.allclose(np.sum(reaction_tally, axis=0), 1.0))
+        assert (np.allclose(reaction_tally[CAPTURE-1], [0.5, 1.0, 0.0]))
+        
 if __name__ == '__main__':
     test_SampleEvent()
+    test_SampleEvent_implicit_capture()
@@ -7,70 +7,93 @@ Date: Dec 2nd 2021
 
 import math
 import numpy as np
+from mcdc_tnt.pp_kernels.particle_bank import ParticleBank
+from mcdc_tnt.pp_kernels.rng import Rand
+from mcdc_tnt.pp_kernels.energy_groups import EnergyGroups
+from mcdc_tnt.sampling import SampleCdf
 
-def Scatter(scatter_indices, scat_count, p_dir_x, p_dir_y, p_dir_z, rands):
+def Scatter(bank, scatter_indices, scat_count, energy_groups=None):
     """
-    Isotropically chosses new particle directions after a scatter event
+    Isotropically chosses new particle directions after a scatter event. In
+    multigroup runs the outgoing group is sampled from the group to group
+    table of the cell's region (draw 2) and sets the particle speed
 
     Parameters
     ----------
+    bank : ParticleBank
+        PSV: phase space of particles under transport (directions updated,
+        and groups and speeds with energy groups).
     scatter_indices : vector int
         Indicies to PSV of particls that will be undergoing transport.
     scat_count : int
         number of particles to scatter.
-    p_dir_y : vector double
-        PSV: y direction unit value of phase space particles (index is particle value).
-    p_dir_z : vector double
-         PSV: z direction unit value of phase space particles (index is particle value).
-    p_dir_x : vector double
-         PSV: x direction unit value of phase space particles (index is particle value).
-    rands : vector doubles
-        from an rng, length: 2*scat_count.
+    energy_groups : EnergyGroups, optional
+        speeds and cumulative group to group scattering tables. The default
+        is None (one group, groups and speeds are not touched).
 
     Returns
     -------
     None.
 
     """
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_speed = bank.p_speed
+    p_mesh_cell = bank.p_mesh_cell
+    p_group = bank.p_group
+    p_id = bank.p_id
+    seed = bank.seed
+    event = bank.next_event()
 
     for i in range(scat_count):
 
         # Sample polar and azimuthal angles uniformly
-        mu  = 2.0*rands[2*i] - 1.0
-        azi = 2.0*math.pi*rands[2*i+1]
+        mu  = 2.0*Rand(seed, p_id[scatter_indices[i]], event, 0) - 1.0
+        azi = 2.0*math.pi*Rand(seed, p_id[scatter_indices[i]], event, 1)
 	    
         # Convert to Cartesian coordinate
         c = (1.0 - mu**2)**0.5
         p_dir_y[scatter_indices[i]] = math.cos(azi)*c
         p_dir_z[scatter_indices[i]] = math.sin(azi)*c
         p_dir_x[scatter_indices[i]] = mu
-            
-    return(p_dir_x, p_dir_y, p_dir_z)
+        
+        # Outgoing energy group
+        if energy_groups is not None:
+            j = scatter_indices[i]
+            g = SampleCdf(energy_groups.scatter_cdf[energy_groups.mesh_region[p_mesh_cell[j]], p_group[j]],
+                            Rand(seed, p_id[j], event, 2))
+            p_group[j] = g
+            p_speed[j] = energy_groups.speeds[g]
     
 def test_Scatter():
     
     scat_count = 3
-    scatter_indices = [0,1,4]
-    p_dir_x = [1,2,0,0,4]
-    p_dir_y = [1,2,0,0,4]
-    p_dir_z = [1,2,0,0,4]
-    rands = [1,1,0,0,.5,.5]
+    scatter_indices = np.array([0,1,4])
+    bank = ParticleBank(5)
+    bank.num_part = 5
+    bank.p_id[:] = np.arange(5)
+    bank.p_dir_x[:] = [1,2,0,0,4]
+    bank.p_dir_y[:] = [1,2,0,0,4]
+    bank.p_dir_z[:] = [1,2,0,0,4]
     
+    Scatter(bank, scatter_indices, scat_count)
     
-    [p_dir_x, p_dir_y, p_dir_z] = Scatter(scatter_indices, scat_count, p_dir_x, p_dir_y, p_dir_z, rands)
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
     
+    #scattered particles get new unit directions, the rest are untouched
+    norms = p_dir_x**2 + p_dir_y**2 + p_dir_z**2
+    assert(np.allclose(norms[scatter_indices], 1))
+    assert(p_dir_x[2] == 0)
+    assert(p_dir_x[3] == 0)
     
-    assert(p_dir_y[0] == 0)
-    assert(p_dir_z[0] == 0)
-    assert(p_dir_x[0] == 1)
-    
-    assert(p_dir_y[1] == 0)
-    assert(p_dir_z[1] == 0)
-    assert(p_dir_x[1] == -1)
-    
-    assert(p_dir_y[4] == -1)
-    assert(np.allclose(p_dir_z[4], 0))
-    assert(p_dir_x[4] == 0)
+    #same seed, particle and event gives the same direction
+    first = p_dir_x.copy()
+    bank.event = 0
+    Scatter(bank, scatter_indices, scat_count)
+    assert(np.array_equal(bank.p_dir_x, first))
     
 if __name__ == '__main__':
     test_Scatter()
@@ -0,0 +1,123 @@
+"""
+Name: TallyMeshes
+breif: Track length tally meshes independent of the material mesh for MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+class TallyMeshes:
+    """
+    Any number of 1D tally meshes, each with its own (sorted) bin edges. Same
+    layout as the Numba jitclass in mcdc_tnt.numba_kernels.tally_mesh
+
+    Attributes
+    ----------
+    num_meshes : int
+        number of tally meshes.
+    num_bins : int
+        total number of bins over every mesh.
+    edges : vector double
+        bin edges of every mesh, back to back.
+    edge_offsets : vector int
+        edges of mesh m are edges[edge_offsets[m]:edge_offsets[m+1]], its
+        bins start at edge_offsets[m]-m in the flux vectors.
+    flux, flux_squared : vector double
+        track length (and squared) tally of every bin.
+    """
+
+    def __init__(self, edges, edge_offsets):
+        self.num_meshes = len(edge_offsets)-1
+        self.num_bins = len(edges) - self.num_meshes
+        self.edges = edges
+        self.edge_offsets = edge_offsets
+        self.flux = np.zeros(self.num_bins, dtype=np.float64)
+        self.flux_squared = np.zeros(self.num_bins, dtype=np.float64)
+
+
+def BuildTallyMeshes(mesh_edges):
+    """
+    TallyMeshes from a list of edge vectors (one per mesh)
+    """
+    edge_offsets = np.zeros(len(mesh_edges)+1, dtype=np.int64)
+    for m in range(len(mesh_edges)):
+        edge_offsets[m+1] = edge_offsets[m] + len(mesh_edges[m])
+
+    if len(mesh_edges) > 0:
+        edges = np.concatenate([np.asarray(e, dtype=np.float64) for e in mesh_edges])
+    else:
+        edges = np.zeros(0, dtype=np.float64)
+
+    return(TallyMeshes(edges, edge_offsets))
+
+
+def ScoreSegment(x0, x1, dist, edges, edge_offsets, tally, tally_squared):
+    """
+    Splits a flight of length dist from x0 to x1 across the bins of every
+    tally mesh it crosses and scores the track length in each bin
+    """
+    if dist <= 0:
+        return
+
+    lo = min(x0, x1)
+    hi = max(x0, x1)
+
+    for m in range(len(edge_offsets)-1):
+        start = edge_offsets[m]
+        end = edge_offsets[m+1]
+        bin0 = start - m
+
+        if (hi < edges[start]) or (lo >= edges[end-1]):
+            continue
+
+        if hi == lo:
+            #flight parallel to the bin surfaces, all in one bin
+            b = np.searchsorted(edges[start:end], lo, side='right') - 1
+            if 0 <= b < end-start-1:
+                tally[bin0+b] += dist
+                tally_squared[bin0+b] += dist**2
+            continue
+
+        scale = dist/(hi-lo)
+        b = max(np.searchsorted(edges[start:end], lo, side='right') - 1, 0)
+        while (b < end-start-1) and (edges[start+b] < hi):
+            length = (min(hi, edges[start+b+1]) - max(lo, edges[start+b]))*scale
+            if length > 0:
+                tally[bin0+b] += length
+                tally_squared[bin0+b] += length**2
+            b += 1
+
+
+def ScoreCollision(x, score, edges, edge_offsets, tally, tally_squared):
+    """
+    Scores a collision estimate at x into the bin of every tally mesh that
+    holds it
+    """
+    for m in range(len(edge_offsets)-1):
+        start = edge_offsets[m]
+        end = edge_offsets[m+1]
+        b = np.searchsorted(edges[start:end], x, side='right') - 1
+        if 0 <= b < end-start-1:
+            tally[start-m+b] += score
+            tally_squared[start-m+b] += score**2
+
+
+def test_ScoreSegment():
+    meshes = BuildTallyMeshes([np.linspace(0, 1, 11), np.array([0.0, 0.5, 1.0])])
+    assert(meshes.num_meshes == 2)
+    assert(meshes.num_bins == 12)
+
+    #mu = 0.5, crosses [0.25, 0.55] so the track is twice as long as the x span
+    ScoreSegment(0.55, 0.25, 0.6, meshes.edges, meshes.edge_offsets, meshes.flux, meshes.flux_squared)
+
+    assert(np.allclose(meshes.flux[:10], [0, 0, .1, .2, .2, .1, 0, 0, 0, 0]))
+    assert(np.allclose(meshes.flux[10:], [.5, .1]))
+
+    ScoreCollision(0.95, 2.0, meshes.edges, meshes.edge_offsets, meshes.flux, meshes.flux_squared)
+    assert(np.isclose(meshes.flux[9], 2.0))
+
+
+if __name__ == '__main__':
+    test_ScoreSegment()
@@ -0,0 +1,82 @@
+"""
+Name: SurfaceTally
+breif: Surface crossing current tallies binned by direction cosine and time for MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+class SurfaceTally:
+    """
+    Particles crossing every surface, binned by direction cosine and
+    crossing time. Same layout as the Numba jitclass in
+    mcdc_tnt.numba_kernels.tally_surface, bin (surface, mu, time) is
+    (s*num_mu_bins + m)*num_time_bins + t
+
+    Attributes
+    ----------
+    num_surfaces, num_mu_bins, num_time_bins : int
+        number of surfaces, direction cosine bins and time bins.
+    surfaces : vector double
+        x location of every surface.
+    mu_edges : vector double
+        sorted direction cosine bin edges on [-1, 1].
+    time_edges : vector double
+        sorted crossing time bin edges.
+    current : vector double
+        number of crossings in every bin.
+    """
+
+    def __init__(self, surfaces, mu_edges, time_edges):
+        self.num_surfaces = len(surfaces)
+        self.num_mu_bins = len(mu_edges)-1
+        self.num_time_bins = len(time_edges)-1
+        self.surfaces = surfaces
+        self.mu_edges = mu_edges
+        self.time_edges = time_edges
+        self.current = np.zeros(self.num_surfaces*self.num_mu_bins*self.num_time_bins, dtype=np.float64)
+
+
+def ScoreCrossings(x0, x1, t0, t1, mu, surfaces, mu_edges, time_edges, tally, weight=1.0):
+    """
+    Scores every surface crossed by a flight from x0 (time t0) to x1 (time
+    t1) with direction cosine mu and statistical weight
+    """
+    if x0 == x1:
+        return
+
+    num_mu_bins = len(mu_edges)-1
+    num_time_bins = len(time_edges)-1
+    m = np.searchsorted(mu_edges, mu, side='right') - 1
+    m = min(max(m, 0), num_mu_bins-1)
+
+    for s in range(len(surfaces)):
+        xs = surfaces[s]
+        if (x0 < xs) != (x1 < xs):
+            t = t0 + (t1-t0)*(xs-x0)/(x1-x0)
+            b = np.searchsorted(time_edges, t, side='right') - 1
+            if 0 <= b < num_time_bins:
+                tally[(s*num_mu_bins + m)*num_time_bins + b] += weight
+
+
+def test_ScoreCrossings():
+    surface_tally = SurfaceTally(np.array([0.0, 0.5, 1.0]), np.array([-1.0, 0.0, 1.0]),
+                                 np.array([0.0, 1.0, 10.0]))
+
+    #right through the middle surface at t = 1.5 and out the right at t = 2
+    ScoreCrossings(0.25, 1.0 + 1e-10, 1.25, 2.0, 1.0, surface_tally.surfaces,
+                   surface_tally.mu_edges, surface_tally.time_edges, surface_tally.current)
+    assert(surface_tally.current[(1*2 + 1)*2 + 1] == 1)
+    assert(surface_tally.current[(2*2 + 1)*2 + 1] == 1)
+
+    #out the left at t = .5
+    ScoreCrossings(0.25, -1e-10, 0.25, 0.5, -1.0, surface_tally.surfaces,
+                   surface_tally.mu_edges, surface_tally.time_edges, surface_tally.current)
+    assert(surface_tally.current[0] == 1)
+    assert(np.sum(surface_tally.current) == 3)
+
+
+if __name__ == '__main__':
+    test_ScoreCrossings()
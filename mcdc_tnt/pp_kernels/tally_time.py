@@ -0,0 +1,121 @@
+"""
+Name: TimeTally
+breif: Time binned track length tally of the material mesh for MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+class TimeTally:
+    """
+    Track length flux of every material mesh cell in every time bin. Same
+    layout as the Numba jitclass in mcdc_tnt.numba_kernels.tally_time, bin
+    (t, cell) is t*num_cells + cell and only the bins that scored are kept
+
+    Attributes
+    ----------
+    num_cells : int
+        number of material mesh cells.
+    num_time_bins : int
+        number of time bins.
+    time_edges : vector double
+        sorted time bin edges, flights past the last edge are not scored.
+    tally, tally_squared : dict
+        track length (and squared) tally of every bin that scored.
+    bins : vector int
+        sorted bins that scored, as of the last MergeTimeTally.
+    flux, flux_squared : vector double [len(bins)]
+        track length (and squared) tally of those bins.
+    """
+
+    def __init__(self, time_edges, num_cells):
+        self.num_cells = num_cells
+        self.num_time_bins = len(time_edges)-1
+        self.time_edges = time_edges
+        self.tally = {}
+        self.tally_squared = {}
+        self.bins = np.zeros(0, dtype=np.int64)
+        self.flux = np.zeros(0, dtype=np.float64)
+        self.flux_squared = np.zeros(0, dtype=np.float64)
+
+    def dense_flux(self):
+        """
+        Flux of all num_time_bins*num_cells bins, zero where nothing scored
+        """
+        flux = np.zeros(self.num_time_bins*self.num_cells, dtype=np.float64)
+        flux[self.bins] = self.flux
+        return(flux)
+
+
+def ScoreTimeSegment(cell, t0, t1, dist, time_edges, num_cells, tally, tally_squared):
+    """
+    Splits a flight of length dist in cell, from time t0 to t1, across the
+    time bins it crosses (tally and tally_squared are dicts by bin)
+    """
+    num_time_bins = len(time_edges)-1
+    if (dist <= 0) or (cell < 0) or (cell >= num_cells):
+        return
+    if (t1 < time_edges[0]) or (t0 >= time_edges[num_time_bins]):
+        return
+
+    if t1 == t0:
+        b = np.searchsorted(time_edges, t0, side='right') - 1
+        if 0 <= b < num_time_bins:
+            AddTimeScore(b*num_cells + cell, dist, tally, tally_squared)
+        return
+
+    scale = dist/(t1-t0)
+    b = max(np.searchsorted(time_edges, t0, side='right') - 1, 0)
+    while (b < num_time_bins) and (time_edges[b] < t1):
+        length = (min(t1, time_edges[b+1]) - max(t0, time_edges[b]))*scale
+        if length > 0:
+            AddTimeScore(b*num_cells + cell, length, tally, tally_squared)
+        b += 1
+
+
+def ScoreTimeCollision(cell, t, score, time_edges, num_cells, tally, tally_squared):
+    """
+    Scores a collision estimate in cell at time t into its time bin
+    """
+    b = np.searchsorted(time_edges, t, side='right') - 1
+    if (0 <= b < len(time_edges)-1) and (0 <= cell < num_cells):
+        AddTimeScore(b*num_cells + cell, score, tally, tally_squared)
+
+
+def AddTimeScore(b, score, tally, tally_squared):
+    """
+    Adds score to bin b, the bin is created the first time it scores
+    """
+    tally[b] = tally.get(b, 0.0) + score
+    tally_squared[b] = tally_squared.get(b, 0.0) + score**2
+
+
+def MergeTimeTally(time_tally):
+    """
+    Copies the scored bins (sorted) and their tallies into bins, flux and
+    flux_squared
+    """
+    bins = sorted(time_tally.tally)
+    time_tally.bins = np.array(bins, dtype=np.int64)
+    time_tally.flux = np.array([time_tally.tally[b] for b in bins], dtype=np.float64)
+    time_tally.flux_squared = np.array([time_tally.tally_squared[b] for b in bins], dtype=np.float64)
+
+
+def test_ScoreTimeSegment():
+    time_tally = TimeTally(np.array([0.0, 1.0, 2.0, 4.0]), 2)
+
+    #speed 2, from t = .5 to 2.5 in cell 1
+    ScoreTimeSegment(1, 0.5, 2.5, 4.0, time_tally.time_edges, 2, time_tally.tally, time_tally.tally_squared)
+    MergeTimeTally(time_tally)
+    assert(np.array_equal(time_tally.bins, [1, 3, 5]))
+    assert(np.allclose(time_tally.flux, [1, 2, 1]))
+
+    ScoreTimeCollision(0, 3.0, 2.0, time_tally.time_edges, 2, time_tally.tally, time_tally.tally_squared)
+    MergeTimeTally(time_tally)
+    assert(np.allclose(time_tally.dense_flux(), [0, 1, 0, 2, 2, 1]))
+
+
+if __name__ == '__main__':
+    test_ScoreTimeSegment()
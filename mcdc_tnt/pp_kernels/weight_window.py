@@ -0,0 +1,167 @@
+"""
+Name: WeightWindow
+breif: Splitting and Russian roulette against per cell weight windows for MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+import math
+import numpy as np
+from mcdc_tnt.pp_kernels.particle_bank import ParticleBank
+from mcdc_tnt.pp_kernels.rng import Rand, ChildId
+from mcdc_tnt.pp_kernels.sample_event import Roulette
+
+
+# rows of the weight window array
+WW_LOWER = 0
+WW_SURVIVAL = 1
+WW_UPPER = 2
+
+# most copies a particle is split into per collision, heavier particles are
+# split again at their next collision
+MAX_SPLIT = 10
+
+
+def WeightWindow(bank, scatter_event_index, scat_count, weight_windows):
+    """
+    Plays the scattered particles against the weight window of their cell.
+    Particles above the upper bound are split into equal weight copies
+    appended to the bank, particles below the lower bound play Russian
+    roulette for the survival weight (losers are marked dead and purged
+    with the rest)
+
+    Parameters
+    ----------
+    bank : ParticleBank
+        PSV: phase space of particles under transport, split copies are
+        appended after the first bank.num_part particles (the bank is grown
+        first if they would not fit). Copy j of particle p gets its p_id
+        from draw j+1 of p's stream, roulette uses draw 0.
+    scatter_event_index : vector int
+        indicies of particles that scattered in sample event.
+    scat_count : int
+        how many scatters where recorded in sample event.
+    weight_windows : array double [3, N_mesh]
+        lower bound, survival weight and upper bound of every mesh cell.
+
+    Returns
+    -------
+    Number of particles added by splitting and number killed by roulette.
+
+    """
+    N_mesh = weight_windows.shape[1]
+
+    # grow the bank (geometrically) before anything is written past num_part
+    num_new = 0
+    for k in range(scat_count):
+        i = scatter_event_index[k]
+        cell = bank.p_mesh_cell[i]
+        if (0 <= cell < N_mesh) and (bank.p_weight[i] > weight_windows[WW_UPPER, cell]):
+            num_new += min(math.ceil(bank.p_weight[i]/weight_windows[WW_UPPER, cell]), MAX_SPLIT) - 1
+    bank.reserve(bank.num_part + num_new)
+
+    p_pos_x = bank.p_pos_x
+    p_pos_y = bank.p_pos_y
+    p_pos_z = bank.p_pos_z
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
+    p_speed = bank.p_speed
+    p_time = bank.p_time
+    p_weight = bank.p_weight
+    p_mesh_cell = bank.p_mesh_cell
+    p_group = bank.p_group
+    p_alive = bank.p_alive
+    p_id = bank.p_id
+    seed = bank.seed
+    event = bank.next_event()
+    num_part = bank.num_part
+
+    added = 0
+    killed = 0
+    for k in range(scat_count):
+        i = scatter_event_index[k]
+        cell = p_mesh_cell[i]
+        if (cell < 0) or (cell >= N_mesh):
+            continue
+
+        if p_weight[i] > weight_windows[WW_UPPER, cell]:
+            n = min(math.ceil(p_weight[i]/weight_windows[WW_UPPER, cell]), MAX_SPLIT)
+            p_weight[i] /= n
+            for j in range(n-1):
+                o = num_part + added
+                p_pos_x[o] = p_pos_x[i]
+                p_pos_y[o] = p_pos_y[i]
+                p_pos_z[o] = p_pos_z[i]
+                p_dir_x[o] = p_dir_x[i]
+                p_dir_y[o] = p_dir_y[i]
+                p_dir_z[o] = p_dir_z[i]
+                p_speed[o] = p_speed[i]
+                p_time[o] = p_time[i]
+                p_weight[o] = p_weight[i]
+                p_mesh_cell[o] = cell
+                p_group[o] = p_group[i]
+                p_alive[o] = True
+                p_id[o] = ChildId(seed, p_id[i], event, j+1)
+                added += 1
+
+        elif p_weight[i] < weight_windows[WW_LOWER, cell]:
+            p_weight[i] = Roulette(Rand(seed, p_id[i], event, 0), p_weight[i], weight_windows[WW_SURVIVAL, cell])
+            if p_weight[i] == 0.0:
+                p_alive[i] = False
+                killed += 1
+
+    bank.num_part = num_part + added
+
+    return(added, killed)
+
+
+
+def test_WeightWindow():
+    bank = ParticleBank(3)
+    bank.num_part = 3
+    bank.p_pos_x[:] = np.array([.1, .5, .9])
+    bank.p_mesh_cell[:] = np.array([0, 1, 2])
+    bank.p_dir_x[:] = 1
+    bank.p_alive[:] = True
+    bank.p_id[:] = np.arange(3)
+    bank.p_weight[:] = np.array([4.5, 1.0, .01])
+
+    #window [.5, 2] everywhere, survival 1.25
+    weight_windows = np.zeros((3, 3))
+    weight_windows[WW_LOWER] = .5
+    weight_windows[WW_SURVIVAL] = 1.25
+    weight_windows[WW_UPPER] = 2
+
+    [added, killed] = WeightWindow(bank, np.array([0, 1, 2]), 3, weight_windows)
+
+    #4.5 splits into 3 of 1.5, 1 is left alone
+    assert(added == 2)
+    assert(bank.num_part == 5)
+    assert(np.allclose(bank.p_weight[[0, 3, 4]], 1.5))
+    assert(np.allclose(bank.p_pos_x[3:5], .1))
+    assert(np.all(bank.p_mesh_cell[3:5] == 0))
+    assert(len(np.unique(bank.p_id[:5])) == 5)
+    assert(bank.p_weight[1] == 1.0)
+
+    #.01 survives roulette with weight 1.25 or dies
+    if killed == 1:
+        assert(bank.p_alive[2] == False)
+    else:
+        assert(bank.p_weight[2] == 1.25)
+
+    #weight is conserved on average
+    num_part = 10000
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_mesh_cell[:] = 0
+    bank.p_alive[:] = True
+    bank.p_id[:] = np.arange(num_part)
+    bank.p_weight[:] = .1
+    WeightWindow(bank, np.arange(num_part), num_part, weight_windows)
+    total = np.sum(bank.p_weight[:num_part]*bank.p_alive[:num_part])
+    assert(abs(total - .1*num_part)/(.1*num_part) < .05)
+
+
+
+if __name__ == '__main__':
+    test_WeightWindow()
@@ -0,0 +1,76 @@
+"""
+Name: AdvanceWorkspace
+breif: Persistent scratch vectors for the Advance kernels of MCDC-TNT (Pure Python)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+class AdvanceWorkspace:
+    """
+    Scratch vectors Advance needs on every sub-step. Create once per
+    simulation (sized like the bank) and pass to every Advance call. Same
+    layout as the Numba jitclass in mcdc_tnt.numba_kernels.workspace
+
+    Attributes
+    ----------
+    capacity : int
+        number of particle slots allocated in every vector.
+    rands : vector double
+        random numbers for distance to collision, refilled in place.
+    p_dist_travled : vector double
+        distance traveled by every particle in the current sub-step.
+    p_end_trans : vector int
+        1 once a particle reached its collision site (or left the slab).
+    active, active_next : vector int
+        worklist of bank indices still streaming (compacted every sub-step).
+    num_sub_steps : int
+        sub-steps the last Advance call took.
+    active_fraction : vector double
+        fraction of the bank still streaming at the start of every sub-step
+        of the last Advance call (first num_sub_steps entries).
+    """
+
+    def __init__(self, capacity):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.rands = np.zeros(capacity, dtype=np.float64)
+        self.p_dist_travled = np.zeros(capacity, dtype=np.float64)
+        self.p_end_trans = np.zeros(capacity, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=np.int64)
+        self.active_next = np.zeros(capacity, dtype=np.int64)
+        self.num_sub_steps = 0
+        self.active_fraction = np.zeros(64, dtype=np.float64)
+
+    def reserve(self, n):
+        """
+        Grows (doubling) to hold at least n particles, contents are not kept.
+        Returns True if the vectors were reallocated
+        """
+        if n <= self.capacity:
+            return False
+
+        new_capacity = self.capacity
+        while new_capacity < n:
+            new_capacity *= 2
+
+        self.rands = np.zeros(new_capacity, dtype=np.float64)
+        self.p_dist_travled = np.zeros(new_capacity, dtype=np.float64)
+        self.p_end_trans = np.zeros(new_capacity, dtype=np.int32)
+        self.active = np.zeros(new_capacity, dtype=np.int64)
+        self.active_next = np.zeros(new_capacity, dtype=np.int64)
+        self.capacity = new_capacity
+        return True
+
+    def record_pass(self, fraction):
+        """
+        Appends the active fraction of one sub-step to the report
+        """
+        if self.num_sub_steps == len(self.active_fraction):
+            grown = np.zeros(2*len(self.active_fraction), dtype=np.float64)
+            grown[:self.num_sub_steps] = self.active_fraction
+            self.active_fraction = grown
+        self.active_fraction[self.num_sub_steps] = fraction
+        self.num_sub_steps += 1
@@ -1,5 +1,7 @@
+from .particle_bank import ParticleBank
+from .workspace import AdvanceWorkspace
 from .advance import Advance, StillIn
-from .cleanup import BringOutYourDead
+from .cleanup import BringOutYourDead, CopyBack, SwapBuffers
 from .fissions_add import FissionsAdd
 from .sample_event import SampleEvent
 from .scatter import Scatter
@@ -1,36 +1,42 @@
 import math
 import numpy as np
 import pykokkos as pk
+from mcdc_tnt.pyk_kernels.all.particle_bank import ParticleBank
+from mcdc_tnt.pyk_kernels.all.workspace import AdvanceWorkspace
+from mcdc_tnt.pyk_kernels.all.rng import philox_rand
 
 
 
 @pk.workload
 class Advance_cycle:
-    def __init__(self, num_part, p_pos_x, p_pos_y, p_pos_z, p_dir_y, p_dir_z, p_dir_x,  p_mesh_cell, p_speed, p_time, dx, mesh_total_xsec, L, p_dist_travled, p_end_trans, rands):
+    def __init__(self, bank, dx, mesh_total_xsec, L, p_dist_travled, p_end_trans, event, draw):
     
-        self.p_pos_x: pk.View1D[pk.double] = p_pos_x
-        self.p_pos_y: pk.View1D[pk.double] = p_pos_y
-        self.p_pos_z: pk.View1D[pk.double] = p_pos_z
+        self.p_pos_x: pk.View1D[pk.double] = bank.p_pos_x
+        self.p_pos_y: pk.View1D[pk.double] = bank.p_pos_y
+        self.p_pos_z: pk.View1D[pk.double] = bank.p_pos_z
         
-        self.p_dir_y: pk.View1D[pk.double] = p_dir_y
-        self.p_dir_z: pk.View1D[pk.double] = p_dir_z
-        self.p_dir_x: pk.View1D[pk.double] = p_dir_x
+        self.p_dir_y: pk.View1D[pk.double] = bank.p_dir_y
+        self.p_dir_z: pk.View1D[pk.double] = bank.p_dir_z
+        self.p_dir_x: pk.View1D[pk.double] = bank.p_dir_x
         
-        self.p_mesh_cell: pk.View1D[int] = p_mesh_cell
-        self.p_speed: pk.View1D[pk.double] = p_speed
-        self.p_time: pk.View1D[pk.double] = p_time
+        self.p_mesh_cell: pk.View1D[int] = bank.p_mesh_cell
+        self.p_speed: pk.View1D[pk.double] = bank.p_speed
+        self.p_time: pk.View1D[pk.double] = bank.p_time
+        self.p_id: pk.View1D[pk.int64] = bank.p_id
         
         self.dx: pk.double = dx
         self.L: pk.double = L
         #print(dx)
         #print(L)
-        self.num_part: int = num_part
+        self.num_part: int = bank.num_part
         
         self.mesh_total_xsec: pk.View1D[pk.double] = mesh_total_xsec
         
         self.p_dist_travled: pk.View1D[pk.double] = p_dist_travled
         self.p_end_trans: pk.View1D[int] = p_end_trans
-        self.rands: pk.View1D[pk.double] = rands
+        self.seed: int = bank.seed
+        self.event: int = event
+        self.draw: int = draw
         
     @pk.main
     def run(self):
@@ -47,7 +53,7 @@ class Advance_cycle:
                 self.p_end_trans[i] = 1
                 
             else:
-                dist: pk.double = -math.log(self.rands[i]) / self.mesh_total_xsec[self.p_mesh_cell[i]]
+                dist: pk.double = -math.log(philox_rand(self.seed, self.p_id[i], self.event, self.draw)) / self.mesh_total_xsec[self.p_mesh_cell[i]]
                 
                 #pk.printf('%d   %f    %f     %f\n', i, dist, rands[i], mesh_total_xsec[p_mesh_cell[i]])
                 
@@ -80,6 +86,11 @@ class Advance_cycle:
 
 @pk.workload
 class DistTraveled:
+    """
+    Scores the track lengths of the last sub-step in parallel (atomic adds
+    into the mesh tallies) and reduces the number of particles that finished
+    transport into clever_out[1], clever_out[0] is 1 once all have
+    """
     def __init__(self, num_part, max_mesh_index, mesh_dist_traveled_pk, mesh_dist_traveled_squared_pk, p_dist_travled, mesh, p_end_trans, clever_out):
         self.num_part: int = num_part
         self.max_mesh_index: int = max_mesh_index
@@ -92,25 +103,21 @@ class DistTraveled:
     
     @pk.main
     def distTraveled_main(self):
-        end_flag: int = 1
-        cur_cell: int = 0
-        summer: int = 0
-        #pk.printf('1   %d\n', cur_cell)
-        #pk.printf('3   %f\n', mesh_dist_traveled_pk[cur_cell])
+        summer: int = pk.parallel_reduce(self.num_part, self.distTraveled_wu)
         
-        for i in range(self.num_part):
-            cur_cell = int(self.mesh[i])
-            if (0 < cur_cell) and (cur_cell < self.max_mesh_index):
-                self.mesh_dist_traveled_pk[cur_cell] += self.p_dist_travled[i]
-                self.mesh_dist_traveled_squared_pk[cur_cell] += self.p_dist_travled[i]**2
-                
-            if self.p_end_trans[i] == 0:
-                end_flag = 0
-                
-            summer += p_end_trans[i]
-            
-        clever_out[0] = end_flag
-        clever_out[1] = summer
+        self.clever_out[0] = 0
+        if summer == self.num_part:
+            self.clever_out[0] = 1
+        self.clever_out[1] = summer
+    
+    @pk.workunit
+    def distTraveled_wu(self, i: int, acc: pk.Acc[int]):
+        cur_cell: int = self.mesh[i]
+        if (0 < cur_cell) and (cur_cell < self.max_mesh_index):
+            pk.atomic_add(self.mesh_dist_traveled_pk, [cur_cell], self.p_dist_travled[i])
+            pk.atomic_add(self.mesh_dist_traveled_squared_pk, [cur_cell], self.p_dist_travled[i]*self.p_dist_travled[i])
+        
+        acc += self.p_end_trans[i]
 
 #@pk.workunit
 #def CellSum
@@ -118,36 +125,36 @@ class DistTraveled:
 
     
 #@profile
-def Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time,
-            num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L):
+def Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L, workspace):
             
+    num_part = bank.num_part
+    workspace.reserve(num_part)
     
     max_mesh_index = int(len(mesh_total_xsec)-1)
     
-    p_end_trans: pk.View1D[int] = pk.View([num_part], int) #flag
-    p_end_trans.fill(0)
-    p_dist_travled: pk.View1D[pk.double] = pk.View([num_part], pk.double)
+    p_end_trans = workspace.p_end_trans #flag
+    p_dist_travled = workspace.p_dist_travled
+    pre_p_mesh = workspace.pre_p_mesh
+    workspace.host['p_end_trans'][:num_part] = 0
     
     clever_out: pk.View1D[int] = pk.View([4], int)
     
     end_flag = 0
     cycle_count = 0
+    L = float(L)
+    summer = 0
+    workspace.num_sub_steps = 0
+    event = bank.next_event()
     
     while end_flag == 0:
-        #allocate randoms
-        summer = 0
-        rands_np = np.random.random([num_part])
-        rands = pk.from_numpy(rands_np)
-        #vector of indicies for particle transport
+        workspace.record_pass((num_part-summer)/num_part)
         
-        p = pk.RangePolicy(pk.get_default_space(), 0, num_part)
-        p_dist_travled.fill(0)
-        
-        pre_p_mesh = p_mesh_cell
-        L = float(L)
+        #zero segments through the backing arrays, sub-step n takes draw n
+        workspace.host['p_dist_travled'][:num_part] = 0
+        workspace.host['pre_p_mesh'][:num_part] = bank.host['p_mesh_cell'][:num_part] #cell each segment was tracked in
         
         #space = pk.ExecutionSpace.OpenMP
-        pk.execute(pk.ExecutionSpace.OpenMP, Advance_cycle(num_part, p_pos_x, p_pos_y, p_pos_z, p_dir_y, p_dir_z, p_dir_x, p_mesh_cell, p_speed, p_time, dx, mesh_total_xsec, L, p_dist_travled, p_end_trans, rands))#pk for number still in transport
+        pk.execute(pk.ExecutionSpace.OpenMP, Advance_cycle(bank, dx, mesh_total_xsec, L, p_dist_travled, p_end_trans, event, workspace.num_sub_steps))#pk for number still in transport
         
         pk.execute(pk.ExecutionSpace.OpenMP,
             DistTraveled(num_part, max_mesh_index, mesh_dist_traveled, mesh_dist_traveled_squared, p_dist_travled, pre_p_mesh, p_end_trans, clever_out))
@@ -159,7 +166,7 @@ def Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_
         if (cycle_count > int(1e3)):
             print("************ERROR**********")
             print(" Max itter hit")
-            print(p_end_trans)
+            print(workspace.host['p_end_trans'][:num_part])
             print()
             print()
             return()
@@ -173,13 +180,13 @@ def Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_
 
 @pk.workload
 class StillIn:
-    def __init__(self, p_pos_x, surface_distances, p_alive, num_part, clever_out):
+    def __init__(self, bank, surface_distances, clever_out):
     
-        self.p_pos_x: pk.View1D[pk.double] = p_pos_x
+        self.p_pos_x: pk.View1D[pk.double] = bank.p_pos_x
         self.clever_out: pk.View1D[int] = clever_out
         self.surface_distances: pk.View1D[pk.double] = surface_distances
-        self.p_alive: pk.View1D[int] = p_alive
-        self.num_part: int = num_part
+        self.p_alive: pk.View1D[int] = bank.p_alive
+        self.num_part: int = bank.num_part
         
     @pk.main
     def run(self):
@@ -203,41 +210,11 @@ def speedTestAdvance():
     num_part = int(1e8)
     phase_parts = num_parts
     
-    p_pos_x_np = np.zeros(phase_parts, dtype=float)
-    p_pos_y_np = np.zeros(phase_parts, dtype=float)
-    p_pos_z_np = np.zeros(phase_parts, dtype=float)
+    bank = ParticleBank(phase_parts)
+    bank.num_part = num_part
     
-    p_pos_x = pk.from_numpy(p_pos_x_np)
-    p_pos_y = pk.from_numpy(p_pos_y_np)
-    p_pos_z = pk.from_numpy(p_pos_z_np)
     
-    # Direction
-    p_dir_x_np = np.zeros(phase_parts, dtype=float)
-    p_dir_y_np = np.zeros(phase_parts, dtype=float)
-    p_dir_z_np = np.zeros(phase_parts, dtype=float)
-    
-    p_dir_x = pk.from_numpy(p_dir_x_np)
-    p_dir_y = pk.from_numpy(p_dir_y_np)
-    p_dir_z = pk.from_numpy(p_dir_z_np)
-    
-    # Speed
-    p_speed_np = np.zeros(phase_parts, dtype=float)
-    p_speed = pk.from_numpy(p_speed_np)
-    
-    # Time
-    p_time_np = np.zeros(phase_parts, dtype=float)
-    p_time = pk.from_numpy(p_time_np)
-    
-    # Region
-    p_mesh_cell_np = np.zeros(phase_parts, dtype=np.int32)
-    p_mesh_cell = pk.from_numpy(p_mesh_cell_np)
-    
-    # Flags
-    p_alive_np = np.full(phase_parts, False, dtype=np.int32)
-    p_alive = pk.from_numpy(p_alive_np)
-    
-    
-    kernels.Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, surface_distances[len(surface_distances)-1])
+    kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, surface_distances[len(surface_distances)-1], AdvanceWorkspace(phase_parts))
     
     
 """   
@@ -285,16 +262,23 @@ def test_StillIn():
     
     num_part = 7
     surface_distances = [0,.25,.75,1]
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
-    p_alive = np.ones(num_part, bool)
+    surface_distances = pk.from_numpy(np.array(surface_distances, dtype=float))
+    clever_out = pk.from_numpy(np.zeros(4, dtype=np.int32))
+    
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
+    bank.p_alive[:] = 1
     
-    [p_alive, tally_left, tally_right] = StillIn(p_pos_x, surface_distances, p_alive, num_part)
+    pk.execute(pk.ExecutionSpace.OpenMP, StillIn(bank, surface_distances, clever_out))
+    tally_left = clever_out[0]
+    tally_right = clever_out[1]
     
-    assert(p_alive[0] == False)
-    assert(p_alive[5] == False)
+    assert(bank.p_alive[0] == False)
+    assert(bank.p_alive[5] == False)
     assert(tally_left == 2)
     assert(tally_right == 2)
-    assert(p_alive[2:4].all() == True)
+    assert(bank.p_alive[2:4].all() == True)
 
 
 if __name__ == '__main__':
@@ -6,32 +6,183 @@ Date: Dec 2nd 2021
 """
 import pykokkos as pk
 import numpy as np
+from mcdc_tnt.pyk_kernels.all.particle_bank import ParticleBank
 
 @pk.workload
 class BringOutYourDead:
-    def __init__ (self,p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_part, clever_out):
-        self.p_pos_x: pk.View1D[pk.double] = p_pos_x
-        self.p_pos_y: pk.View1D[pk.double] = p_pos_y
-        self.p_pos_z: pk.View1D[pk.double] = p_pos_z
+    """
+    Stream compaction of the particle bank: a parallel exclusive scan over the
+    alive flags gives every live particle its new slot, on the final pass it
+    is scattered into the second (spare) bank. Kept count is returned in
+    clever_out[0]. Follow with SwapBuffers (no copy) or CopyBack
+    """
+    def __init__ (self, bank, spare, clever_out):
+        # runs on the host, make sure the scatter target fits before binding
+        spare.num_part = 0
+        spare.reserve(bank.num_part)
         
-        self.p_dir_x: pk.View1D[pk.double] = p_dir_x
-        self.p_dir_y: pk.View1D[pk.double] = p_dir_y
-        self.p_dir_z: pk.View1D[pk.double] = p_dir_z
+        self.p_pos_x: pk.View1D[pk.double] = bank.p_pos_x
+        self.p_pos_y: pk.View1D[pk.double] = bank.p_pos_y
+        self.p_pos_z: pk.View1D[pk.double] = bank.p_pos_z
         
-        self.p_mesh_cell: pk.View1D[int] = p_mesh_cell
-        self.p_speed: pk.View1D[pk.double] = p_speed
-        self.p_time: pk.View1D[pk.double] = p_time
-        self.p_alive: pk.View1D[int] = p_alive
+        self.p_dir_x: pk.View1D[pk.double] = bank.p_dir_x
+        self.p_dir_y: pk.View1D[pk.double] = bank.p_dir_y
+        self.p_dir_z: pk.View1D[pk.double] = bank.p_dir_z
         
-        self.num_part: int = num_part
+        self.p_mesh_cell: pk.View1D[int] = bank.p_mesh_cell
+        self.p_speed: pk.View1D[pk.double] = bank.p_speed
+        self.p_time: pk.View1D[pk.double] = bank.p_time
+        self.p_alive: pk.View1D[int] = bank.p_alive
+        self.p_id: pk.View1D[pk.int64] = bank.p_id
+        
+        self.o_pos_x: pk.View1D[pk.double] = spare.p_pos_x
+        self.o_pos_y: pk.View1D[pk.double] = spare.p_pos_y
+        self.o_pos_z: pk.View1D[pk.double] = spare.p_pos_z
+        
+        self.o_dir_x: pk.View1D[pk.double] = spare.p_dir_x
+        self.o_dir_y: pk.View1D[pk.double] = spare.p_dir_y
+        self.o_dir_z: pk.View1D[pk.double] = spare.p_dir_z
+        
+        self.o_mesh_cell: pk.View1D[int] = spare.p_mesh_cell
+        self.o_speed: pk.View1D[pk.double] = spare.p_speed
+        self.o_time: pk.View1D[pk.double] = spare.p_time
+        self.o_alive: pk.View1D[int] = spare.p_alive
+        self.o_id: pk.View1D[pk.int64] = spare.p_id
+        
+        self.num_part: int = bank.num_part
+        
+        self.clever_out: pk.View1D[int] = clever_out
+        
+    @pk.main
+    def BOYD(self):
+        kept: int = pk.parallel_scan(self.num_part, self.compact_wu)
+        self.clever_out[0] = kept
+    
+    @pk.workunit
+    def compact_wu(self, i: int, acc: pk.Acc[int], last_pass: bool):
+        if self.p_alive[i] == 1:
+            if last_pass:
+                # acc is the exclusive prefix here
+                self.o_pos_x[acc] = self.p_pos_x[i]
+                self.o_pos_y[acc] = self.p_pos_y[i]
+                self.o_pos_z[acc] = self.p_pos_z[i]
+                
+                # Direction
+                self.o_dir_x[acc] = self.p_dir_x[i]
+                self.o_dir_y[acc] = self.p_dir_y[i]
+                self.o_dir_z[acc] = self.p_dir_z[i]
+                
+                # Speed
+                self.o_speed[acc] = self.p_speed[i]
+                
+                # Time
+                self.o_time[acc] = self.p_time[i]
+                
+                # Regions
+                self.o_mesh_cell[acc] = self.p_mesh_cell[i]
+                
+                # Flags
+                self.o_alive[acc] = 1
+                self.o_id[acc] = self.p_id[i]
+            acc += 1
+
+
+@pk.workload
+class CopyBack:
+    """
+    Copies the first kept particles of spare back into bank
+    """
+    def __init__ (self, spare, bank, kept):
+        self.p_pos_x: pk.View1D[pk.double] = bank.p_pos_x
+        self.p_pos_y: pk.View1D[pk.double] = bank.p_pos_y
+        self.p_pos_z: pk.View1D[pk.double] = bank.p_pos_z
+        
+        self.p_dir_x: pk.View1D[pk.double] = bank.p_dir_x
+        self.p_dir_y: pk.View1D[pk.double] = bank.p_dir_y
+        self.p_dir_z: pk.View1D[pk.double] = bank.p_dir_z
+        
+        self.p_mesh_cell: pk.View1D[int] = bank.p_mesh_cell
+        self.p_speed: pk.View1D[pk.double] = bank.p_speed
+        self.p_time: pk.View1D[pk.double] = bank.p_time
+        self.p_alive: pk.View1D[int] = bank.p_alive
+        self.p_id: pk.View1D[pk.int64] = bank.p_id
+        
+        self.o_pos_x: pk.View1D[pk.double] = spare.p_pos_x
+        self.o_pos_y: pk.View1D[pk.double] = spare.p_pos_y
+        self.o_pos_z: pk.View1D[pk.double] = spare.p_pos_z
+        
+        self.o_dir_x: pk.View1D[pk.double] = spare.p_dir_x
+        self.o_dir_y: pk.View1D[pk.double] = spare.p_dir_y
+        self.o_dir_z: pk.View1D[pk.double] = spare.p_dir_z
+        
+        self.o_mesh_cell: pk.View1D[int] = spare.p_mesh_cell
+        self.o_speed: pk.View1D[pk.double] = spare.p_speed
+        self.o_time: pk.View1D[pk.double] = spare.p_time
+        self.o_alive: pk.View1D[int] = spare.p_alive
+        self.o_id: pk.View1D[pk.int64] = spare.p_id
+        
+        self.kept: int = kept
+    
+    @pk.main
+    def run(self):
+        pk.parallel_for(self.kept, self.copy_wu)
+    
+    @pk.workunit
+    def copy_wu(self, i: int):
+        self.p_pos_x[i] = self.o_pos_x[i]
+        self.p_pos_y[i] = self.o_pos_y[i]
+        self.p_pos_z[i] = self.o_pos_z[i]
+        self.p_dir_x[i] = self.o_dir_x[i]
+        self.p_dir_y[i] = self.o_dir_y[i]
+        self.p_dir_z[i] = self.o_dir_z[i]
+        self.p_mesh_cell[i] = self.o_mesh_cell[i]
+        self.p_speed[i] = self.o_speed[i]
+        self.p_time[i] = self.o_time[i]
+        self.p_alive[i] = self.o_alive[i]
+        self.p_id[i] = self.o_id[i]
+
+
+def SwapBuffers(bank, spare):
+    """
+    Exchanges the PSV columns (views, host arrays and capacity) of two banks
+    """
+    for name, dtype in ParticleBank.columns:
+        col = getattr(bank, name)
+        setattr(bank, name, getattr(spare, name))
+        setattr(spare, name, col)
+    bank.host, spare.host = spare.host, bank.host
+    bank.capacity, spare.capacity = spare.capacity, bank.capacity
+
+
+@pk.workload
+class BringOutYourDead_serial:
+    """
+    Serial in place compaction, kept as the reference for BringOutYourDead
+    """
+    def __init__ (self, bank, clever_out):
+        self.p_pos_x: pk.View1D[pk.double] = bank.p_pos_x
+        self.p_pos_y: pk.View1D[pk.double] = bank.p_pos_y
+        self.p_pos_z: pk.View1D[pk.double] = bank.p_pos_z
+        
+        self.p_dir_x: pk.View1D[pk.double] = bank.p_dir_x
+        self.p_dir_y: pk.View1D[pk.double] = bank.p_dir_y
+        self.p_dir_z: pk.View1D[pk.double] = bank.p_dir_z
+        
+        self.p_mesh_cell: pk.View1D[int] = bank.p_mesh_cell
+        self.p_speed: pk.View1D[pk.double] = bank.p_speed
+        self.p_time: pk.View1D[pk.double] = bank.p_time
+        self.p_alive: pk.View1D[int] = bank.p_alive
+        self.p_id: pk.View1D[pk.int64] = bank.p_id
+        
+        self.num_part: int = bank.num_part
         
         self.clever_out: pk.View1D[int] = clever_out
         
     @pk.main
     def BOYD(self):
         kept: int = 0
-        for i in range(num_part):
-            if p_alive[i] == 1:
+        for i in range(self.num_part):
+            if self.p_alive[i] == 1:
                 self.p_pos_x[kept] = self.p_pos_x[i]
                 self.p_pos_y[kept] = self.p_pos_y[i]
                 self.p_pos_z[kept] = self.p_pos_z[i]
@@ -52,6 +203,7 @@ class BringOutYourDead:
                 
                 # Flags
                 self.p_alive[kept] = self.p_alive[i] 
+                self.p_id[kept] = self.p_id[i]
                 kept +=1
         #pk.printf('>>>>> %d\n particles kept', kept)
         self.clever_out[0] = kept
@@ -65,57 +217,50 @@ def test_BOYD():
     
     num_part = 3
     
-    p_pos_x_np = np.array([1,2,3], dtype=float)
-    p_pos_y_np = np.array([1,2,3], dtype=float)
-    p_pos_z_np = np.array([1,2,3], dtype=float)
-    
-    p_mesh_cell_np = np.array([1,2,3], dtype=np.int32)
+    bank = ParticleBank(num_part)
+    bank.num_part = num_part
     
-    p_dir_x_np = np.array([1,2,3], dtype=float)
-    p_dir_y_np = np.array([1,2,3], dtype=float)
-    p_dir_z_np = np.array([1,2,3], dtype=float)
+    bank.p_pos_x[:] = np.array([1,2,3], dtype=float)
+    bank.p_pos_y[:] = np.array([1,2,3], dtype=float)
+    bank.p_pos_z[:] = np.array([1,2,3], dtype=float)
     
-    p_speed_np = np.array([1,2,3], dtype=float)
-    p_time_np = np.array([1,2,3], dtype=float)
-    p_alive_np = np.array([0,1,0], dtype=np.int32)
+    bank.p_mesh_cell[:] = np.array([1,2,3], dtype=np.int32)
     
-    p_pos_x = pk.from_numpy(p_pos_x_np)
-    p_pos_y = pk.from_numpy(p_pos_y_np)
-    p_pos_z = pk.from_numpy(p_pos_z_np)
+    bank.p_dir_x[:] = np.array([1,2,3], dtype=float)
+    bank.p_dir_y[:] = np.array([1,2,3], dtype=float)
+    bank.p_dir_z[:] = np.array([1,2,3], dtype=float)
     
-    p_dir_x = pk.from_numpy(p_dir_x_np)
-    p_dir_y = pk.from_numpy(p_dir_y_np)
-    p_dir_z = pk.from_numpy(p_dir_z_np)
-    
-    p_mesh_cell = pk.from_numpy(p_mesh_cell_np)
-    p_speed = pk.from_numpy(p_speed_np)
-    p_time = pk.from_numpy(p_time_np)
-    p_alive = pk.from_numpy(p_alive_np)
+    bank.p_speed[:] = np.array([1,2,3], dtype=float)
+    bank.p_time[:] = np.array([1,2,3], dtype=float)
+    bank.p_alive[:] = np.array([0,1,0], dtype=np.int32)
     
     clever_out_np = np.array([0], dtype=np.int32)
     clever_out = pk.from_numpy(clever_out_np)
     
-    pk.execute(pk.ExecutionSpace.OpenMP,
-        BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_part, clever_out))
+    spare = ParticleBank(1)
+    
+    pk.execute(pk.ExecutionSpace.OpenMP, BringOutYourDead(bank, spare, clever_out))
     
     kept = clever_out[0]
+    SwapBuffers(bank, spare)
+    bank.num_part = kept
     
     print(kept)
     
-    print(p_pos_x)
+    print(bank.p_pos_x)
     
     assert(kept == 1)
-    assert(p_dir_x[0] == 2)
-    assert(p_dir_y[0] == 2)
-    assert(p_dir_z[0] == 2)
+    assert(bank.p_dir_x[0] == 2)
+    assert(bank.p_dir_y[0] == 2)
+    assert(bank.p_dir_z[0] == 2)
     
-    assert(p_pos_x[0] == 2)
-    assert(p_pos_y[0] == 2)
-    assert(p_pos_z[0] == 2)
+    assert(bank.p_pos_x[0] == 2)
+    assert(bank.p_pos_y[0] == 2)
+    assert(bank.p_pos_z[0] == 2)
     
-    assert(p_speed[0] == 2)
-    assert(p_time[0] == 2)
-    assert(p_alive[0] == True)
+    assert(bank.p_speed[0] == 2)
+    assert(bank.p_time[0] == 2)
+    assert(bank.p_alive[0] == True)
     
 if __name__ == '__main__':
     test_BOYD()
@@ -7,33 +7,36 @@ Date: Nov 18th 2021
 import numpy as np
 import pykokkos as pk
 import math
+from mcdc_tnt.pyk_kernels.all.particle_bank import ParticleBank
+from mcdc_tnt.pyk_kernels.all.rng import philox_rand, philox_child_id
 
 @pk.workload
 class FissionsAdd:
-    def __init__(self, p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_time, p_alive, p_speed,
-                fis_count, nu_new_neutrons, fission_event_index, num_part, particle_speed, rands, clever_out):
-        self.p_pos_x: pk.View1D[pk.double] = p_pos_x
-        self.p_pos_y: pk.View1D[pk.double] = p_pos_y
-        self.p_pos_z: pk.View1D[pk.double] = p_pos_z
+    def __init__(self, bank, fis_count, nu_new_neutrons, fission_event_index, particle_speed, clever_out):
+        self.p_pos_x: pk.View1D[pk.double] = bank.p_pos_x
+        self.p_pos_y: pk.View1D[pk.double] = bank.p_pos_y
+        self.p_pos_z: pk.View1D[pk.double] = bank.p_pos_z
         
-        self.p_dir_x: pk.View1D[pk.double] = p_dir_x
-        self.p_dir_y: pk.View1D[pk.double] = p_dir_y
-        self.p_dir_z: pk.View1D[pk.double] = p_dir_z
+        self.p_dir_x: pk.View1D[pk.double] = bank.p_dir_x
+        self.p_dir_y: pk.View1D[pk.double] = bank.p_dir_y
+        self.p_dir_z: pk.View1D[pk.double] = bank.p_dir_z
         
         
-        self.p_mesh_cell: pk.View1D[int] = p_mesh_cell
-        self.p_alive: pk.View1D[int] = p_alive
-        self.p_time: pk.View1D[pk.double] = p_time
-        self.p_speed: pk.View1D[pk.double] = p_speed
+        self.p_mesh_cell: pk.View1D[int] = bank.p_mesh_cell
+        self.p_alive: pk.View1D[int] = bank.p_alive
+        self.p_time: pk.View1D[pk.double] = bank.p_time
+        self.p_speed: pk.View1D[pk.double] = bank.p_speed
+        self.p_id: pk.View1D[pk.int64] = bank.p_id
         
         self.fission_event_index: pk.View1D[int] = fission_event_index
         
         self.clever_out: pk.View1D[int] = clever_out
         
-        self.rands: pk.View1D[pk.double] = rands
+        self.seed: int = bank.seed
+        self.event: int = bank.next_event()
         
         self.fis_count: int = fis_count
-        self.num_part: int = num_part
+        self.num_part: int = bank.num_part
         self.nu_new_neutrons: int = nu_new_neutrons
         self.particle_speed: pk.double = particle_speed
         
@@ -55,8 +58,9 @@ class FissionsAdd:
                 # print("produced at: {0}".format(p_pos_x[k+num_part]))
                 # Direction
                 # Sample polar and azimuthal angles uniformly
-                mu: pk.double  = 2.0*self.rands[4*i+2*j] - 1.0
-                azi: pk.double = 2.0*self.rands[4*i+2*j+1]
+                parent: pk.int64 = self.p_id[self.fission_event_index[i]]
+                mu: pk.double  = 2.0*philox_rand(self.seed, parent, self.event, 3*j) - 1.0
+                azi: pk.double = 2.0*3.141592653589793*philox_rand(self.seed, parent, self.event, 3*j+1)
                 # Convert to Cartesian coordinate
                 c: pk.double = (1.0 - mu**2)**0.5
                 self.p_dir_y[k+self.num_part] = math.cos(azi)*c
@@ -72,10 +76,11 @@ class FissionsAdd:
 
                 # Flags
                 self.p_alive[k+self.num_part] = 1
+                self.p_id[k+self.num_part] = philox_child_id(self.seed, parent, self.event, 3*j+2)
                 
                 k+=1
                 
-        clever_out[0] = k
+        self.clever_out[0] = k
             
 
 def test_FissionsAdd():
@@ -85,57 +90,39 @@ def test_FissionsAdd():
     N_m = 4
     
     num_part = 1
-    p_pos_x_np = np.array([.55, 3, 5], dtype=float)
-    p_pos_x = pk.from_numpy(p_pos_x_np)
     
-    p_pos_y_np = np.array([10, 3, 5], dtype=float)
-    p_pos_y = pk.from_numpy(p_pos_y_np)
-    
-    p_pos_z_np = np.array([15, 3, 5], dtype=float)
-    p_pos_z = pk.from_numpy(p_pos_z_np)
-
+    bank = ParticleBank(num_part+2)
+    bank.num_part = num_part
     
+    bank.p_pos_x[:] = np.array([.55, 3, 5], dtype=float)
+    bank.p_pos_y[:] = np.array([10, 3, 5], dtype=float)
+    bank.p_pos_z[:] = np.array([15, 3, 5], dtype=float)
     
-    p_mesh_cell_np = np.array([2, 87, -1], dtype=np.int32)
+    bank.p_mesh_cell[:] = np.array([2, 87, -1], dtype=np.int32)
     
-    p_dir_x_np = np.ones(num_part+2, dtype=float)
-    p_dir_y_np = np.zeros(num_part+2, dtype=float)
-    p_dir_z_np = np.zeros(num_part+2, dtype=float)
-    
-    p_speed_np = np.ones(num_part+2, dtype=float)
-    p_time_np = np.zeros(num_part+2, dtype=float)
-    p_alive_np = np.zeros(num_part+2, dtype=np.int32)
-    p_alive_np[0] = 1
+    bank.p_dir_x[:] = 1
+    bank.p_speed[:] = 1
+    bank.p_alive[0] = 1
     
     fis_count = 1
     nu = 2
     particle_speed = 1
-    fission_event_index_np = np.array([0,1,413], dtype=np.int32)
-    
-    rands_np = np.array([1.0,1.0,1.0,1.0,1.0,1.0], dtype=float)
-    
-    p_dir_x = pk.from_numpy(p_dir_x_np)
-    p_dir_y = pk.from_numpy(p_dir_y_np)
-    p_dir_z = pk.from_numpy(p_dir_z_np)
-    
-    p_mesh_cell = pk.from_numpy(p_mesh_cell_np)
-    p_speed = pk.from_numpy(p_speed_np)
-    p_time = pk.from_numpy(p_time_np)
-    p_alive = pk.from_numpy(p_alive_np)
-    
-    rands = pk.from_numpy(rands_np)
+    fission_event_index = pk.from_numpy(np.array([0,1,413], dtype=np.int32))
     
-    fission_event_index = pk.from_numpy(fission_event_index_np)
+    clever_out = pk.from_numpy(np.zeros(1, dtype=np.int32))
     
     
-    pk.execute(pk.ExecutionSpace.OpenMP, FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_time, p_alive, p_speed, fis_count, nu, fission_event_index, num_part, particle_speed, rands))
+    pk.execute(pk.ExecutionSpace.OpenMP, FissionsAdd(bank, fis_count, nu, fission_event_index, particle_speed, clever_out))
+    bank.num_part += clever_out[0]
     
     
-    assert(np.allclose(p_pos_x, [0.55, 0.55, 0.55]))
-    assert(np.allclose(p_pos_y, [10,10,10]))
-    assert(np.allclose(p_pos_z, [15,15,15]))
-    assert(p_dir_x[0] == 1)
-    assert(np.allclose(p_alive, 1))
+    assert(bank.num_part == 3)
+    assert(np.allclose(bank.p_pos_x, [0.55, 0.55, 0.55]))
+    assert(np.allclose(bank.p_pos_y, [10,10,10]))
+    assert(np.allclose(bank.p_pos_z, [15,15,15]))
+    assert(bank.p_dir_x[0] == 1)
+    assert(np.allclose(bank.p_alive, 1))
+    assert(bank.p_id[1] != bank.p_id[2])
     
     
 if __name__ == '__main__':
@@ -0,0 +1,127 @@
+"""
+Name: ParticleBank
+breif: Structure of arrays particle phase space for MCDC-TNT (PyKokkos)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import pykokkos as pk
+
+
+class ParticleBank:
+    """
+    PyKokkos twin of the Numba ParticleBank, every PSV column is a pk.View
+    (backed by a numpy array) so workloads can bind the columns they need
+    straight from the bank. Flags are int32 as PyKokkos has no bool views
+
+    Attributes
+    ----------
+    capacity : int
+        number of particle slots allocated in every PSV column.
+    num_part : int
+        number of particles currently under transport (live count, the
+        first num_part slots of every column are in use).
+    high_water : int
+        largest number of particles the bank has been asked to hold.
+    num_resize : int
+        number of times the columns have been reallocated (grow or shrink).
+    seed : int
+        key of the counter based random number generator (rng.Rand).
+    event : int
+        rng event counter, every kernel that draws takes a fresh one.
+    p_pos_x, p_pos_y, p_pos_z : View1D double
+        PSV: position of phase space particles (index is particle value).
+    p_dir_x, p_dir_y, p_dir_z : View1D double
+        PSV: direction unit value of phase space particles.
+    p_speed : View1D double
+        PSV: speed (energy) or a particle (index is particle).
+    p_time : View1D double
+        PSV: particle clock.
+    p_mesh_cell : View1D int
+        PSV: mesh cell location of a given particle.
+    p_alive : View1D int
+        PSV: is it alive? (1/0)
+    p_id : View1D int
+        PSV: particle id, keys the particle's random number stream.
+    """
+
+    columns = (('p_pos_x', np.float64), ('p_pos_y', np.float64), ('p_pos_z', np.float64),
+               ('p_dir_x', np.float64), ('p_dir_y', np.float64), ('p_dir_z', np.float64),
+               ('p_speed', np.float64), ('p_time', np.float64),
+               ('p_mesh_cell', np.int32), ('p_alive', np.int32), ('p_id', np.int64))
+
+    def __init__(self, capacity):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.num_part = 0
+        self.high_water = 0
+        self.num_resize = 0
+        self.seed = 0
+        self.event = 0
+
+        # numpy backing arrays, views share their memory
+        self.host = {}
+        for name, dtype in self.columns:
+            self.host[name] = np.zeros(capacity, dtype=dtype)
+            setattr(self, name, pk.from_numpy(self.host[name]))
+
+    def resize(self, new_capacity):
+        """
+        Reallocates every PSV column to new_capacity, copying the first
+        num_part (live) slots over. Workloads bind views at construction so
+        they must be built after any resize
+        """
+        n = self.num_part
+        for name, dtype in self.columns:
+            new = np.zeros(new_capacity, dtype=dtype)
+            new[:n] = self.host[name][:n]
+            self.host[name] = new
+            setattr(self, name, pk.from_numpy(new))
+
+        self.capacity = new_capacity
+        self.num_resize += 1
+
+    def reserve(self, n):
+        """
+        Makes sure the bank can hold n particles, doubling the capacity until
+        it fits. Also moves the high-water mark. Returns True if the columns
+        were reallocated
+        """
+        if n > self.high_water:
+            self.high_water = n
+
+        if n <= self.capacity:
+            return False
+
+        new_capacity = self.capacity
+        while new_capacity < n:
+            new_capacity *= 2
+
+        self.resize(new_capacity)
+        return True
+
+    def shrink(self, min_capacity):
+        """
+        Halves the allocation once the live count drops below a quarter of the
+        capacity (never below min_capacity). Returns True if the columns were
+        reallocated
+        """
+        if 4*self.num_part >= self.capacity:
+            return False
+
+        new_capacity = max(2*self.num_part, min_capacity, 1)
+        if new_capacity >= self.capacity:
+            return False
+
+        self.resize(new_capacity)
+        return True
+
+    def next_event(self):
+        """
+        Advances the rng event counter, returns the new event number. Draws
+        are keyed by (seed, p_id, event, draw) so they do not depend on which
+        thread (or backend) handles a particle
+        """
+        self.event += 1
+        return self.event
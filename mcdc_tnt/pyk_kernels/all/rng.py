@@ -0,0 +1,112 @@
+"""
+Name: RNG
+breif: Counter based (Philox4x32-10) random numbers for MCDC-TNT (PyKokkos)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import pykokkos as pk
+
+# Same block as mcdc_tnt.numba_kernels.rng, written out twice as a
+# pk.function can only return one value
+
+
+@pk.function
+def philox_rand(seed: pk.int64, p_id: pk.int64, event: pk.int64, draw: pk.int64) -> pk.double:
+    """
+    Uniform double on (0,1) from words 0 and 1 of the Philox4x32-10 block
+    keyed by seed with counter (p_id, event, draw)
+    """
+    k0: pk.uint64 = pk.uint64(seed) & 0xFFFFFFFF
+    k1: pk.uint64 = (pk.uint64(seed) >> 32) & 0xFFFFFFFF
+    c0: pk.uint64 = pk.uint64(p_id) & 0xFFFFFFFF
+    c1: pk.uint64 = (pk.uint64(p_id) >> 32) & 0xFFFFFFFF
+    c2: pk.uint64 = pk.uint64(event) & 0xFFFFFFFF
+    c3: pk.uint64 = pk.uint64(draw) & 0xFFFFFFFF
+    prod0: pk.uint64 = 0
+    prod1: pk.uint64 = 0
+
+    for r in range(10):
+        prod0 = 0xD2511F53*c0
+        prod1 = 0xCD9E8D57*c2
+
+        c0 = (prod1 >> 32) ^ c1 ^ k0
+        c1 = prod1 & 0xFFFFFFFF
+        c2 = (prod0 >> 32) ^ c3 ^ k1
+        c3 = prod0 & 0xFFFFFFFF
+
+        k0 = (k0 + 0x9E3779B9) & 0xFFFFFFFF
+        k1 = (k1 + 0xBB67AE85) & 0xFFFFFFFF
+
+    x: pk.uint64 = (c0 >> 6)*67108864 + (c1 >> 6)
+    return (pk.double(x) + 0.5)*2.220446049250313e-16
+
+
+@pk.function
+def philox_child_id(seed: pk.int64, p_id: pk.int64, event: pk.int64, draw: pk.int64) -> pk.int64:
+    """
+    63 bit id for a particle born from p_id, from words 2 and 3 of the block
+    """
+    k0: pk.uint64 = pk.uint64(seed) & 0xFFFFFFFF
+    k1: pk.uint64 = (pk.uint64(seed) >> 32) & 0xFFFFFFFF
+    c0: pk.uint64 = pk.uint64(p_id) & 0xFFFFFFFF
+    c1: pk.uint64 = (pk.uint64(p_id) >> 32) & 0xFFFFFFFF
+    c2: pk.uint64 = pk.uint64(event) & 0xFFFFFFFF
+    c3: pk.uint64 = pk.uint64(draw) & 0xFFFFFFFF
+    prod0: pk.uint64 = 0
+    prod1: pk.uint64 = 0
+
+    for r in range(10):
+        prod0 = 0xD2511F53*c0
+        prod1 = 0xCD9E8D57*c2
+
+        c0 = (prod1 >> 32) ^ c1 ^ k0
+        c1 = prod1 & 0xFFFFFFFF
+        c2 = (prod0 >> 32) ^ c3 ^ k1
+        c3 = prod0 & 0xFFFFFFFF
+
+        k0 = (k0 + 0x9E3779B9) & 0xFFFFFFFF
+        k1 = (k1 + 0xBB67AE85) & 0xFFFFFFFF
+
+    return pk.int64(((c2 & 0x7FFFFFFF) << 32) | c3)
+
+
+@pk.workload
+class FillRands:
+    """
+    Fills out[i] with draw `draw` of particle i's stream, used to check the
+    kernels against the Numba and pure Python generators
+    """
+    def __init__(self, p_id, seed, event, draw, num, out):
+        self.p_id: pk.View1D[pk.int64] = p_id
+        self.seed: int = seed
+        self.event: int = event
+        self.draw: int = draw
+        self.num: int = num
+        self.out: pk.View1D[pk.double] = out
+
+    @pk.main
+    def run(self):
+        pk.parallel_for(self.num, self.fill_wu)
+
+    @pk.workunit
+    def fill_wu(self, i: int):
+        self.out[i] = philox_rand(self.seed, self.p_id[i], self.event, self.draw)
+
+
+def test_Rand():
+    from mcdc_tnt.numba_kernels.rng import Rand
+
+    num = 100
+    p_id = pk.from_numpy(np.arange(num, dtype=np.int64))
+    out_np = np.zeros(num, dtype=np.float64)
+    out = pk.from_numpy(out_np)
+
+    pk.execute(pk.ExecutionSpace.OpenMP, FillRands(p_id, 777, 3, 1, num, out))
+
+    assert(np.array_equal(out_np, [Rand(777, i, 3, 1) for i in range(num)]))
+
+
+if __name__ == '__main__':
+    test_Rand()
@@ -6,12 +6,26 @@ Date: Dec 2nd 2021
 """
 import numpy as np
 import pykokkos as pk
+from mcdc_tnt.pyk_kernels.all.particle_bank import ParticleBank
+from mcdc_tnt.pyk_kernels.all.rng import philox_rand
+from mcdc_tnt.pyk_kernels.all.workspace import AdvanceWorkspace
 
 @pk.workload
 class SampleEvent:
-    def __init__(self, p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu_new_neutrons, rands, clever_out):
-        self.p_mesh_cell: pk.View1D[int] = p_mesh_cell
-        self.p_alive: pk.View1D[int] = p_alive
+    """
+    Samples the next events of particles under transport. A parallel_for
+    gives every particle an event code (0 none, 1 scatter, 2 capture,
+    3 fission, same as the Numba kernels), then one parallel_scan per code
+    writes the index vectors in particle order. Counts land in clever_out[0:3]
+    (scatter, capture, fission). Cross sections are read only, they do not
+    need to be normalized. The event codes live in the AdvanceWorkspace
+    (grown to the bank here, a fresh one when None) so building a workload
+    per event allocates nothing
+    """
+    def __init__(self, bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu_new_neutrons, clever_out, workspace=None):
+        self.p_mesh_cell: pk.View1D[int] = bank.p_mesh_cell
+        self.p_alive: pk.View1D[int] = bank.p_alive
+        self.p_id: pk.View1D[pk.int64] = bank.p_id
         
         self.mesh_cap_xsec: pk.View1D[pk.double] = mesh_cap_xsec
         self.mesh_scat_xsec: pk.View1D[pk.double] = mesh_scat_xsec
@@ -21,76 +35,91 @@ class SampleEvent:
         self.capture_event_index: pk.View1D[int] = capture_event_index
         self.fission_event_index: pk.View1D[int] = fission_event_index
         
-        self.num_part: int = num_part
-        self.nu_new_neutrons: int = num_part
-        self.rands: pk.View1D[pk.double] = rands
-        
-        self.fissions_to_add: int = 0
-        self.scat_count: int = 0
-        self.cap_count: int = 0
-        self.fis_count: int = 0
-        self.killed: int = 0
-        
+        self.num_part: int = bank.num_part
+        self.nu_new_neutrons: int = nu_new_neutrons
+        self.seed: int = bank.seed
+        self.event: int = bank.next_event()
         
+        if workspace is None:
+            workspace = AdvanceWorkspace(bank.num_part)
+        workspace.reserve(bank.num_part)
+        self.event_code: pk.View1D[pk.int32] = workspace.event_code
         
         self.clever_out: pk.View1D[int] = clever_out
-        
-        #print('made it through init!')
 
     @pk.main
     def run(self):
-        for i in range(self.num_part):
-            #normalize cross sections in each mesh cell
-            total_scat_xsec: pk.double = self.mesh_scat_xsec[self.p_mesh_cell[i]] + self.mesh_cap_xsec[self.p_mesh_cell[i]] + self.mesh_fis_xsec[self.p_mesh_cell[i]]
-            mesh_scat_xsec_temp: pk.double = self.mesh_scat_xsec[self.p_mesh_cell[i]] / total_scat_xsec
-            mesh_cap_xsec_temp: pk.double = self.mesh_cap_xsec[self.p_mesh_cell[i]] / total_scat_xsec
-            mesh_fis_xsec_temp: pk.double = self.mesh_fis_xsec[self.p_mesh_cell[i]] / total_scat_xsec
+        pk.parallel_for(self.num_part, self.classify_wu)
+        
+        scat_count: int = pk.parallel_scan(self.num_part, self.scatter_scan_wu)
+        cap_count: int = pk.parallel_scan(self.num_part, self.capture_scan_wu)
+        fis_count: int = pk.parallel_scan(self.num_part, self.fission_scan_wu)
+        
+        self.clever_out[0] = scat_count
+        self.clever_out[1] = cap_count
+        self.clever_out[2] = fis_count
+    
+    @pk.workunit
+    def classify_wu(self, i: int):
+        self.event_code[i] = 0
+        
+        if self.p_alive[i] == 1:
+            cell: int = self.p_mesh_cell[i]
+            scat_xsec: pk.double = self.mesh_scat_xsec[cell]
+            cap_xsec: pk.double = self.mesh_cap_xsec[cell]
+            fis_xsec: pk.double = self.mesh_fis_xsec[cell]
             
-            #pk.printf('%d     %d     %d\n ',self.scat_count, self.cap_count, self.fis_count)
+            #draw scaled by the cell total
+            event_rand: pk.double = philox_rand(self.seed, self.p_id[i], self.event, 0)*(scat_xsec + cap_xsec + fis_xsec)
             
-            if self.p_alive[i] == 1:
-                
-                event_rand:pk.double = self.rands[i]
-                
-                #scatter?
-                if event_rand < mesh_scat_xsec_temp:
-                    self.scatter_event_index[self.scat_count] = i
-                    self.scat_count += 1
-                    #pk.printf('had a scatter! %d\n', self.scat_count)
+            #scatter?
+            if event_rand < scat_xsec:
+                self.event_code[i] = 1
+            
+            #capture?
+            elif event_rand < scat_xsec + cap_xsec:
+                self.event_code[i] = 2
+                self.p_alive[i] = 0
                 
-                #capture?
-                elif mesh_scat_xsec_temp < event_rand  and event_rand < mesh_scat_xsec_temp + mesh_cap_xsec_temp:
-                    self.p_alive[i] = 0
-                    self.killed += 1
-                    self.capture_event_index[self.cap_count] = i
-                    self.cap_count +=1
-                    #pk.printf('had a capture! %d\n', self.cap_count)
-                    
-                #fission?
-                elif mesh_scat_xsec_temp + mesh_cap_xsec_temp < event_rand and event_rand < mesh_scat_xsec_temp + mesh_cap_xsec_temp + mesh_fis_xsec_temp:
-                    self.p_alive[i] = 0
-                    self.killed += 1
-                    self.fissions_to_add += self.nu_new_neutrons
-                    self.fission_event_index[self.fis_count] = i
-                    self.fis_count += 1
-                    #pk.printf('had a fission! %d\n', self.fis_count)
-                    
-                else:
-                    pk.printf('Well shoot dang')
-                    
-        self.clever_out[0] = self.scat_count
-        self.clever_out[1] = self.cap_count
-        self.clever_out[2] = self.fis_count
+            #fission?
+            elif event_rand < scat_xsec + cap_xsec + fis_xsec:
+                self.event_code[i] = 3
+                self.p_alive[i] = 0
+    
+    @pk.workunit
+    def scatter_scan_wu(self, i: int, acc: pk.Acc[int], last_pass: bool):
+        if self.event_code[i] == 1:
+            if last_pass:
+                self.scatter_event_index[acc] = i
+            acc += 1
+    
+    @pk.workunit
+    def capture_scan_wu(self, i: int, acc: pk.Acc[int], last_pass: bool):
+        if self.event_code[i] == 2:
+            if last_pass:
+                self.capture_event_index[acc] = i
+            acc += 1
+    
+    @pk.workunit
+    def fission_scan_wu(self, i: int, acc: pk.Acc[int], last_pass: bool):
+        if self.event_code[i] == 3:
+            if last_pass:
+                self.fission_event_index[acc] = i
+            acc += 1
     
     
     
 def test_SampleEvent():
-        p_mesh_cell = np.array([0,1,0,5], dtype=np.int32)
-        p_alive = np.array([1,1,1,0], dtype=np.int32)
+        bank = ParticleBank(4)
+        bank.num_part = 3
+        bank.p_mesh_cell[:] = np.array([0,1,2,5], dtype=np.int32)
+        bank.p_alive[:] = np.array([1,1,1,0], dtype=np.int32)
+        bank.p_id[:] = np.arange(4)
         
-        mesh_cap_xsec = 1/3*np.ones(2, dtype=float)
-        mesh_scat_xsec = 1/3*np.ones(2, dtype=float)
-        mesh_fis_xsec = 1/2*np.ones(2, dtype=float)
+        #each cell only has one reaction so the outcome does not depend on the draw
+        mesh_cap_xsec = np.array([0.0, 1.0, 0.0], dtype=float)
+        mesh_scat_xsec = np.array([2.0, 0.0, 0.0], dtype=float)
+        mesh_fis_xsec = np.array([0.0, 0.0, 0.5], dtype=float)
         
         scatter_event_index = np.zeros(3, dtype=np.int32)
         capture_event_index = np.zeros(3, dtype=np.int32)
@@ -98,13 +127,7 @@ def test_SampleEvent():
         
         
         
-        controled_rands = np.array([.2, .4, .8], dtype=float)
-        
         nu = 2
-        num_part = 3
-        
-        p_mesh_cell = pk.from_numpy(p_mesh_cell)
-        p_alive = pk.from_numpy(p_alive)
         
         mesh_cap_xsec = pk.from_numpy(mesh_cap_xsec)
         mesh_scat_xsec = pk.from_numpy(mesh_scat_xsec)
@@ -114,13 +137,14 @@ def test_SampleEvent():
         capture_event_index = pk.from_numpy(capture_event_index)
         fission_event_index = pk.from_numpy(fission_event_index)
         
-        controled_rands = pk.from_numpy(controled_rands)
-        
         clever_out = np.zeros(3, dtype=np.int32) 
         clever_out = pk.from_numpy(clever_out)
         
+        workspace = AdvanceWorkspace(4)
+        
         print("Running!")
-        pk.execute(pk.ExecutionSpace.OpenMP, SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu, controled_rands, clever_out))
+        workload = SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu, clever_out, workspace)
+        pk.execute(pk.ExecutionSpace.OpenMP, workload)
         print('Made it through')
         
         scat_count = clever_out[0]
@@ -137,6 +161,12 @@ def test_SampleEvent():
         assert (capture_event_index[0] == 1)
         assert (fission_event_index[0] == 2)
         assert (scatter_event_index[0] == 0)
+        assert (bank.p_alive[0] == 1)
+        assert (bank.p_alive[1] == 0)
+        
+        #event codes are the workspace's view, no allocation per workload
+        assert (workload.event_code is workspace.event_code)
+        assert (workspace.host['event_code'][1] == 2)
         
 if __name__ == '__main__':
     test_SampleEvent()
@@ -8,16 +8,20 @@ Date: Dec 2nd 2021
 import math
 import numpy as np
 import pykokkos as pk
+from mcdc_tnt.pyk_kernels.all.particle_bank import ParticleBank
+from mcdc_tnt.pyk_kernels.all.rng import philox_rand
 
 @pk.workload
 class Scatter:
-    def __init__(self,scatter_indices, scat_count, p_dir_x, p_dir_y, p_dir_z, rands):
+    def __init__(self, bank, scatter_indices, scat_count):
         self.scatter_indices: pk.View1D[int] = scatter_indices
         self.scat_count: int = scat_count
-        self.p_dir_x: pk.View1D[pk.double] = p_dir_x
-        self.p_dir_y: pk.View1D[pk.double] = p_dir_y
-        self.p_dir_z: pk.View1D[pk.double] = p_dir_z
-        self.rands: pk.View1D[float] = rands 
+        self.p_dir_x: pk.View1D[pk.double] = bank.p_dir_x
+        self.p_dir_y: pk.View1D[pk.double] = bank.p_dir_y
+        self.p_dir_z: pk.View1D[pk.double] = bank.p_dir_z
+        self.p_id: pk.View1D[pk.int64] = bank.p_id
+        self.seed: int = bank.seed
+        self.event: int = bank.next_event()
     
     
     @pk.main
@@ -31,8 +35,8 @@ class Scatter:
     @pk.workunit
     def Scatter_wu(self, i: int):
         # Sample polar and azimuthal angles uniformly
-        mu: pk.double  = 2.0*self.rands[2*i] - 1.0
-        azi: pk.double = 2.0*3.14159265359*self.rands[2*i+1]
+        mu: pk.double  = 2.0*philox_rand(self.seed, self.p_id[self.scatter_indices[i]], self.event, 0) - 1.0
+        azi: pk.double = 2.0*3.141592653589793*philox_rand(self.seed, self.p_id[self.scatter_indices[i]], self.event, 1)
 	    
         # Convert to Cartesian coordinate
         c: pk.double = (1.0 - mu**2)**0.5
@@ -46,35 +50,28 @@ def test_Scatter():
     
     scat_count = 3
     scatter_indices = np.array([0,1,4], dtype=np.int32)
-    p_dir_x = np.array([1,2,0,0,4], dtype=float)
-    p_dir_y = np.array([1,2,0,0,4], dtype=float)
-    p_dir_z = np.array([1,2,0,0,4], dtype=float)
-    rands = np.array([1,1,0,0,.5,.5], dtype=float)
-    
-    p_dir_x = pk.from_numpy(p_dir_x)
-    p_dir_y = pk.from_numpy(p_dir_y)
-    p_dir_z = pk.from_numpy(p_dir_z)
-    
-    rands = pk.from_numpy(rands)
+    bank = ParticleBank(5)
+    bank.num_part = 5
+    bank.p_dir_x[:] = np.array([1,2,0,0,4], dtype=float)
+    bank.p_dir_y[:] = np.array([1,2,0,0,4], dtype=float)
+    bank.p_dir_z[:] = np.array([1,2,0,0,4], dtype=float)
+    bank.p_id[:] = np.arange(5)
     
     scatter_indices = pk.from_numpy(scatter_indices)
     
     
     
-    pk.execute(pk.ExecutionSpace.OpenMP, Scatter(scatter_indices, scat_count, p_dir_x, p_dir_y, p_dir_z, rands))
-    
-    
-    assert(p_dir_y[0] == 0)
-    assert(p_dir_z[0] == 0)
-    assert(p_dir_x[0] == 1)
+    pk.execute(pk.ExecutionSpace.OpenMP, Scatter(bank, scatter_indices, scat_count))
+    p_dir_x = bank.p_dir_x
+    p_dir_y = bank.p_dir_y
+    p_dir_z = bank.p_dir_z
     
-    assert(p_dir_y[1] == 0)
-    assert(p_dir_z[1] == 0)
-    assert(p_dir_x[1] == -1)
     
-    assert(p_dir_y[4] == -1)
-    assert(np.allclose(p_dir_z[4], 0))
-    assert(p_dir_x[4] == 0)
+    #scattered particles get new unit directions, the rest are untouched
+    norms = p_dir_x**2 + p_dir_y**2 + p_dir_z**2
+    assert(np.allclose(norms[[0,1,4]], 1))
+    assert(p_dir_x[2] == 0)
+    assert(p_dir_x[3] == 0)
     
     print("Passed!")
     
@@ -8,33 +8,34 @@ Date: Dec 2nd 2021
 import numpy as np
 import pykokkos as pk
 import math
+from mcdc_tnt.pyk_kernels.all.particle_bank import ParticleBank
+from mcdc_tnt.pyk_kernels.all.rng import philox_rand
 #import numba as nb
 
 @pk.workload
 class SourceParticles:
-    def __init__(self, p_pos_x, p_pos_y, p_pos_z,
-                p_mesh_cell, dx,
-                p_dir_y, p_dir_z, p_dir_x,
-                p_speed, p_time, p_alive,
-                num_parts, particle_speed, meshwise_fission_pdf, rands):
+    def __init__(self, bank, dx, num_parts, particle_speed, meshwise_fission_cdf):
         
-        self.p_pos_x: pk.View1D[pk.double] = p_pos_x
-        self.p_pos_y: pk.View1D[pk.double] = p_pos_y
-        self.p_pos_z: pk.View1D[pk.double] = p_pos_z
+        self.p_pos_x: pk.View1D[pk.double] = bank.p_pos_x
+        self.p_pos_y: pk.View1D[pk.double] = bank.p_pos_y
+        self.p_pos_z: pk.View1D[pk.double] = bank.p_pos_z
         
-        self.p_dir_x: pk.View1D[pk.double] = p_dir_x
-        self.p_dir_y: pk.View1D[pk.double] = p_dir_y
-        self.p_dir_z: pk.View1D[pk.double] = p_dir_z
+        self.p_dir_x: pk.View1D[pk.double] = bank.p_dir_x
+        self.p_dir_y: pk.View1D[pk.double] = bank.p_dir_y
+        self.p_dir_z: pk.View1D[pk.double] = bank.p_dir_z
         
-        self.p_mesh_cell: pk.View1D[int] = p_mesh_cell
-        self.p_speed: pk.View1D[pk.double] = p_speed
-        self.p_time: pk.View1D[pk.double] = p_time
-        self.p_alive: pk.View1D[int] = p_alive
+        self.p_mesh_cell: pk.View1D[int] = bank.p_mesh_cell
+        self.p_speed: pk.View1D[pk.double] = bank.p_speed
+        self.p_time: pk.View1D[pk.double] = bank.p_time
+        self.p_alive: pk.View1D[int] = bank.p_alive
+        self.p_id: pk.View1D[pk.int64] = bank.p_id
         
         #self.meshwise_fission_pdf: pk.View1D[pk.double] = meshwise_fission_pdf
         
-        self.rands: pk.View1D[pk.double] = rands
-        self.meshwise_fission_pdf: pk.View1D[pk.double] = meshwise_fission_pdf
+        self.seed: int = bank.seed
+        self.event: int = bank.next_event()
+        self.meshwise_fission_cdf: pk.View1D[pk.double] = meshwise_fission_cdf
+        self.num_cells: int = int(len(meshwise_fission_cdf))
         
         self.num_parts: int = num_parts
         self.dx: pk.double = dx
@@ -58,26 +59,29 @@ class SourceParticles:
         #find mesh cell birth based on provided pdf+
     @pk.workunit
     def sourceP(self, i: int):
+        self.p_id[i] = i
+        #bisection of the cumulative table (mcdc_tnt.sampling.SampleCdf)
+        xi: pk.double = philox_rand(self.seed, i, self.event, 0)
         cell: int = 0
-        summer: float = 0.0
-        while (summer < self.rands[i*4]):
-            summer += self.meshwise_fission_pdf[cell]
-            cell += 1
-                
-        cell -=1
+        hi: int = self.num_cells-1
+        while (cell < hi):
+            mid: int = int((cell + hi)/2)
+            if (self.meshwise_fission_cdf[mid] < xi):
+                cell = mid + 1
+            else:
+                hi = mid
         
-        #pk.printf('%f\n',self.rands[i*4])
         self.p_mesh_cell[i] = int(cell)
         
         #sample birth location within cell
-        self.p_pos_x[i] = dx*cell + dx*self.rands[i*4+1]
+        self.p_pos_x[i] = self.dx*cell + self.dx*philox_rand(self.seed, i, self.event, 1)
         self.p_pos_y[i] = 0.0
         self.p_pos_z[i] = 0.0
         
         
         # Sample polar and azimuthal angles uniformly
-        mu: pk.double  = 2.0*self.rands[i*4+2] - 1.0
-        azi: pk.double = 2.0*self.rands[i*4+3]
+        mu: pk.double  = 2.0*philox_rand(self.seed, i, self.event, 2) - 1.0
+        azi: pk.double = 2.0*3.141592653589793*philox_rand(self.seed, i, self.event, 3)
     
         # Convert to Cartesian coordinate
         c: pk.double = (1.0 - mu**2)**0.5
@@ -86,7 +90,7 @@ class SourceParticles:
         self.p_dir_x[i] = mu
 
         # Speed
-        self.p_speed[i] = particle_speed
+        self.p_speed[i] = self.particle_speed
 
         # Time
         self.p_time[i] = 0.0
@@ -102,57 +106,26 @@ class SourceParticles:
 
 def test_SourceParticles():
     num_parts = 5
-    p_pos_x_np = np.zeros(num_parts)
-    p_pos_y_np = np.zeros(num_parts)
-    p_pos_z_np = np.zeros(num_parts)
-    
-    p_mesh_cell_np = np.zeros(num_parts, dtype=np.int32)
-    
-    p_dir_x_np = np.zeros(num_parts)
-    p_dir_y_np = np.zeros(num_parts)
-    p_dir_z_np = np.zeros(num_parts)
-    
-    p_speed_np = np.zeros(num_parts)
-    p_time_np = np.ones(num_parts)
-    p_alive_np = np.zeros(num_parts, dtype=np.int32)
+    bank = ParticleBank(num_parts)
+    bank.p_time.fill(1)
     
     particle_speed = 1
-    meshwise_fission_pdf_np = np.array([0.0,1.001], dtype=float)
-    
-    iso=False
+    meshwise_fission_cdf_np = np.array([0.0,1.0], dtype=float)
     
     dx = 0.2
     
-    p_pos_x = pk.from_numpy(p_pos_x_np)
-    p_pos_y = pk.from_numpy(p_pos_y_np)
-    p_pos_z = pk.from_numpy(p_pos_z_np)
-    
-    p_dir_x = pk.from_numpy(p_dir_x_np)
-    p_dir_y = pk.from_numpy(p_dir_y_np)
-    p_dir_z = pk.from_numpy(p_dir_z_np)
+    meshwise_fission_cdf = pk.from_numpy(meshwise_fission_cdf_np)
     
-    p_mesh_cell = pk.from_numpy(p_mesh_cell_np)
-    p_speed = pk.from_numpy(p_speed_np)
-    p_time = pk.from_numpy(p_time_np)
-    p_alive = pk.from_numpy(p_alive_np)
-    
-    meshwise_fission_pdf = pk.from_numpy(meshwise_fission_pdf_np)
-    
-    rands_np = np.random.random(4*num_parts)
-    rands = pk.from_numpy(rands_np)
-    
-    #p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive] = 
-    pk.execute(pk.ExecutionSpace.OpenMP, Source_Particles(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_parts, particle_speed,  meshwise_fission_pdf, rands))
-    
-    #[p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive] = SourceParticles(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_parts, meshwise_fission_pdf, particle_speed, rands)
+    pk.execute(pk.ExecutionSpace.OpenMP, SourceParticles(bank, dx, num_parts, particle_speed, meshwise_fission_cdf))
+    bank.num_part = num_parts
     
     print("Ran")
+    assert (np.sum(bank.p_time) == 0)
+    assert (np.allclose(bank.p_mesh_cell, 1))
+    assert (np.allclose(bank.p_alive, 1))
+    assert (bank.p_pos_x[3] > .2)
+    assert (np.array_equal(bank.p_id, np.arange(num_parts)))
     
-    assert (np.sum(p_time) == 0)
-    assert (np.allclose(p_mesh_cell, 1))
-    assert (np.allclose(p_alive, 1))
-    assert (p_pos_x[3] > .2)
     
 if __name__ == '__main__':
     test_SourceParticles()    
-
@@ -0,0 +1,80 @@
+"""
+Name: AdvanceWorkspace
+breif: Persistent scratch vectors for the Advance kernels of MCDC-TNT (PyKokkos)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+import pykokkos as pk
+
+
+class AdvanceWorkspace:
+    """
+    PyKokkos twin of the Numba AdvanceWorkspace, every vector is a pk.View
+    backed by a numpy array (in host) that the host side refills in place,
+    so no views are built inside the Advance sub-step loop or per event
+
+    Attributes
+    ----------
+    capacity : int
+        number of particle slots allocated in every vector.
+    rands : View1D double
+        random numbers for distance to collision, refilled in place.
+    p_dist_travled : View1D double
+        distance traveled by every particle in the current sub-step.
+    p_end_trans : View1D int
+        1 once a particle reached its collision site (or left the slab).
+    pre_p_mesh : View1D int
+        mesh cell every particle started the sub-step in (tally cell).
+    event_code : View1D int32
+        reaction code SampleEvent gives every particle before its scans.
+    num_sub_steps : int
+        sub-steps the last Advance call took.
+    active_fraction : vector double
+        fraction of the bank still streaming at the start of every sub-step
+        of the last Advance call (first num_sub_steps entries).
+    """
+
+    columns = (('rands', np.float64), ('p_dist_travled', np.float64),
+               ('p_end_trans', np.int32), ('pre_p_mesh', np.int32),
+               ('event_code', np.int32))
+
+    def __init__(self, capacity):
+        self.capacity = 0
+        self.num_sub_steps = 0
+        self.active_fraction = np.zeros(64, dtype=np.float64)
+        self.host = {}
+        self.allocate(max(capacity, 1))
+
+    def allocate(self, capacity):
+        for name, dtype in self.columns:
+            self.host[name] = np.zeros(capacity, dtype=dtype)
+            setattr(self, name, pk.from_numpy(self.host[name]))
+        self.capacity = capacity
+
+    def reserve(self, n):
+        """
+        Grows (doubling) to hold at least n particles, contents are not kept.
+        Returns True if the views were reallocated
+        """
+        if n <= self.capacity:
+            return False
+
+        new_capacity = self.capacity
+        while new_capacity < n:
+            new_capacity *= 2
+
+        self.allocate(new_capacity)
+        return True
+
+    def record_pass(self, fraction):
+        """
+        Appends the active fraction of one sub-step to the report
+        """
+        if self.num_sub_steps == len(self.active_fraction):
+            grown = np.zeros(2*len(self.active_fraction), dtype=np.float64)
+            grown[:self.num_sub_steps] = self.active_fraction
+            self.active_fraction = grown
+        self.active_fraction[self.num_sub_steps] = fraction
+        self.num_sub_steps += 1
@@ -1,10 +1,12 @@
 #from .input_parser import SimulationSetup
 import numpy as np
 import sys
+import os
+import json
 import argparse
 import mcdc_tnt
 
-def run(input_file, output_file=None, hard_targ=None):
+def run(input_file, output_file=None, hard_targ=None, cache=True):
     """
     main function to run a single generation and plot the output
 
@@ -14,7 +16,7 @@ def run(input_file, output_file=None, hard_targ=None):
 
     """
     
-    [comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec, surface_distances] = mcdc_tnt.SimulationSetup(input_file)
+    [comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec, surface_distances] = mcdc_tnt.SimulationSetup(input_file, cache)
     
     if hard_targ != None:
          comp_parms['hard_targ'] = hard_targ
@@ -45,12 +47,14 @@ def run(input_file, output_file=None, hard_targ=None):
         return()
     print()
     
-    [scalar_flux, standard_deviation_flux] = Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec, surface_distances)
+    [scalar_flux, standard_deviation_flux, tallies] = Generations(comp_parms, sim_perams, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec, surface_distances)
     print()
     print('Simulation complete')
     print()
     
-    x_mesh = np.linspace(0,1,len(scalar_flux))
+    #cell centers of the (possibly non-uniform) material mesh
+    cell_edges = tallies['cell edges']
+    x_mesh = (cell_edges[:-1] + cell_edges[1:])/2
 
     scalar_flux /= np.max(scalar_flux)
     
@@ -63,7 +67,60 @@ def run(input_file, output_file=None, hard_targ=None):
             print('cell, center x, normalized scalar flux, associated error', file=f)
             for i in range(len(scalar_flux)):
                 print('{0},{1},{2},{3}'.format(i, x_mesh[i], scalar_flux[i], standard_deviation_flux[i]), file=f) 
+            for m, [edges, flux, error] in enumerate(tallies['tally meshes']):
+                print('tally mesh {0}'.format(m), file=f)
+                print('bin, lower edge, upper edge, normalized scalar flux, associated error', file=f)
+                for i in range(len(flux)):
+                    print('{0},{1},{2},{3},{4}'.format(i, edges[i], edges[i+1], flux[i], error[i]), file=f)
+            if tallies['reaction rates'] is not None:
+                reaction_rates = tallies['reaction rates']
+                print('reaction rates (per source particle per unit width)', file=f)
+                print('cell, center x, collision flux, scatter rate, capture rate, fission rate', file=f)
+                for i in range(reaction_rates.shape[1]):
+                    print('{0},{1},{2},{3},{4},{5}'.format(i, x_mesh[i], *reaction_rates[:, i]), file=f)
+            if tallies['time flux'] is not None:
+                [time_edges, time_bins, cells, flux, error] = tallies['time flux']
+                #sparse, only the (time bin, cell) pairs that scored
+                print('time binned flux (per source particle per unit width and time)', file=f)
+                print('time bin, lower time, upper time, cell, center x, scalar flux, associated error', file=f)
+                for [t, i, phi, err] in zip(time_bins, cells, flux, error):
+                    print('{0},{1},{2},{3},{4},{5},{6}'.format(t, time_edges[t], time_edges[t+1], i, x_mesh[i],
+                                                               phi, err), file=f)
+            if tallies['surface current'] is not None:
+                [surfaces, mu_edges, time_edges, current, error] = tallies['surface current']
+                #partial currents are the crossings with mu above and below 0
+                positive = mu_edges[1:] > 0
+                print('surface currents (per source particle), leakage left {0}, right {1}'.format(*tallies['leakage']), file=f)
+                print('surface, x, partial current +, partial current -, net current', file=f)
+                for s in range(len(surfaces)):
+                    j_plus = np.sum(current[s, positive])
+                    j_minus = np.sum(current[s, ~positive])
+                    print('{0},{1},{2},{3},{4}'.format(s, surfaces[s], j_plus, j_minus, j_plus - j_minus), file=f)
+                #sparse, only the (surface, mu bin, time bin) that scored
+                print('surface current spectrum (per source particle)', file=f)
+                print('surface, x, lower mu, upper mu, lower time, upper time, current, associated error', file=f)
+                for [s, m, t] in np.argwhere(current > 0):
+                    print('{0},{1},{2},{3},{4},{5},{6},{7}'.format(s, surfaces[s], mu_edges[m], mu_edges[m+1], time_edges[t],
+                                                                   time_edges[t+1], current[s, m, t], error[s, m, t]), file=f)
+            if tallies['k'] is not None:
+                print('k-eigenvalue (mean over active cycles)', file=f)
+                print('estimator, k, associated error', file=f)
+                for name, [k, error] in tallies['k'].items():
+                    print('{0},{1},{2}'.format(name, k, error), file=f)
         print('Output written to',output_file)
+        
+        #kernel timings and figures of merit next to the output file
+        timing_file = os.path.splitext(output_file)[0] + '_timing.json'
+        with open(timing_file, 'w') as f:
+            json.dump({'name': comp_parms['sim name'],
+                       'hardware target': comp_parms['hard_targ'],
+                       'run seconds': tallies['timing']['run seconds'],
+                       'particles': int(tallies['timing']['particles']),
+                       'kernels': tallies['timing']['kernels'],
+                       'fom': {'mesh': tallies['fom']['mesh'].tolist(),
+                               'tally meshes': [fom.tolist() for fom in tallies['fom']['tally meshes']]}},
+                      f, indent=2)
+        print('Timing report written to',timing_file)
         print()
     else:
         print('No file outputs requested, Simulation Complete')
@@ -101,10 +158,12 @@ if __name__ == "__main__":
                         help='output file, if none then output.txt')
     parser.add_argument('-t', '--target', required=False,
                         help='hardware target, if none then use one listed in input.yaml (pp = pure python, nb_cpu = numba cpu)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='parse the input deck again instead of reusing (and writing) its cached setup')
     args = parser.parse_args(sys.argv[1:])
 
     input_file = args.input
     output_file = args.output
     hard_targ = args.target
 
-    run(input_file, output_file, hard_targ)
+    run(input_file, output_file, hard_targ, not args.no_cache)
@@ -0,0 +1,121 @@
+"""
+Name: Sampling
+breif: Cumulative tables, binary search sampling of discrete pdfs and flight distances for MCDC-TNT (all backends)
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import math
+import numpy as np
+
+
+def CumulativeTable(probabilities):
+    """
+    Cumulative tables along the last axis, normalized to end at 1. Rows of
+    a table that sum to zero (a group that never scatters) stay zero and are
+    never sampled. A single pdf (1-D) has to sum to a finite, positive total
+    and no row may be NaN or infinite: SampleCdf would hand back the last
+    entry for every draw. Built once on the host for every backend, kernels
+    only search them (SampleCdf)
+    """
+    table = np.cumsum(probabilities, axis=-1)
+    total = table[..., -1:]
+    if not np.all(np.isfinite(total)):
+        raise ValueError('cannot sample a pdf that does not sum to a finite value: {0}'.format(total.ravel()))
+    if (np.ndim(table) == 1) and (total[0] <= 0):
+        raise ValueError('cannot sample a pdf that sums to {0}, it needs a positive entry'.format(total[0]))
+    return(np.ascontiguousarray(np.divide(table, total, out=np.zeros_like(table), where=total > 0)))
+
+
+def MakeSampleCdf(jit):
+    """
+    Builds the table search with the given decorator (nb.jit for the cpu,
+    cuda.jit(device=True) for kernels, none for pure python) so every
+    backend shares one definition
+    """
+
+    @jit
+    def sample_cdf(cdf, xi):
+        """
+        First entry of a cumulative table reaching xi, by bisection in
+        O(log N): the same entry a linear walk summing the pdf finds, zero
+        probability entries are never picked and xi past the (rounded) end
+        of the table gives the last entry
+        """
+        lo = 0
+        hi = cdf.shape[0]-1
+        while lo < hi:
+            mid = (lo + hi)//2
+            if cdf[mid] < xi:
+                lo = mid + 1
+            else:
+                hi = mid
+        return(lo)
+
+    return(sample_cdf)
+
+
+def MakeSampleDistance(jit):
+    """
+    Builds the distance to collision sampler with the given decorator, same
+    sharing as MakeSampleCdf
+    """
+
+    @jit
+    def sample_distance(rand, total_xsec):
+        """
+        Distance to the next collision, -ln(rand)/total. A void (total of 0)
+        never collides: the distance is infinite so the particle streams to
+        the cell boundary
+        """
+        if total_xsec > 0:
+            return(-math.log(rand)/total_xsec)
+        return(math.inf)
+
+    return(sample_distance)
+
+
+# pure python flavour (pp kernels), numba builds its own in numba_kernels
+SampleCdf = MakeSampleCdf(lambda f: f)
+SampleDistance = MakeSampleDistance(lambda f: f)
+
+
+def test_SampleCdf():
+    pdf = np.array([0.0, 0.25, 0.0, 0.5, 0.25])
+    cdf = CumulativeTable(pdf)
+    assert(np.array_equal(cdf, [0, 0.25, 0.25, 0.75, 1]))
+    assert(SampleCdf(cdf, 0.1) == 1)
+    assert(SampleCdf(cdf, 0.25) == 1)
+    assert(SampleCdf(cdf, 0.3) == 3)
+    assert(SampleCdf(cdf, 1.5) == 4)
+
+    #matches the linear walk over the pdf
+    np.random.seed(7)
+    pdf = np.random.random(101)*(np.random.random(101) > 0.3)
+    pdf /= np.sum(pdf)
+    cdf = CumulativeTable(pdf)
+    for xi in np.random.random(1000):
+        cell = 0
+        summer = 0
+        while (summer < xi):
+            summer += pdf[cell]
+            cell += 1
+        assert(SampleCdf(cdf, xi) == cell-1)
+
+    #rows of a table that never sum up stay zero
+    assert(np.array_equal(CumulativeTable(np.array([[1.0, 3.0], [0.0, 0.0]])), [[0.25, 1], [0, 0]]))
+
+    assert(SampleDistance(np.exp(-2.0), 4.0) == 0.5)
+    assert(SampleDistance(0.5, 0.0) == np.inf)
+
+    #but a pdf with nothing (or NaN) to sample is an error
+    for pdf in (np.zeros(3), np.full(3, np.nan), np.array([[1.0, np.nan]])):
+        try:
+            CumulativeTable(pdf)
+            assert(False)
+        except ValueError:
+            pass
+
+
+if __name__ == '__main__':
+    test_SampleCdf()
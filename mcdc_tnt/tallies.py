@@ -0,0 +1,96 @@
+"""
+Name: Tallies
+breif: Batch statistics for mesh tallies of MCDC-TNT
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+class BatchTally:
+    """
+    Running (Welford) mean and variance of a mesh tally over source batches.
+    Every batch adds its tally per source particle, weighted by the number of
+    source particles in the batch, so the mean is the same as one big run
+
+    Attributes
+    ----------
+    num_batches : int
+        number of batches added so far.
+    weight : double
+        total weight (source particles) of the batches added so far.
+    mean : vector double
+        weighted mean of the batch tallies (per source particle).
+    m2 : vector double
+        weighted sum of squared deviations from the mean.
+    """
+
+    def __init__(self, N):
+        self.num_batches = 0
+        self.weight = 0.0
+        self.mean = np.zeros(N, dtype=np.float64)
+        self.m2 = np.zeros(N, dtype=np.float64)
+
+    def add_batch(self, batch_tally, weight=1.0):
+        """
+        Adds one batch estimate (tally per source particle) in place
+        """
+        self.num_batches += 1
+        self.weight += weight
+        delta = batch_tally - self.mean
+        self.mean += (weight/self.weight)*delta
+        self.m2 += weight*delta*(batch_tally - self.mean)
+
+    def grow(self, positions, N):
+        """
+        Moves the running sums to positions of a longer tally of N bins (a
+        sparse tally that gained bins). The new bins scored nothing in the
+        batches so far, their mean and m2 are zero
+        """
+        mean = np.zeros(N, dtype=np.float64)
+        m2 = np.zeros(N, dtype=np.float64)
+        mean[positions] = self.mean
+        m2[positions] = self.m2
+        self.mean = mean
+        self.m2 = m2
+
+    def std_error(self):
+        """
+        Standard error of the mean in every cell, zeros until there are two
+        batches
+        """
+        if self.num_batches < 2:
+            return(np.zeros_like(self.mean))
+        return(np.sqrt(np.maximum(self.m2, 0)/(self.weight*(self.num_batches-1))))
+
+    def relative_error(self):
+        """
+        Largest relative standard error over the cells that scored, inf
+        until there are two batches
+        """
+        scored = self.mean > 0
+        if (self.num_batches < 2) or (scored.any() == False):
+            return(np.inf)
+        return(np.max(self.std_error()[scored]/self.mean[scored]))
+
+    def figure_of_merit(self, time):
+        """
+        1/(R^2 T) with R the relative_error and T the run time so far
+        """
+        rel_error = self.relative_error()
+        if (rel_error == np.inf) or (time <= 0):
+            return(0.0)
+        if rel_error == 0:
+            return(np.inf)
+        return(1/(rel_error**2*time))
+
+    def converged(self, target_rel_error=None, target_fom=None, time=0.0):
+        """
+        True once either target is met (a target of None is ignored)
+        """
+        if (target_rel_error is not None) and (self.relative_error() <= target_rel_error):
+            return(True)
+        if (target_fom is not None) and (self.figure_of_merit(time) >= target_fom):
+            return(True)
+        return(False)
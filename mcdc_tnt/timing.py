@@ -0,0 +1,106 @@
+"""
+Name: Timing
+breif: Per kernel timing accumulator and figure of merit for MCDC-TNT
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+class KernelTimer:
+    """
+    Wall time of every kernel (event) call of a run, accumulated by kernel
+    name so backends and revisions can be compared kernel by kernel
+
+    Attributes
+    ----------
+    calls : dict str -> int
+        number of calls of every kernel.
+    total, minimum, maximum : dict str -> double
+        total, shortest and longest call of every kernel in seconds.
+    particles : dict str -> int
+        particles processed by every kernel over all of its calls.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.total = {}
+        self.minimum = {}
+        self.maximum = {}
+        self.particles = {}
+
+    def add(self, name, seconds, num_part=0):
+        """
+        Records one call of kernel name that took seconds on num_part
+        particles
+        """
+        if name not in self.calls:
+            self.calls[name] = 0
+            self.total[name] = 0.0
+            self.minimum[name] = np.inf
+            self.maximum[name] = 0.0
+            self.particles[name] = 0
+        self.calls[name] += 1
+        self.total[name] += seconds
+        self.minimum[name] = min(self.minimum[name], seconds)
+        self.maximum[name] = max(self.maximum[name], seconds)
+        self.particles[name] += int(num_part)
+
+    def report(self):
+        """
+        Dict of kernel name -> calls, total/min/max seconds, particles
+        processed and particles per second (in the order first called)
+        """
+        report = {}
+        for name in self.calls:
+            report[name] = {'calls': self.calls[name],
+                            'total seconds': self.total[name],
+                            'min seconds': self.minimum[name],
+                            'max seconds': self.maximum[name],
+                            'particles': self.particles[name],
+                            'particles per second': self.particles[name]/self.total[name] if self.total[name] > 0 else 0.0}
+        return(report)
+
+    def print_report(self):
+        print('kernel                calls   total [s]     min [s]     max [s]   particles/s')
+        for name, kernel in self.report().items():
+            print('{0:<20} {1:>6} {2:>11.4e} {3:>11.4e} {4:>11.4e} {5:>13.4e}'.format(name, kernel['calls'],
+                    kernel['total seconds'], kernel['min seconds'], kernel['max seconds'], kernel['particles per second']))
+
+
+def FigureOfMerit(mean, std_error, seconds):
+    """
+    Figure of merit 1/(R^2 T) of every tally cell, R the relative error and
+    T the run time. Cells without a score (or without an error estimate)
+    get 0, a broken (not finite) error stays NaN instead of looking unscored
+    """
+    mean = np.asarray(mean, dtype=float)
+    std_error = np.asarray(std_error, dtype=float)
+    fom = np.zeros(mean.shape, dtype=float)
+    scored = (mean != 0) & (std_error > 0) & (seconds > 0)
+    fom[scored] = (mean[scored]/std_error[scored])**2/seconds
+    fom[~np.isfinite(std_error)] = np.nan
+    return(fom)
+
+
+def test_KernelTimer():
+    timers = KernelTimer()
+    timers.add('Advance', 2.0, 100)
+    timers.add('Advance', 1.0, 50)
+    timers.add('Scatter', 0.5)
+
+    report = timers.report()
+    assert(list(report.keys()) == ['Advance', 'Scatter'])
+    assert(report['Advance']['calls'] == 2)
+    assert(report['Advance']['min seconds'] == 1.0)
+    assert(report['Advance']['max seconds'] == 2.0)
+    assert(report['Advance']['particles per second'] == 50)
+    assert(report['Scatter']['particles'] == 0)
+
+    fom = FigureOfMerit([1.0, 0.0, 2.0], [0.1, 0.0, 0.0], 2.0)
+    assert(np.allclose(fom, [50, 0, 0]))
+
+
+if __name__ == '__main__':
+    test_KernelTimer()
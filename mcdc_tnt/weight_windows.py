@@ -0,0 +1,92 @@
+"""
+Name: WeightWindows
+breif: Per cell weight window bounds from importances or a pilot run's flux for MCDC-TNT
+Author: Jackson Morgan (OR State Univ - morgjack@oregonstate.edu) CEMeNT
+Date: Oct 17th 2026
+"""
+
+import numpy as np
+
+
+def WeightWindows(lower, ratio):
+    """
+    Weight window array from the lower bound of every cell, the upper bound
+    is ratio times the lower and the survival weight sits in the middle
+
+    Parameters
+    ----------
+    lower : vector double
+        lower weight bound of every mesh cell.
+    ratio : double
+        upper to lower bound ratio (> 1).
+
+    Returns
+    -------
+    array double [3, N_mesh] of lower bound, survival weight and upper bound
+    (the layout WeightWindow kernels expect).
+
+    """
+    lower = np.asarray(lower, dtype=float)
+    return(np.array([lower, lower*(1+ratio)/2, lower*ratio]))
+
+
+def WindowsFromImportance(importance, ratio):
+    """
+    Weight windows inversely proportional to the cell importances, a weight
+    1 particle sits in the middle of the window of the least important cell
+    """
+    importance = np.asarray(importance, dtype=float)
+    if np.any(importance <= 0):
+        raise ValueError('importances must be positive: {0}'.format(importance))
+    return(WeightWindows(2/(1+ratio)*np.min(importance)/importance, ratio))
+
+
+def WindowsFromFlux(flux, source_pdf, ratio):
+    """
+    Weight windows proportional to a (pilot run) flux estimate, which keeps
+    the number of particles per cell roughly flat so the far cells of deep
+    penetration problems are sampled as well as the source. The windows are
+    normalized so the source weighted window center is 1 (the source
+    weight), cells the pilot never scored take the flux of the nearest cell
+    that did
+
+    Parameters
+    ----------
+    flux : vector double
+        flux estimate of every mesh cell.
+    source_pdf : vector double
+        probability of a source particle being born in every mesh cell.
+    ratio : double
+        upper to lower bound ratio (> 1).
+
+    Returns
+    -------
+    array double [3, N_mesh], see WeightWindows.
+
+    """
+    flux = np.array(flux, dtype=float)
+    scored = flux > 0
+    if scored.any() == False:
+        return(WeightWindows(np.full(len(flux), 2/(1+ratio)), ratio))
+    cells = np.arange(len(flux))
+    flux[~scored] = np.interp(cells[~scored], cells[scored], flux[scored])
+
+    center = flux/max(np.sum(source_pdf*flux), 1e-300)
+    return(WeightWindows(2/(1+ratio)*center, ratio))
+
+
+def test_WeightWindows():
+    windows = WeightWindows([1, 2], 5)
+    assert(np.allclose(windows, [[1, 2], [3, 6], [5, 10]]))
+
+    windows = WindowsFromImportance([1, 2, 4], 3)
+    assert(np.allclose(windows[1], [1, .5, .25]))
+
+    #source in the second cell, flux falling off by 10 per cell
+    windows = WindowsFromFlux([0, 1, .1, .01, 0], [0, 1, 0, 0, 0], 3)
+    assert(np.allclose(windows[1], [1, 1, .1, .01, .01]))
+    assert(np.allclose(windows[2]/windows[0], 3))
+
+
+if __name__ == '__main__':
+    test_WeightWindows()
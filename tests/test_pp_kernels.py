@@ -4,58 +4,124 @@ import math
 #class test_pp_kernels:
   
     
-def test_SourceParticles():
-    num_parts = 5
-    p_pos_x = np.zeros(num_parts)
-    p_pos_y = np.zeros(num_parts)
-    p_pos_z = np.zeros(num_parts)
-    
-    p_mesh_cell = np.zeros(num_parts)
+def test_ParticleBank():
+    capacity = 4
+    bank = kernels.ParticleBank(capacity)
+    
+    assert (bank.capacity == capacity)
+    assert (bank.num_part == 0)
+    assert (len(bank.p_pos_x) == capacity)
+    assert (len(bank.p_mesh_cell) == capacity)
+    assert (bank.p_alive.any() == False)
+    
+    #columns are views into the bank, writes must stick
+    p_pos_x = bank.p_pos_x
+    p_pos_x[2] = 1.5
+    bank.num_part = 3
+    
+    assert (bank.p_pos_x[2] == 1.5)
+    assert (bank.num_part == 3)
+    
+    
+def test_ParticleBank_grow():
+    bank = kernels.ParticleBank(2)
+    bank.num_part = 2
+    bank.p_pos_x[:] = [1,2]
+    bank.p_alive[:] = True
+    
+    assert (bank.reserve(2) == False)
+    assert (bank.reserve(5) == True)
+    assert (bank.capacity == 8)
+    assert (bank.high_water == 5)
+    assert (np.allclose(bank.p_pos_x[0:2], [1,2]))
+    assert (bank.p_alive[0:2].all() == True)
+    
+    bank.num_part = 1
+    assert (bank.shrink(2) == True)
+    assert (bank.capacity == 2)
+    assert (bank.p_pos_x[0] == 1)
+    assert (bank.num_resize == 2)
+    
+    
+def test_AdvanceWorkspace():
+    workspace = kernels.AdvanceWorkspace(2)
+    
+    assert (workspace.reserve(2) == False)
+    assert (workspace.reserve(5) == True)
+    assert (workspace.capacity == 8)
+    assert (len(workspace.rands) == 8)
+    assert (len(workspace.active) == 8)
+    
+    # Advance grows an undersized workspace and refills the randoms in place
+    num_part = 20
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = 0.5
+    bank.p_mesh_cell[:] = 2
+    bank.p_dir_x[:] = 1
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(bank.capacity)
+    
+    mesh_dist_traveled = np.zeros(4)
+    mesh_dist_traveled_squared = np.zeros(4)
+    kernels.Advance(bank, .25, np.ones(4), mesh_dist_traveled, mesh_dist_traveled_squared, 1.0, workspace)
+    
+    assert (workspace.capacity == 32)
+    assert (workspace.p_end_trans[:num_part].all() == True)
+    assert ((workspace.rands[:num_part] > 0).all() == True)
+    assert (mesh_dist_traveled[2] > 0)
+    
+    # worklist shrinks every sub-step until nobody is streaming
+    fraction = workspace.active_fraction[:workspace.num_sub_steps]
+    assert (workspace.num_sub_steps > 1)
+    assert (fraction[0] == 1)
+    assert ((np.diff(fraction) <= 0).all() == True)
+    assert (fraction[-1] > 0)
     
-    p_dir_x = np.zeros(num_parts)
-    p_dir_y = np.zeros(num_parts)
-    p_dir_z = np.zeros(num_parts)
     
-    p_speed = np.zeros(num_parts)
-    p_time = np.ones(num_parts)
-    p_alive = np.zeros(num_parts)
+def test_SourceParticles():
+    num_parts = 5
+    bank = kernels.ParticleBank(num_parts)
+    bank.p_time[:] = 1
     
     particle_speed = 1
-    meshwise_fission_pdf = [0,1]
+    meshwise_fission_cdf = np.array([0,1], dtype=float)
     
     iso=False
     
     dx = 0.2
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive] = kernels.SourceParticles(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_parts, meshwise_fission_pdf, particle_speed, iso)
+    kernels.SourceParticles(bank, dx, num_parts, meshwise_fission_cdf, particle_speed, iso)
     
-    assert (np.sum(p_time) == 0)
-    assert (p_mesh_cell.all() == 1)
-    assert (p_alive.all() == True)
-    assert (p_pos_x.all() > .2)
+    assert (bank.num_part == num_parts)
+    assert (np.sum(bank.p_time) == 0)
+    assert (bank.p_mesh_cell.all() == 1)
+    assert (bank.p_alive.all() == True)
+    assert (bank.p_pos_x.all() > .2)
 
 
 
 
 
 def test_SampleEvent():
-    p_mesh_cell = np.array([0,1,0,5])
-    p_alive = [True,True,True,False]
+    bank = kernels.ParticleBank(4)
+    bank.num_part = 3
+    bank.p_mesh_cell[:] = np.array([0,1,2,5])
+    bank.p_alive[:] = np.array([True,True,True,False])
+    bank.p_id[:] = np.arange(4)
     
-    mesh_cap_xsec = 1/3*np.ones(2)
-    mesh_scat_xsec = 1/3*np.ones(2)
-    mesh_fis_xsec = 1/2*np.ones(2)
+    # one reaction per cell, the outcome does not depend on the draw
+    mesh_cap_xsec = np.array([0, 1, 0], dtype=float)
+    mesh_scat_xsec = np.array([2, 0, 0], dtype=float)
+    mesh_fis_xsec = np.array([0, 0, .5], dtype=float)
     
-    scatter_event_index = np.zeros(3)
-    capture_event_index = np.zeros(3)
-    fission_event_index = np.zeros(3) 
-    
-    controled_rands = np.array([.2, .4, .8])
+    scatter_event_index = np.zeros(3, dtype=int)
+    capture_event_index = np.zeros(3, dtype=int)
+    fission_event_index = np.zeros(3, dtype=int)
     
     nu = 2
-    num_part = 3
     
-    [scatter_event_index, scat_count, capture_event_index, cap_count, fission_event_index, fis_count] = kernels.SampleEvent(p_mesh_cell, p_alive, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, num_part, nu, controled_rands)
+    [scat_count, cap_count, fis_count] = kernels.SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu)
     
     assert (fis_count == 1)
     assert (scat_count == 1)
@@ -64,19 +130,47 @@ def test_SampleEvent():
     assert (capture_event_index[0] == 1)
     assert (fission_event_index[0] == 2)
     assert (scatter_event_index[0] == 0)
+    assert (bank.event == 1)
+    
+    # reaction tally fused into the same pass
+    bank.p_alive[:] = np.array([True,True,True,False])
+    reaction_tally = np.zeros((3, 3))
+    kernels.SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu, reaction_tally)
+    assert (np.array_equal(reaction_tally, np.eye(3)))
+
+    # implicit capture: nobody is absorbed, the weight carries the capture
+    bank.p_alive[:] = np.array([True,True,True,False])
+    bank.p_weight[:] = 1.0
+    mesh_cap_xsec = np.array([1, 1, 0], dtype=float)
+    reaction_tally = np.zeros((3, 3))
+    kernels.SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, scatter_event_index, capture_event_index, fission_event_index, nu, reaction_tally,
+                        np.array([0.25, 1.0]))
+    assert (bank.p_alive[0] == True)
+    assert (math.isclose(bank.p_weight[0], 2/3))
+    assert (np.allclose(np.sum(reaction_tally, axis=0), 1.0))
         
         
         
         
         
+    
+    
+    
+    
+    
 def test_StillIn():    
     
     num_part = 7
-    surface_distances = [0,.25,.75,1]
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1])
-    p_alive = np.ones(num_part, bool)
+    surface_distances = np.array([0,.25,.75,1], dtype=float)
     
-    [p_alive, tally_left, tally_right] = kernels.StillIn(p_pos_x, surface_distances, p_alive, num_part)
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1, 1], dtype=float)
+    bank.p_alive[:] = True
+    
+    [tally_left, tally_right] = kernels.StillIn(bank, surface_distances)
+    
+    p_alive = bank.p_alive
     
     assert(p_alive[0] == False)
     assert(p_alive[5] == False)
@@ -92,35 +186,67 @@ def test_BOYD():
     
     num_part = 3
     
-    p_pos_x = [1,2,3]
-    p_pos_y = [1,2,3]
-    p_pos_z = [1,2,3]
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
     
-    p_mesh_cell = [1,2,3]
+    bank.p_pos_x[:] = [1,2,3]
+    bank.p_pos_y[:] = [1,2,3]
+    bank.p_pos_z[:] = [1,2,3]
     
-    p_dir_x = [1,2,3]
-    p_dir_y = [1,2,3]
-    p_dir_z = [1,2,3]
+    bank.p_mesh_cell[:] = [1,2,3]
     
-    p_speed = [1,2,3]
-    p_time = [1,2,3]
-    p_alive = [False,True,False]
+    bank.p_dir_x[:] = [1,2,3]
+    bank.p_dir_y[:] = [1,2,3]
+    bank.p_dir_z[:] = [1,2,3]
     
+    bank.p_speed[:] = [1,2,3]
+    bank.p_time[:] = [1,2,3]
+    bank.p_alive[:] = [False,True,False]
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, kept] = kernels.BringOutYourDead(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, num_part)
+    
+    kept = kernels.BringOutYourDead(bank)
     
     assert(kept == 1)
-    assert(p_dir_x[0] == 2)
-    assert(p_dir_y[0] == 2)
-    assert(p_dir_z[0] == 2)
+    assert(bank.num_part == 1)
+    assert(bank.p_dir_x[0] == 2)
+    assert(bank.p_dir_y[0] == 2)
+    assert(bank.p_dir_z[0] == 2)
+    
+    assert(bank.p_pos_x[0] == 2)
+    assert(bank.p_pos_y[0] == 2)
+    assert(bank.p_pos_z[0] == 2)
     
-    assert(p_pos_x[0] == 2)
-    assert(p_pos_y[0] == 2)
-    assert(p_pos_z[0] == 2)
+    assert(bank.p_speed[0] == 2)
+    assert(bank.p_time[0] == 2)
+    assert(bank.p_alive[0] == True)
     
-    assert(p_speed[0] == 2)
-    assert(p_time[0] == 2)
-    assert(p_alive[0] == True)
+    
+def test_BOYD_double_buffer():
+    
+    num_part = 1000
+    
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = np.arange(num_part)
+    bank.p_time[:] = np.arange(num_part)
+    bank.p_alive[:] = np.arange(num_part) % 3 == 0
+    
+    spare = kernels.ParticleBank(num_part)
+    
+    kept = kernels.BringOutYourDead(bank, spare, swap=True)
+    
+    assert(kept == 334)
+    assert(bank.num_part == kept)
+    assert(np.all(bank.p_pos_x[0:kept] == 3*np.arange(kept)))
+    assert(np.all(bank.p_time[0:kept] == 3*np.arange(kept)))
+    assert(bank.p_alive[0:kept].all() == True)
+    
+    #and back again in copy mode, order must be preserved
+    bank.p_alive[0:kept] = np.arange(kept) % 2 == 1
+    kept = kernels.BringOutYourDead(bank, spare, swap=False)
+    
+    assert(kept == 167)
+    assert(np.all(bank.p_pos_x[0:kept] == 3*np.arange(1, 2*kept, 2)))
     
     
     
@@ -133,38 +259,105 @@ def test_FissionsAdd():
     N_m = 4
     
     num_part = 3
-    p_pos_x = np.array([.55, 3, 5])
-    p_pos_y = np.array([10, 3, 5])
-    p_pos_z = np.array([15, 3, 5])
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = 1
+    
+    bank.p_pos_x[:] = np.array([.55, 3, 5])
+    bank.p_pos_y[:] = np.array([10, 3, 5])
+    bank.p_pos_z[:] = np.array([15, 3, 5])
     
-    p_mesh_cell = np.array([2, 87, -1])
+    bank.p_mesh_cell[:] = np.array([2, 87, -1])
     
-    p_dir_x = np.ones(num_part)
-    p_dir_y = np.zeros(num_part)
-    p_dir_z = np.zeros(num_part)
+    bank.p_dir_x[:] = 1
     
-    p_speed = np.ones(num_part)
-    p_time = np.zeros(num_part)
-    p_alive = np.ones(num_part, bool)
-    p_alive[0] = False
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(bank.capacity)
+    bank.p_alive[:] = True
+    bank.p_alive[0] = False
     
     fis_count = 1
     nu = 2
-    fission_event_index = [0]
-    
-    rands = [1,1,1,1]
-    
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, k] = kernels.FissionsAdd(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, p_alive, fis_count, nu, fission_event_index, 1, 1, rands)
-    
-    print(p_pos_x)
-    print(p_pos_y)
-    print(p_pos_z)
-    
-    assert(np.allclose(p_pos_x, [0.55, 0.55, 0.55]))
-    assert(np.allclose(p_pos_y, [10,10,10]))
-    assert(np.allclose(p_pos_z, [15,15,15]))
-    assert(p_dir_x.all() == 1)
-    assert(p_alive[1:2].all() == True)
+    fission_event_index = np.array([0])
+    
+    k = kernels.FissionsAdd(bank, fis_count, nu, fission_event_index, 1)
+    
+    print(bank.p_pos_x)
+    print(bank.p_pos_y)
+    print(bank.p_pos_z)
+    
+    assert(k == 2)
+    assert(bank.num_part == 3)
+    assert(np.allclose(bank.p_pos_x, [0.55, 0.55, 0.55]))
+    assert(np.allclose(bank.p_pos_y, [10,10,10]))
+    assert(np.allclose(bank.p_pos_z, [15,15,15]))
+    assert(bank.p_dir_x.all() == 1)
+    assert(bank.p_alive[1:2].all() == True)
+    assert(np.allclose(bank.p_dir_x[1:3]**2 + bank.p_dir_y[1:3]**2 + bank.p_dir_z[1:3]**2, 1))
+    assert(bank.p_id[1] != bank.p_id[2])
+    
+    #supercritical, fission neutrons do not fit in the current allocation
+    bank.num_part = 3
+    k = kernels.FissionsAdd(bank, fis_count, 3, fission_event_index, 1)
+    
+    assert(k == 3)
+    assert(bank.num_part == 6)
+    assert(bank.capacity == 6)
+    assert(np.allclose(bank.p_pos_x[0:6], 0.55))
+    
+    
+def test_PopulationControl():
+    
+    #fission sites of a cycle banked apart from the transported particles
+    bank = kernels.ParticleBank(2)
+    bank.num_part = 2
+    bank.p_pos_x[:] = [.25, .75]
+    bank.p_mesh_cell[:] = [2, 7]
+    bank.p_id[:] = [0, 1]
+    
+    fission_bank = kernels.ParticleBank(1)
+    kernels.FissionsAdd(bank, 2, 3, np.array([0, 1]), 1, fission_bank)
+    assert(bank.num_part == 2)
+    assert(fission_bank.num_part == 6)
+    
+    #combed down to 4 source particles, every site picked at most once
+    combed = kernels.PopulationControl(fission_bank, bank, 4)
+    
+    assert(combed == 6)
+    assert(bank.num_part == 4)
+    assert(fission_bank.num_part == 0)
+    assert(np.sum(bank.p_pos_x[0:4] == .25) == 2)
+    assert(np.sum(bank.p_mesh_cell[0:4] == 7) == 2)
+    assert(np.all(bank.p_time[0:4] == 0))
+    assert(bank.p_alive[0:4].all() == True)
+    assert(len(np.unique(bank.p_id[0:4])) == 4)
+    
+    
+def test_WeightWindow():
+    
+    #window [.5, 2] in cell 0, [.05, .2] in cell 1
+    weight_windows = np.array([[.5, .05], [1.25, .125], [2, .2]])
+    
+    bank = kernels.ParticleBank(4)
+    bank.num_part = 4
+    bank.p_pos_x[:] = [.1, .2, .6, .7]
+    bank.p_mesh_cell[:] = [0, 0, 1, 1]
+    bank.p_alive[:] = True
+    bank.p_id[:] = np.arange(4)
+    bank.p_weight[:] = [1, 5, .5, .1]
+    
+    #particle 3 did not scatter and is left alone
+    [added, killed] = kernels.WeightWindow(bank, np.array([0, 1, 2]), 3, weight_windows)
+    
+    #5 is split into 3 copies of 5/3 and .5 into 3 copies of 1/6
+    assert(added == 4)
+    assert(killed == 0)
+    assert(bank.num_part == 8)
+    assert(bank.p_weight[0] == 1)
+    assert(bank.p_weight[3] == .1)
+    assert(np.isclose(np.sum(bank.p_weight[:8]), 1 + 5 + .5 + .1))
+    assert(np.all(bank.p_mesh_cell[4:6] == 0))
+    assert(np.all(bank.p_mesh_cell[6:8] == 1))
+    assert(len(np.unique(bank.p_id[:8])) == 8)
     
     
 def test_Advance():
@@ -173,46 +366,468 @@ def test_Advance():
     N_m = 4
     
     num_part = 6
-    p_pos_x = np.array([-.01, 0, .1544, .2257, .75, 1.1])
-    p_pos_y = 2.1*np.ones(num_part)
-    p_pos_z = 3.4*np.ones(num_part)
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
     
-    p_mesh_cell = np.array([-1, 0, 0, 1, 3, 4])
+    bank.p_pos_x[:] = np.array([-.01, 0, .1544, .2257, .75, 1.1])
+    bank.p_pos_y[:] = 2.1
+    bank.p_pos_z[:] = 3.4
     
-    p_dir_x = np.ones(num_part)
-    p_dir_x[0] = -1
-    p_dir_y = np.zeros(num_part)
-    p_dir_z = np.zeros(num_part)
+    bank.p_mesh_cell[:] = np.array([-1, 0, 0, 1, 3, 4])
     
-    p_speed = np.ones(num_part)
-    p_time = np.zeros(num_part)
-    p_alive = np.ones(num_part, bool)
-    p_alive[5] = False
+    bank.p_dir_x[:] = 1
+    bank.p_dir_x[0] = -1
+    
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(bank.capacity)
+    bank.p_alive[:] = True
+    bank.p_alive[5] = False
     
     
-    particle_speed = 1
     mesh_total_xsec = np.array([0.1,1,.1,100])
     
     mesh_dist_traveled_squared = np.zeros(N_m)
     mesh_dist_traveled = np.zeros(N_m)
     
-    [p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, mesh_dist_traveled, mesh_dist_traveled_squared] = kernels.Advance(p_pos_x, p_pos_y, p_pos_z, p_mesh_cell, dx, p_dir_y, p_dir_z, p_dir_x, p_speed, p_time, num_part, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L)
+    kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L,
+                    kernels.AdvanceWorkspace(num_part))
     
+    p_pos_x = bank.p_pos_x
     
     assert (np.sum(mesh_dist_traveled) > 0)
     assert (np.sum(mesh_dist_traveled_squared) > 0)
     assert (p_pos_x[0]  == -.01)
     assert (p_pos_x[5]  == 1.1)
-    assert (p_pos_x[1:4].all()  > .75)
+    assert (p_pos_x[1:4].all()  > .75)    
     
+def test_Advance_tally_mesh():
+    #a tally mesh twice as fine as the material mesh: each pair of bins must
+    #add up to the material cell it splits (interior cells, up to the kicker)
+    L = 1
+    dx = .1
+    N_m = 10
+    
+    num_part = 200
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.seed = 7
+    bank.p_pos_x[:] = np.linspace(0.01, 0.99, num_part)
+    bank.p_mesh_cell[:] = (bank.p_pos_x/dx).astype(np.int32)
+    bank.p_dir_x[:] = np.linspace(-1, 1, num_part)
+    bank.p_dir_y[:] = np.sqrt(1 - bank.p_dir_x**2)
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(num_part)
+    bank.p_alive[:] = True
+    
+    mesh_total_xsec = 0.5*np.ones(N_m)
+    mesh_dist_traveled = np.zeros(N_m)
+    mesh_dist_traveled_squared = np.zeros(N_m)
+    
+    tally_meshes = kernels.BuildTallyMeshes([np.linspace(0, L, 2*N_m+1), np.array([0.0, 0.5, 1.0])])
+    
+    kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L,
+                    kernels.AdvanceWorkspace(num_part), tally_meshes)
+    
+    fine = tally_meshes.flux[:2*N_m]
+    coarse = tally_meshes.flux[2*N_m:]
+    assert (np.allclose(fine[2:2*N_m-2].reshape(-1, 2).sum(axis=1), mesh_dist_traveled[1:N_m-1], atol=1e-6))
+    assert (np.allclose(coarse, [fine[:N_m].sum(), fine[N_m:].sum()]))
+    assert (np.all(tally_meshes.flux_squared > 0))
+    
+    
+def test_Advance_time_tally():
+    #time bins that cover every flight: summed over time they give the
+    #material tally, and nothing is scored before the particles start
+    L = 1
+    dx = .1
+    N_m = 10
+    
+    num_part = 200
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.seed = 3
+    bank.p_pos_x[:] = np.linspace(0.01, 0.99, num_part)
+    bank.p_mesh_cell[:] = (bank.p_pos_x/dx).astype(np.int32)
+    bank.p_dir_x[:] = np.linspace(-1, 1, num_part)
+    bank.p_dir_y[:] = np.sqrt(1 - bank.p_dir_x**2)
+    bank.p_speed[:] = 2
+    bank.p_time[:] = 0.5
+    bank.p_id[:] = np.arange(num_part)
+    bank.p_alive[:] = True
+    
+    mesh_total_xsec = 0.5*np.ones(N_m)
+    mesh_dist_traveled = np.zeros(N_m)
+    mesh_dist_traveled_squared = np.zeros(N_m)
+    
+    time_tally = kernels.TimeTally(np.linspace(0, 100, 401), N_m)
+    
+    kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L,
+                    kernels.AdvanceWorkspace(num_part), None, time_tally)
+    
+    flux = time_tally.dense_flux().reshape(400, N_m)
+    assert (np.allclose(flux.sum(axis=0)[1:N_m-1], mesh_dist_traveled[1:N_m-1]))
+    assert (np.all(flux[:2] == 0))
+    assert (np.sum(flux[2]) > 0)
+    
+
+def test_Advance_surface_tally():
+    #the crossings of the outer surfaces are the leakage StillIn counts
+    L = 1
+    dx = .1
+    N_m = 10
+    
+    num_part = 200
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.seed = 11
+    bank.p_pos_x[:] = np.linspace(0.01, 0.99, num_part)
+    bank.p_mesh_cell[:] = (bank.p_pos_x/dx).astype(np.int32)
+    bank.p_dir_x[:] = np.linspace(1, -1, num_part) #toward the middle
+    bank.p_dir_y[:] = np.sqrt(1 - bank.p_dir_x**2)
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(num_part)
+    bank.p_alive[:] = True
+    
+    mesh_total_xsec = 0.5*np.ones(N_m)
+    surface_distances = np.array([0, .5, 1])
+    surface_tally = kernels.SurfaceTally(surface_distances, np.array([-1, 0, 1.]), np.array([0, np.inf]))
+    
+    kernels.Advance(bank, dx, mesh_total_xsec, np.zeros(N_m), np.zeros(N_m), L,
+                    kernels.AdvanceWorkspace(num_part), None, None, surface_tally)
+    [tally_left, tally_right] = kernels.StillIn(bank, surface_distances)
+    
+    current = surface_tally.current.reshape(3, 2)
+    assert (tally_left > 0) and (tally_right > 0)
+    assert (current[0, 0] == tally_left) and (current[0, 1] == 0)
+    assert (current[2, 1] == tally_right) and (current[2, 0] == 0)
+    assert (current[1].sum() > 0)
+    
+
+def test_AdvanceDelta():
+    # delta tracking with a collision estimator against surface tracking with
+    # a track length estimator, same source in a slab with jumpy cross sections
+    L = 1.0
+    N_m = 10
+    dx = L/N_m
+    num_part = int(2e4)
+    mesh_total_xsec = np.array([1, 2, .5, 3, 1, 1, 4, .2, 1, 2], dtype=float)
+    
+    np.random.seed(777)
+    x0 = L*np.random.random(num_part)
+    mu = 2*np.random.random(num_part) - 1
+    
+    tallies = []
+    collided = []
+    for Advance in (kernels.Advance, kernels.AdvanceDelta):
+        bank = kernels.ParticleBank(num_part)
+        bank.num_part = num_part
+        bank.p_pos_x[:] = x0
+        bank.p_mesh_cell[:] = (x0/dx).astype(int)
+        bank.p_dir_x[:] = mu
+        bank.p_speed[:] = 1
+        bank.p_id[:] = np.arange(num_part)
+        bank.p_alive[:] = True
+        
+        mesh_dist_traveled = np.zeros(N_m)
+        mesh_dist_traveled_squared = np.zeros(N_m)
+        Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L,
+                kernels.AdvanceWorkspace(num_part))
+        
+        tallies.append(mesh_dist_traveled)
+        collided.append(np.mean((bank.p_pos_x >= 0) & (bank.p_pos_x < L)))
+        
+        # every particle that stayed in sits in the cell it collided in
+        inside = (bank.p_pos_x >= 0) & (bank.p_pos_x < L)
+        assert ((bank.p_mesh_cell[inside] == (bank.p_pos_x[inside]/dx).astype(int)).all() == True)
+    
+    [surface, delta] = tallies
+    assert (surface[0] == 0 and delta[0] == 0)
+    assert (np.allclose(delta[1:-1], surface[1:-1], rtol=0.2))
+    assert (abs(np.sum(delta)/np.sum(surface) - 1) < 0.05)
+    assert (abs(collided[0] - collided[1]) < 0.03)
+    
+    
+def test_Advance_void():
+    # surface tracking through a void cell: a particle parallel to the cell
+    # edges (p_dir_x of 0) is killed in place instead of getting a nan
+    # position and an infinite track length, the others cross the void
+    L = 1.0
+    N_m = 4
+    dx = L/N_m
+    mesh_total_xsec = np.array([1, 0, 1, 1], dtype=float)
+    
+    bank = kernels.ParticleBank(3)
+    bank.num_part = 3
+    bank.p_pos_x[:] = 0.3
+    bank.p_mesh_cell[:] = 1
+    bank.p_dir_x[:] = np.array([0.0, 1.0, -0.5])
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(3)
+    bank.p_alive[:] = True
+    
+    mesh_dist_traveled = np.zeros(N_m)
+    mesh_dist_traveled_squared = np.zeros(N_m)
+    kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L,
+                    kernels.AdvanceWorkspace(3))
+    
+    assert (np.all(np.isfinite(bank.p_pos_x[:3])) and np.all(np.isfinite(bank.p_time[:3])))
+    assert (bank.p_alive[0] == False and bank.p_pos_x[0] == 0.3)
+    assert (bank.p_alive[1] == True and bank.p_alive[2] == True)
+    assert (np.isclose(mesh_dist_traveled[1], 0.2 + 0.05/0.5, atol=1e-8))
+    
+    
+def test_AdvanceDelta_void():
+    # a void slab and a void cell: a particle parallel to the cell edges
+    # (p_dir_x of 0) can neither collide nor leave and is killed in place,
+    # the others stream straight out of the void slab
+    L = 1.0
+    N_m = 4
+    dx = L/N_m
+    
+    for mesh_total_xsec in (np.zeros(N_m), np.array([1, 0, 1, 1], dtype=float)):
+        bank = kernels.ParticleBank(3)
+        bank.num_part = 3
+        bank.p_pos_x[:] = 0.3
+        bank.p_mesh_cell[:] = 1
+        bank.p_dir_x[:] = np.array([0.0, 1.0, -0.5])
+        bank.p_speed[:] = 1
+        bank.p_id[:] = np.arange(3)
+        bank.p_alive[:] = True
+        
+        mesh_dist_traveled = np.zeros(N_m)
+        mesh_dist_traveled_squared = np.zeros(N_m)
+        kernels.AdvanceDelta(bank, dx, mesh_total_xsec, mesh_dist_traveled, mesh_dist_traveled_squared, L,
+                             kernels.AdvanceWorkspace(3))
+        
+        assert (np.all(np.isfinite(bank.p_pos_x[:3])) and np.all(np.isfinite(bank.p_time[:3])))
+        assert (np.all(np.isfinite(mesh_dist_traveled)))
+        assert (bank.p_alive[0] == False and bank.p_pos_x[0] == 0.3)
+        if mesh_total_xsec.max() == 0:
+            assert (bank.p_alive[1] == True and bank.p_pos_x[1] >= L)
+            assert (bank.p_alive[2] == True and bank.p_pos_x[2] < 0)
+    
+    
+def test_Advance_cell_edges():
+    # a non-uniform mesh: cells must follow the edges in both trackers, and
+    # edges on the uniform grid must give exactly the uniform result
+    L = 1.0
+    num_part = int(2e4)
+    cell_edges = np.array([0, .05, .1, .2, .35, .5, .65, .8, .9, .95, 1])
+    N_m = len(cell_edges)-1
+    mesh_total_xsec = np.array([1, 2, .5, 3, 1, 1, 4, .2, 1, 2], dtype=float)
+    
+    np.random.seed(777)
+    x0 = L*np.random.random(num_part)
+    mu = 2*np.random.random(num_part) - 1
+    
+    def Bank(cell):
+        bank = kernels.ParticleBank(num_part)
+        bank.num_part = num_part
+        bank.p_pos_x[:] = x0
+        bank.p_mesh_cell[:] = cell
+        bank.p_dir_x[:] = mu
+        bank.p_speed[:] = 1
+        bank.p_id[:] = np.arange(num_part)
+        bank.p_alive[:] = True
+        return(bank)
+    
+    tallies = []
+    for Advance in (kernels.Advance, kernels.AdvanceDelta):
+        bank = Bank(np.searchsorted(cell_edges, x0, side='right') - 1)
+        mesh_dist_traveled = np.zeros(N_m)
+        Advance(bank, .05, mesh_total_xsec, mesh_dist_traveled, np.zeros(N_m), L,
+                kernels.AdvanceWorkspace(num_part), None, None, None, cell_edges)
+        tallies.append(mesh_dist_traveled/np.diff(cell_edges))
+        
+        inside = (bank.p_pos_x >= 0) & (bank.p_pos_x < L)
+        cell = bank.p_mesh_cell[inside]
+        assert ((cell_edges[cell] <= bank.p_pos_x[inside]).all() == True)
+        assert ((bank.p_pos_x[inside] <= cell_edges[cell+1]).all() == True)
+    
+    [surface, delta] = tallies
+    assert (np.allclose(delta[1:-1], surface[1:-1], rtol=0.2))
+    
+    dx = 0.125 #exact edges
+    results = []
+    for edges in (None, np.arange(N_m+1)*dx):
+        bank = Bank((x0/dx).astype(int))
+        mesh_dist_traveled = np.zeros(N_m)
+        kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, np.zeros(N_m), N_m*dx,
+                        kernels.AdvanceWorkspace(num_part), None, None, None, edges)
+        results.append((mesh_dist_traveled, bank.p_pos_x[:num_part].copy()))
+    assert (np.array_equal(results[0][0], results[1][0]))
+    assert (np.array_equal(results[0][1], results[1][1]))
+    
+    
+def test_SourceParticles_cell_edges():
+    num_parts = 1000
+    bank = kernels.ParticleBank(num_parts)
+    cell_edges = np.array([0, .1, .5, 1])
+    meshwise_fission_cdf = np.array([.2, .6, 1])
+    
+    kernels.SourceParticles(bank, 0.1, num_parts, meshwise_fission_cdf, 1.0, True, cell_edges)
+    
+    cell = bank.p_mesh_cell[:num_parts]
+    assert (np.all(cell_edges[cell] <= bank.p_pos_x[:num_parts]))
+    assert (np.all(bank.p_pos_x[:num_parts] < cell_edges[cell+1]))
+    assert (np.sum(bank.p_pos_x[:num_parts] > .5) > 300)
+    
+    
+def test_EnergyGroups():
+    # two groups on four cells: everything is born fast, a fast scatter
+    # always lands in the slow group, fast particles only scatter and slow
+    # ones only get captured
+    N_m = 4
+    dx = .25
+    num_part = 1000
+    scatter_cdf = np.array([[[0.0, 1.0], [0.0, 1.0]]])
+    energy_groups = kernels.EnergyGroups(np.array([2.0, .5]), np.array([1.0, 1.0]), scatter_cdf,
+                                         np.zeros(N_m, dtype=np.int32))
+    
+    bank = kernels.ParticleBank(num_part)
+    kernels.SourceParticles(bank, dx, num_part, np.arange(1, N_m+1)/N_m, 1.0, True, None, energy_groups)
+    assert (np.all(bank.p_group[:num_part] == 0))
+    assert (np.all(bank.p_speed[:num_part] == 2))
+    
+    #group major tables, group g of a cell is g*N_m + cell
+    mesh_cap_xsec = np.repeat([0.0, 1.0], N_m)
+    mesh_scat_xsec = np.repeat([1.0, 0.0], N_m)
+    mesh_fis_xsec = np.zeros(2*N_m)
+    scatter_event_index = np.zeros(num_part, dtype=np.int32)
+    capture_event_index = np.zeros(num_part, dtype=np.int32)
+    fission_event_index = np.zeros(num_part, dtype=np.int32)
+    
+    [scat_count, cap_count, fis_count] = kernels.SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+            scatter_event_index, capture_event_index, fission_event_index, 2, None, None, energy_groups)
+    assert (scat_count == num_part)
+    
+    kernels.Scatter(bank, scatter_event_index, scat_count, energy_groups)
+    assert (np.all(bank.p_group[:num_part] == 1))
+    assert (np.all(bank.p_speed[:num_part] == .5))
+    
+    [scat_count, cap_count, fis_count] = kernels.SampleEvent(bank, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+            scatter_event_index, capture_event_index, fission_event_index, 2, None, None, energy_groups)
+    assert (cap_count == num_part)
+    
+    #slow particles see the (thin) slow group cross sections and stream out,
+    #the tally stays one value per cell
+    bank.p_alive[:num_part] = True
+    mesh_total_xsec = np.repeat([1e6, 1e-6], N_m)
+    mesh_dist_traveled = np.zeros(N_m)
+    kernels.Advance(bank, dx, mesh_total_xsec, mesh_dist_traveled, np.zeros(N_m), N_m*dx,
+                    kernels.AdvanceWorkspace(num_part))
+    assert (np.all((bank.p_pos_x[:num_part] <= 0) | (bank.p_pos_x[:num_part] >= N_m*dx)))
+    assert (np.sum(mesh_dist_traveled) > .5*num_part*dx)
+    
+    
+def test_SourceParticles_cdf():
+    # bisection of the cumulative table finds the cell the linear walk over
+    # the pdf would, zero probability cells are never picked and a pdf that
+    # does not sum to a positive value is an error
+    from mcdc_tnt.sampling import CumulativeTable
+    from mcdc_tnt.pp_kernels.rng import Rand
+    num_parts = 500
+    N_m = 1000
+    np.random.seed(11)
+    pdf = np.random.random(N_m)*(np.arange(N_m) % 3 != 0)
+    pdf /= np.sum(pdf)
+    
+    bank = kernels.ParticleBank(num_parts)
+    bank.seed = 5
+    kernels.SourceParticles(bank, 1/N_m, num_parts, CumulativeTable(pdf), 1.0)
+    
+    cell = bank.p_mesh_cell[:num_parts]
+    assert (np.all(pdf[cell] > 0))
+    for i in range(num_parts):
+        walk = 0
+        summer = 0
+        while (summer < Rand(5, i, bank.event, 0)):
+            summer += pdf[walk]
+            walk += 1
+        assert (cell[i] == walk-1)
+    
+    # a pdf with nothing to sample (no fission anywhere gives zeros or NaN)
+    # would put every particle in the last cell, the table refuses it
+    for pdf in (np.zeros(N_m), np.full(N_m, np.nan)):
+        try:
+            CumulativeTable(pdf)
+            assert (False)
+        except ValueError:
+            pass
+    
+    
+def test_TransportHistories():
+    
+    # pure absorber with a mono-directional beam from the middle of the slab
+    num_part = 300
+    N_mesh = 10
+    dx = 0.1
+    
+    bank = kernels.ParticleBank(num_part)
+    bank.num_part = num_part
+    bank.p_pos_x[:] = 0.5
+    bank.p_mesh_cell[:] = 5
+    bank.p_dir_x[:] = 1
+    bank.p_speed[:] = 1
+    bank.p_id[:] = np.arange(bank.capacity)
+    bank.p_alive[:] = True
+    
+    surface_distances = np.array([0.0, 1.0])
+    mesh_total_xsec = np.ones(N_mesh)
+    mesh_cap_xsec = np.ones(N_mesh)
+    mesh_scat_xsec = np.zeros(N_mesh)
+    mesh_fis_xsec = np.zeros(N_mesh)
+    
+    mesh_dist_traveled = np.zeros(N_mesh)
+    mesh_dist_traveled_squared = np.zeros(N_mesh)
+    
+    [tally_left, tally_right] = kernels.TransportHistories(bank, dx, mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                                                           2, 1.0, surface_distances, mesh_dist_traveled, mesh_dist_traveled_squared)
+    
+    assert(tally_left == 0)
+    assert(abs(tally_right/num_part - math.exp(-0.5)) < 0.1)
+    assert(bank.num_part == 0)
+    assert(np.sum(mesh_dist_traveled[0:5]) == 0)
+    assert(np.sum(mesh_dist_traveled[6:9]) > 0)
+    
+    # fission only, every collision doubles: population must still die out
+    # through leakage and all secondaries get transported
+    bank.num_part = num_part
+    bank.p_alive[:] = True
+    bank.p_pos_x[:] = 0.5
+    bank.p_mesh_cell[:] = 5
+    mesh_fis_xsec[:] = 0.2
+    mesh_cap_xsec[:] = 0.8
+    
+    [tally_left, tally_right] = kernels.TransportHistories(bank, dx, mesh_total_xsec, mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec,
+                                                           2, 1.0, surface_distances, mesh_dist_traveled, mesh_dist_traveled_squared)
+    
+    assert(tally_left > 0)
+    assert(tally_right > 0)
+    assert(bank.num_part == 0)
     
     
 if __name__ == '__main__':
+    test_ParticleBank()
+    test_ParticleBank_grow()
+    test_AdvanceWorkspace()
     test_SourceParticles()
     test_SampleEvent()
     test_StillIn()
     test_BOYD()
+    test_BOYD_double_buffer()
     test_FissionsAdd()
+    test_PopulationControl()
+    test_WeightWindow()
     test_Advance()
-    test_Advance()
-    
+    test_Advance_tally_mesh()
+    test_Advance_time_tally()
+    test_Advance_surface_tally()
+    test_AdvanceDelta()
+    test_Advance_void()
+    test_AdvanceDelta_void()
+    test_Advance_cell_edges()
+    test_SourceParticles_cell_edges()
+    test_EnergyGroups()
+    test_SourceParticles_cdf()
+    test_TransportHistories()
@@ -0,0 +1,212 @@
+import mcdc_tnt.tallies as tallies
+import numpy as np
+
+
+def test_BatchTally():
+    rng = np.random.default_rng(3)
+    batches = rng.random((8, 5))
+    weights = np.array([3, 3, 3, 3, 3, 3, 3, 2], dtype=float)
+    
+    tally = tallies.BatchTally(5)
+    for b in range(8):
+        tally.add_batch(batches[b], weights[b])
+    
+    mean = np.average(batches, axis=0, weights=weights)
+    assert (tally.num_batches == 8)
+    assert (np.allclose(tally.mean, mean))
+    assert (np.allclose(tally.m2, np.sum(weights[:,None]*(batches - mean)**2, axis=0)))
+    
+    #equal weights give the textbook standard error of the mean
+    tally = tallies.BatchTally(5)
+    for b in range(8):
+        tally.add_batch(batches[b])
+    assert (np.allclose(tally.std_error(), np.std(batches, axis=0, ddof=1)/np.sqrt(8)))
+    assert (np.isclose(tally.relative_error(), np.max(tally.std_error()/tally.mean)))
+    
+    
+def test_BatchTally_converged():
+    tally = tallies.BatchTally(2)
+    tally.add_batch(np.array([1.0, 0.0]))
+    
+    #one batch has no error estimate
+    assert (tally.relative_error() == np.inf)
+    assert (tally.converged(0.5) == False)
+    
+    tally.add_batch(np.array([1.2, 0.0]))
+    
+    #cells that never scored are left out
+    assert (np.isclose(tally.relative_error(), 0.1/1.1))
+    assert (tally.converged(0.1) == True)
+    assert (tally.converged(0.05) == False)
+    assert (tally.converged(None, 1.0, 1.0) == True)
+    assert (tally.converged(None, 1000.0, 1.0) == False)
+    assert (tally.converged() == False)
+    
+    
+def test_Generations_implicit_capture_errors():
+    # many weighted track segments per history in every cell, squaring the
+    # segments used to give negative variances (NaN errors), event and
+    # history based
+    import os
+    import tempfile
+    from mcdc_tnt import SimulationSetup
+    from mcdc_tnt.generations import Generations
+    
+    deck = '\n'.join(['name: implicit capture', 'number of particles: 400', 'rng seed: 777',
+                      'particle speed: 1', 'neutrons per fission: 2', 'isotropic: Ture',
+                      'length of slab: 4', 'surface locations: [0,4]', 'dx: 0.25',
+                      'hardware target: pp', 'print warmup times: False', 'assemble mesh: True',
+                      'capture cross section: 0.2', 'scatter cross section: 4.0', 'fission cross section: 0.1',
+                      'implicit capture: True', 'weight cutoff: 0.25', 'file output: False',
+                      'error plot: False', 'flux plot: False', ''])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, 'deck.yaml')
+        for hard_targ, transport_mode in (('pp', 'event'), ('nb_cpu', 'event'), ('nb_cpu', 'history')):
+            with open(input_file, 'w') as f:
+                f.write(deck + 'transport mode: {0}\n'.format(transport_mode))
+            setup = SimulationSetup(input_file, cache=False)
+            setup[0]['hard_targ'] = hard_targ
+            
+            [scalar_flux, standard_deviation_flux, tallies] = Generations(*setup)
+            assert (np.all(np.isfinite(standard_deviation_flux)))
+            assert (np.all(standard_deviation_flux[scalar_flux > 0] > 0))
+
+
+def test_Generations_void_region():
+    # a middle region with no material: particles stream across it (no
+    # division by the zero total cross section) and still score track length,
+    # the reaction rates and collision flux of the void cells are 0
+    import os
+    import tempfile
+    from mcdc_tnt import SimulationSetup
+    from mcdc_tnt.generations import Generations
+    
+    deck = '\n'.join(['name: void region', 'number of particles: 200', 'rng seed: 777',
+                      'particle speed: 1', 'neutrons per fission: 2', 'isotropic: Ture',
+                      'length of slab: 3', 'surface locations: [0,1,2,3]', 'dx: 0.1',
+                      'hardware target: pp', 'print warmup times: False', 'assemble mesh: True',
+                      'capture cross section: [0.5, 0, 0.5]', 'scatter cross section: [0.5, 0, 0.5]',
+                      'fission cross section: [0.3, 0, 0.3]', 'reaction tallies: True', 'file output: False',
+                      'error plot: False', 'flux plot: False', ''])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, 'deck.yaml')
+        for hard_targ, transport_mode, tracking in (('pp', 'event', 'surface'), ('pp', 'history', 'surface'),
+                                                    ('nb_cpu', 'event', 'surface'), ('nb_cpu', 'event', 'delta'),
+                                                    ('nb_cpu', 'history', 'surface')):
+            with open(input_file, 'w') as f:
+                f.write(deck + 'transport mode: {0}\ntracking: {1}\n'.format(transport_mode, tracking))
+            setup = SimulationSetup(input_file, cache=False)
+            setup[0]['hard_targ'] = hard_targ
+            
+            [scalar_flux, standard_deviation_flux, tallies] = Generations(*setup)
+            assert (np.all(np.isfinite(scalar_flux)))
+            assert (np.all(np.isfinite(standard_deviation_flux)))
+            if tracking == 'surface':
+                assert (np.all(scalar_flux[10:20] > 0))
+            if tallies['reaction rates'] is not None:
+                assert (np.all(np.isfinite(tallies['reaction rates'])))
+                assert (np.all(tallies['reaction rates'][:, 10:20] == 0))
+                assert (np.all(tallies['reaction rates'][0, 1:10] > 0))
+
+
+def test_Generations_imported_mesh_unchanged():
+    # memory mapped cross sections are read, never normalized in place: the
+    # arrays match the file after a run and a second run gives the same flux
+    import os
+    import tempfile
+    from mcdc_tnt import SimulationSetup
+    from mcdc_tnt.generations import Generations
+    
+    N_mesh = 20
+    capture = np.linspace(0.2, 0.6, N_mesh)
+    scatter = np.full(N_mesh, 0.8)
+    fission = np.linspace(0.3, 0.1, N_mesh)
+    
+    deck = '\n'.join(['name: imported mesh', 'number of particles: 200', 'rng seed: 777',
+                      'particle speed: 1', 'neutrons per fission: 2', 'isotropic: Ture',
+                      'length of slab: 2', 'surface locations: [0,2]', 'dx: 0.1',
+                      'hardware target: pp', 'print warmup times: False', 'assemble mesh: False',
+                      'mesh file: mesh.npz', 'file output: False',
+                      'error plot: False', 'flux plot: False', ''])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        np.savez(os.path.join(directory, 'mesh.npz'), capture=capture, scatter=scatter, fission=fission)
+        input_file = os.path.join(directory, 'deck.yaml')
+        for hard_targ, transport_mode in (('pp', 'event'), ('nb_cpu', 'event'), ('nb_cpu', 'history')):
+            with open(input_file, 'w') as f:
+                f.write(deck + 'transport mode: {0}\n'.format(transport_mode))
+            setup = SimulationSetup(input_file, cache=False)
+            setup[0]['hard_targ'] = hard_targ
+            
+            [scalar_flux, standard_deviation_flux, tallies] = Generations(*setup)
+            [mesh_cap_xsec, mesh_scat_xsec, mesh_fis_xsec, mesh_total_xsec] = setup[2:6]
+            assert (isinstance(mesh_cap_xsec, np.memmap))
+            assert (np.array_equal(mesh_cap_xsec, capture))
+            assert (np.array_equal(mesh_scat_xsec, scatter))
+            assert (np.array_equal(mesh_fis_xsec, fission))
+            assert (np.array_equal(mesh_total_xsec, capture + scatter + fission))
+            
+            [second_flux, second_deviation, tallies] = Generations(*setup)
+            assert (np.array_equal(scalar_flux, second_flux))
+
+
+def test_Generations_error_modes():
+    # event based runs with history groups take their errors from groups of
+    # whole histories and history based runs square every history, both
+    # estimate the standard error of the mean history score so they must
+    # agree within the noise of a 20 group estimate (squaring track segments,
+    # the default, is ~10x too small here, an extra 1/N in the history
+    # formula was ~40x)
+    import os
+    import tempfile
+    from mcdc_tnt import SimulationSetup
+    from mcdc_tnt.generations import Generations
+    
+    deck = '\n'.join(['name: error modes', 'number of particles: 2000', 'rng seed: 777',
+                      'particle speed: 1', 'neutrons per fission: 2', 'isotropic: Ture',
+                      'length of slab: 4', 'surface locations: [0,4]', 'dx: 0.25',
+                      'hardware target: nb_cpu', 'print warmup times: False', 'assemble mesh: True',
+                      'capture cross section: 0.2', 'scatter cross section: 2.0', 'fission cross section: 0.1',
+                      'file output: False', 'error plot: False', 'flux plot: False', ''])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, 'deck.yaml')
+        errors = []
+        for transport_mode in ('event', 'history'):
+            with open(input_file, 'w') as f:
+                f.write(deck + 'transport mode: {0}\nhistory groups: 20\n'.format(transport_mode))
+            [scalar_flux, standard_deviation_flux, tallies] = Generations(*SimulationSetup(input_file, cache=False))
+            errors.append(standard_deviation_flux[1:-1])
+        
+        ratio = errors[0]/errors[1]
+        assert (0.5 < np.median(ratio) < 2)
+
+
+def test_SimulationSetup_options():
+    # misspelled transport options are refused instead of silently running
+    # the defaults
+    import os
+    import tempfile
+    from mcdc_tnt import SimulationSetup
+    
+    deck = '\n'.join(['name: options', 'number of particles: 10', 'rng seed: 777',
+                      'particle speed: 1', 'neutrons per fission: 2', 'isotropic: Ture',
+                      'length of slab: 1', 'surface locations: [0,1]', 'dx: 0.1',
+                      'hardware target: pp', 'print warmup times: False', 'assemble mesh: True',
+                      'capture cross section: 0.5', 'scatter cross section: 0.5', 'fission cross section: 0.1',
+                      'file output: False', 'error plot: False', 'flux plot: False', ''])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, 'deck.yaml')
+        for option, value, valid in (('transport mode', 'history', True), ('transport mode', 'histroy', False),
+                                     ('tracking', 'delta', True), ('tracking', 'Delta', False)):
+            with open(input_file, 'w') as f:
+                f.write(deck + '{0}: {1}\n'.format(option, value))
+            try:
+                setup = SimulationSetup(input_file, cache=False)
+                assert (valid == True)
+                assert (setup[1][option.replace(' ', '_')] == value)
+            except ValueError:
+                assert (valid == False)